@@ -0,0 +1,33 @@
+"""Measure CPU cost against bytes saved for each response encoding.
+
+Run from ``backend/``::
+
+    python benchmarks/bench_compression.py
+"""
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'lambdas'))
+
+from common import responses  # noqa: E402
+from bench_json import make_flashcards  # noqa: E402
+
+
+def main(sizes=(10, 100, 1000, 5000), number=20):
+    for count in sizes:
+        raw = responses.dumps({'flashcards': make_flashcards(count)}).encode('utf-8')
+        print(f'{count} flashcards, {len(raw) / 1024:.1f} KB uncompressed')
+        for name in responses.ENCODING_PREFERENCE:
+            encode = responses.ENCODERS.get(name)
+            if encode is None:
+                print(f'  {name:8} not installed')
+                continue
+            elapsed = timeit.timeit(lambda: encode(raw), number=number) / number
+            size = len(encode(raw))
+            print(f'  {name:8} {elapsed * 1000:8.2f} ms  {size / 1024:8.1f} KB  '
+                  f'({100 * (1 - size / len(raw)):.0f}% saved)')
+
+
+if __name__ == '__main__':
+    main()
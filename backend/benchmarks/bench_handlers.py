@@ -0,0 +1,392 @@
+"""Latency, DynamoDB calls and consumed capacity for every handler endpoint.
+
+Fills a table with synthetic users (see dataset.py), then drives each endpoint
+with API Gateway v2 events and reports p50/p95/p99 latency, DynamoDB calls per
+request, read/write capacity units per request and where the time went, taken
+from the records common.metrics emits for each invocation. Run from ``backend/``::
+
+    python benchmarks/bench_handlers.py --shape medium --output before.json
+    python benchmarks/bench_handlers.py --shape medium --compare before.json
+
+The in-memory table is used unless STORAGE_BACKEND is set; it reports the units
+DynamoDB would bill. With STORAGE_BACKEND=dynamodb the table named by
+DYNAMODB_TABLE_NAME must already exist and is used as is; the users created are
+deleted at the end. Endpoints that delete or create things run against scratch
+data made before each timed call, so every iteration measures the same work.
+Writes that fail a condition are counted as calls, but DynamoDB does not report
+the capacity they consume.
+"""
+import argparse
+import json
+import logging
+import math
+import os
+import platform
+import random
+import sys
+import time
+import types
+from datetime import datetime, timezone
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..'))
+sys.path.insert(0, os.path.join(HERE, '..', 'lambdas'))
+
+os.environ.setdefault('STORAGE_BACKEND', 'memory')
+os.environ.setdefault('DYNAMODB_TABLE_NAME', 'LangoApp')
+os.environ.setdefault('JWT_SECRET', 'benchmark-secret-of-at-least-32-bytes')
+os.environ.setdefault('AWS_REGION', 'us-east-1')
+# Calls and capacity come from the handlers' metrics records.
+os.environ['METRICS_ENABLED'] = 'true'
+
+import dataset  # noqa: E402
+from dataset import Shape, event  # noqa: E402
+from common import auth, cache, db, metrics  # noqa: E402
+from lambdas.auth import handler as auth_handler  # noqa: E402
+from lambdas.flashcard import handler as flashcard_handler  # noqa: E402
+from lambdas.language import handler as language_handler  # noqa: E402
+from lambdas.set import handler as set_handler  # noqa: E402
+from lambdas.user import handler as user_handler  # noqa: E402
+
+HANDLERS = types.SimpleNamespace(auth=auth_handler, user=user_handler, language=language_handler,
+                                 set=set_handler, flashcard=flashcard_handler)
+
+PERCENTILES = (50, 95, 99)
+
+
+def percentile(ordered, p):
+    """Nearest-rank percentile of an ascending list."""
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+
+class Bench:
+    def __init__(self, shape, seed, iterations, cold):
+        self.shape = shape
+        self.seed = seed
+        self.iterations = iterations
+        self.cold = cold
+        self.rng = random.Random(seed + 1)
+        # Metrics records of the timed invocations; setup calls are not kept.
+        self.records = None
+        self.users = []
+        self.scratch = None
+        self.created = []
+        self.results = {}
+
+    def setup(self):
+        if db.backend() == 'memory':
+            db.create_table()
+        metrics.sink = self.collect
+        started = time.perf_counter()
+        self.users = dataset.build(HANDLERS, self.shape, self.seed)
+        # Scratch data for the endpoints that add or delete things. One language
+        # and set at the dataset's size keeps each delete the same size.
+        scratch_shape = Shape(users=1, languages=1, sets=1, cards=self.shape.cards)
+        self.scratch = dataset.create_user(HANDLERS, self.rng, scratch_shape, 9999, prefix='scratch')
+        print(f'Seeded {self.shape.users} users with {self.shape.total_cards} flashcards '
+              f'in {time.perf_counter() - started:.1f}s ({db.backend()} backend)')
+
+    def teardown(self):
+        if db.backend() == 'memory':
+            return
+        for user in self.users + [self.scratch] + self.created:
+            user_handler.delete_user(event(user, method='DELETE'), None)
+
+    # Helpers for building events
+
+    def user(self, i):
+        return self.users[i % len(self.users)]
+
+    def card(self, i, set_offset=0):
+        """(user, language, set_id, flashcard_id) for iteration i."""
+        user = self.user(i)
+        sets = [key for key in user.cards if user.cards[key]]
+        language, set_id = sets[(i // len(self.users) + set_offset) % len(sets)]
+        cards = user.cards[(language, set_id)]
+        return user, language, set_id, cards[(i * 7) % len(cards)]
+
+    def scratch_language(self):
+        return next(iter(self.scratch.sets))
+
+    def scratch_set(self, i, cards=0):
+        """A new set in the scratch language, holding cards flashcards."""
+        language = self.scratch_language()
+        created = dataset.check(set_handler.add_set(event(
+            self.scratch, {'set_name': f'Scratch {i}'}, method='POST', language=language), None))
+        ids = []
+        if cards:
+            ids = dataset.add_cards(HANDLERS, self.scratch, language, created['set_id'],
+                                    dataset.flashcards(self.rng, language, cards))
+        return language, created['set_id'], ids
+
+    # Running
+
+    def collect(self, record):
+        if self.records is not None:
+            self.records.append(record)
+
+    def run(self, name, function, prepare, after=None):
+        latencies = []
+        records = []
+        errors = 0
+        for i in range(self.iterations):
+            request = prepare(i)
+            if self.cold:
+                cache.clear_all()
+                auth.clear_cache()
+            self.records = records
+            started = time.perf_counter()
+            try:
+                response = function(request, None)
+            finally:
+                elapsed = time.perf_counter() - started
+                self.records = None
+            latencies.append(elapsed * 1000)
+            if after is not None:
+                after(response)
+            if response['statusCode'] >= 400:
+                errors += 1
+                if errors == 1:
+                    print(f"  {name}: {response['statusCode']} {response.get('body')}", file=sys.stderr)
+        self.results[name] = self.summarise(latencies, records, errors)
+
+    @staticmethod
+    def summarise(latencies, records, errors):
+        ordered = sorted(latencies)
+        count = len(latencies)
+        calls = {}
+        for record in records:
+            for operation, number in record['DynamoDBOperations'].items():
+                calls[operation] = calls.get(operation, 0) + number
+
+        def mean(field):
+            return round(sum(record[field] for record in records) / count, 3)
+
+        return {
+            'requests': count,
+            'errors': errors,
+            'latency_ms': dict(
+                {f'p{p}': round(percentile(ordered, p), 3) for p in PERCENTILES},
+                mean=round(sum(ordered) / count, 3), max=round(ordered[-1], 3)),
+            'phases_ms': {phase: mean(field) for phase, field in metrics.PHASES.items()},
+            'calls_per_request': round(sum(calls.values()) / count, 2),
+            'calls': {operation: round(number / count, 2) for operation, number in sorted(calls.items())},
+            'read_units_per_request': round(mean('ConsumedReadCapacity'), 2),
+            'write_units_per_request': round(mean('ConsumedWriteCapacity'), 2),
+        }
+
+    def endpoints(self):
+        """(name, handler, prepare(i) -> event[, after(response)]) per endpoint, writes and deletes last."""
+        now = int(time.time())
+        review_base = now - self.iterations - 1
+
+        def on_card(i, set_offset=0, **extra):
+            user, language, set_id, flashcard_id = self.card(i, set_offset)
+            return user, dict(language=language, set_id=set_id, flashcard_id=flashcard_id, **extra)
+
+        def search_query(i):
+            user = self.user(i)
+            language = list(user.sets)[i % len(user.sets)]
+            word = dataset.VOCABULARY[language][0][i % len(dataset.VOCABULARY[language][0])][0]
+            return event(user, q=word[:3])
+
+        def set_event(i, body=None, method='GET', **extra):
+            user, params = on_card(i)
+            del params['flashcard_id']
+            return event(user, body, method, **params, **extra)
+
+        def reviews(i):
+            user, language, set_id, _ = self.card(i, set_offset=1)
+            cards = user.cards[(language, set_id)]
+            return event(user, {'reviews': [
+                {'language': language, 'set_id': set_id, 'flashcard_id': cards[(i * 20 + n) % len(cards)],
+                 'grade': 3 + n % 3, 'reviewed_at': review_base + i}
+                for n in range(min(20, len(cards)))
+            ]}, method='POST')
+
+        def edit_flashcard(i):
+            user, params = on_card(i)
+            card = dataset.check(flashcard_handler.get_flashcard(event(user, **params), None))['flashcard']
+            fields = {field: card[field] for field in ('word', 'translated_word', 'translated_usage')}
+            return event(user, dict(fields, usage=f'{card["usage"]} ({i})'), method='PUT', **params)
+
+        def signed_up(response):
+            if response['statusCode'] == 201:
+                body = json.loads(response['body'])
+                self.created.append(dataset.User(body['user_id'], None, body['token'], {}, {}))
+
+        def signup(i):
+            return event(body={'username': f'signup{self.seed}x{i:05d}{self.rng.randrange(16 ** 6):06x}',
+                               'password': dataset.PASSWORD, 'first_name': 'New', 'last_name': 'User',
+                               'preferred_language': 'english'}, method='POST')
+
+        def import_csv(i):
+            language, set_id, _ = self.scratch_set(i)
+            cards = dataset.flashcards(self.rng, language, min(self.shape.cards, 100))
+            rows = ['word,translated_word,usage,translated_usage'] + [
+                ','.join('"' + card[field].replace('"', '""') + '"'
+                         for field in ('word', 'translated_word', 'usage', 'translated_usage'))
+                for card in cards
+            ]
+            return event(self.scratch, method='POST', raw_body='\n'.join(rows), language=language, set_id=set_id,
+                         has_header='true')
+
+        def add_flashcard(i):
+            language, set_id, _ = self.scratch_set(i)
+            return event(self.scratch, dataset.flashcards(self.rng, language, 1)[0], method='POST',
+                         language=language, set_id=set_id)
+
+        def add_flashcards(i):
+            language, set_id, _ = self.scratch_set(i)
+            return event(self.scratch, {'flashcards': dataset.flashcards(self.rng, language, min(self.shape.cards, 100))},
+                         method='POST', language=language, set_id=set_id)
+
+        def delete_flashcard(i):
+            language, set_id, ids = self.scratch_set(i, cards=1)
+            return event(self.scratch, method='DELETE', language=language, set_id=set_id, flashcard_id=ids[0])
+
+        def delete_set(i):
+            language, set_id, _ = self.scratch_set(i, cards=self.shape.cards)
+            return event(self.scratch, method='DELETE', language=language, set_id=set_id)
+
+        def delete_language(i):
+            language = f'scratch{i}'
+            dataset.check(language_handler.add_language(event(self.scratch, {'language': language}, method='POST'), None))
+            created = dataset.check(set_handler.add_set(event(
+                self.scratch, {'set_name': 'Scratch'}, method='POST', language=language), None))
+            dataset.add_cards(HANDLERS, self.scratch, language, created['set_id'],
+                              dataset.flashcards(self.rng, 'spanish', self.shape.cards))
+            return event(self.scratch, method='DELETE', language=language)
+
+        def delete_user(i):
+            shape = Shape(users=1, languages=1, sets=2, cards=self.shape.cards)
+            user = dataset.create_user(HANDLERS, self.rng, shape, i, prefix='doomed')
+            return event(user, method='DELETE')
+
+        return [
+            ('login', auth_handler.login,
+             lambda i: event(body={'username': self.user(i).username, 'password': dataset.PASSWORD}, method='POST')),
+            ('get_user', user_handler.get_user, lambda i: event(self.user(i))),
+            ('get_dashboard', user_handler.get_dashboard, lambda i: event(self.user(i), include_counts='true')),
+            ('export_user_data', user_handler.export_user_data, lambda i: event(self.user(i))),
+            ('get_languages', language_handler.get_languages, lambda i: event(self.user(i))),
+            ('get_sets', set_handler.get_sets,
+             lambda i: event(self.user(i), language=list(self.user(i).sets)[i % self.shape.languages])),
+            ('get_set', set_handler.get_set, set_event),
+            ('get_flashcards', flashcard_handler.get_flashcards, set_event),
+            ('get_flashcards?limit=50', flashcard_handler.get_flashcards, lambda i: set_event(i, limit='50')),
+            ('get_flashcard', flashcard_handler.get_flashcard, lambda i: event(on_card(i)[0], **on_card(i)[1])),
+            ('get_due', flashcard_handler.get_due, lambda i: event(self.user(i))),
+            ('search_flashcards', flashcard_handler.search_flashcards, search_query),
+            ('edit_user', user_handler.edit_user,
+             lambda i: event(self.user(i), {'username': self.user(i).username, 'first_name': 'Bench',
+                                            'last_name': f'User {i}', 'preferred_language': 'english'}, method='PUT')),
+            ('edit_set', set_handler.edit_set,
+             lambda i: set_event(i, {'set_name': f'Renamed {i}'}, method='PUT')),
+            ('edit_flashcard', flashcard_handler.edit_flashcard, edit_flashcard),
+            ('grade_flashcard', flashcard_handler.grade_flashcard,
+             lambda i: event(on_card(i)[0], {'grade': 3 + i % 3}, method='POST', **on_card(i)[1])),
+            ('submit_reviews', flashcard_handler.submit_reviews, reviews),
+            ('add_language', language_handler.add_language,
+             lambda i: event(self.scratch, {'language': f'added{i}'}, method='POST')),
+            ('add_set', set_handler.add_set,
+             lambda i: event(self.scratch, {'set_name': f'Added {i}'}, method='POST', language=self.scratch_language())),
+            ('add_flashcard', flashcard_handler.add_flashcard, add_flashcard),
+            ('add_flashcards', flashcard_handler.add_flashcards, add_flashcards),
+            ('import_flashcards', flashcard_handler.import_flashcards, import_csv),
+            ('delete_flashcard', flashcard_handler.delete_flashcard, delete_flashcard),
+            ('delete_set', set_handler.delete_set, delete_set),
+            ('delete_language', language_handler.delete_language, delete_language),
+            ('delete_user', user_handler.delete_user, delete_user),
+            ('signup', auth_handler.signup, signup, signed_up),
+        ]
+
+    def report(self):
+        return {
+            'meta': {
+                'created_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+                'backend': db.backend(),
+                'shape': dict(vars(self.shape)),
+                'seed': self.seed,
+                'iterations': self.iterations,
+                'cold_cache': self.cold,
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+            },
+            'endpoints': self.results,
+        }
+
+
+def print_results(results, baseline=None):
+    header = f"{'endpoint':26} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'calls':>7} {'RCU':>8} {'WCU':>8}"
+    print(header)
+    print('-' * len(header))
+    for name, result in results.items():
+        latency = result['latency_ms']
+        print(f"{name:26} {latency['p50']:9.2f} {latency['p95']:9.2f} {latency['p99']:9.2f} "
+              f"{result['calls_per_request']:7.1f} {result['read_units_per_request']:8.1f} "
+              f"{result['write_units_per_request']:8.1f}" + (f"  ({result['errors']} errors)" if result['errors'] else ''))
+        before = (baseline or {}).get(name)
+        if before:
+            print(' ' * 26 + ' '.join(change(before, result, field) for field in (
+                ('latency_ms', 'p50'), ('latency_ms', 'p95'), ('latency_ms', 'p99'),
+                ('calls_per_request',), ('read_units_per_request',), ('write_units_per_request',))))
+
+
+def change(before, after, field):
+    old, new = before, after
+    for part in field:
+        old, new = old.get(part), new.get(part)
+    width = 9 if field[0] == 'latency_ms' else (7 if field[0] == 'calls_per_request' else 8)
+    if not old:
+        return f"{'-':>{width}}"
+    return f'{100 * (new - old) / old:+{width - 1}.0f}%'
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--shape', choices=sorted(dataset.SHAPES), default='small', help='dataset size (default small)')
+    parser.add_argument('--users', type=int, help='override the number of users')
+    parser.add_argument('--languages', type=int, help='override languages per user')
+    parser.add_argument('--sets', type=int, help='override sets per language')
+    parser.add_argument('--cards', type=int, help='override flashcards per set')
+    parser.add_argument('--iterations', type=int, default=20, help='timed requests per endpoint (default 20)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--cold', action='store_true', help='clear the in-container caches before every request')
+    parser.add_argument('--only', action='append', help='run only this endpoint (repeatable)')
+    parser.add_argument('--output', help='write the results as JSON to this file')
+    parser.add_argument('--compare', help='print changes against a previous --output file')
+    args = parser.parse_args(argv)
+
+    shape = dataset.SHAPES[args.shape]
+    shape = Shape(**{field: getattr(args, field) or getattr(shape, field) for field in vars(shape)})
+    if shape.languages > len(dataset.VOCABULARY):
+        parser.error(f'at most {len(dataset.VOCABULARY)} languages per user are available')
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)['endpoints']
+
+    # Handlers log every step; keep errors visible but not the rest.
+    logging.disable(logging.WARNING)
+    bench = Bench(shape, args.seed, args.iterations, args.cold)
+    bench.setup()
+    try:
+        for name, function, *hooks in bench.endpoints():
+            if args.only and name not in args.only:
+                continue
+            bench.run(name, function, *hooks)
+    finally:
+        bench.teardown()
+
+    print(f'{args.iterations} requests per endpoint, {"cold" if args.cold else "warm"} caches')
+    print_results(bench.results, baseline)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(bench.report(), f, indent=2, ensure_ascii=False)
+            f.write('\n')
+        print(f'Results written to {args.output}')
+
+
+if __name__ == '__main__':
+    main()
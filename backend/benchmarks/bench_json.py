@@ -0,0 +1,46 @@
+"""Compare the old ``json.dumps(default=str)`` path with ``common.responses.dumps``.
+
+Run from ``backend/``::
+
+    python benchmarks/bench_json.py
+"""
+import json
+import os
+import sys
+import timeit
+from decimal import Decimal
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'lambdas'))
+
+from common import responses  # noqa: E402
+
+
+def make_flashcards(count):
+    return [
+        {
+            'PK': 'USER#u1#LANGUAGE#spanish#SET#s1',
+            'SK': f'FLASHCARD#{i:08d}',
+            'id': f'{i:08d}',
+            'front': f'palabra {i}',
+            'back': f'word {i}',
+            'example': 'Él come una manzana todos los días.',
+            'created_at': Decimal(1700000000 + i),
+            'updated_at': Decimal(1700000000 + i),
+        }
+        for i in range(count)
+    ]
+
+
+def main(count=5000, number=20):
+    cards = {'flashcards': make_flashcards(count)}
+    baseline = timeit.timeit(lambda: json.dumps(cards, default=str), number=number)
+    shared = timeit.timeit(lambda: responses.dumps(cards), number=number)
+    backend = 'orjson' if responses.orjson is not None else 'stdlib'
+    print(f'{count} flashcards x {number} runs')
+    print(f'  json.dumps(default=str): {baseline / number * 1000:8.2f} ms')
+    print(f'  responses.dumps ({backend}): {shared / number * 1000:8.2f} ms')
+    print(f'  speedup: {baseline / shared:.2f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,233 @@
+"""Cold-start cost of every Lambda function defined in terraform/lambda.tf.
+
+Each function is started the way Lambda starts it: a fresh interpreter with the
+function's zip laid out on sys.path (the zip's handler.py and common/ at the
+root, compiled the way build_all.sh compiles them), importing ``handler`` and
+looking up the entry point named in lambda.tf. The import runs under ``python -X importtime``, so besides the init
+duration the report shows which top-level packages the time went to. The entry
+point is then invoked once with an authenticated event to time the first call,
+which pays for anything the module left to load lazily. Run from ``backend/``::
+
+    python benchmarks/coldstart.py
+    python benchmarks/coldstart.py --only get_sets --only login --imports 10
+    python benchmarks/coldstart.py --budget-ms 400 --output coldstart.json
+    python benchmarks/coldstart.py --no-bytecode   # zips built without .pyc files
+    python benchmarks/coldstart.py --only router --route 'PUT /editSet'
+
+With --budget-ms (init) or --first-call-budget-ms the script exits non-zero when
+any function's median exceeds the budget, so it can run in CI. The first call
+uses the in-memory table, created before the call, so it measures our code but
+no network round trips. Timings are wall-clock on this machine; compare runs made
+on the same machine, not against Lambda's reported Init Duration.
+"""
+import argparse
+import compileall
+import json
+import os
+import py_compile
+import re
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+BACKEND = os.path.join(HERE, '..')
+LAMBDAS = os.path.join(BACKEND, 'lambdas')
+LAMBDA_TF = os.path.join(BACKEND, '..', 'terraform', 'lambda.tf')
+API_GATEWAY_TF = os.path.join(BACKEND, '..', 'terraform', 'api_gateway.tf')
+
+JWT_SECRET = 'coldstart-secret-of-at-least-32-bytes'
+USER_ID = 'coldstart-user'
+
+FUNCTION = re.compile(
+    r'^\s*(\w+)\s*=\s*\{\s*zip\s*=\s*"(\w+)\.zip"\s*handler\s*=\s*"handler\.(\w+)"', re.MULTILINE)
+ENDPOINT = re.compile(r'^\s*(\w+)\s*=\s*\{\s*method\s*=\s*"(\w+)",\s*function\s*=\s*"(\w+)"', re.MULTILINE)
+IMPORT_LINE = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|( *)(\S+)$')
+
+# Runs in the fresh interpreter. The markers fence off the handler's imports
+# from the probe's own in the -X importtime output.
+PROBE = '''
+import json, os, sys, time
+started = time.perf_counter()
+sys.stderr.write('coldstart:init\\n'); sys.stderr.flush()
+import handler
+entry = getattr(handler, os.environ['COLDSTART_ENTRY'])
+init = time.perf_counter() - started
+sys.stderr.write('coldstart:done\\n'); sys.stderr.flush()
+if os.environ['STORAGE_BACKEND'] == 'memory':
+    from common import db
+    db.create_table()
+loaded = set(sys.modules)
+started = time.perf_counter()
+response = entry(json.loads(os.environ['COLDSTART_EVENT']), None)
+call = time.perf_counter() - started
+print(json.dumps({
+    'init_ms': init * 1000,
+    'first_call_ms': call * 1000,
+    'status_code': (response or {}).get('statusCode'),
+    'loaded_by_call': sorted({name if name.startswith('common.') else name.split('.')[0]
+                              for name in set(sys.modules) - loaded}),
+}))
+'''
+
+
+def functions(path=LAMBDA_TF):
+    """(function, zip, entry point) for each entry of local.lambda_functions."""
+    with open(path) as f:
+        return [match.groups() for match in FUNCTION.finditer(f.read())]
+
+
+def route_keys(path=API_GATEWAY_TF):
+    """Route key of each function's endpoint in local.lango_endpoints."""
+    with open(path) as f:
+        return {function: f'{method} /{name}' for name, method, function in ENDPOINT.findall(f.read())}
+
+
+def token():
+    import jwt
+    return jwt.encode({'user_id': USER_ID, 'username': 'coldstart', 'exp': int(time.time()) + 3600},
+                      JWT_SECRET, algorithm='HS256')
+
+
+def event(bearer, route_key):
+    # Enough for every entry point to get past authentication; most then stop at
+    # validation or an empty table, which is the cheap end of a first call.
+    return {
+        'routeKey': route_key,
+        'headers': {'authorization': f'Bearer {bearer}'},
+        'queryStringParameters': {'user_id': USER_ID, 'language': 'spanish', 'set_id': 'set-1', 'flashcard_id': 'card-1'},
+        'body': '{}',
+        'requestContext': {'http': {'method': 'GET'}},
+    }
+
+
+def imports_by_package(stderr):
+    """Self time (ms) per top-level package imported between the probe's markers."""
+    lines = stderr.splitlines()
+    try:
+        lines = lines[lines.index('coldstart:init') + 1:lines.index('coldstart:done')]
+    except ValueError:
+        return {}
+    totals = {}
+    for line in lines:
+        match = IMPORT_LINE.match(line)
+        if match:
+            package = match.group(4).split('.')[0]
+            totals[package] = totals.get(package, 0.0) + int(match.group(1)) / 1000
+    return totals
+
+
+def stage(target, bytecode=True):
+    """Copy the Lambda sources to target, compiled like build_all.sh unless bytecode is False."""
+    shutil.copytree(LAMBDAS, target, ignore=shutil.ignore_patterns('__pycache__', 'zip', 'package'))
+    if bytecode:
+        compileall.compile_dir(target, quiet=1, invalidation_mode=py_compile.PycInvalidationMode.UNCHECKED_HASH)
+    return target
+
+
+def probe(root, function, zip_name, entry, bearer, route_key):
+    zip_root = os.path.join(root, zip_name)
+    env = dict(os.environ)
+    env.update({
+        # The zip puts handler.py and common/ side by side at its root.
+        'PYTHONPATH': os.pathsep.join([zip_root, root]),
+        # /var/task is read-only, so whatever the zip lacks is compiled on every cold start.
+        'PYTHONDONTWRITEBYTECODE': '1',
+        'AWS_LAMBDA_FUNCTION_NAME': f'{function}Function',
+        'STORAGE_BACKEND': env.get('STORAGE_BACKEND', 'memory'),
+        'DYNAMODB_TABLE_NAME': env.get('DYNAMODB_TABLE_NAME', 'LangoApp'),
+        'AWS_REGION': env.get('AWS_REGION', 'us-east-1'),
+        'JWT_SECRET': JWT_SECRET,
+        'METRICS_ENABLED': 'false',
+        'LOG_LEVEL': 'CRITICAL',
+        'COLDSTART_ENTRY': entry,
+        'COLDSTART_EVENT': json.dumps(event(bearer, route_key)),
+    })
+    completed = subprocess.run([sys.executable, '-X', 'importtime', '-c', PROBE], cwd=zip_root, env=env,
+                               capture_output=True, text=True)
+    if completed.returncode != 0:
+        raise RuntimeError(f'{function} failed to start:\n{completed.stderr[-2000:]}')
+    result = json.loads(completed.stdout.strip().splitlines()[-1])
+    result['imports'] = imports_by_package(completed.stderr)
+    return result
+
+
+def measure(root, function, zip_name, entry, runs, bearer, route_key):
+    samples = [probe(root, function, zip_name, entry, bearer, route_key) for _ in range(runs)]
+    imports = {}
+    for sample in samples:
+        for package, ms in sample['imports'].items():
+            imports.setdefault(package, []).append(ms)
+    return {
+        'zip': f'{zip_name}.zip',
+        'handler': f'handler.{entry}',
+        'route': route_key,
+        'init_ms': round(statistics.median(s['init_ms'] for s in samples), 2),
+        'first_call_ms': round(statistics.median(s['first_call_ms'] for s in samples), 2),
+        'status_code': samples[-1]['status_code'],
+        'loaded_by_call': samples[-1]['loaded_by_call'],
+        'imports_ms': {package: round(statistics.median(values), 2)
+                       for package, values in sorted(imports.items(), key=lambda item: -statistics.median(item[1]))},
+    }
+
+
+def over_budget(results, budget_ms, first_call_budget_ms):
+    failures = []
+    for function, result in results.items():
+        if budget_ms is not None and result['init_ms'] > budget_ms:
+            failures.append(f"{function}: init {result['init_ms']:.1f} ms > {budget_ms:.1f} ms")
+        if first_call_budget_ms is not None and result['first_call_ms'] > first_call_budget_ms:
+            failures.append(f"{function}: first call {result['first_call_ms']:.1f} ms > {first_call_budget_ms:.1f} ms")
+    return failures
+
+
+def report(results, top):
+    print(f"{'function':<22} {'zip':<14} {'init ms':>9} {'call ms':>9} {'status':>6}  top imports (ms)")
+    for function, result in results.items():
+        imports = ', '.join(f'{package} {ms:.0f}' for package, ms in list(result['imports_ms'].items())[:top])
+        print(f"{function:<22} {result['zip']:<14} {result['init_ms']:>9.1f} {result['first_call_ms']:>9.1f} "
+              f"{result['status_code']!s:>6}  {imports}")
+        if result['loaded_by_call']:
+            print(f"{'':<22} first call loaded: {', '.join(result['loaded_by_call'])}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--only', action='append', help='function name from lambda.tf (repeatable)')
+    parser.add_argument('--runs', type=int, default=3, help='fresh interpreters per function; the median is reported')
+    parser.add_argument('--imports', type=int, default=5, help='top-level packages to show per function')
+    parser.add_argument('--budget-ms', type=float, help='fail when a median init duration exceeds this')
+    parser.add_argument('--first-call-budget-ms', type=float, help='fail when a median first call exceeds this')
+    parser.add_argument('--route', default='GET /getSets', help='route key the router function is called with')
+    parser.add_argument('--no-bytecode', action='store_true', help='start from .py files only, as zips without .pyc do')
+    parser.add_argument('--output', help='write the results as JSON to this file')
+    args = parser.parse_args(argv)
+
+    selected = [f for f in functions() if not args.only or f[0] in args.only]
+    if not selected:
+        parser.error('no functions matched --only')
+    bearer = token()
+    routes = route_keys()
+    with tempfile.TemporaryDirectory() as staging:
+        root = stage(os.path.join(staging, 'lambdas'), bytecode=not args.no_bytecode)
+        results = {function: measure(root, function, zip_name, entry, args.runs, bearer,
+                                     routes.get(function, args.route))
+                   for function, zip_name, entry in selected}
+
+    report(results, args.imports)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'python': sys.version.split()[0], 'runs': args.runs, 'bytecode': not args.no_bytecode,
+                       'functions': results}, f, indent=2)
+
+    failures = over_budget(results, args.budget_ms, args.first_call_budget_ms)
+    for failure in failures:
+        print(f'over budget: {failure}', file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,183 @@
+"""Synthetic users for the handler benchmarks.
+
+Users are created through the handlers themselves (signup, add_language,
+add_set, add_flashcards), so the table ends up with every item a real account
+has: username claims, aggregates, search postings and word keys. Text is drawn
+from small per-language vocabularies, so cards carry accented, Cyrillic,
+Hangul, kana and Arabic text of realistic length. The same seed always builds
+the same dataset.
+"""
+import json
+import random
+from dataclasses import dataclass
+
+PASSWORD = 'Benchmark#2024'
+
+# (word, translation) pairs and a (usage, translated usage) template per language.
+VOCABULARY = {
+    'spanish': (
+        [('manzana', 'apple'), ('biblioteca', 'library'), ('cuchara', 'spoon'), ('estación', 'station'),
+         ('mañana', 'morning'), ('almohada', 'pillow'), ('paraguas', 'umbrella'), ('corazón', 'heart'),
+         ('ventana', 'window'), ('cumpleaños', 'birthday'), ('pájaro', 'bird'), ('lápiz', 'pencil')],
+        ('¿Dónde está {word}? La necesito hoy.', 'Where is the {translation}? I need it today.'),
+    ),
+    'french': (
+        [('fenêtre', 'window'), ('boulangerie', 'bakery'), ('château', 'castle'), ('écureuil', 'squirrel'),
+         ('forêt', 'forest'), ('hôpital', 'hospital'), ('cœur', 'heart'), ('garçon', 'boy'),
+         ('île', 'island'), ('clé', 'key'), ('été', 'summer'), ('parapluie', 'umbrella')],
+        ("J'ai oublié {word} chez mon frère hier soir.", 'I forgot the {translation} at my brother\'s last night.'),
+    ),
+    'german': (
+        [('Frühstück', 'breakfast'), ('Schlüssel', 'key'), ('Mädchen', 'girl'), ('Straße', 'street'),
+         ('Brötchen', 'bread roll'), ('Tür', 'door'), ('Gemüse', 'vegetables'), ('Fahrkarte', 'ticket'),
+         ('Wörterbuch', 'dictionary'), ('Käse', 'cheese'), ('Geschäft', 'shop'), ('Übung', 'exercise')],
+        ('Ich habe {word} gestern im Zug vergessen.', 'I forgot the {translation} on the train yesterday.'),
+    ),
+    'russian': (
+        [('яблоко', 'apple'), ('библиотека', 'library'), ('окно', 'window'), ('сердце', 'heart'),
+         ('ключ', 'key'), ('улица', 'street'), ('зонтик', 'umbrella'), ('подушка', 'pillow'),
+         ('птица', 'bird'), ('карандаш', 'pencil'), ('вокзал', 'station'), ('лес', 'forest')],
+        ('Где {word}? Я искал весь вечер.', 'Where is the {translation}? I looked all evening.'),
+    ),
+    'korean': (
+        [('사과', 'apple'), ('도서관', 'library'), ('창문', 'window'), ('마음', 'heart'),
+         ('열쇠', 'key'), ('거리', 'street'), ('우산', 'umbrella'), ('베개', 'pillow'),
+         ('새', 'bird'), ('연필', 'pencil'), ('기차역', 'train station'), ('숲', 'forest')],
+        ('어제 {word}을 집에 두고 왔어요.', 'I left the {translation} at home yesterday.'),
+    ),
+    'japanese': (
+        [('りんご', 'apple'), ('図書館', 'library'), ('窓', 'window'), ('心', 'heart'),
+         ('鍵', 'key'), ('通り', 'street'), ('傘', 'umbrella'), ('枕', 'pillow'),
+         ('鳥', 'bird'), ('鉛筆', 'pencil'), ('駅', 'station'), ('森', 'forest')],
+        ('昨日、{word}を電車に忘れました。', 'Yesterday I left the {translation} on the train.'),
+    ),
+    'arabic': (
+        [('تفاحة', 'apple'), ('مكتبة', 'library'), ('نافذة', 'window'), ('قلب', 'heart'),
+         ('مفتاح', 'key'), ('شارع', 'street'), ('مظلة', 'umbrella'), ('وسادة', 'pillow'),
+         ('طائر', 'bird'), ('قلم', 'pencil'), ('محطة', 'station'), ('غابة', 'forest')],
+        ('أين {word}؟ بحثت عنها طوال المساء.', 'Where is the {translation}? I looked for it all evening.'),
+    ),
+}
+
+# Words are made unique within a set by pairing them with a qualifier when the
+# vocabulary runs out, the way learners add "big dog" after "dog".
+QUALIFIERS = ['small', 'old', 'new', 'red', 'second', 'broken', 'favourite', 'borrowed']
+
+
+@dataclass(frozen=True)
+class Shape:
+    users: int
+    languages: int
+    sets: int
+    cards: int
+
+    @property
+    def total_cards(self):
+        return self.users * self.languages * self.sets * self.cards
+
+
+SHAPES = {
+    'small': Shape(users=2, languages=2, sets=2, cards=20),
+    'medium': Shape(users=3, languages=3, sets=4, cards=100),
+    'large': Shape(users=4, languages=4, sets=6, cards=500),
+}
+
+
+@dataclass
+class User:
+    user_id: str
+    username: str
+    token: str
+    sets: dict  # {language: [set_id, ...]}
+    cards: dict  # {(language, set_id): [flashcard_id, ...]}
+
+    def headers(self):
+        return {'authorization': f'Bearer {self.token}'}
+
+
+def event(user=None, body=None, method='GET', raw_body=None, **params):
+    """An API Gateway v2 (HTTP API) event as the handlers receive it."""
+    headers = {'content-type': 'application/json', 'accept-encoding': 'gzip, br'}
+    if user is not None:
+        headers.update(user.headers())
+    if raw_body is None and body is not None:
+        raw_body = json.dumps(body)
+    return {
+        'version': '2.0',
+        'rawPath': '/',
+        'headers': headers,
+        'queryStringParameters': dict(params) if params else None,
+        'body': raw_body,
+        'isBase64Encoded': False,
+        'requestContext': {'http': {'method': method, 'path': '/', 'protocol': 'HTTP/1.1'}},
+    }
+
+
+def flashcards(rng, language, count):
+    """count flashcards in language, each word unique within the list."""
+    vocabulary, (usage, translated_usage) = VOCABULARY[language]
+    pairs = list(vocabulary)
+    rng.shuffle(pairs)
+    cards = []
+    for index in range(count):
+        word, translation = pairs[index % len(pairs)]
+        round_ = index // len(pairs)
+        if round_:
+            qualifier = QUALIFIERS[(round_ - 1) % len(QUALIFIERS)]
+            suffix = f' {round_}' if round_ > len(QUALIFIERS) else ''
+            word, translation = f'{word} ({qualifier}{suffix})', f'{qualifier} {translation}{suffix}'
+        cards.append({
+            'word': word,
+            'translated_word': translation,
+            'usage': usage.format(word=word),
+            'translated_usage': translated_usage.format(translation=translation),
+        })
+    return cards
+
+
+def check(response, *expected):
+    if response['statusCode'] not in (expected or (200, 201)):
+        raise RuntimeError(f"Seeding failed with {response['statusCode']}: {response.get('body')}")
+    return json.loads(response['body']) if response.get('body') else {}
+
+
+def create_user(handlers, rng, shape, number, prefix='bench'):
+    """Sign up one user and fill their languages, sets and cards."""
+    username = f'{prefix}{number:04d}{rng.randrange(16 ** 6):06x}'
+    signed_up = check(handlers.auth.signup(event(body={
+        'username': username,
+        'password': PASSWORD,
+        'first_name': 'Bench',
+        'last_name': f'User {number}',
+        'preferred_language': 'english',
+    }, method='POST'), None))
+    user = User(signed_up['user_id'], username, signed_up['token'], {}, {})
+
+    for language in rng.sample(sorted(VOCABULARY), shape.languages):
+        check(handlers.language.add_language(event(user, {'language': language}, method='POST'), None))
+        user.sets[language] = []
+        for set_number in range(shape.sets):
+            created = check(handlers.set.add_set(event(user, {
+                'set_name': f'{language.title()} {set_number + 1}',
+                'set_description': f'Everyday {language} vocabulary, part {set_number + 1}',
+            }, method='POST', language=language), None))
+            set_id = created['set_id']
+            user.sets[language].append(set_id)
+            user.cards[(language, set_id)] = add_cards(handlers, user, language, set_id,
+                                                       flashcards(rng, language, shape.cards))
+    return user
+
+
+def add_cards(handlers, user, language, set_id, cards, chunk=500):
+    ids = []
+    for start in range(0, len(cards), chunk):
+        added = check(handlers.flashcard.add_flashcards(event(
+            user, {'flashcards': cards[start:start + chunk]}, method='POST', language=language, set_id=set_id), None))
+        ids.extend(result['flashcard_id'] for result in added['results'] if 'flashcard_id' in result)
+    return ids
+
+
+def build(handlers, shape, seed=0):
+    """Create shape.users users and return them."""
+    rng = random.Random(seed)
+    return [create_user(handlers, rng, shape, number) for number in range(shape.users)]
@@ -1,7 +1,9 @@
 #!/bin/bash
 
 # Lambda directories to process
-dirs=(set auth user language flashcard)
+handler_dirs=(set auth user language flashcard)
+# router.zip (deployment_mode = "router") carries every handler above
+dirs=("${handler_dirs[@]}" router)
 
 # Output directory for zip files
 output_dir="lambdas/zip"
@@ -28,6 +30,22 @@ for dir in "${dirs[@]}"; do
   fi
 
   cp "$lambda_dir"/*.py "$package_dir"/
+  cp -r lambdas/common "$package_dir"/common
+  # The in-memory DynamoDB (STORAGE_BACKEND=memory) is for tests and benchmarks only
+  rm -f "$package_dir"/common/memorydb.py
+  if [ "$dir" = "router" ]; then
+    # The router imports each zip's handler as <dir>.handler
+    for handler_dir in "${handler_dirs[@]}"; do
+      mkdir -p "$package_dir/$handler_dir"
+      cp "lambdas/$handler_dir"/*.py "$package_dir/$handler_dir"/
+    done
+  fi
+  find "$package_dir" -name __pycache__ -type d -prune -exec rm -rf {} +
+
+  # /var/task is read-only, so modules shipped without bytecode are compiled on
+  # every cold start. Compile with the runtime's Python; unchecked-hash .pyc
+  # files stay valid even though zip rounds source timestamps.
+  "${LAMBDA_PYTHON:-python3.9}" -m compileall -q --invalidation-mode unchecked-hash "$package_dir"
 
   (cd "$package_dir" && zip -r "$OLDPWD/$output_dir/$dir.zip" .)
 
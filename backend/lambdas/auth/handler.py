@@ -1,17 +1,28 @@
-import json
 import uuid
-import boto3
 import os
 import re
 import logging
 import bcrypt
-import jwt
-from boto3.dynamodb.conditions import Key, Attr
+import threading
 import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from botocore.exceptions import ClientError
+from common import usernames, versions
+from common.db import get_table
+from common.metrics import instrument
+from common.responses import json_body, json_response
 
-s3_client = boto3.client('s3')
 logger = logging.getLogger()
-logger.setLevel(logging.INFO)
+
+# last_login is only written when the stored value is older than this many seconds.
+LAST_LOGIN_WRITE_WINDOW = int(os.environ.get('LAST_LOGIN_WRITE_WINDOW', '300'))
+# When set, the write runs alongside token generation and response building.
+LAST_LOGIN_DEFERRED = os.environ.get('LAST_LOGIN_DEFERRED', 'false').lower() == 'true'
+
+_recent_logins = OrderedDict()
+_recent_logins_lock = threading.Lock()
+_login_writer = None
 
 def hash_password(password):
     if (len(password) < 8 or not re.search(r'[A-Z]', password) or not re.search(r'\d', password) or not re.search(r'[!@#$%^&*(),.?":{}|<>]', password)):
@@ -30,245 +41,193 @@ def generate_jwt(user_id, username):
         'exp': int(time.time()) + 3600
     }
 
+    # Only login issues tokens, so signup never loads PyJWT.
+    import jwt
     token = jwt.encode(payload, os.environ['JWT_SECRET'], algorithm='HS256')
     return token
 
+def record_login(table, user_id, now=None):
+    """Update last_login unless it was written within LAST_LOGIN_WRITE_WINDOW.
+
+    Returns True if DynamoDB was written.
+    """
+    now = now or int(time.time())
+    cutoff = now - LAST_LOGIN_WRITE_WINDOW
+
+    # Logins this container already recorded skip DynamoDB entirely.
+    with _recent_logins_lock:
+        last = _recent_logins.get(user_id)
+        if last is not None and last > cutoff:
+            return False
+
+    try:
+        table.update_item(
+            Key={
+                'PK': 'USER#' + user_id,
+                'SK': 'PROFILE'
+            },
+            # Bumping the profile version lets cached profiles pick up the new last_login.
+            UpdateExpression='SET last_login = :ll ADD #v :one',
+            ConditionExpression='attribute_exists(PK) AND (attribute_not_exists(last_login) OR last_login < :cutoff)',
+            ExpressionAttributeNames={'#v': versions.VERSION_ATTRIBUTE},
+            ExpressionAttributeValues={
+                ':ll': now,
+                ':cutoff': cutoff,
+                ':one': 1
+            }
+        )
+        written = True
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            raise
+        written = False
+
+    with _recent_logins_lock:
+        _recent_logins[user_id] = now
+        _recent_logins.move_to_end(user_id)
+        while len(_recent_logins) > 1024:
+            _recent_logins.popitem(last=False)
+    return written
+
+def defer_record_login(table, user_id):
+    global _login_writer
+    if _login_writer is None:
+        _login_writer = ThreadPoolExecutor(max_workers=1)
+    return _login_writer.submit(record_login, table, user_id)
+
+@instrument
 def signup(event, context):
     logger.info("Starting signup handler")
 
-    dynamodb = boto3.resource("dynamodb", region_name=os.environ["AWS_REGION"])
-    table = dynamodb.Table(os.environ["DYNAMODB_TABLE_NAME"])
+    table = get_table()
 
     try:
-        body = json.loads(event['body'])
+        body = json_body(event)
 
         if not body:
-            return {
-                'statusCode': 400,
-                'headers': {
-                    'Access-Control-Allow-Origin': '*',
-                    'Access-Control-Allow-Methods': 'GET,POST,PUT,DELETE,OPTIONS',
-                    'Access-Control-Allow-Headers': '*, Content-Type, Authorization',
-                },
-                'body': json.dumps({'error': 'Request body is required'})
-            }
+            return json_response(400, {'error': 'Request body is required'})
         
-        logger.info(f"Received body")
+        logger.info("Received body")
         
         username = body.get('username')
         password = body.get('password')
         first_name = body.get('first_name')
         last_name = body.get('last_name')
         preferred_language = body.get('preferred_language')
-        logger.info(f"processed body")
+        logger.info("processed body")
 
         if not username or not password or not first_name or not last_name or not preferred_language: 
-            return {
-                'statusCode': 401,
-                'headers': {
-                    'Access-Control-Allow-Origin': '*',
-                    'Access-Control-Allow-Methods': 'GET,POST,PUT,DELETE,OPTIONS',
-                    'Access-Control-Allow-Headers': '*, Content-Type, Authorization',
-                },
-                'body': json.dumps({'error': 'Missing Required Fields'})
-            }
+            return json_response(401, {'error': 'Missing Required Fields'})
         
         username = username.lower()
         
-        logger.info(f"Check if user already exists")
-
-        response = table.query(
-        IndexName='UsernameIndex',
-        KeyConditionExpression=Key('username').eq(username),
-        FilterExpression = Attr('SK').begins_with('PROFILE')
-        )
-
-        if response['Items']:
-            return {
-                'statusCode': 409,  # Conflict
-                'headers': {
-                    'Access-Control-Allow-Origin': '*',
-                    'Access-Control-Allow-Methods': 'GET,POST,PUT,DELETE,OPTIONS',
-                    'Access-Control-Allow-Headers': '*, Content-Type, Authorization',
-                },
-                'body': json.dumps({'error': 'Username already exists'})
-        }
-
-        
-        
         try:
             logger.info("Attempting to hash password")
             hashed_password = hash_password(password)
             logger.info("Password hashed successfully")
         except ValueError as ve:
-            logger.warning(f"Invalid password: {str(ve)}")
-            return {
-                'statusCode': 400,
-                'headers': {
-                    'Access-Control-Allow-Origin': '*',
-                    'Access-Control-Allow-Methods': 'GET,POST,PUT,DELETE,OPTIONS',
-                    'Access-Control-Allow-Headers': '*, Content-Type, Authorization',
-                },
-                'body': json.dumps({'error': str(ve)})
-            }
+            logger.warning("Invalid password: %s", ve)
+            return json_response(400, {'error': str(ve)})
         
         logger.info("Hashed password, generating user ID")
         user_id = generate_user_id()
         jwt_token = generate_jwt(user_id, username)
 
-        logger.info("Writing user to DynamoDB")
+        logger.info("Writing user and username reservation to DynamoDB")
 
-        table.put_item(
-            Item={
-            'PK': 'USER#' + user_id,
-            'SK': 'PROFILE',
+        now = int(time.time())
+        try:
+            usernames.transact([
+                usernames.claim(table.name, username, user_id, hashed_password),
+                {
+                    'Put': {
+                        'TableName': table.name,
+                        'Item': {
+                            'PK': 'USER#' + user_id,
+                            'SK': 'PROFILE',
+                            'user_id': user_id,
+                            'username': username,
+                            'hashed_password': hashed_password,
+                            'first_name': first_name,
+                            'last_name': last_name,
+                            'preferred_language': preferred_language,
+                            'created_at': now,
+                            'last_login': now
+                        },
+                        'ConditionExpression': 'attribute_not_exists(PK)'
+                    }
+                }
+            ])
+        except usernames.UsernameTaken:
+            return json_response(409, {'error': 'Username already exists'})
+
+        return json_response(201, {
+            'message': 'User created successfully',
             'user_id': user_id,
-            'username': username,
-            'hashed_password': hashed_password,
-            'first_name': first_name,
-            'last_name': last_name,
-            'preferred_language': preferred_language,
-            'created_at': int(time.time()),
-            'last_login': int(time.time())
-            }
-        )
-
-        return{
-            'statusCode': 201,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET,POST,PUT,DELETE,OPTIONS',
-                'Access-Control-Allow-Headers': '*, Content-Type, Authorization',
-            }, 
-            'body': json.dumps({
-                'message': 'User created successfully',
-                'user_id': user_id,
-                'token': jwt_token,
-        })
-        }
+            'token': jwt_token,
+    })
     except Exception as e:
-        logger.error(f"Error in signup: {str(e)}")
-        return {
-            'statusCode': 500,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET,POST,PUT,DELETE,OPTIONS',
-                'Access-Control-Allow-Headers': '*, Content-Type, Authorization',
-            },
-            'body': json.dumps({'error': 'Internal Server Error'})
-        }
+        logger.error("Error in signup: %s", e)
+        return json_response(500, {'error': 'Internal Server Error'})
     
+@instrument
 def login(event, context):
     logger.info("Starting login handler")
 
-    dynamodb = boto3.resource("dynamodb", region_name=os.environ["AWS_REGION"])
-    table = dynamodb.Table(os.environ["DYNAMODB_TABLE_NAME"])
+    table = get_table()
     try:
-        body = json.loads(event['body'])
+        body = json_body(event)
         if not body:
-            return {
-                'statusCode': 400,
-                'headers': {
-                    'Access-Control-Allow-Origin': '*',
-                    'Access-Control-Allow-Methods': 'GET,POST,PUT,DELETE,OPTIONS',
-                    'Access-Control-Allow-Headers': '*, Content-Type, Authorization',
-                },
-                'body': json.dumps({'error': 'Request body is required'})
-            }
+            return json_response(400, {'error': 'Request body is required'})
         
-        logger.info(f"Received body for login")
+        logger.info("Received body for login")
         username = body.get('username')
         password = body.get('password')
-        logger.info(f"Processed body for login")
+        logger.info("Processed body for login")
         if not username or not password:
-            return {
-                'statusCode': 401,
-                'headers': {
-                    'Access-Control-Allow-Origin': '*',
-                    'Access-Control-Allow-Methods': 'GET,POST,PUT,DELETE,OPTIONS',
-                    'Access-Control-Allow-Headers': '*, Content-Type, Authorization',
-                },
-                'body': json.dumps({'error': 'Missing Required Fields'})
-            }
+            return json_response(401, {'error': 'Missing Required Fields'})
         
         username = username.lower()
         
-        logger.info("Querying DynamoDB for user")
-        response = table.query(
-            IndexName = 'UsernameIndex',
-            KeyConditionExpression = Key('username').eq(username),
-            FilterExpression = Attr('SK').begins_with('PROFILE')
-        )
-        logger.info(f"Query response")
+        logger.info("Looking up username reservation")
+        user_item = usernames.lookup(username)
 
-        if not response['Items']:
-            logger.warning(f"User not found for username: {username}")
-            return {
-                'statusCode': 404,
-                'headers': {
-                    'Access-Control-Allow-Origin': '*',
-                    'Access-Control-Allow-Methods': 'GET,POST,PUT,DELETE,OPTIONS',
-                    'Access-Control-Allow-Headers': '*, Content-Type, Authorization',
-                },
-                'body': json.dumps({'error': 'Invalid Username'})
-            }
+        if not user_item:
+            logger.warning("User not found for username: %s", username)
+            return json_response(404, {'error': 'Invalid Username'})
         
-        user_item = response['Items'][0]
         hashed_password = user_item['hashed_password']
         logger.info("Checking password")
         if not bcrypt.checkpw(password.encode('utf-8'), hashed_password.encode('utf-8')):
-            logger.warning(f"Invalid password for username: {username}")
-            return {
-                'statusCode': 401,
-                'headers': {
-                    'Access-Control-Allow-Origin': '*',
-                    'Access-Control-Allow-Methods': 'GET,POST,PUT,DELETE,OPTIONS',
-                    'Access-Control-Allow-Headers': '*, Content-Type, Authorization',
-                },
-                'body': json.dumps({'error': 'Invalid Password'})
-            }
+            logger.warning("Invalid password for username: %s", username)
+            return json_response(401, {'error': 'Invalid Password'})
         
         logger.info("Password verified, generating JWT")
         
         user_id = user_item["user_id"]
+        pending_login_write = None
+        if LAST_LOGIN_DEFERRED:
+            pending_login_write = defer_record_login(table, user_id)
+        elif record_login(table, user_id):
+            logger.info("Last login time updated successfully")
+
         jwt_token = generate_jwt(user_id, username)
         logger.info("JWT generated successfully")
 
-        logger.info("Updating last login time")
-        table.update_item(
-            Key={
-                'PK': 'USER#' + user_id,
-                'SK': 'PROFILE'
-            },
-            UpdateExpression='SET last_login = :ll',
-            ExpressionAttributeValues={
-                ':ll': int(time.time())
-            }
-        )
+        login_response = json_response(200, {
+            'message': "Login Successful",
+            'user_id': user_id,
+            'token': jwt_token
+        })
 
-        logger.info("Last login time updated successfully")
+        if pending_login_write:
+            # Lambda freezes the container once we return, so the write has to finish first.
+            try:
+                pending_login_write.result()
+            except Exception as e:
+                logger.warning("Deferred last_login update failed: %s", e)
 
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET,POST,PUT,DELETE,OPTIONS',
-                'Access-Control-Allow-Headers': '*, Content-Type, Authorization',
-            },
-            'body': json.dumps({
-                'message': "Login Successful",
-                'user_id': user_id,
-                'token': jwt_token
-            },default=str)
-        }
+        return login_response
     except Exception as e:
-        logger.error(f"Error in login: {str(e)}")
-        return {
-            'statusCode': 500,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET,POST,PUT,DELETE,OPTIONS',
-                'Access-Control-Allow-Headers': '*, Content-Type, Authorization',
-            },
-            'body': json.dumps({'error': 'Internal Server Error'})
-        }
\ No newline at end of file
+        logger.error("Error in login: %s", e)
+        return json_response(500, {'error': 'Internal Server Error'})
\ No newline at end of file
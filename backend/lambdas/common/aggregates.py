@@ -0,0 +1,124 @@
+import logging
+import os
+import time
+from boto3.dynamodb.conditions import Key
+from botocore.exceptions import ClientError
+from common.db import get_client
+from common.flashcards import FLASHCARD_FIELDS, set_partition
+from common.versions import VERSION_ATTRIBUTE, set_key
+
+logger = logging.getLogger()
+
+# SET items carry card_count, total_characters and last_card_update so the set
+# listing can show summaries without reading any cards. Single-card writes
+# apply their deltas in the same transaction as the card; bulk writes apply
+# one delta after their batches. recompute() rebuilds the numbers from the
+# cards themselves if they ever drift.
+
+AGGREGATE_FIELDS = ('card_count', 'total_characters', 'last_card_update')
+
+
+def card_characters(card):
+    return sum(len(card.get(field) or '') for field in FLASHCARD_FIELDS)
+
+
+def adjust(table_name, user_id, language, set_id, cards=0, characters=0, now=None):
+    """Update request applying card and character deltas to a set, bumping its version."""
+    return {
+        'Update': {
+            'TableName': table_name,
+            'Key': set_key(user_id, language, set_id),
+            'UpdateExpression': 'ADD #v :one, card_count :cards, total_characters :chars SET last_card_update = :now',
+            'ConditionExpression': 'attribute_exists(PK)',
+            'ExpressionAttributeNames': {'#v': VERSION_ATTRIBUTE},
+            'ExpressionAttributeValues': {
+                ':one': 1,
+                ':cards': cards,
+                ':chars': characters,
+                ':now': now or int(time.time()),
+            },
+        }
+    }
+
+
+def adjust_after(user_id, language, set_id, cards=0, characters=0, now=None, table_name=None):
+    """Apply deltas outside a transaction. Returns False if the set does not exist."""
+    table_name = table_name or os.environ['DYNAMODB_TABLE_NAME']
+    try:
+        get_client().update_item(**adjust(table_name, user_id, language, set_id, cards, characters, now)['Update'])
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            raise
+        return False
+    return True
+
+
+def recompute(user_id, language, set_id, table_name=None, client=None):
+    """Rebuild a set's aggregates from its cards. Returns them, or None if the set does not exist."""
+    client = client or get_client()
+    table_name = table_name or os.environ['DYNAMODB_TABLE_NAME']
+    kwargs = {
+        'TableName': table_name,
+        'ConsistentRead': True,
+        'KeyConditionExpression': Key('PK').eq(set_partition(user_id, language, set_id)) & Key('SK').begins_with('FLASHCARD#'),
+        'ProjectionExpression': 'word, #u, translated_word, #tu, updated_at',
+        'ExpressionAttributeNames': {'#u': 'usage', '#tu': 'translated_usage'},
+    }
+    totals = {'card_count': 0, 'total_characters': 0, 'last_card_update': 0}
+    while True:
+        response = client.query(**kwargs)
+        for card in response.get('Items', []):
+            totals['card_count'] += 1
+            totals['total_characters'] += card_characters(card)
+            totals['last_card_update'] = max(totals['last_card_update'], int(card.get('updated_at') or 0))
+        if 'LastEvaluatedKey' not in response:
+            break
+        kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+    try:
+        client.update_item(
+            TableName=table_name,
+            Key=set_key(user_id, language, set_id),
+            UpdateExpression='SET card_count = :cards, total_characters = :chars, last_card_update = :last ADD #v :one',
+            ConditionExpression='attribute_exists(PK)',
+            ExpressionAttributeNames={'#v': VERSION_ATTRIBUTE},
+            ExpressionAttributeValues={
+                ':cards': totals['card_count'],
+                ':chars': totals['total_characters'],
+                ':last': totals['last_card_update'],
+                ':one': 1,
+            }
+        )
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            raise
+        return None
+    return totals
+
+
+def repair_all(table_name=None):
+    """Recompute the aggregates of every set in the table."""
+    client = get_client()
+    table_name = table_name or os.environ['DYNAMODB_TABLE_NAME']
+    kwargs = {
+        'TableName': table_name,
+        'FilterExpression': 'begins_with(SK, :set)',
+        'ExpressionAttributeValues': {':set': 'SET#'},
+        'ProjectionExpression': 'PK, SK',
+    }
+    repaired = 0
+    while True:
+        response = client.scan(**kwargs)
+        for item in response.get('Items', []):
+            # PK is USER#<id>#LANGUAGE#<language>, SK is SET#<set_id>
+            _, user_id, _, language = item['PK'].split('#', 3)
+            if recompute(user_id, language, item['SK'].split('#', 1)[1], table_name, client) is not None:
+                repaired += 1
+        if 'LastEvaluatedKey' not in response:
+            return repaired
+        kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    print(f"Recomputed aggregates for {repair_all()} sets")
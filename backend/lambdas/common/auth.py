@@ -0,0 +1,118 @@
+import functools
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from common import logs, metrics
+from common.responses import json_response
+
+logger = logging.getLogger()
+
+CACHE_SIZE = int(os.environ.get('AUTH_CACHE_SIZE', '1024'))
+
+# Verified tokens keyed by SHA-256 digest, so raw tokens are never held as keys.
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+class AuthError(Exception):
+    def __init__(self, message, status_code=401):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def _cached(digest, now):
+    with _cache_lock:
+        entry = _cache.get(digest)
+        if entry is None:
+            return None
+        claims, expires_at = entry
+        if expires_at <= now:
+            del _cache[digest]
+            return None
+        _cache.move_to_end(digest)
+        return claims
+
+
+def _remember(digest, claims):
+    with _cache_lock:
+        _cache[digest] = (claims, claims['exp'])
+        _cache.move_to_end(digest)
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+
+
+def clear_cache():
+    with _cache_lock:
+        _cache.clear()
+
+
+def verify_token(token):
+    digest = hashlib.sha256(token.encode('utf-8')).digest()
+    now = time.time()
+    claims = _cached(digest, now)
+    if claims is not None:
+        return claims
+
+    # PyJWT loads cryptography, tens of milliseconds; it is imported by the
+    # first token that needs verifying rather than at init.
+    import jwt
+    try:
+        claims = jwt.decode(
+            token,
+            os.environ['JWT_SECRET'],
+            algorithms=['HS256'],
+            options={'require': ['exp', 'user_id']}
+        )
+    except jwt.ExpiredSignatureError:
+        raise AuthError('Token has expired')
+    except jwt.InvalidTokenError:
+        raise AuthError('Invalid token')
+
+    _remember(digest, claims)
+    return claims
+
+
+def token_from_event(event):
+    headers = event.get('headers') or {}
+    # API Gateway v2 lower-cases header names; direct invocations may not.
+    value = headers.get('authorization') or headers.get('Authorization')
+    if not value:
+        raise AuthError('Authorization header is required')
+    scheme, _, token = value.partition(' ')
+    if scheme.lower() != 'bearer' or not token.strip():
+        raise AuthError('Authorization header must be a Bearer token')
+    return token.strip()
+
+
+def authenticate(event):
+    """Verify the caller's token and pin the request to the user it was issued for."""
+    claims = verify_token(token_from_event(event))
+    user_id = claims['user_id']
+
+    params = event.get('queryStringParameters') or {}
+    if params.get('user_id') and params['user_id'] != user_id:
+        raise AuthError('Token does not grant access to this user', 403)
+    params['user_id'] = user_id
+    event['queryStringParameters'] = params
+    logs.bind(user_id=user_id)
+    event.setdefault('requestContext', {}).setdefault('authorizer', {})['lambda'] = claims
+    return claims
+
+
+def require_auth(handler):
+    @functools.wraps(handler)
+    def wrapper(event, context):
+        # CORS preflights never carry credentials.
+        if event.get('requestContext', {}).get('http', {}).get('method') == 'OPTIONS':
+            return handler(event, context)
+        try:
+            with metrics.phase('auth'):
+                authenticate(event)
+        except AuthError as e:
+            logger.warning("Rejected request in %s: %s", handler.__name__, e)
+            return json_response(e.status_code, {'error': str(e)})
+        return handler(event, context)
+    return wrapper
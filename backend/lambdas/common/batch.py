@@ -0,0 +1,87 @@
+import logging
+import os
+import random
+import time
+
+logger = logging.getLogger()
+
+# BatchWriteItem accepts at most 25 put/delete requests per call, BatchGetItem 100 keys.
+BATCH_WRITE_LIMIT = 25
+BATCH_GET_LIMIT = 100
+MAX_ATTEMPTS = int(os.environ.get('BATCH_WRITE_MAX_ATTEMPTS', '6'))
+BASE_BACKOFF = float(os.environ.get('BATCH_WRITE_BASE_BACKOFF', '0.05'))
+MAX_BACKOFF = 2.0
+
+
+def put_request(item):
+    return {'PutRequest': {'Item': item}}
+
+
+def delete_request(key):
+    return {'DeleteRequest': {'Key': key}}
+
+
+def chunked(iterable, size):
+    chunk = []
+    for value in iterable:
+        chunk.append(value)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def backoff(attempt):
+    # Full jitter keeps parallel writers from retrying in lockstep.
+    time.sleep(random.uniform(0, min(MAX_BACKOFF, BASE_BACKOFF * (2 ** attempt))))
+
+
+def write_chunk(client, table_name, requests, max_attempts=MAX_ATTEMPTS):
+    """Write up to 25 requests, retrying UnprocessedItems with backoff.
+
+    Returns the requests DynamoDB still had not processed after max_attempts.
+    """
+    pending = requests
+    for attempt in range(max_attempts):
+        response = client.batch_write_item(RequestItems={table_name: pending})
+        pending = response.get('UnprocessedItems', {}).get(table_name, [])
+        if not pending:
+            return []
+        logger.warning("%s unprocessed batch write requests, retry %s of %s", len(pending), attempt + 1, max_attempts)
+        if attempt + 1 < max_attempts:
+            backoff(attempt)
+    return pending
+
+
+def batch_write(client, table_name, requests, max_attempts=MAX_ATTEMPTS):
+    unprocessed = []
+    for chunk in chunked(requests, BATCH_WRITE_LIMIT):
+        unprocessed.extend(write_chunk(client, table_name, chunk, max_attempts))
+    return unprocessed
+
+
+def batch_get(client, table_name, keys, projection=None, consistent=False, max_attempts=MAX_ATTEMPTS):
+    """Read keys 100 at a time, retrying UnprocessedKeys with backoff.
+
+    Returns the items found, in no particular order. Raises if keys are still
+    unprocessed after max_attempts, since a missing item would look deleted.
+    """
+    items = []
+    for chunk in chunked(keys, BATCH_GET_LIMIT):
+        request = {'Keys': chunk, 'ConsistentRead': consistent}
+        if projection:
+            request['ProjectionExpression'] = projection
+        for attempt in range(max_attempts):
+            response = client.batch_get_item(RequestItems={table_name: request})
+            items.extend(response.get('Responses', {}).get(table_name, []))
+            pending = response.get('UnprocessedKeys', {}).get(table_name)
+            if not pending:
+                break
+            request = pending
+            logger.warning("%s unprocessed batch get keys, retry %s of %s", len(pending['Keys']), attempt + 1, max_attempts)
+            if attempt + 1 < max_attempts:
+                backoff(attempt)
+        else:
+            raise RuntimeError(f"{len(request['Keys'])} keys could not be read")
+    return items
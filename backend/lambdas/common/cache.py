@@ -0,0 +1,137 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# Profiles, set metadata and language lists are read far more often than they
+# change, so warm containers keep them in memory. An entry is served as is for
+# its TTL; after that it is revalidated by reading only the owner's version
+# counter (see versions.py) and reloaded only if the counter moved. Writes in
+# the same container drop the entries they touch straight away; writes made by
+# other functions or containers are picked up by the version check, so a read
+# is never staler than one TTL. CACHE_REVALIDATE_EVERY_READ=true checks the
+# version on every read instead, for deployments that cannot accept that; the
+# profile and set counters live on the items they version, so there it saves
+# only the reload, not the read.
+
+MAX_ENTRIES = int(os.environ.get('CACHE_MAX_ENTRIES', '1024'))
+REVALIDATE_EVERY_READ = os.environ.get('CACHE_REVALIDATE_EVERY_READ', 'false').lower() == 'true'
+
+HIT = 'hit'
+MISS = 'miss'
+REVALIDATED = 'revalidated'
+
+
+class _Entry:
+    __slots__ = ('value', 'version', 'expires')
+
+    def __init__(self, value, version, expires):
+        self.value = value
+        self.version = version
+        self.expires = expires
+
+
+class ReadThroughCache:
+    """A bounded LRU of loaded values keyed by tuples, each valid for ttl seconds.
+
+    A ttl of 0 turns the cache off: every read goes to the loader. With
+    revalidate, reads that pass a version() check the version even within the TTL.
+    """
+
+    def __init__(self, name, ttl, max_entries=MAX_ENTRIES, clock=time.monotonic, revalidate=False):
+        self.name = name
+        self.ttl = ttl
+        self.revalidate = revalidate
+        self.max_entries = max_entries
+        self.clock = clock
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = dict.fromkeys(('hits', 'misses', 'revalidations', 'evictions', 'invalidations'), 0)
+
+    def _count(self, counter):
+        self._counters[counter] += 1
+
+    def get(self, key, load, version=None):
+        """Return (value, outcome) for key.
+
+        load() returns (value, version), with value None for something that does not
+        exist; None is returned but not cached. version(), if given, returns the
+        current version without loading the value and is used to revalidate an
+        expired entry.
+        """
+        if self.ttl <= 0:
+            value, _ = load()
+            return value, MISS
+
+        now = self.clock()
+        checked = self.revalidate and version is not None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                if entry.expires > now and not (checked and entry.version is not None):
+                    self._count('hits')
+                    return entry.value, HIT
+
+        if entry is not None and version is not None and entry.version is not None:
+            if version() == entry.version:
+                with self._lock:
+                    # An invalidation that ran during the version read wins.
+                    if self._entries.get(key) is entry:
+                        entry.expires = self.clock() + self.ttl
+                    self._count('revalidations')
+                return entry.value, REVALIDATED
+
+        value, current = load()
+        with self._lock:
+            self._count('misses')
+            if value is None:
+                self._entries.pop(key, None)
+            else:
+                self._entries[key] = _Entry(value, current, self.clock() + self.ttl)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+                    self._count('evictions')
+        return value, MISS
+
+    def invalidate(self, *prefix):
+        """Drop every entry whose key starts with prefix; no prefix drops everything."""
+        with self._lock:
+            stale = [key for key in self._entries if key[:len(prefix)] == prefix]
+            for key in stale:
+                del self._entries[key]
+            self._counters['invalidations'] += len(stale)
+        return len(stale)
+
+    def stats(self):
+        with self._lock:
+            return dict(self._counters, entries=len(self._entries))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            for counter in self._counters:
+                self._counters[counter] = 0
+
+
+profiles = ReadThroughCache('profile', float(os.environ.get('CACHE_TTL_PROFILE', '300')),
+                            revalidate=REVALIDATE_EVERY_READ)
+languages = ReadThroughCache('languages', float(os.environ.get('CACHE_TTL_LANGUAGES', '300')),
+                             revalidate=REVALIDATE_EVERY_READ)
+sets = ReadThroughCache('set', float(os.environ.get('CACHE_TTL_SET', '60')), revalidate=REVALIDATE_EVERY_READ)
+
+CACHES = (profiles, languages, sets)
+
+
+def stats():
+    return {cache.name: cache.stats() for cache in CACHES}
+
+
+def clear_all():
+    for cache in CACHES:
+        cache.clear()
+
+
+def invalidate_user(user_id):
+    return sum(cache.invalidate(user_id) for cache in CACHES)
@@ -0,0 +1,168 @@
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from boto3.dynamodb.conditions import Key
+from botocore.exceptions import ClientError
+from common import search, usernames
+from common.batch import BATCH_WRITE_LIMIT, batch_write, chunked, delete_request
+from common.db import get_client
+
+logger = logging.getLogger()
+
+MAX_WORKERS = int(os.environ.get('CASCADE_MAX_WORKERS', '8'))
+
+
+class CascadeDeleteError(Exception):
+    pass
+
+
+# Item layout, parent to child:
+#   USER#<id>                              PROFILE, LANGUAGE#<language>
+#   USER#<id>#LANGUAGE#<language>          SET#<set_id>
+#   USER#<id>#LANGUAGE#<language>#SET#<id> FLASHCARD#<flashcard_id>
+# plus the user's USERNAME#<name> reservation item and their USER#<id>#SEARCH
+# postings.
+# Children are found with key queries on these partitions, never with a scan,
+# and are deleted before their parent so an interrupted delete can be retried.
+
+def user_pk(user_id):
+    return f'USER#{user_id}'
+
+
+def language_pk(user_id, language):
+    return f'USER#{user_id}#LANGUAGE#{language}'
+
+
+def set_pk(user_id, language, set_id):
+    return f'USER#{user_id}#LANGUAGE#{language}#SET#{set_id}'
+
+
+def _query_keys(client, table_name, pk, sk_prefix=None):
+    condition = Key('PK').eq(pk)
+    if sk_prefix:
+        condition = condition & Key('SK').begins_with(sk_prefix)
+    kwargs = {
+        'TableName': table_name,
+        'KeyConditionExpression': condition,
+        'ProjectionExpression': 'PK, SK',
+    }
+    while True:
+        response = client.query(**kwargs)
+        yield from response.get('Items', [])
+        if 'LastEvaluatedKey' not in response:
+            return
+        kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+def _delete_keys(client, table_name, keys):
+    deleted = 0
+    for chunk in chunked(keys, BATCH_WRITE_LIMIT):
+        unprocessed = batch_write(client, table_name, [delete_request(key) for key in chunk])
+        if unprocessed:
+            raise CascadeDeleteError(f"{len(unprocessed)} items could not be deleted")
+        deleted += len(chunk)
+    return deleted
+
+
+def delete_partition(pk, sk_prefix=None, table_name=None, client=None):
+    client = client or get_client()
+    table_name = table_name or os.environ['DYNAMODB_TABLE_NAME']
+    deleted = _delete_keys(client, table_name, _query_keys(client, table_name, pk, sk_prefix))
+    logger.info("Deleted %s items from partition %s", deleted, pk)
+    return deleted
+
+
+def _fan_out(function, arguments):
+    if not arguments:
+        return 0
+    workers = max(1, min(MAX_WORKERS, len(arguments)))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(function, *args) for args in arguments]
+        return sum(future.result() for future in futures)
+
+
+def _delete_postings(client, table_name, user_id, language, set_id):
+    # Postings are keyed by token, so they are found from the cards' own text.
+    kwargs = {
+        'TableName': table_name,
+        'KeyConditionExpression': Key('PK').eq(set_pk(user_id, language, set_id)) & Key('SK').begins_with('FLASHCARD#'),
+        'ProjectionExpression': 'SK, word, #u, translated_word, #tu',
+        'ExpressionAttributeNames': {'#u': 'usage', '#tu': 'translated_usage'},
+    }
+    # Each page's postings are deleted before the next page is read, so memory
+    # stays bounded by a page however large the set is.
+    deleted = 0
+    while True:
+        response = client.query(**kwargs)
+        deleted += _delete_keys(client, table_name, [
+            key for card in response.get('Items', [])
+            for key in search.posting_keys(user_id, language, set_id, card['SK'].split('#', 1)[1], card)
+        ])
+        if 'LastEvaluatedKey' not in response:
+            return deleted
+        kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+def _delete_set_contents(user_id, language, set_id, table_name, client):
+    # Posting deletes are blind, so they are not counted as deleted items.
+    _delete_postings(client, table_name, user_id, language, set_id)
+    search.invalidate(user_id)
+    return delete_partition(set_pk(user_id, language, set_id), table_name=table_name, client=client)
+
+
+def delete_set(user_id, language, set_id):
+    client = get_client()
+    table_name = os.environ['DYNAMODB_TABLE_NAME']
+    deleted = _delete_set_contents(user_id, language, set_id, table_name, client)
+    deleted += _delete_keys(client, table_name, [{'PK': language_pk(user_id, language), 'SK': f'SET#{set_id}'}])
+    return deleted
+
+
+def delete_language(user_id, language):
+    client = get_client()
+    table_name = os.environ['DYNAMODB_TABLE_NAME']
+    sets = [
+        (user_id, language, key['SK'].split('#', 1)[1], table_name, client)
+        for key in _query_keys(client, table_name, language_pk(user_id, language), 'SET#')
+    ]
+    deleted = _fan_out(_delete_set_contents, sets)
+    deleted += delete_partition(language_pk(user_id, language), table_name=table_name, client=client)
+    deleted += _delete_keys(client, table_name, [{'PK': user_pk(user_id), 'SK': f'LANGUAGE#{language}'}])
+    return deleted
+
+
+def delete_user(user_id):
+    client = get_client()
+    table_name = os.environ['DYNAMODB_TABLE_NAME']
+    profile = client.get_item(
+        TableName=table_name,
+        Key={'PK': user_pk(user_id), 'SK': 'PROFILE'},
+        ProjectionExpression='username'
+    ).get('Item')
+    languages = [
+        key['SK'].split('#', 1)[1]
+        for key in _query_keys(client, table_name, user_pk(user_id), 'LANGUAGE#')
+    ]
+
+    set_partitions = []
+    for language in languages:
+        set_partitions.extend(
+            set_pk(user_id, language, key['SK'].split('#', 1)[1])
+            for key in _query_keys(client, table_name, language_pk(user_id, language), 'SET#')
+        )
+
+    # The whole search partition goes, so postings need not be found card by card.
+    partitions = set_partitions + [language_pk(user_id, language) for language in languages] + [search.search_partition(user_id)]
+    deleted = _fan_out(delete_partition, [(pk, None, table_name, client) for pk in partitions])
+    search.invalidate(user_id)
+    deleted += delete_partition(user_pk(user_id), table_name=table_name, client=client)
+
+    # The username reservation lives outside the user's partitions.
+    if profile and profile.get('username'):
+        try:
+            client.delete_item(**usernames.release(table_name, profile['username'], user_id)['Delete'])
+            deleted += 1
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                raise
+    return deleted
@@ -0,0 +1,90 @@
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from boto3.dynamodb.conditions import Key
+from common.aggregates import AGGREGATE_FIELDS
+from common.cascade import language_pk, user_pk
+from common.db import get_client
+from common.usernames import PROFILE_FIELDS
+
+logger = logging.getLogger()
+
+MAX_WORKERS = int(os.environ.get('DASHBOARD_MAX_WORKERS', '8'))
+
+SET_FIELDS = ('set_name', 'set_description', 'created_at', 'updated_at')
+
+# The profile and the language list share the USER#<id> partition, so one
+# query returns both. Each language's sets live in their own partition and
+# are queried concurrently; the shared client is thread-safe, the resource
+# Table is not.
+
+
+def _elapsed_ms(started):
+    return round((time.perf_counter() - started) * 1000, 1)
+
+
+def _query(client, table_name, condition, projection=None):
+    kwargs = {'TableName': table_name, 'KeyConditionExpression': condition}
+    if projection:
+        kwargs['ProjectionExpression'] = projection
+    while True:
+        response = client.query(**kwargs)
+        yield from response.get('Items', [])
+        if 'LastEvaluatedKey' not in response:
+            return
+        kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+def _load_sets(client, table_name, user_id, language, include_counts):
+    started = time.perf_counter()
+    fields = SET_FIELDS + (AGGREGATE_FIELDS if include_counts else ())
+    sets = []
+    condition = Key('PK').eq(language_pk(user_id, language)) & Key('SK').begins_with('SET#')
+    for item in _query(client, table_name, condition, ', '.join(('SK',) + fields)):
+        entry = {'set_id': item['SK'].split('#', 1)[1]}
+        for field in SET_FIELDS:
+            entry[field] = item.get(field)
+        if include_counts:
+            entry['card_count'] = item.get('card_count', 0)
+            entry['total_characters'] = item.get('total_characters', 0)
+            entry['last_card_update'] = item.get('last_card_update')
+        sets.append(entry)
+    return sets, _elapsed_ms(started)
+
+
+def load(user_id, include_counts=False, table_name=None, client=None):
+    """Return the profile, languages and sets of a user, or None if the user does not exist."""
+    client = client or get_client()
+    table_name = table_name or os.environ['DYNAMODB_TABLE_NAME']
+    started = time.perf_counter()
+
+    profile = None
+    languages = []
+    for item in _query(client, table_name, Key('PK').eq(user_pk(user_id))):
+        if item['SK'] == 'PROFILE':
+            profile = {field: item.get(field) for field in PROFILE_FIELDS}
+        elif item['SK'].startswith('LANGUAGE#') and item.get('language'):
+            languages.append(item['language'])
+    timings = {'profile_and_languages': _elapsed_ms(started)}
+    if profile is None:
+        return None
+
+    results = {}
+    if languages:
+        workers = max(1, min(MAX_WORKERS, len(languages)))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = {
+                language: pool.submit(_load_sets, client, table_name, user_id, language, include_counts)
+                for language in languages
+            }
+            results = {language: future.result() for language, future in futures.items()}
+
+    timings['sets'] = {language: elapsed for language, (_, elapsed) in results.items()}
+    timings['total'] = _elapsed_ms(started)
+    logger.info("Loaded dashboard for user %s with %s languages in %s ms", user_id, len(languages), timings['total'])
+    return {
+        'profile': profile,
+        'languages': [{'language': language, 'sets': results[language][0]} for language in languages],
+        'timings_ms': timings,
+    }
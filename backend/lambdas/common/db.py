@@ -0,0 +1,140 @@
+import os
+import threading
+import boto3
+from botocore.config import Config
+from common import metrics
+
+# One DynamoDB resource per warm container. Building a resource/client costs
+# several milliseconds and a fresh TLS handshake, so every handler shares this one.
+#
+# STORAGE_BACKEND=memory replaces DynamoDB with common.memorydb, which keeps
+# every table in this process behind the same Table and client calls. Tests,
+# benchmarks and local runs use it; deployed functions never set it.
+_lock = threading.RLock()
+_resource = None
+_memory_client = None
+_tables = {}
+_s3_client = None
+
+
+def backend():
+    return os.environ.get('STORAGE_BACKEND', 'dynamodb').lower()
+
+
+def table_definition(name=None):
+    """create_table arguments for the app table; terraform/dynamoDB.tf is the deployed copy."""
+    return {
+        'TableName': name or os.environ['DYNAMODB_TABLE_NAME'],
+        'BillingMode': 'PAY_PER_REQUEST',
+        'KeySchema': [
+            {'AttributeName': 'PK', 'KeyType': 'HASH'},
+            {'AttributeName': 'SK', 'KeyType': 'RANGE'}
+        ],
+        'AttributeDefinitions': [
+            {'AttributeName': 'PK', 'AttributeType': 'S'},
+            {'AttributeName': 'SK', 'AttributeType': 'S'},
+            {'AttributeName': 'due_user', 'AttributeType': 'S'},
+            {'AttributeName': 'due_at', 'AttributeType': 'N'}
+        ],
+        'GlobalSecondaryIndexes': [{
+            'IndexName': 'DueIndex',
+            'KeySchema': [
+                {'AttributeName': 'due_user', 'KeyType': 'HASH'},
+                {'AttributeName': 'due_at', 'KeyType': 'RANGE'}
+            ],
+            'Projection': {
+                'ProjectionType': 'INCLUDE',
+                'NonKeyAttributes': ['word', 'usage', 'translated_word', 'translated_usage', 'ease', 'interval_days', 'repetitions']
+            }
+        }]
+    }
+
+
+def create_table(name=None):
+    """Create the app table on the current backend and return it."""
+    definition = table_definition(name)
+    client = get_client()
+    client.create_table(**definition)
+    client.get_waiter('table_exists').wait(TableName=definition['TableName'])
+    return get_table(definition['TableName'])
+
+
+def _client_config():
+    return Config(
+        max_pool_connections=int(os.environ.get('DYNAMODB_MAX_POOL_CONNECTIONS', '10')),
+        connect_timeout=float(os.environ.get('DYNAMODB_CONNECT_TIMEOUT', '2')),
+        read_timeout=float(os.environ.get('DYNAMODB_READ_TIMEOUT', '5')),
+        retries={
+            'mode': os.environ.get('DYNAMODB_RETRY_MODE', 'standard'),
+            'total_max_attempts': int(os.environ.get('DYNAMODB_MAX_ATTEMPTS', '3')),
+        },
+        tcp_keepalive=True,
+    )
+
+
+def get_resource():
+    global _resource
+    if _resource is None:
+        with _lock:
+            if _resource is None:
+                resource = boto3.resource(
+                    'dynamodb',
+                    region_name=os.environ['AWS_REGION'],
+                    config=_client_config(),
+                )
+                metrics.instrument_client(resource.meta.client)
+                _resource = resource
+    return _resource
+
+
+def _get_memory_client():
+    global _memory_client
+    if _memory_client is None:
+        with _lock:
+            if _memory_client is None:
+                from common.memorydb import MemoryClient
+                _memory_client = metrics.instrument_client(MemoryClient())
+    return _memory_client
+
+
+def get_table(name=None):
+    name = name or os.environ['DYNAMODB_TABLE_NAME']
+    table = _tables.get(name)
+    if table is None:
+        with _lock:
+            table = _tables.get(name)
+            if table is None:
+                if backend() == 'memory':
+                    from common.memorydb import MemoryTable
+                    table = MemoryTable(name, _get_memory_client())
+                else:
+                    table = get_resource().Table(name)
+                _tables[name] = table
+    return table
+
+
+def get_client():
+    # The resource's client accepts and returns plain Python values instead of
+    # typed AttributeValue dicts, which is what the handlers work with.
+    if backend() == 'memory':
+        return _get_memory_client()
+    return get_resource().meta.client
+
+
+def get_s3_client():
+    global _s3_client
+    if _s3_client is None:
+        with _lock:
+            if _s3_client is None:
+                _s3_client = boto3.client('s3', region_name=os.environ['AWS_REGION'])
+    return _s3_client
+
+
+def reset():
+    """Forget every client and table; on the memory backend that drops all data too."""
+    global _resource, _memory_client, _s3_client
+    with _lock:
+        _resource = None
+        _memory_client = None
+        _s3_client = None
+        _tables.clear()
@@ -0,0 +1,146 @@
+import logging
+import os
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from boto3.dynamodb.conditions import Key
+from common.db import get_client, get_s3_client
+from common.responses import dumps
+
+logger = logging.getLogger()
+
+PAGE_SIZE = int(os.environ.get('EXPORT_PAGE_SIZE', '200'))
+PREFETCH_SETS = int(os.environ.get('EXPORT_PREFETCH_SETS', '4'))
+CHUNK_BYTES = 64 * 1024
+# S3 rejects multipart parts under 5 MB except for the last one.
+PART_BYTES = 5 * 1024 * 1024
+URL_EXPIRY = int(os.environ.get('EXPORT_URL_EXPIRY', '3600'))
+
+PROFILE_FIELDS = ('user_id', 'username', 'first_name', 'last_name', 'preferred_language', 'created_at', 'last_login')
+SET_FIELDS = ('set_name', 'set_description', 'created_at', 'updated_at')
+FLASHCARD_FIELDS = ('word', 'usage', 'translated_word', 'translated_usage', 'created_at', 'updated_at')
+
+
+def _query_page(client, table_name, pk, sk_prefix, start_key=None):
+    kwargs = {
+        'TableName': table_name,
+        'KeyConditionExpression': Key('PK').eq(pk) & Key('SK').begins_with(sk_prefix),
+        'Limit': PAGE_SIZE,
+    }
+    if start_key:
+        kwargs['ExclusiveStartKey'] = start_key
+    response = client.query(**kwargs)
+    return response.get('Items', []), response.get('LastEvaluatedKey')
+
+
+def _query(client, table_name, pk, sk_prefix):
+    start_key = None
+    while True:
+        items, start_key = _query_page(client, table_name, pk, sk_prefix, start_key)
+        yield from items
+        if not start_key:
+            return
+
+
+def _pick(item, fields):
+    return {field: item.get(field) for field in fields if field in item}
+
+
+def iter_records(user_id, client=None, table_name=None):
+    """Yield every record a user owns, parents before children.
+
+    Flashcards are read page by page; the first page of the next few sibling
+    sets is fetched in the background while the current set is written out.
+    """
+    client = client or get_client()
+    table_name = table_name or os.environ['DYNAMODB_TABLE_NAME']
+    user_pk = f'USER#{user_id}'
+
+    profile = client.get_item(TableName=table_name, Key={'PK': user_pk, 'SK': 'PROFILE'}).get('Item')
+    if profile:
+        yield dict(type='profile', **_pick(profile, PROFILE_FIELDS))
+
+    with ThreadPoolExecutor(max_workers=PREFETCH_SETS) as pool:
+        for language_item in _query(client, table_name, user_pk, 'LANGUAGE#'):
+            language = language_item['SK'].split('#', 1)[1]
+            yield {'type': 'language', 'language': language}
+
+            language_pk = f'{user_pk}#LANGUAGE#{language}'
+            window = deque()
+            sets = _query(client, table_name, language_pk, 'SET#')
+            while True:
+                for set_item in sets:
+                    set_pk = f"{language_pk}#{set_item['SK']}"
+                    window.append((set_item, set_pk, pool.submit(_query_page, client, table_name, set_pk, 'FLASHCARD#')))
+                    if len(window) >= PREFETCH_SETS:
+                        break
+                if not window:
+                    break
+
+                set_item, set_pk, first_page = window.popleft()
+                set_id = set_item['SK'].split('#', 1)[1]
+                yield dict(type='set', language=language, set_id=set_id, **_pick(set_item, SET_FIELDS))
+
+                items, start_key = first_page.result()
+                while True:
+                    for item in items:
+                        yield dict(
+                            type='flashcard', language=language, set_id=set_id,
+                            flashcard_id=item['SK'].split('#', 1)[1], **_pick(item, FLASHCARD_FIELDS)
+                        )
+                    if not start_key:
+                        break
+                    items, start_key = _query_page(client, table_name, set_pk, 'FLASHCARD#', start_key)
+
+
+def iter_ndjson(records, compress=False):
+    """Encode records as NDJSON, yielding roughly CHUNK_BYTES at a time (gzip-compressed if asked)."""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+    buffer = bytearray()
+    for record in records:
+        buffer += dumps(record).encode('utf-8')
+        buffer += b'\n'
+        if len(buffer) >= CHUNK_BYTES:
+            chunk = compressor.compress(bytes(buffer)) if compressor else bytes(buffer)
+            buffer.clear()
+            if chunk:
+                yield chunk
+    tail = compressor.compress(bytes(buffer)) + compressor.flush() if compressor else bytes(buffer)
+    if tail:
+        yield tail
+
+
+def upload_to_s3(chunks, bucket, key, compress=False, s3=None):
+    """Stream chunks into a multipart upload, holding at most one part in memory."""
+    s3 = s3 or get_s3_client()
+    extra = {'ContentType': 'application/x-ndjson'}
+    if compress:
+        extra['ContentEncoding'] = 'gzip'
+    upload_id = s3.create_multipart_upload(Bucket=bucket, Key=key, **extra)['UploadId']
+    parts = []
+    size = 0
+
+    def flush(data):
+        response = s3.upload_part(Bucket=bucket, Key=key, UploadId=upload_id, PartNumber=len(parts) + 1, Body=bytes(data))
+        parts.append({'ETag': response['ETag'], 'PartNumber': len(parts) + 1})
+
+    try:
+        buffer = bytearray()
+        for chunk in chunks:
+            buffer += chunk
+            size += len(chunk)
+            if len(buffer) >= PART_BYTES:
+                flush(buffer)
+                buffer.clear()
+        if buffer or not parts:
+            flush(buffer)
+        s3.complete_multipart_upload(Bucket=bucket, Key=key, UploadId=upload_id, MultipartUpload={'Parts': parts})
+    except Exception:
+        s3.abort_multipart_upload(Bucket=bucket, Key=key, UploadId=upload_id)
+        raise
+    return size
+
+
+def presigned_url(bucket, key, s3=None):
+    s3 = s3 or get_s3_client()
+    return s3.generate_presigned_url('get_object', Params={'Bucket': bucket, 'Key': key}, ExpiresIn=URL_EXPIRY)
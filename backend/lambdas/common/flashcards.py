@@ -0,0 +1,40 @@
+import time
+import uuid
+from common import srs
+
+FLASHCARD_FIELDS = ('word', 'usage', 'translated_word', 'translated_usage')
+MAX_FIELD_LENGTH = 2000
+
+
+def set_partition(user_id, language, set_id):
+    return f'USER#{user_id}#LANGUAGE#{language}#SET#{set_id}'
+
+
+def validate_flashcard(card):
+    if not isinstance(card, dict):
+        return 'Flashcard must be an object'
+    if not card.get('word') or not card.get('translated_word'):
+        return 'Word and translated word are required'
+    for field in FLASHCARD_FIELDS:
+        value = card.get(field)
+        if value is not None and not isinstance(value, str):
+            return f'{field} must be a string'
+        if value and len(value) > MAX_FIELD_LENGTH:
+            return f'{field} must be at most {MAX_FIELD_LENGTH} characters'
+    return None
+
+
+def new_flashcard_item(user_id, language, set_id, card, now=None):
+    now = now or int(time.time())
+    flashcard_id = str(uuid.uuid4())
+    item = {
+        'PK': set_partition(user_id, language, set_id),
+        'SK': f'FLASHCARD#{flashcard_id}',
+        'created_at': now,
+        'updated_at': now,
+    }
+    for field in FLASHCARD_FIELDS:
+        item[field] = card.get(field)
+    item.update(srs.initial_state(user_id, now))
+    return flashcard_id, item
+
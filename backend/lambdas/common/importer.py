@@ -0,0 +1,233 @@
+import codecs
+import csv
+import html
+import io
+import itertools
+import logging
+import os
+import re
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from common.batch import chunked
+from common import search, wordkeys
+from common.flashcards import FLASHCARD_FIELDS, new_flashcard_item, validate_flashcard
+
+logger = logging.getLogger()
+
+FORMATS = ('csv', 'tsv', 'anki')
+SNIFF_BYTES = 64 * 1024
+MAX_ROWS = int(os.environ.get('IMPORT_MAX_ROWS', '20000'))
+MAX_REPORTED_ERRORS = 100
+WRITERS = int(os.environ.get('IMPORT_WRITERS', '4'))
+
+# Header names we recognise, including the Front/Back columns Anki uses.
+HEADER_ALIASES = {
+    'word': 'word',
+    'term': 'word',
+    'front': 'word',
+    'translated_word': 'translated_word',
+    'translation': 'translated_word',
+    'meaning': 'translated_word',
+    'back': 'translated_word',
+    'usage': 'usage',
+    'example': 'usage',
+    'translated_usage': 'translated_usage',
+    'example_translation': 'translated_usage',
+}
+DEFAULT_COLUMNS = ('word', 'translated_word', 'usage', 'translated_usage')
+ANKI_SEPARATORS = {'tab': '\t', 'comma': ',', 'semicolon': ';', 'pipe': '|', 'space': ' ', 'colon': ':'}
+
+_TAG_RE = re.compile(r'<[^>]+>')
+_BREAK_RE = re.compile(r'<br\s*/?>', re.IGNORECASE)
+
+
+class InvalidImport(ValueError):
+    pass
+
+
+class ImportResult:
+    def __init__(self):
+        self.imported = 0
+        self.rows = 0
+        self.failed = 0
+        self.errors = []
+        self.truncated = False
+
+    def add_error(self, line, error):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'line': line, 'error': error})
+
+    def to_dict(self):
+        return {
+            'rows': self.rows,
+            'imported': self.imported,
+            'failed': self.failed,
+            'errors': self.errors,
+            'truncated': self.truncated,
+        }
+
+
+def detect_encoding(sample):
+    for bom, encoding in ((codecs.BOM_UTF8, 'utf-8-sig'), (codecs.BOM_UTF16_LE, 'utf-16'), (codecs.BOM_UTF16_BE, 'utf-16')):
+        if sample.startswith(bom):
+            return encoding
+    try:
+        sample.decode('utf-8')
+        return 'utf-8'
+    except UnicodeDecodeError as e:
+        # A multi-byte character cut off by the end of the sample is still UTF-8.
+        if e.start >= len(sample) - 3 and e.reason == 'unexpected end of data':
+            return 'utf-8'
+        return 'cp1252'
+
+
+def open_text(raw, encoding=None):
+    buffered = raw if hasattr(raw, 'peek') else io.BufferedReader(raw, buffer_size=SNIFF_BYTES)
+    encoding = encoding or detect_encoding(buffered.peek(SNIFF_BYTES)[:SNIFF_BYTES])
+    return io.TextIOWrapper(buffered, encoding=encoding, errors='replace', newline=''), encoding
+
+
+def _read_directives(lines):
+    """Consume Anki '#key:value' header lines, returning them and the first data line."""
+    directives = {}
+    for line in lines:
+        if not line.startswith('#'):
+            return directives, line
+        key, _, value = line[1:].rstrip('\r\n').partition(':')
+        directives[key.strip().lower()] = value.strip()
+    return directives, None
+
+
+def _strip_html(value):
+    return html.unescape(_TAG_RE.sub('', _BREAK_RE.sub('\n', value)))
+
+
+def _resolve_columns(columns, first_row, has_header):
+    """Return (column mapping, whether first_row is a header)."""
+    if columns:
+        mapping = []
+        for index, name in enumerate(columns):
+            name = name.strip().lower()
+            if not name:
+                continue
+            if name not in FLASHCARD_FIELDS:
+                raise InvalidImport(f'Unknown column {name}')
+            mapping.append((index, name))
+        return mapping, bool(has_header)
+
+    header_fields = [HEADER_ALIASES.get(cell.strip().lower()) for cell in first_row]
+    looks_like_header = 'word' in header_fields and 'translated_word' in header_fields
+    if has_header or (has_header is None and looks_like_header):
+        mapping = [(index, field) for index, field in enumerate(header_fields) if field]
+        if not mapping:
+            raise InvalidImport('Header row does not name any flashcard columns')
+        return mapping, True
+    return list(enumerate(DEFAULT_COLUMNS)), False
+
+
+def parse_flashcards(raw, fmt=None, columns=None, has_header=None, encoding=None):
+    """Yield (line_number, card, error) for every data row of a CSV, TSV or Anki text export.
+
+    Rows are decoded and parsed lazily, so memory use does not grow with the file.
+    """
+    text, encoding = open_text(raw, encoding)
+    directives, first_line = _read_directives(text)
+    if first_line is None:
+        return
+    directive_lines = len(directives)
+
+    if fmt is None:
+        if directives:
+            fmt = 'anki'
+        else:
+            fmt = 'tsv' if first_line.count('\t') > first_line.count(',') else 'csv'
+    if fmt not in FORMATS:
+        raise InvalidImport(f'Unsupported format {fmt}')
+
+    strip = False
+    if fmt == 'anki':
+        separator = directives.get('separator', 'tab')
+        delimiter = ANKI_SEPARATORS.get(separator.lower(), separator[:1] or '\t')
+        strip = directives.get('html', 'true').lower() == 'true'
+        if not columns and 'columns' in directives:
+            mapped = [HEADER_ALIASES.get(name.strip().lower(), '') for name in directives['columns'].split(delimiter)]
+            if 'word' in mapped:
+                columns = mapped
+    else:
+        delimiter = '\t' if fmt == 'tsv' else ','
+
+    reader = csv.reader(itertools.chain([first_line], text), delimiter=delimiter)
+    first_row = next(reader, None)
+    if first_row is None:
+        return
+    mapping, skip_first = _resolve_columns(columns, first_row, has_header)
+    rows = reader if skip_first else itertools.chain([first_row], reader)
+
+    for row in rows:
+        line = reader.line_num + directive_lines
+        if not any(cell.strip() for cell in row):
+            continue
+        card = {}
+        for index, field in mapping:
+            value = row[index].strip() if index < len(row) else ''
+            if strip and value:
+                value = _strip_html(value).strip()
+            card[field] = value or None
+        yield line, card, validate_flashcard(card)
+
+
+def import_flashcards(raw, user_id, language, set_id, fmt=None, columns=None, has_header=None, encoding=None):
+    """Parse an export and batch-write its cards into the set's partition.
+
+    Only WRITERS chunks of wordkeys.CARDS_PER_TRANSACTION items are ever held in memory at once.
+    """
+    result = ImportResult()
+    now = int(time.time())
+
+    def items():
+        for line, card, error in parse_flashcards(raw, fmt, columns, has_header, encoding):
+            if result.rows >= MAX_ROWS:
+                result.truncated = True
+                return
+            result.rows += 1
+            if error:
+                result.add_error(line, error)
+                continue
+            _, item = new_flashcard_item(user_id, language, set_id, card, now)
+            item_lines[item['SK']] = line
+            yield item
+
+    item_lines = {}
+    in_flight = deque()
+
+    def write_and_index(chunk):
+        written, duplicates, failed = wordkeys.write_unique(chunk)
+        requests = []
+        for item in written:
+            requests.extend(search.index_requests(user_id, language, set_id, item['SK'].split('#', 1)[1], new_card=item))
+        search.apply(requests)
+        return duplicates, failed
+
+    def collect(future, chunk):
+        duplicates, failed = future.result()
+        for item in chunk:
+            line = item_lines.pop(item['SK'])
+            if item['SK'] in duplicates:
+                result.add_error(line, f"Duplicate of flashcard {duplicates[item['SK']]}")
+            elif item['SK'] in failed:
+                result.add_error(line, 'Flashcard could not be written, please retry')
+            else:
+                result.imported += 1
+
+    with ThreadPoolExecutor(max_workers=WRITERS) as pool:
+        for chunk in chunked(items(), wordkeys.CARDS_PER_TRANSACTION):
+            if len(in_flight) >= WRITERS:
+                collect(*in_flight.popleft())
+            in_flight.append((pool.submit(write_and_index, chunk), chunk))
+        while in_flight:
+            collect(*in_flight.popleft())
+
+    logger.info("Imported %s of %s rows into set %s", result.imported, result.rows, set_id)
+    return result
@@ -0,0 +1,174 @@
+import json
+import logging
+import os
+import random
+import sys
+import threading
+import time
+from collections import deque
+
+# Structured logging for the handlers. Every line is one JSON object carrying
+# the request's context (request id, function, route and, once authenticated,
+# user id) and any fields passed with extra=fields(...). Messages use %-style
+# arguments, so nothing is formatted unless the line is actually written.
+#
+# Payloads (request bodies, items read) are logged at DEBUG. They are written
+# for a sample of requests chosen when the request starts (head sampling), and
+# the DEBUG lines of any other request are held in a small buffer and written
+# only if that request logs an error or fails (tail sampling), so failures come
+# with their context while successful requests cost no log volume.
+
+LEVEL = logging.getLevelName(os.environ.get('LOG_LEVEL', 'INFO').upper())
+PAYLOAD_SAMPLE_RATE = float(os.environ.get('LOG_PAYLOAD_SAMPLE_RATE', '0'))
+# DEBUG lines kept per request for tail sampling; 0 turns it off.
+TAIL_BUFFER = int(os.environ.get('LOG_TAIL_BUFFER', '50'))
+MAX_FIELD_CHARS = int(os.environ.get('LOG_MAX_FIELD_CHARS', '2000'))
+
+# Libraries whose DEBUG output carries request bodies (hashed passwords
+# included), signatures and headers. They keep their own level so they never
+# follow the root logger down to DEBUG while a request fills its tail buffer.
+LIBRARY_LOGGERS = ('boto3', 'botocore', 's3transfer', 'urllib3')
+LIBRARY_LEVEL = max(LEVEL, logging.WARNING)
+
+REDACTED = '[REDACTED]'
+REDACT_FIELDS = frozenset(
+    {'password', 'hashed_password', 'token', 'jwt_token', 'authorization', 'cookie', 'jwt_secret', 'secret'}
+    | {name.strip().lower() for name in os.environ.get('LOG_REDACT_FIELDS', '').split(',') if name.strip()}
+)
+
+
+class _Request:
+    def __init__(self, context, sampled):
+        self.context = context
+        self.sampled = sampled
+        self.buffer = deque(maxlen=TAIL_BUFFER) if TAIL_BUFFER and not sampled else None
+
+
+_request = None
+_lock = threading.Lock()
+
+
+def fields(**values):
+    """extra= for a log call: logger.debug('Sets read', extra=fields(sets=sets))."""
+    return {'fields': values}
+
+
+def redact(value):
+    if isinstance(value, dict):
+        return {key: REDACTED if str(key).lower() in REDACT_FIELDS else redact(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return [redact(item) for item in value]
+    return value
+
+
+def _truncate(value):
+    if MAX_FIELD_CHARS <= 0:
+        return value
+    text = value if isinstance(value, str) else json.dumps(value, default=str, ensure_ascii=False)
+    if len(text) <= MAX_FIELD_CHARS:
+        return value
+    return text[:MAX_FIELD_CHARS] + f'... ({len(text)} chars)'
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(record.created)) + f'.{int(record.msecs):03d}Z',
+            'level': record.levelname,
+            'message': record.getMessage(),
+        }
+        context = getattr(record, 'context', None)
+        if context:
+            entry.update(context)
+        values = getattr(record, 'fields', None)
+        if values:
+            entry.update({key: _truncate(value) for key, value in redact(values).items()})
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class RequestHandler(logging.StreamHandler):
+    """Writes lines at or above LEVEL, and DEBUG lines the request's sampling keeps."""
+
+    def handle(self, record):
+        request = _request
+        if request is None:
+            if record.levelno >= LEVEL:
+                return super().handle(record)
+            return False
+        record.context = request.context
+        if record.levelno < LEVEL and record.name.partition('.')[0] in LIBRARY_LOGGERS:
+            # Only our own lines are sampled or buffered; see LIBRARY_LOGGERS.
+            return False
+        if record.levelno >= LEVEL or request.sampled:
+            if record.levelno >= logging.ERROR:
+                self.flush_buffer(request)
+            return super().handle(record)
+        if request.buffer is not None:
+            request.buffer.append(record)
+        return False
+
+    def flush_buffer(self, request):
+        with _lock:
+            held = list(request.buffer or ())
+            if request.buffer:
+                request.buffer.clear()
+        for record in held:
+            super().handle(record)
+
+
+_handler = RequestHandler(sys.stdout)
+_handler.setFormatter(JsonFormatter())
+
+
+def configure():
+    """Send the root logger's output through the JSON handler."""
+    root = logging.getLogger()
+    if os.environ.get('AWS_LAMBDA_FUNCTION_NAME'):
+        # The Lambda runtime installs a plain-text handler; every line would be written twice.
+        for handler in list(root.handlers):
+            if handler is not _handler:
+                root.removeHandler(handler)
+    if _handler not in root.handlers:
+        root.addHandler(_handler)
+    root.setLevel(_root_level(None))
+    for name in LIBRARY_LOGGERS:
+        logging.getLogger(name).setLevel(LIBRARY_LEVEL)
+
+
+def _root_level(request):
+    # Records below LEVEL are only created when a request may keep them.
+    if request is not None and (request.sampled or request.buffer is not None):
+        return min(LEVEL, logging.DEBUG)
+    return LEVEL
+
+
+def start_request(**context):
+    global _request
+    request = _Request({key: value for key, value in context.items() if value is not None},
+                       PAYLOAD_SAMPLE_RATE > 0 and random.random() < PAYLOAD_SAMPLE_RATE)
+    _request = request
+    logging.getLogger().setLevel(_root_level(request))
+    return request
+
+
+def bind(**context):
+    """Add fields, such as the authenticated user id, to every later line of the request."""
+    request = _request
+    if request is not None:
+        request.context = dict(request.context, **context)
+
+
+def end_request(failed=False):
+    global _request
+    request = _request
+    if request is None:
+        return
+    if failed:
+        _handler.flush_buffer(request)
+    _request = None
+    logging.getLogger().setLevel(_root_level(None))
+
+
+configure()
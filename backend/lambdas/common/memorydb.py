@@ -0,0 +1,1435 @@
+import re
+import threading
+import zlib
+from bisect import bisect_left, bisect_right
+from decimal import Decimal
+from boto3.dynamodb.conditions import ConditionBase, ConditionExpressionBuilder
+from boto3.dynamodb.types import Binary
+from botocore.exceptions import ClientError
+
+# An in-process stand-in for the part of DynamoDB the handlers use, selected
+# with STORAGE_BACKEND=memory (see db.py). MemoryClient takes the same
+# arguments as the resource's client and MemoryTable the same as a resource
+# Table, including boto3 Key/Attr conditions. Each partition keeps its sort
+# keys in a sorted list and each GSI keeps (sort key, table key) tuples per
+# index partition, so queries are bisections. Expressions are parsed and
+# checked the way DynamoDB checks them: undefined or unused placeholders,
+# key updates and overlapping paths are all rejected, and failures are raised
+# as the ClientErrors DynamoDB returns, as are attribute names that are
+# reserved words, items over 400 KB and keys over DynamoDB's 2048-byte
+# partition and 1024-byte sort key limits. ReturnConsumedCapacity reports the
+# units DynamoDB would bill, so benchmarks can measure capacity; throttling is
+# not modelled, nor are local secondary indexes, streams and TTL.
+
+PAGE_BYTES = 1024 * 1024
+MAX_ITEM_BYTES = 400 * 1024
+MAX_HASH_KEY_BYTES = 2048
+MAX_RANGE_KEY_BYTES = 1024
+READ_UNIT_BYTES = 4 * 1024
+WRITE_UNIT_BYTES = 1024
+BATCH_WRITE_LIMIT = 25
+BATCH_GET_LIMIT = 100
+TRANSACTION_LIMIT = 100
+
+_MISSING = object()
+
+
+def _error(code, message, operation, **extra):
+    response = {'Error': {'Code': code, 'Message': message}, 'ResponseMetadata': {'HTTPStatusCode': 400}}
+    response.update(extra)
+    return ClientError(response, operation)
+
+
+class _Invalid(Exception):
+    """A ValidationException; the client turns it into a ClientError for the running operation."""
+
+
+class _ConditionFailed(Exception):
+    def __init__(self, item):
+        super().__init__('The conditional request failed')
+        self.item = item
+
+
+# Values
+
+def _store(value):
+    """Copy a value into the store the way boto3 serializes it: ints become Decimals, bytes Binary."""
+    if isinstance(value, bool) or value is None or isinstance(value, str):
+        return value
+    if isinstance(value, int):
+        return Decimal(value)
+    if isinstance(value, Decimal):
+        if not value.is_finite():
+            raise TypeError('Infinity and NaN not supported')
+        return value
+    if isinstance(value, float):
+        raise TypeError('Float types are not supported. Use Decimal types instead.')
+    if isinstance(value, (bytes, bytearray)):
+        return Binary(bytes(value))
+    if isinstance(value, Binary):
+        return value
+    if isinstance(value, dict):
+        return {name: _store(element) for name, element in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_store(element) for element in value]
+    if isinstance(value, (set, frozenset)):
+        if not value:
+            raise _Invalid('One or more parameter values were invalid: A set may not be empty')
+        return {_store(element) for element in value}
+    raise TypeError(f'Unsupported type "{type(value)}" for value "{value}"')
+
+
+def _copy(value):
+    if isinstance(value, dict):
+        return {name: _copy(element) for name, element in value.items()}
+    if isinstance(value, list):
+        return [_copy(element) for element in value]
+    if isinstance(value, set):
+        return set(value)
+    return value
+
+
+def _type(value):
+    if isinstance(value, bool):
+        return 'BOOL'
+    if value is None:
+        return 'NULL'
+    if isinstance(value, str):
+        return 'S'
+    if isinstance(value, Decimal):
+        return 'N'
+    if isinstance(value, Binary):
+        return 'B'
+    if isinstance(value, dict):
+        return 'M'
+    if isinstance(value, list):
+        return 'L'
+    if isinstance(value, set):
+        element = next(iter(value))
+        return {'S': 'SS', 'N': 'NS', 'B': 'BS'}[_type(element)]
+    raise TypeError(f'Unsupported type {type(value)}')
+
+
+def _sortable(value):
+    return bytes(value) if isinstance(value, Binary) else value
+
+
+def _size(value):
+    kind = _type(value)
+    if kind == 'S':
+        return len(value.encode('utf-8'))
+    if kind == 'N':
+        return len(value.as_tuple().digits) // 2 + 2
+    if kind == 'B':
+        return len(bytes(value))
+    if kind in ('BOOL', 'NULL'):
+        return 1
+    if kind == 'M':
+        return 3 + sum(len(name.encode('utf-8')) + _size(element) + 1 for name, element in value.items())
+    if kind == 'L':
+        return 3 + sum(_size(element) + 1 for element in value)
+    return sum(_size(element) for element in value)
+
+
+def item_size(item):
+    return sum(len(name.encode('utf-8')) + _size(value) for name, value in item.items())
+
+
+# Capacity, billed as DynamoDB bills it: reads in 4 KB units (half for eventually
+# consistent reads), writes in 1 KB units, plus index writes, doubled in transactions.
+
+def _read_units(size, consistent):
+    units = max(1, -(-size // READ_UNIT_BYTES))
+    return units if consistent else units / 2
+
+
+def _write_units(size):
+    return max(1, -(-size // WRITE_UNIT_BYTES))
+
+
+def _index_write_units(table, table_key, old, new):
+    units = 0
+    for index in table.indexes.values():
+        before = index.entry(old, table_key) if old else None
+        after = index.entry(new, table_key) if new else None
+        if before is None and after is None:
+            continue
+        if before == after and index.project(old) == index.project(new):
+            continue
+        size = max(item_size(index.project(item)) for item in (old, new) if item)
+        units += _write_units(size) * (2 if before is not None and after is not None and before != after else 1)
+    return units
+
+
+def _capacity(mode, table_name, read=0, write=0):
+    if mode not in ('TOTAL', 'INDEXES'):
+        return None
+    capacity = {'TableName': table_name, 'CapacityUnits': float(read + write)}
+    if mode == 'INDEXES':
+        if read:
+            capacity['ReadCapacityUnits'] = float(read)
+        if write:
+            capacity['WriteCapacityUnits'] = float(write)
+    return capacity
+
+
+# Expressions
+
+_TOKEN = re.compile(
+    r'\s*(?:(?P<name>#[A-Za-z0-9_]+)|(?P<value>:[A-Za-z0-9_]+)|(?P<ident>[A-Za-z_][A-Za-z0-9_]*)'
+    r'|\[(?P<index>\d+)\]|(?P<op><>|<=|>=|[=<>(),.+\-]))'
+)
+_COMPARATORS = ('=', '<>', '<', '<=', '>', '>=')
+_FUNCTIONS = ('attribute_exists', 'attribute_not_exists', 'attribute_type', 'begins_with', 'contains')
+_UPDATE_CLAUSES = ('SET', 'REMOVE', 'ADD', 'DELETE')
+
+# Attribute names that have to go through ExpressionAttributeNames.
+RESERVED_WORDS = frozenset('''
+    ABORT ABSOLUTE ACTION ADD AFTER AGENT AGGREGATE ALL ALLOCATE ALTER ANALYZE AND ANY ARCHIVE ARE
+    ARRAY AS ASC ASCII ASENSITIVE ASSERTION ASYMMETRIC AT ATOMIC ATTACH ATTRIBUTE AUTH AUTHORIZATION
+    AUTHORIZE AUTO AVG BACK BACKUP BASE BATCH BEFORE BEGIN BETWEEN BIGINT BINARY BIT BLOB BLOCK
+    BOOLEAN BOTH BREADTH BUCKET BULK BY BYTE CALL CALLED CALLING CAPACITY CASCADE CASCADED CASE CAST
+    CATALOG CHAR CHARACTER CHECK CLASS CLOB CLOSE CLUSTER CLUSTERED CLUSTERING CLUSTERS COALESCE
+    COLLATE COLLATION COLLECTION COLUMN COLUMNS COMBINE COMMENT COMMIT COMPACT COMPILE COMPRESS
+    CONDITION CONFLICT CONNECT CONNECTION CONSISTENCY CONSISTENT CONSTRAINT CONSTRAINTS CONSTRUCTOR
+    CONSUMED CONTINUE CONVERT COPY CORRESPONDING COUNT COUNTER CREATE CROSS CUBE CURRENT CURSOR
+    CYCLE DATA DATABASE DATE DATETIME DAY DEALLOCATE DEC DECIMAL DECLARE DEFAULT DEFERRABLE DEFERRED
+    DEFINE DEFINED DEFINITION DELETE DELIMITED DEPTH DEREF DESC DESCRIBE DESCRIPTOR DETACH
+    DETERMINISTIC DIAGNOSTICS DIRECTORIES DISABLE DISCONNECT DISTINCT DISTRIBUTE DO DOMAIN DOUBLE
+    DROP DUMP DURATION DYNAMIC EACH ELEMENT ELSE ELSEIF EMPTY ENABLE END EQUAL EQUALS ERROR ESCAPE
+    ESCAPED EVAL EVALUATE EXCEEDED EXCEPT EXCEPTION EXCEPTIONS EXCLUSIVE EXEC EXECUTE EXISTS EXIT
+    EXPLAIN EXPLODE EXPORT EXPRESSION EXTENDED EXTERNAL EXTRACT FAIL FALSE FAMILY FETCH FIELDS FILE
+    FILTER FILTERING FINAL FINISH FIRST FIXED FLATTERN FLOAT FOR FORCE FOREIGN FORMAT FORWARD FOUND
+    FREE FROM FULL FUNCTION FUNCTIONS GENERAL GENERATE GET GLOB GLOBAL GO GOTO GRANT GREATER GROUP
+    GROUPING HANDLER HASH HAVE HAVING HEAP HIDDEN HOLD HOUR IDENTIFIED IDENTITY IF IGNORE IMMEDIATE
+    IMPORT IN INCLUDING INCLUSIVE INCREMENT INCREMENTAL INDEX INDEXED INDEXES INDICATOR INFINITE
+    INITIALLY INLINE INNER INNTER INOUT INPUT INSENSITIVE INSERT INSTEAD INT INTEGER INTERSECT
+    INTERVAL INTO INVALIDATE IS ISOLATION ITEM ITEMS ITERATE JOIN KEY KEYS LAG LANGUAGE LARGE LAST
+    LATERAL LEAD LEADING LEAVE LEFT LENGTH LESS LEVEL LIKE LIMIT LIMITED LINES LIST LOAD LOCAL
+    LOCALTIME LOCALTIMESTAMP LOCATION LOCATOR LOCK LOCKS LOG LOGED LONG LOOP LOWER MAP MATCH
+    MATERIALIZED MAX MAXLEN MEMBER MERGE METHOD METRICS MIN MINUS MINUTE MISSING MOD MODE MODIFIES
+    MODIFY MODULE MONTH MULTI MULTISET NAME NAMES NATIONAL NATURAL NCHAR NCLOB NEW NEXT NO NONE NOT
+    NULL NULLIF NUMBER NUMERIC OBJECT OF OFFLINE OFFSET OLD ON ONLINE ONLY OPAQUE OPEN OPERATOR
+    OPTION OR ORDER ORDINALITY OTHER OTHERS OUT OUTER OUTPUT OVER OVERLAPS OVERRIDE OWNER PAD
+    PARALLEL PARAMETER PARAMETERS PARTIAL PARTITION PARTITIONED PARTITIONS PATH PERCENT PERCENTILE
+    PERMISSION PERMISSIONS PIPE PIPELINED PLAN POOL POSITION PRECISION PREPARE PRESERVE PRIMARY
+    PRIOR PRIVATE PRIVILEGES PROCEDURE PROCESSED PROJECT PROJECTION PROPERTY PROVISIONING PUBLIC PUT
+    QUERY QUIT QUORUM RAISE RANDOM RANGE RANK RAW READ READS REAL REBUILD RECORD RECURSIVE REDUCE
+    REF REFERENCE REFERENCES REFERENCING REGEXP REGION REINDEX RELATIVE RELEASE REMAINDER RENAME
+    REPEAT REPLACE REQUEST RESET RESIGNAL RESOURCE RESPONSE RESTORE RESTRICT RESULT RETURN RETURNING
+    RETURNS REVERSE REVOKE RIGHT ROLE ROLES ROLLBACK ROLLUP ROUTINE ROW ROWS RULE RULES SAMPLE
+    SATISFIES SAVE SAVEPOINT SCAN SCHEMA SCOPE SCROLL SEARCH SECOND SECTION SEGMENT SEGMENTS SELECT
+    SELF SEMI SENSITIVE SEPARATE SEQUENCE SERIALIZABLE SESSION SET SETS SHARD SHARE SHARED SHORT
+    SHOW SIGNAL SIMILAR SIZE SKEWED SMALLINT SNAPSHOT SOME SOURCE SPACE SPACES SPARSE SPECIFIC
+    SPECIFICTYPE SPLIT SQL SQLCODE SQLERROR SQLEXCEPTION SQLSTATE SQLWARNING START STATE STATIC
+    STATUS STORAGE STORE STORED STREAM STRING STRUCT STYLE SUB SUBMULTISET SUBPARTITION SUBSTRING
+    SUBTYPE SUM SUPER SYMMETRIC SYNONYM SYSTEM TABLE TABLESAMPLE TEMP TEMPORARY TERMINATED TEXT THAN
+    THEN THROUGHPUT TIME TIMESTAMP TIMEZONE TINYINT TO TOKEN TOTAL TOUCH TRAILING TRANSACTION
+    TRANSFORM TRANSLATE TRANSLATION TREAT TRIGGER TRIM TRUE TRUNCATE TTL TUPLE TYPE UNDER UNDO UNION
+    UNIQUE UNIT UNKNOWN UNLOGGED UNNEST UNPROCESSED UNSIGNED UNTIL UPDATE UPPER URL USAGE USE USER
+    USERS USING UUID VACUUM VALUE VALUED VALUES VARCHAR VARIABLE VARIANCE VARINT VARYING VIEW VIEWS
+    VIRTUAL VOID WAIT WHEN WHENEVER WHERE WHILE WINDOW WITH WITHIN WITHOUT WORK WRAPPED WRITE YEAR
+    ZONE
+'''.split())
+
+
+class _Placeholders:
+    """Resolves #name and :value placeholders for one request and remembers which were used."""
+
+    def __init__(self, names, values):
+        if names is not None and not names:
+            raise _Invalid('ExpressionAttributeNames must not be empty')
+        if values is not None and not values:
+            raise _Invalid('ExpressionAttributeValues must not be empty')
+        self.names = names or {}
+        self.values = {key: _store(value) for key, value in (values or {}).items()}
+        self.used_names = set()
+        self.used_values = set()
+
+    def name(self, placeholder):
+        if placeholder not in self.names:
+            raise _Invalid(f'An expression attribute name used in the document path is not defined; attribute name: {placeholder}')
+        self.used_names.add(placeholder)
+        return self.names[placeholder]
+
+    def value(self, placeholder):
+        if placeholder not in self.values:
+            raise _Invalid(f'An expression attribute value used in expression is not defined; attribute value: {placeholder}')
+        self.used_values.add(placeholder)
+        return self.values[placeholder]
+
+    def check_unused(self):
+        unused = set(self.names) - self.used_names
+        if unused:
+            raise _Invalid(f"Value provided in ExpressionAttributeNames unused in expressions: keys: {{{', '.join(sorted(unused))}}}")
+        unused = set(self.values) - self.used_values
+        if unused:
+            raise _Invalid(f"Value provided in ExpressionAttributeValues unused in expressions: keys: {{{', '.join(sorted(unused))}}}")
+
+
+class _Parser:
+    def __init__(self, text, placeholders):
+        self.tokens = []
+        position = 0
+        text = text.rstrip()
+        while position < len(text):
+            match = _TOKEN.match(text, position)
+            if not match or match.end() == position:
+                raise _Invalid(f'Invalid expression: Syntax error; token: "{text[position:position + 10].strip()}"')
+            self.tokens.append((match.lastgroup, match.group(match.lastgroup)))
+            position = match.end()
+        self.position = 0
+        self.placeholders = placeholders
+
+    def peek(self, offset=0):
+        index = self.position + offset
+        return self.tokens[index] if index < len(self.tokens) else (None, None)
+
+    def take(self):
+        token = self.peek()
+        if token[0] is None:
+            raise _Invalid('Invalid expression: Syntax error; token: "<EOF>"')
+        self.position += 1
+        return token
+
+    def expect(self, text):
+        kind, token = self.take()
+        if token != text:
+            raise _Invalid(f'Invalid expression: Syntax error; token: "{token}", near: "{text}"')
+
+    def keyword(self, word):
+        kind, token = self.peek()
+        return kind == 'ident' and token.upper() == word
+
+    def done(self):
+        return self.position >= len(self.tokens)
+
+    def finish(self):
+        if not self.done():
+            raise _Invalid(f'Invalid expression: Syntax error; token: "{self.peek()[1]}"')
+
+    def path(self):
+        segments = [self._segment()]
+        while True:
+            kind, token = self.peek()
+            if kind == 'index':
+                self.take()
+                segments.append(int(token))
+            elif token == '.':
+                self.take()
+                segments.append(self._segment())
+            else:
+                return tuple(segments)
+
+    def _segment(self):
+        kind, token = self.take()
+        if kind == 'name':
+            return self.placeholders.name(token)
+        if kind == 'ident':
+            if token.upper() in RESERVED_WORDS:
+                raise _Invalid(f'Invalid expression: Attribute name is a reserved keyword; reserved keyword: {token}')
+            return token
+        raise _Invalid(f'Invalid expression: Syntax error; token: "{token}"')
+
+    # Conditions
+
+    def condition(self):
+        node = self._and()
+        while self.keyword('OR'):
+            self.take()
+            node = ('or', node, self._and())
+        return node
+
+    def _and(self):
+        node = self._not()
+        while self.keyword('AND'):
+            self.take()
+            node = ('and', node, self._not())
+        return node
+
+    def _not(self):
+        if self.keyword('NOT'):
+            self.take()
+            return ('not', self._not())
+        return self._primary()
+
+    def _primary(self):
+        kind, token = self.peek()
+        if token == '(':
+            self.take()
+            node = self.condition()
+            self.expect(')')
+            return node
+        if kind == 'ident' and token in _FUNCTIONS and self.peek(1)[1] == '(':
+            self.take()
+            self.expect('(')
+            arguments = [('path', self.path())]
+            while self.peek()[1] == ',':
+                self.take()
+                arguments.append(self.operand())
+            self.expect(')')
+            return ('function', token, arguments)
+        left = self.operand()
+        kind, token = self.peek()
+        if token in _COMPARATORS:
+            self.take()
+            return ('compare', token, left, self.operand())
+        if self.keyword('BETWEEN'):
+            self.take()
+            low = self.operand()
+            if not self.keyword('AND'):
+                raise _Invalid('Invalid expression: BETWEEN requires AND')
+            self.take()
+            return ('between', left, low, self.operand())
+        if self.keyword('IN'):
+            self.take()
+            self.expect('(')
+            options = [self.operand()]
+            while self.peek()[1] == ',':
+                self.take()
+                options.append(self.operand())
+            self.expect(')')
+            return ('in', left, options)
+        raise _Invalid(f'Invalid expression: Syntax error; token: "{token}"')
+
+    def operand(self):
+        kind, token = self.peek()
+        if kind == 'value':
+            self.take()
+            return ('value', self.placeholders.value(token))
+        if kind == 'ident' and token == 'size' and self.peek(1)[1] == '(':
+            self.take()
+            self.expect('(')
+            path = self.path()
+            self.expect(')')
+            return ('size', path)
+        return ('path', self.path())
+
+    # Updates
+
+    def update(self):
+        clauses = {}
+        while not self.done():
+            kind, token = self.take()
+            clause = token.upper() if kind == 'ident' else None
+            if clause not in _UPDATE_CLAUSES:
+                raise _Invalid(f'Invalid UpdateExpression: Syntax error; token: "{token}"')
+            if clause in clauses:
+                raise _Invalid(f'Invalid UpdateExpression: The "{clause}" section can only be used once in an update expression;')
+            actions = clauses[clause] = []
+            while True:
+                path = self.path()
+                if clause == 'SET':
+                    self.expect('=')
+                    actions.append((path, self._set_value()))
+                elif clause == 'REMOVE':
+                    actions.append((path, None))
+                else:
+                    kind, token = self.take()
+                    if kind != 'value':
+                        raise _Invalid(f'Invalid UpdateExpression: Syntax error; token: "{token}"')
+                    actions.append((path, self.placeholders.value(token)))
+                if self.peek()[1] != ',':
+                    break
+                self.take()
+        if not clauses:
+            raise _Invalid('Invalid UpdateExpression: The expression can not be empty;')
+        return clauses
+
+    def _set_value(self):
+        left = self._set_operand()
+        kind, token = self.peek()
+        if token in ('+', '-'):
+            self.take()
+            return (token, left, self._set_operand())
+        return left
+
+    def _set_operand(self):
+        kind, token = self.peek()
+        if kind == 'ident' and token in ('if_not_exists', 'list_append') and self.peek(1)[1] == '(':
+            self.take()
+            self.expect('(')
+            first = ('path', self.path()) if token == 'if_not_exists' else self._set_operand()
+            self.expect(',')
+            second = self._set_operand()
+            self.expect(')')
+            return (token, first, second)
+        if kind == 'value':
+            self.take()
+            return ('value', self.placeholders.value(token))
+        return ('path', self.path())
+
+    def projection(self):
+        paths = [self.path()]
+        while self.peek()[1] == ',':
+            self.take()
+            paths.append(self.path())
+        return paths
+
+
+def _resolve(item, path):
+    value = item
+    for segment in path:
+        if isinstance(segment, int):
+            if not isinstance(value, list) or segment >= len(value):
+                return _MISSING
+        elif not isinstance(value, dict) or segment not in value:
+            return _MISSING
+        value = value[segment]
+    return value
+
+
+def _operand(node, item):
+    kind = node[0]
+    if kind == 'value':
+        return node[1]
+    value = _resolve(item, node[1])
+    if kind == 'size' and value is not _MISSING:
+        kind_of = _type(value)
+        if kind_of in ('BOOL', 'NULL', 'N'):
+            return _MISSING
+        return Decimal(len(bytes(value)) if kind_of == 'B' else len(value))
+    return value
+
+
+def _comparable(left, right):
+    return (left is not _MISSING and right is not _MISSING
+            and _type(left) == _type(right) and _type(left) in ('S', 'N', 'B'))
+
+
+def _evaluate(node, item):
+    kind = node[0]
+    if kind == 'and':
+        return _evaluate(node[1], item) and _evaluate(node[2], item)
+    if kind == 'or':
+        return _evaluate(node[1], item) or _evaluate(node[2], item)
+    if kind == 'not':
+        return not _evaluate(node[1], item)
+    if kind == 'compare':
+        operator = node[1]
+        left, right = _operand(node[2], item), _operand(node[3], item)
+        if operator in ('=', '<>'):
+            equal = left is not _MISSING and right is not _MISSING and _type(left) == _type(right) and left == right
+            return equal if operator == '=' else not equal
+        if not _comparable(left, right):
+            return False
+        left, right = _sortable(left), _sortable(right)
+        return {'<': left < right, '<=': left <= right, '>': left > right, '>=': left >= right}[operator]
+    if kind == 'between':
+        value, low, high = (_operand(operand, item) for operand in node[1:])
+        if not (_comparable(value, low) and _comparable(value, high)):
+            return False
+        return _sortable(low) <= _sortable(value) <= _sortable(high)
+    if kind == 'in':
+        value = _operand(node[1], item)
+        return value is not _MISSING and any(
+            option is not _MISSING and _type(option) == _type(value) and option == value
+            for option in (_operand(operand, item) for operand in node[2])
+        )
+    name, arguments = node[1], node[2]
+    value = _operand(arguments[0], item)
+    if name == 'attribute_exists':
+        return value is not _MISSING
+    if name == 'attribute_not_exists':
+        return value is _MISSING
+    if value is _MISSING:
+        return False
+    argument = _operand(arguments[1], item)
+    if argument is _MISSING:
+        return False
+    if name == 'attribute_type':
+        return _type(value) == argument
+    if name == 'begins_with':
+        return _type(value) == _type(argument) and _type(value) in ('S', 'B') and \
+            _sortable(value).startswith(_sortable(argument))
+    # contains
+    kind_of = _type(value)
+    if kind_of == 'S':
+        return isinstance(argument, str) and argument in value
+    if kind_of in ('SS', 'NS', 'BS', 'L'):
+        return argument in value
+    return False
+
+
+def _project(item, paths):
+    projected = {}
+    for path in paths:
+        value = _resolve(item, path)
+        if value is _MISSING:
+            continue
+        target = projected
+        for position, segment in enumerate(path[:-1]):
+            following = path[position + 1]
+            if isinstance(target, list):
+                target.append([] if isinstance(following, int) else {})
+                target = target[-1]
+            else:
+                target = target.setdefault(segment, [] if isinstance(following, int) else {})
+        if isinstance(target, list):
+            target.append(_copy(value))
+        else:
+            target[path[-1]] = _copy(value)
+    return projected
+
+
+# Tables
+
+class _Schema:
+    def __init__(self, hash_key, range_key, types):
+        self.hash_key = hash_key
+        self.range_key = range_key
+        self.types = types
+
+    @classmethod
+    def parse(cls, key_schema, types):
+        hash_key = next(key['AttributeName'] for key in key_schema if key['KeyType'] == 'HASH')
+        range_key = next((key['AttributeName'] for key in key_schema if key['KeyType'] == 'RANGE'), None)
+        return cls(hash_key, range_key, types)
+
+    @property
+    def attributes(self):
+        return (self.hash_key, self.range_key) if self.range_key else (self.hash_key,)
+
+    def check(self, item, index=None):
+        for attribute in self.attributes:
+            value = item.get(attribute, _MISSING)
+            if value is _MISSING:
+                if index:
+                    return False
+                raise _Invalid(f'One or more parameter values were invalid: Missing the key {attribute} in the item')
+            expected = self.types[attribute]
+            if _type(value) != expected:
+                where = f'Type mismatch for Index Key {attribute} Expected: {expected}' if index else \
+                    f'Type mismatch for key {attribute} expected: {expected}'
+                raise _Invalid(f'One or more parameter values were invalid: {where} Actual: {_type(value)}')
+            if expected in ('S', 'B') and not len(_sortable(value)):
+                raise _Invalid(f'One or more parameter values are not valid. The AttributeValue for a key attribute '
+                               f'cannot contain an empty string value. Key: {attribute}')
+            if attribute == self.hash_key and _size(value) > MAX_HASH_KEY_BYTES:
+                raise _Invalid('One or more parameter values were invalid: Size of hashkey has exceeded '
+                               f'the maximum size limit of {MAX_HASH_KEY_BYTES} bytes')
+            if attribute == self.range_key and _size(value) > MAX_RANGE_KEY_BYTES:
+                raise _Invalid('One or more parameter values were invalid: Aggregated size of all range keys '
+                               f'has exceeded the size limit of {MAX_RANGE_KEY_BYTES} bytes')
+        return True
+
+    def key(self, item):
+        return tuple(_sortable(item[attribute]) for attribute in self.attributes)
+
+
+class _Index:
+    def __init__(self, definition, types, table_schema):
+        self.name = definition['IndexName']
+        self.schema = _Schema.parse(definition['KeySchema'], types)
+        projection = definition.get('Projection', {})
+        self.projection = projection.get('ProjectionType', 'ALL')
+        self.attributes = set(projection.get('NonKeyAttributes', ())) | set(self.schema.attributes) | set(table_schema.attributes)
+        self.partitions = {}
+
+    def entry(self, item, table_key):
+        if not self.schema.check(item, index=self.name):
+            return None
+        hash_value = _sortable(item[self.schema.hash_key])
+        range_value = _sortable(item[self.schema.range_key]) if self.schema.range_key else 0
+        return hash_value, (range_value,) + table_key
+
+    def add(self, item, table_key):
+        entry = self.entry(item, table_key)
+        if entry:
+            entries = self.partitions.setdefault(entry[0], [])
+            entries.insert(bisect_left(entries, entry[1]), entry[1])
+
+    def remove(self, item, table_key):
+        entry = self.entry(item, table_key)
+        if entry:
+            entries = self.partitions[entry[0]]
+            del entries[bisect_left(entries, entry[1])]
+            if not entries:
+                del self.partitions[entry[0]]
+
+    def project(self, item):
+        if self.projection == 'ALL':
+            return item
+        return {name: value for name, value in item.items() if name in self.attributes}
+
+
+class _Table:
+    def __init__(self, name, key_schema, attribute_definitions, indexes=()):
+        self.name = name
+        types = {definition['AttributeName']: definition['AttributeType'] for definition in attribute_definitions}
+        self.schema = _Schema.parse(key_schema, types)
+        self.indexes = {definition['IndexName']: _Index(definition, types, self.schema) for definition in indexes}
+        # {hash value: (sorted range values, {range value: item})}
+        self.partitions = {}
+
+    def describe(self):
+        return {
+            'TableName': self.name,
+            'TableStatus': 'ACTIVE',
+            'KeySchema': [{'AttributeName': self.schema.hash_key, 'KeyType': 'HASH'}] +
+                         ([{'AttributeName': self.schema.range_key, 'KeyType': 'RANGE'}] if self.schema.range_key else []),
+            'ItemCount': sum(len(items) for _, items in self.partitions.values()),
+        }
+
+    def key_of(self, key):
+        """Validate a Key argument and return its sortable (hash, range) tuple."""
+        key = {name: _store(value) for name, value in key.items()}
+        if set(key) != set(self.schema.attributes):
+            raise _Invalid('The provided key element does not match the schema')
+        self.schema.check(key)
+        return self.schema.key(key)
+
+    def get(self, table_key):
+        partition = self.partitions.get(table_key[0])
+        if partition is None:
+            return None
+        return partition[1].get(table_key[1] if len(table_key) > 1 else None)
+
+    def put(self, item):
+        table_key = self.schema.key(item)
+        self.delete(table_key)
+        range_value = table_key[1] if len(table_key) > 1 else None
+        ordered, items = self.partitions.setdefault(table_key[0], ([], {}))
+        if range_value is not None:
+            ordered.insert(bisect_left(ordered, range_value), range_value)
+        else:
+            ordered.append(None)
+        items[range_value] = item
+        for index in self.indexes.values():
+            index.add(item, table_key)
+
+    def delete(self, table_key):
+        existing = self.get(table_key)
+        if existing is None:
+            return None
+        range_value = table_key[1] if len(table_key) > 1 else None
+        ordered, items = self.partitions[table_key[0]]
+        del items[range_value]
+        if range_value is not None:
+            del ordered[bisect_left(ordered, range_value)]
+        else:
+            ordered.clear()
+        if not items:
+            del self.partitions[table_key[0]]
+        for index in self.indexes.values():
+            index.remove(existing, table_key)
+        return existing
+
+    def key_attributes(self, item, index=None):
+        names = set(self.schema.attributes)
+        if index:
+            names.update(index.schema.attributes)
+        return {name: _copy(item[name]) for name in names}
+
+
+def _check_item(item):
+    if item_size(item) > MAX_ITEM_BYTES:
+        raise _Invalid('Item size has exceeded the maximum allowed size')
+
+
+def _key_condition(node, schema):
+    """Split a parsed key condition into the hash value and an optional (operator, values) on the range key."""
+    parts = []
+
+    def flatten(part):
+        if part[0] == 'and':
+            flatten(part[1])
+            flatten(part[2])
+        else:
+            parts.append(part)
+    flatten(node)
+
+    hash_value = _MISSING
+    range_condition = None
+    for part in parts:
+        if part[0] == 'compare' and part[2][0] == 'path' and part[3][0] == 'value':
+            path, operator, values = part[2][1], part[1], (part[3][1],)
+        elif part[0] == 'between' and part[1][0] == 'path' and part[2][0] == part[3][0] == 'value':
+            path, operator, values = part[1][1], 'between', (part[2][1], part[3][1])
+        elif part[0] == 'function' and part[1] == 'begins_with' and part[2][1][0] == 'value':
+            path, operator, values = part[2][0][1], 'begins_with', (part[2][1][1],)
+        else:
+            raise _Invalid('Invalid operator used in KeyConditionExpression')
+        attribute = path[0]
+        if len(path) == 1 and attribute == schema.hash_key and operator == '=' and hash_value is _MISSING:
+            hash_value = values[0]
+        elif len(path) == 1 and attribute == schema.range_key and operator != '<>' and range_condition is None:
+            range_condition = (operator, values)
+        else:
+            raise _Invalid(f'Query key condition not supported: {".".join(map(str, path))} {operator}')
+        expected = schema.types[attribute]
+        if any(_type(value) != expected for value in values) or (operator == 'begins_with' and expected == 'N'):
+            raise _Invalid('One or more parameter values were invalid: Condition parameter type does not match schema type')
+    if hash_value is _MISSING:
+        raise _Invalid(f'Query condition missed key schema element: {schema.hash_key}')
+    return _sortable(hash_value), range_condition
+
+
+def _range_bounds(ordered, condition):
+    """(lo, hi) such that ordered[lo:hi] are the sort keys matching condition."""
+    if condition is None:
+        return 0, len(ordered)
+    operator, values = condition
+    value = _sortable(values[0])
+    if operator == '=':
+        return bisect_left(ordered, value), bisect_right(ordered, value)
+    if operator == '<':
+        return 0, bisect_left(ordered, value)
+    if operator == '<=':
+        return 0, bisect_right(ordered, value)
+    if operator == '>':
+        return bisect_right(ordered, value), len(ordered)
+    if operator == '>=':
+        return bisect_left(ordered, value), len(ordered)
+    if operator == 'between':
+        return bisect_left(ordered, value), bisect_right(ordered, _sortable(values[1]))
+    # begins_with
+    lo = hi = bisect_left(ordered, value)
+    while hi < len(ordered) and ordered[hi].startswith(value):
+        hi += 1
+    return lo, hi
+
+
+class MemoryStore:
+    """Tables shared by every MemoryClient and MemoryTable built on them."""
+
+    def __init__(self):
+        self.tables = {}
+        self.lock = threading.RLock()
+
+
+class MemoryClient:
+    """The DynamoDB client operations the handlers use, against a MemoryStore."""
+
+    def __init__(self, store=None):
+        self.store = store or MemoryStore()
+
+    def get_waiter(self, name):
+        return _Waiter()
+
+    # Tables
+
+    def create_table(self, TableName, KeySchema, AttributeDefinitions, GlobalSecondaryIndexes=(), **kwargs):
+        with self.store.lock:
+            if TableName in self.store.tables:
+                raise _error('ResourceInUseException', f'Table already exists: {TableName}', 'CreateTable')
+            table = self.store.tables[TableName] = _Table(TableName, KeySchema, AttributeDefinitions, GlobalSecondaryIndexes)
+            return {'TableDescription': table.describe()}
+
+    def delete_table(self, TableName):
+        with self.store.lock:
+            description = self._table(TableName, 'DeleteTable').describe()
+            del self.store.tables[TableName]
+            return {'TableDescription': description}
+
+    def describe_table(self, TableName):
+        with self.store.lock:
+            return {'Table': self._table(TableName, 'DescribeTable').describe()}
+
+    def _table(self, name, operation):
+        table = self.store.tables.get(name)
+        if table is None:
+            raise _error('ResourceNotFoundException', 'Requested resource not found', operation)
+        return table
+
+    # Items
+
+    def _run(self, operation, function):
+        with self.store.lock:
+            try:
+                return function()
+            except _Invalid as e:
+                raise _error('ValidationException', str(e), operation)
+            except _ConditionFailed as e:
+                extra = {'Item': e.item} if e.item is not None else {}
+                raise _error('ConditionalCheckFailedException', 'The conditional request failed', operation, **extra)
+
+    def _write(self, operation, write, table_name, key_or_item, kwargs):
+        mode = kwargs.pop('ReturnConsumedCapacity', None)
+
+        def run():
+            response, units = write(self._table(table_name, operation), key_or_item, kwargs)
+            capacity = _capacity(mode, table_name, write=units)
+            if capacity:
+                response['ConsumedCapacity'] = capacity
+            return response
+        return self._run(operation, run)
+
+    def put_item(self, TableName, Item, **kwargs):
+        return self._write('PutItem', self._put, TableName, Item, kwargs)
+
+    def update_item(self, TableName, Key, **kwargs):
+        return self._write('UpdateItem', self._update, TableName, Key, kwargs)
+
+    def delete_item(self, TableName, Key, **kwargs):
+        return self._write('DeleteItem', self._delete, TableName, Key, kwargs)
+
+    def get_item(self, TableName, Key, ProjectionExpression=None, ExpressionAttributeNames=None, ConsistentRead=False,
+                 ReturnConsumedCapacity=None):
+        def run():
+            table = self._table(TableName, 'GetItem')
+            placeholders = _Placeholders(ExpressionAttributeNames, None)
+            paths = _parse(ProjectionExpression, placeholders, 'projection')
+            placeholders.check_unused()
+            item = table.get(table.key_of(Key))
+            response = {} if item is None else {'Item': _project(item, paths) if paths else _copy(item)}
+            units = _read_units(item_size(item) if item else 0, ConsistentRead)
+            capacity = _capacity(ReturnConsumedCapacity, TableName, read=units)
+            if capacity:
+                response['ConsumedCapacity'] = capacity
+            return response
+        return self._run('GetItem', run)
+
+    def _prepare(self, kwargs, allowed):
+        for name in kwargs:
+            if name not in allowed:
+                raise _Invalid(f'Unsupported parameter {name}')
+        placeholders, built = _built(kwargs)
+        condition = _parse(built.get('ConditionExpression'), placeholders, 'condition')
+        return placeholders, condition
+
+    def _check(self, condition, existing, kwargs):
+        if condition is not None and not _evaluate(condition, existing or {}):
+            returned = _copy(existing) if existing and kwargs.get('ReturnValuesOnConditionCheckFailure') == 'ALL_OLD' else None
+            raise _ConditionFailed(returned)
+
+    def _put(self, table, item, kwargs, apply=True):
+        placeholders, condition = self._prepare(kwargs, _WRITE_ARGUMENTS)
+        placeholders.check_unused()
+        item = _store(item)
+        table.schema.check(item)
+        for index in table.indexes.values():
+            index.schema.check(item, index=index.name)
+        _check_item(item)
+        table_key = table.schema.key(item)
+        existing = table.get(table_key)
+        self._check(condition, existing, kwargs)
+        units = _write_units(max(item_size(item), item_size(existing or {}))) + \
+            _index_write_units(table, table_key, existing, item)
+        if apply:
+            table.put(item)
+        if kwargs.get('ReturnValues') == 'ALL_OLD' and existing is not None:
+            return {'Attributes': _copy(existing)}, units
+        return {}, units
+
+    def _delete(self, table, key, kwargs, apply=True):
+        placeholders, condition = self._prepare(kwargs, _WRITE_ARGUMENTS)
+        placeholders.check_unused()
+        table_key = table.key_of(key)
+        existing = table.get(table_key)
+        self._check(condition, existing, kwargs)
+        units = _write_units(item_size(existing or {})) + _index_write_units(table, table_key, existing, None)
+        if apply:
+            table.delete(table_key)
+        if kwargs.get('ReturnValues') == 'ALL_OLD' and existing is not None:
+            return {'Attributes': _copy(existing)}, units
+        return {}, units
+
+    def _update(self, table, key, kwargs, apply=True):
+        placeholders, condition = self._prepare(kwargs, _WRITE_ARGUMENTS + ('UpdateExpression',))
+        clauses = _parse(kwargs.get('UpdateExpression'), placeholders, 'update') or {}
+        placeholders.check_unused()
+        table_key = table.key_of(key)
+        existing = table.get(table_key)
+        self._check(condition, existing, kwargs)
+
+        item = _copy(existing) if existing is not None else {name: _store(value) for name, value in key.items()}
+        touched = _apply_update(item, existing or {}, clauses, table.schema.attributes)
+        for index in table.indexes.values():
+            index.schema.check(item, index=index.name)
+        _check_item(item)
+        units = _write_units(max(item_size(item), item_size(existing or {}))) + \
+            _index_write_units(table, table_key, existing, item)
+        if apply:
+            table.put(item)
+
+        returned = kwargs.get('ReturnValues', 'NONE')
+        response = {}
+        if returned == 'ALL_NEW':
+            response = {'Attributes': _copy(item)}
+        elif returned == 'ALL_OLD' and existing:
+            response = {'Attributes': _copy(existing)}
+        elif returned in ('UPDATED_NEW', 'UPDATED_OLD'):
+            source = item if returned == 'UPDATED_NEW' else (existing or {})
+            attributes = {name: _copy(source[name]) for name in touched if name in source}
+            if attributes:
+                response = {'Attributes': attributes}
+        return response, units
+
+    # Reads
+
+    def query(self, TableName, **kwargs):
+        return self._run('Query', lambda: self._read(self._table(TableName, 'Query'), kwargs, query=True))
+
+    def scan(self, TableName, **kwargs):
+        return self._run('Scan', lambda: self._read(self._table(TableName, 'Scan'), kwargs, query=False))
+
+    def _read(self, table, kwargs, query):
+        allowed = _READ_ARGUMENTS + (('KeyConditionExpression', 'ScanIndexForward') if query else ('Segment', 'TotalSegments'))
+        for name in kwargs:
+            if name not in allowed:
+                raise _Invalid(f'Unsupported parameter {name}')
+        placeholders, built = _built(kwargs)
+        index = None
+        if kwargs.get('IndexName'):
+            index = table.indexes.get(kwargs['IndexName'])
+            if index is None:
+                raise _Invalid(f"The table does not have the specified index: {kwargs['IndexName']}")
+            if kwargs.get('ConsistentRead'):
+                raise _Invalid('Consistent reads are not supported on global secondary indexes')
+        schema = index.schema if index else table.schema
+
+        if query:
+            if not built.get('KeyConditionExpression'):
+                raise _Invalid('Either the KeyConditions or KeyConditionExpression parameter must be specified in the request.')
+            hash_value, range_condition = _key_condition(
+                _parse(built['KeyConditionExpression'], placeholders, 'condition'), schema)
+        filter_node = _parse(built.get('FilterExpression'), placeholders, 'condition')
+        paths = _parse(kwargs.get('ProjectionExpression'), placeholders, 'projection')
+        placeholders.check_unused()
+
+        limit = kwargs.get('Limit')
+        if limit is not None and limit < 1:
+            raise _Invalid('1 validation error detected: Value at \'limit\' failed to satisfy constraint: '
+                           'Member must have value greater than or equal to 1')
+        start = kwargs.get('ExclusiveStartKey')
+        start = {name: _store(value) for name, value in start.items()} if start else None
+
+        if query:
+            keys = self._query_keys(table, index, hash_value, range_condition, start, kwargs.get('ScanIndexForward', True))
+        else:
+            keys = self._scan_keys(table, index, start, kwargs.get('Segment'), kwargs.get('TotalSegments'))
+
+        items = []
+        scanned = 0
+        read_bytes = 0
+        last = None
+        # Limit counts items read before the filter. LastEvaluatedKey is only returned
+        # when keys remain; DynamoDB can also return it after an exactly full last page.
+        for table_key in keys:
+            if (limit is not None and scanned == limit) or read_bytes >= PAGE_BYTES:
+                break
+            item = table.get(table_key)
+            scanned += 1
+            last = item
+            if index:
+                item = index.project(item)
+            read_bytes += item_size(item)
+            if filter_node is not None and not _evaluate(filter_node, item):
+                continue
+            items.append(_project(item, paths) if paths else _copy(item))
+        else:
+            last = None
+
+        response = {'Count': len(items), 'ScannedCount': scanned}
+        if kwargs.get('Select') != 'COUNT':
+            response['Items'] = items
+        if last is not None:
+            response['LastEvaluatedKey'] = table.key_attributes(last, index)
+        capacity = _capacity(kwargs.get('ReturnConsumedCapacity'), table.name,
+                             read=_read_units(read_bytes, kwargs.get('ConsistentRead', False)))
+        if capacity:
+            response['ConsumedCapacity'] = capacity
+        return response
+
+    def _query_keys(self, table, index, hash_value, range_condition, start, forward):
+        if index is None:
+            ordered, _ = table.partitions.get(hash_value, ([], {}))
+            if table.schema.range_key is None:
+                return [(hash_value,)] if ordered else []
+            lo, hi = _range_bounds(ordered, range_condition)
+            if start:
+                position = _sortable(start[table.schema.range_key])
+                if forward:
+                    lo = max(lo, bisect_right(ordered, position))
+                else:
+                    hi = min(hi, bisect_left(ordered, position))
+            selected = ordered[lo:hi]
+            if not forward:
+                selected.reverse()
+            return [(hash_value, range_value) for range_value in selected]
+
+        entries = index.partitions.get(hash_value, [])
+        range_values = [entry[0] for entry in entries]
+        lo, hi = _range_bounds(range_values, range_condition)
+        if start:
+            entry = index.entry(start, table.schema.key(start)) if table.schema.check(start) else None
+            if entry is None:
+                raise _Invalid('The provided starting key is invalid')
+            position = entry[1]
+            if forward:
+                lo = max(lo, bisect_right(entries, position))
+            else:
+                hi = min(hi, bisect_left(entries, position))
+        selected = entries[lo:hi]
+        if not forward:
+            selected.reverse()
+        return [entry[1:] for entry in selected]
+
+    def _scan_keys(self, table, index, start, segment, total_segments):
+        if (segment is None) != (total_segments is None):
+            raise _Invalid('The TotalSegments parameter is required but was not present in the request when Segment parameter is present')
+        if index is None:
+            keys = [
+                (hash_value, range_value) if table.schema.range_key else (hash_value,)
+                for hash_value in sorted(table.partitions)
+                for range_value in table.partitions[hash_value][0]
+            ]
+        else:
+            keys = [entry[1:] for hash_value in sorted(index.partitions) for entry in index.partitions[hash_value]]
+        if total_segments is not None:
+            keys = [key for key in keys if zlib.crc32(repr(key[0]).encode('utf-8')) % total_segments == segment]
+        if start:
+            position = table.schema.key(start)
+            for offset, key in enumerate(keys):
+                if key == position:
+                    return keys[offset + 1:]
+        return keys
+
+    # Batches and transactions
+
+    def batch_write_item(self, RequestItems, ReturnConsumedCapacity=None):
+        def run():
+            requests = [(name, request) for name, table_requests in RequestItems.items() for request in table_requests]
+            if not requests or len(requests) > BATCH_WRITE_LIMIT:
+                raise _Invalid('1 validation error detected: Value at \'requestItems\' failed to satisfy constraint: '
+                               'Map value must satisfy constraint: [Member must have length less than or equal to 25, '
+                               'Member must have length greater than or equal to 1]')
+            operations = []
+            seen = set()
+            for name, request in requests:
+                table = self._table(name, 'BatchWriteItem')
+                if 'PutRequest' in request:
+                    item = _store(request['PutRequest']['Item'])
+                    table.schema.check(item)
+                    for index in table.indexes.values():
+                        index.schema.check(item, index=index.name)
+                    _check_item(item)
+                    table_key = table.schema.key(item)
+                else:
+                    item = None
+                    table_key = table.key_of(request['DeleteRequest']['Key'])
+                if (name, table_key) in seen:
+                    raise _Invalid('Provided list of item keys contains duplicates')
+                seen.add((name, table_key))
+                operations.append((table, table_key, item))
+            units = {}
+            for table, table_key, item in operations:
+                existing = table.get(table_key)
+                units[table.name] = units.get(table.name, 0) + \
+                    _write_units(max(item_size(item or {}), item_size(existing or {}))) + \
+                    _index_write_units(table, table_key, existing, item)
+                if item is None:
+                    table.delete(table_key)
+                else:
+                    table.put(item)
+            response = {'UnprocessedItems': {}}
+            capacity = [_capacity(ReturnConsumedCapacity, name, write=total) for name, total in units.items()]
+            if all(capacity):
+                response['ConsumedCapacity'] = capacity
+            return response
+        return self._run('BatchWriteItem', run)
+
+    def batch_get_item(self, RequestItems, ReturnConsumedCapacity=None):
+        def run():
+            if sum(len(request['Keys']) for request in RequestItems.values()) > BATCH_GET_LIMIT:
+                raise _Invalid('Too many items requested for the BatchGetItem call')
+            responses = {}
+            capacity = []
+            for name, request in RequestItems.items():
+                table = self._table(name, 'BatchGetItem')
+                placeholders = _Placeholders(request.get('ExpressionAttributeNames'), None)
+                paths = _parse(request.get('ProjectionExpression'), placeholders, 'projection')
+                placeholders.check_unused()
+                found = responses[name] = []
+                seen = set()
+                units = 0
+                for key in request['Keys']:
+                    table_key = table.key_of(key)
+                    if table_key in seen:
+                        raise _Invalid('Provided list of item keys contains duplicates')
+                    seen.add(table_key)
+                    item = table.get(table_key)
+                    units += _read_units(item_size(item) if item else 0, request.get('ConsistentRead', False))
+                    if item is not None:
+                        found.append(_project(item, paths) if paths else _copy(item))
+                capacity.append(_capacity(ReturnConsumedCapacity, name, read=units))
+            response = {'Responses': responses, 'UnprocessedKeys': {}}
+            if all(capacity):
+                response['ConsumedCapacity'] = capacity
+            return response
+        return self._run('BatchGetItem', run)
+
+    def transact_write_items(self, TransactItems, ClientRequestToken=None, ReturnConsumedCapacity=None):
+        operation = 'TransactWriteItems'
+        with self.store.lock:
+            if not TransactItems or len(TransactItems) > TRANSACTION_LIMIT:
+                raise _error('ValidationException', f'Member must have length less than or equal to {TRANSACTION_LIMIT}', operation)
+            steps = []
+            seen = set()
+            for entry in TransactItems:
+                (action, arguments), = entry.items()
+                arguments = dict(arguments)
+                table = self._table(arguments.pop('TableName'), operation)
+                try:
+                    if action == 'Put':
+                        table_key = table.schema.key(_store(arguments['Item']))
+                    else:
+                        table_key = table.key_of(arguments['Key'])
+                except (_Invalid, KeyError) as e:
+                    raise _error('ValidationException', str(e), operation)
+                if (table.name, table_key) in seen:
+                    raise _error('ValidationException',
+                                 'Transaction request cannot include multiple operations on one item', operation)
+                seen.add((table.name, table_key))
+                steps.append((action, table, arguments))
+
+            # Every condition is checked before anything is written.
+            reasons = []
+            for action, table, arguments in steps:
+                try:
+                    self._step(action, table, arguments, apply=False)
+                    reasons.append({'Code': 'None'})
+                except _ConditionFailed as e:
+                    reason = {'Code': 'ConditionalCheckFailed', 'Message': 'The conditional request failed'}
+                    if e.item is not None:
+                        reason['Item'] = e.item
+                    reasons.append(reason)
+                except _Invalid as e:
+                    reasons.append({'Code': 'ValidationError', 'Message': str(e)})
+            if any(reason['Code'] != 'None' for reason in reasons):
+                codes = ', '.join(reason['Code'] for reason in reasons)
+                raise _error('TransactionCanceledException',
+                             f'Transaction cancelled, please refer cancellation reasons for specific reasons [{codes}]',
+                             operation, CancellationReasons=reasons)
+            # Transactions cost twice the units of the same reads and writes outside one.
+            units = {}
+            for action, table, arguments in steps:
+                _, step_units = self._step(action, table, arguments, apply=True)
+                read, write = units.get(table.name, (0, 0))
+                if action == 'ConditionCheck':
+                    read += 2 * step_units
+                else:
+                    write += 2 * step_units
+                units[table.name] = read, write
+            capacity = [_capacity(ReturnConsumedCapacity, name, read, write) for name, (read, write) in units.items()]
+            return {'ConsumedCapacity': capacity} if all(capacity) else {}
+
+    def _step(self, action, table, arguments, apply):
+        arguments = dict(arguments)
+        if action == 'Put':
+            return self._put(table, arguments.pop('Item'), arguments, apply)
+        key = arguments.pop('Key')
+        if action == 'Delete':
+            return self._delete(table, key, arguments, apply)
+        if action == 'Update':
+            return self._update(table, key, arguments, apply)
+        if action == 'ConditionCheck':
+            if not arguments.get('ConditionExpression'):
+                raise _Invalid('ConditionCheck requires a ConditionExpression')
+            placeholders, condition = self._prepare(arguments, _WRITE_ARGUMENTS)
+            placeholders.check_unused()
+            existing = table.get(table.key_of(key))
+            self._check(condition, existing, arguments)
+            return {}, _read_units(item_size(existing or {}), True)
+        raise _Invalid(f'Unsupported transaction action {action}')
+
+
+_WRITE_ARGUMENTS = ('ConditionExpression', 'ExpressionAttributeNames', 'ExpressionAttributeValues',
+                    'ReturnValues', 'ReturnValuesOnConditionCheckFailure', 'ReturnConsumedCapacity')
+_READ_ARGUMENTS = ('IndexName', 'FilterExpression', 'ProjectionExpression', 'ExpressionAttributeNames',
+                   'ExpressionAttributeValues', 'Limit', 'ExclusiveStartKey', 'ConsistentRead', 'Select',
+                   'ReturnConsumedCapacity')
+
+
+def _built(kwargs):
+    """Turn boto3 Key/Attr conditions into expression strings, as the resource client does."""
+    names = dict(kwargs['ExpressionAttributeNames']) if kwargs.get('ExpressionAttributeNames') is not None else None
+    values = dict(kwargs['ExpressionAttributeValues']) if kwargs.get('ExpressionAttributeValues') is not None else None
+    built = {}
+    builder = ConditionExpressionBuilder()
+    for argument in ('KeyConditionExpression', 'FilterExpression', 'ConditionExpression'):
+        expression = kwargs.get(argument)
+        if isinstance(expression, ConditionBase):
+            result = builder.build_expression(expression, is_key_condition=argument == 'KeyConditionExpression')
+            expression = result.condition_expression
+            names = dict(names or {}, **result.attribute_name_placeholders)
+            values = dict(values or {}, **result.attribute_value_placeholders)
+        built[argument] = expression
+    return _Placeholders(names, values), built
+
+
+def _parse(expression, placeholders, kind):
+    if expression is None:
+        return None
+    if not expression.strip():
+        raise _Invalid('Invalid expression: The expression can not be empty;')
+    parser = _Parser(expression, placeholders)
+    node = {'condition': parser.condition, 'update': parser.update, 'projection': parser.projection}[kind]()
+    parser.finish()
+    return node
+
+
+def _overlaps(first, second):
+    shorter = min(len(first), len(second))
+    return first[:shorter] == second[:shorter]
+
+
+def _container(item, path):
+    """The map or list holding path's last segment, for an update."""
+    parent = _resolve(item, path[:-1]) if len(path) > 1 else item
+    if parent is _MISSING or not isinstance(parent, (dict, list)) or isinstance(path[-1], int) != isinstance(parent, list):
+        raise _Invalid('The document path provided in the update expression is invalid for update')
+    return parent
+
+
+def _set_value(node, old):
+    kind = node[0]
+    if kind == 'value':
+        return node[1]
+    if kind == 'path':
+        value = _resolve(old, node[1])
+        if value is _MISSING:
+            raise _Invalid('The provided expression refers to an attribute that does not exist in the item')
+        return _copy(value)
+    if kind == 'if_not_exists':
+        value = _resolve(old, node[1][1])
+        return _copy(value) if value is not _MISSING else _set_value(node[2], old)
+    if kind == 'list_append':
+        first, second = _set_value(node[1], old), _set_value(node[2], old)
+        if not (isinstance(first, list) and isinstance(second, list)):
+            raise _Invalid('An operand in the update expression has an incorrect data type')
+        return first + second
+    first, second = _set_value(node[1], old), _set_value(node[2], old)
+    if _type(first) != 'N' or _type(second) != 'N':
+        raise _Invalid('An operand in the update expression has an incorrect data type')
+    return first + second if kind == '+' else first - second
+
+
+def _apply_update(item, old, clauses, key_attributes):
+    """Apply parsed update clauses to item in place; right-hand sides read the old item. Returns touched names."""
+    paths = [path for actions in clauses.values() for path, _ in actions]
+    for position, path in enumerate(paths):
+        if path[0] in key_attributes:
+            raise _Invalid(f'One or more parameter values were invalid: Cannot update attribute {path[0]}. '
+                           f'This attribute is part of the key')
+        for other in paths[position + 1:]:
+            if _overlaps(path, other):
+                raise _Invalid('Invalid UpdateExpression: Two document paths overlap with each other; '
+                               'must remove or rewrite one of these paths')
+
+    for path, node in clauses.get('SET', ()):
+        value = _set_value(node, old)
+        parent = _container(item, path)
+        if isinstance(parent, list) and path[-1] >= len(parent):
+            parent.append(value)
+        else:
+            parent[path[-1]] = value
+    for path, _ in clauses.get('REMOVE', ()):
+        parent = _resolve(item, path[:-1]) if len(path) > 1 else item
+        if isinstance(parent, dict):
+            parent.pop(path[-1], None)
+        elif isinstance(parent, list) and isinstance(path[-1], int) and path[-1] < len(parent):
+            del parent[path[-1]]
+    for path, value in clauses.get('ADD', ()):
+        parent = _container(item, path)
+        current = parent.get(path[-1], _MISSING) if isinstance(parent, dict) else _MISSING
+        kind = _type(value)
+        if kind not in ('N', 'SS', 'NS', 'BS') or (current is not _MISSING and _type(current) != kind):
+            raise _Invalid('An operand in the update expression has an incorrect data type')
+        if current is _MISSING:
+            parent[path[-1]] = _copy(value)
+        else:
+            parent[path[-1]] = current + value if kind == 'N' else current | value
+    for path, value in clauses.get('DELETE', ()):
+        parent = _container(item, path)
+        current = parent.get(path[-1], _MISSING) if isinstance(parent, dict) else _MISSING
+        if _type(value) not in ('SS', 'NS', 'BS') or (current is not _MISSING and _type(current) != _type(value)):
+            raise _Invalid('An operand in the update expression has an incorrect data type')
+        if current is not _MISSING:
+            remaining = current - value
+            if remaining:
+                parent[path[-1]] = remaining
+            else:
+                del parent[path[-1]]
+    return {path[0] for path in paths}
+
+
+class _Waiter:
+    def wait(self, **kwargs):
+        pass
+
+
+class _Meta:
+    def __init__(self, client):
+        self.client = client
+
+
+class MemoryTable:
+    """The resource Table operations the handlers use, over a MemoryClient."""
+
+    def __init__(self, name, client):
+        self.name = name
+        self.meta = _Meta(client)
+
+    @property
+    def table_name(self):
+        return self.name
+
+    def put_item(self, **kwargs):
+        return self.meta.client.put_item(TableName=self.name, **kwargs)
+
+    def get_item(self, **kwargs):
+        return self.meta.client.get_item(TableName=self.name, **kwargs)
+
+    def update_item(self, **kwargs):
+        return self.meta.client.update_item(TableName=self.name, **kwargs)
+
+    def delete_item(self, **kwargs):
+        return self.meta.client.delete_item(TableName=self.name, **kwargs)
+
+    def query(self, **kwargs):
+        return self.meta.client.query(TableName=self.name, **kwargs)
+
+    def scan(self, **kwargs):
+        return self.meta.client.scan(TableName=self.name, **kwargs)
+
+    def batch_writer(self, overwrite_by_pkeys=None):
+        return _BatchWriter(self, overwrite_by_pkeys)
+
+
+class _BatchWriter:
+    def __init__(self, table, overwrite_by_pkeys):
+        self.table = table
+        self.overwrite_by_pkeys = overwrite_by_pkeys
+        self.buffer = []
+
+    def put_item(self, Item):
+        self._add({'PutRequest': {'Item': Item}})
+
+    def delete_item(self, Key):
+        self._add({'DeleteRequest': {'Key': Key}})
+
+    def _add(self, request):
+        if self.overwrite_by_pkeys:
+            body = request.get('PutRequest', {}).get('Item') or request['DeleteRequest']['Key']
+            key = [body[name] for name in self.overwrite_by_pkeys]
+            self.buffer = [
+                pending for pending in self.buffer
+                if [(pending.get('PutRequest', {}).get('Item') or pending['DeleteRequest']['Key'])[name]
+                    for name in self.overwrite_by_pkeys] != key
+            ]
+        self.buffer.append(request)
+        if len(self.buffer) >= BATCH_WRITE_LIMIT:
+            self.flush()
+
+    def flush(self):
+        while self.buffer:
+            chunk, self.buffer = self.buffer[:BATCH_WRITE_LIMIT], self.buffer[BATCH_WRITE_LIMIT:]
+            self.table.meta.client.batch_write_item(RequestItems={self.table.name: chunk})
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.flush()
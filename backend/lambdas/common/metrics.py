@@ -0,0 +1,216 @@
+import functools
+import json
+import os
+import sys
+import threading
+import time
+from common import cache, logs
+
+# Per-invocation metrics, written as one CloudWatch Embedded Metric Format line
+# when the handler returns; CloudWatch turns the line into metrics without any
+# API calls. Each invocation records its latency, the time spent parsing the
+# request, authenticating, in DynamoDB and serialising the response, and every
+# DynamoDB call with the capacity it consumed, and how its reads of the
+# in-memory caches (cache.py) were served. A container runs one invocation
+# at a time, so the record being filled is module state that worker threads
+# started by the handler add to as well.
+
+ENABLED = os.environ.get('METRICS_ENABLED', 'true').lower() == 'true'
+NAMESPACE = os.environ.get('METRICS_NAMESPACE', 'Lango')
+# Asking DynamoDB for consumed capacity adds a few bytes to each response.
+CONSUMED_CAPACITY = os.environ.get('METRICS_CONSUMED_CAPACITY', 'true').lower() == 'true'
+
+DIMENSIONS = ('Function', 'Route')
+PHASES = {'parse': 'ParseTime', 'auth': 'AuthTime', 'db': 'DynamoDBTime', 'serialize': 'SerializeTime'}
+COUNTS = ('DynamoDBCalls', 'DynamoDBErrors', 'ConsumedReadCapacity', 'ConsumedWriteCapacity',
+          'ClientErrors', 'ServerErrors', 'ColdStart', 'CacheHits', 'CacheMisses', 'CacheRevalidations')
+# cache.stats() counter behind each cache metric.
+CACHE_COUNTS = {'hits': 'CacheHits', 'misses': 'CacheMisses', 'revalidations': 'CacheRevalidations'}
+
+READ_OPERATIONS = ('get_item', 'query', 'scan', 'batch_get_item')
+WRITE_OPERATIONS = ('put_item', 'update_item', 'delete_item', 'batch_write_item', 'transact_write_items')
+
+_current = None
+_cold = True
+
+
+def _print(record):
+    sys.stdout.write(json.dumps(record, separators=(',', ':')) + '\n')
+    sys.stdout.flush()
+
+
+# Where finished records go; tests and benchmarks swap in their own.
+sink = _print
+
+
+class Invocation:
+    def __init__(self, function, route, handler):
+        self.function = function
+        self.route = route
+        self.handler = handler
+        self.timings = dict.fromkeys(PHASES, 0.0)
+        self.calls = {}
+        self.errors = {}
+        self.read_units = 0.0
+        self.write_units = 0.0
+        # The caches count for the whole container; the invocation's share is the difference.
+        self.cache_stats = cache.stats()
+        self._lock = threading.Lock()
+
+    def add_time(self, phase, seconds):
+        with self._lock:
+            self.timings[phase] += seconds
+
+    def add_call(self, operation, seconds, units, error=None):
+        with self._lock:
+            self.timings['db'] += seconds
+            self.calls[operation] = self.calls.get(operation, 0) + 1
+            if error:
+                self.errors[error] = self.errors.get(error, 0) + 1
+            if operation in READ_OPERATIONS:
+                self.read_units += units
+            else:
+                self.write_units += units
+
+    def cache_outcomes(self):
+        """Hits, misses and revalidations per cache since the invocation started."""
+        outcomes = {}
+        for name, counters in cache.stats().items():
+            started = self.cache_stats.get(name, {})
+            served = {counter: counters[counter] - started.get(counter, 0) for counter in CACHE_COUNTS}
+            if any(served.values()):
+                outcomes[name] = served
+        return outcomes
+
+    def record(self, latency, status_code, request_id, cold):
+        outcomes = self.cache_outcomes()
+        record = {
+            '_aws': {
+                'Timestamp': int(time.time() * 1000),
+                'CloudWatchMetrics': [{
+                    'Namespace': NAMESPACE,
+                    'Dimensions': [list(DIMENSIONS)],
+                    'Metrics': [{'Name': 'Latency', 'Unit': 'Milliseconds'}]
+                    + [{'Name': name, 'Unit': 'Milliseconds'} for name in PHASES.values()]
+                    + [{'Name': name, 'Unit': 'Count'} for name in COUNTS],
+                }],
+            },
+            'Function': self.function,
+            'Route': self.route,
+            'Handler': self.handler,
+            'RequestId': request_id,
+            'StatusCode': status_code,
+            'Latency': round(latency * 1000, 3),
+            'DynamoDBCalls': sum(self.calls.values()),
+            'DynamoDBErrors': sum(self.errors.values()),
+            'DynamoDBOperations': dict(self.calls),
+            'ConsumedReadCapacity': self.read_units,
+            'ConsumedWriteCapacity': self.write_units,
+            'ClientErrors': int(400 <= status_code < 500),
+            'ServerErrors': int(status_code >= 500),
+            'ColdStart': int(cold),
+        }
+        record.update({name: sum(served[counter] for served in outcomes.values())
+                       for counter, name in CACHE_COUNTS.items()})
+        if outcomes:
+            record['CacheOutcomes'] = outcomes
+        record.update({name: round(self.timings[phase] * 1000, 3) for phase, name in PHASES.items()})
+        if self.errors:
+            record['DynamoDBErrorCodes'] = dict(self.errors)
+        return record
+
+
+class phase:
+    """Add the time spent in the block to the current invocation's phase."""
+
+    __slots__ = ('name', 'started')
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        invocation = _current
+        if invocation is not None:
+            invocation.add_time(self.name, time.perf_counter() - self.started)
+        return False
+
+
+def route_of(event, handler):
+    # API Gateway v2 sets routeKey, e.g. "GET /getSets"; direct invocations fall back to the handler.
+    return (event or {}).get('routeKey') or handler.__name__
+
+
+def instrument(handler):
+    """Time the handler and emit its metrics when it returns."""
+    if not ENABLED:
+        return handler
+
+    @functools.wraps(handler)
+    def wrapper(event, context):
+        global _current, _cold
+        cold, _cold = _cold, False
+        function = os.environ.get('AWS_LAMBDA_FUNCTION_NAME') or handler.__name__
+        previous = _current
+        request_id = getattr(context, 'aws_request_id', None)
+        invocation = _current = Invocation(function, route_of(event, handler), handler.__name__)
+        logs.start_request(request_id=request_id, function=function, route=invocation.route)
+        started = time.perf_counter()
+        status_code = 500
+        try:
+            response = handler(event, context)
+            status_code = (response or {}).get('statusCode', 200)
+            return response
+        finally:
+            latency = time.perf_counter() - started
+            _current = previous
+            # A failed request writes the DEBUG lines it held back.
+            logs.end_request(failed=status_code >= 500)
+            sink(invocation.record(latency, status_code, request_id, cold))
+    return wrapper
+
+
+def _units(response):
+    consumed = response.get('ConsumedCapacity') if isinstance(response, dict) else None
+    if not consumed:
+        return 0.0
+    if isinstance(consumed, dict):
+        consumed = [consumed]
+    return sum(float(capacity.get('CapacityUnits', 0)) for capacity in consumed)
+
+
+def instrument_client(client):
+    """Record every DynamoDB call made through client while an invocation runs.
+
+    Resource Tables send their calls through table.meta.client, so wrapping the
+    shared client covers Table calls too.
+    """
+    if not ENABLED or getattr(client, '_metrics_instrumented', False):
+        return client
+    for operation in READ_OPERATIONS + WRITE_OPERATIONS:
+        setattr(client, operation, _recorded(operation, getattr(client, operation)))
+    client._metrics_instrumented = True
+    return client
+
+
+def _recorded(operation, call):
+    @functools.wraps(call)
+    def recorded(*args, **kwargs):
+        invocation = _current
+        if invocation is None:
+            return call(*args, **kwargs)
+        if CONSUMED_CAPACITY:
+            kwargs.setdefault('ReturnConsumedCapacity', 'TOTAL')
+        started = time.perf_counter()
+        try:
+            response = call(*args, **kwargs)
+        except Exception as e:
+            code = getattr(e, 'response', {}).get('Error', {}).get('Code') or type(e).__name__
+            invocation.add_call(operation, time.perf_counter() - started, 0.0, code)
+            raise
+        invocation.add_call(operation, time.perf_counter() - started, _units(response))
+        return response
+    return recorded
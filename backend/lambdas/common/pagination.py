@@ -0,0 +1,111 @@
+import base64
+import hashlib
+import hmac
+import json
+import os
+from common.responses import json_default
+
+# Lambda caps synchronous responses at 6 MB, so a drained query stops well below that.
+DEFAULT_MAX_BYTES = int(os.environ.get('QUERY_MAX_RESPONSE_BYTES', str(4 * 1024 * 1024)))
+MAX_PAGE_SIZE = 500
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def _secret():
+    return os.environ.get('CURSOR_SECRET', os.environ.get('JWT_SECRET', '')).encode('utf-8')
+
+
+def encode_cursor(last_evaluated_key):
+    if not last_evaluated_key:
+        return None
+    payload = json.dumps(last_evaluated_key, separators=(',', ':'), sort_keys=True, default=json_default).encode('utf-8')
+    signature = hmac.new(_secret(), payload, hashlib.sha256).digest()[:16]
+    return (base64.urlsafe_b64encode(payload).rstrip(b'=') + b'.' +
+            base64.urlsafe_b64encode(signature).rstrip(b'=')).decode('ascii')
+
+
+def decode_cursor(cursor, partition_key=None):
+    # Cursors are opaque to clients; the signature stops them from being edited
+    # to start a query inside somebody else's partition.
+    try:
+        payload_part, signature_part = cursor.split('.', 1)
+        payload = base64.urlsafe_b64decode(payload_part + '=' * (-len(payload_part) % 4))
+        signature = base64.urlsafe_b64decode(signature_part + '=' * (-len(signature_part) % 4))
+    except (ValueError, AttributeError):
+        raise InvalidCursor('Malformed cursor')
+
+    expected = hmac.new(_secret(), payload, hashlib.sha256).digest()[:16]
+    if not hmac.compare_digest(signature, expected):
+        raise InvalidCursor('Cursor signature mismatch')
+
+    try:
+        key = json.loads(payload)
+    except ValueError:
+        raise InvalidCursor('Malformed cursor')
+    if not isinstance(key, dict) or (partition_key is not None and key.get('PK') != partition_key):
+        raise InvalidCursor('Cursor does not belong to this query')
+    return key
+
+
+def parse_limit(value):
+    if value in (None, ''):
+        return None
+    limit = int(value)
+    if limit < 1:
+        raise ValueError('limit must be a positive integer')
+    return min(limit, MAX_PAGE_SIZE)
+
+
+def estimate_size(item):
+    # Close enough to DynamoDB's own item size accounting to budget a response.
+    size = 0
+    for name, value in item.items():
+        size += len(name)
+        if isinstance(value, str):
+            size += len(value.encode('utf-8'))
+        else:
+            size += 21
+    return size
+
+
+def query_page(table, limit=None, exclusive_start_key=None, **query_kwargs):
+    if limit:
+        query_kwargs['Limit'] = limit
+    if exclusive_start_key:
+        query_kwargs['ExclusiveStartKey'] = exclusive_start_key
+    response = table.query(**query_kwargs)
+    return response.get('Items', []), response.get('LastEvaluatedKey')
+
+
+def query_all(table, max_bytes=DEFAULT_MAX_BYTES, exclusive_start_key=None, **query_kwargs):
+    """Follow LastEvaluatedKey until the partition is drained or max_bytes is reached.
+
+    Returns (items, last_evaluated_key); the key is None only when nothing is left.
+    """
+    items = []
+    used = 0
+    start_key = exclusive_start_key
+    while True:
+        page, last_key = query_page(table, exclusive_start_key=start_key, **query_kwargs)
+        for item in page:
+            item_size = estimate_size(item)
+            if items and used + item_size > max_bytes:
+                # Resume from the last item we kept, not from the end of the page.
+                return items, {'PK': items[-1]['PK'], 'SK': items[-1]['SK']}
+            used += item_size
+            items.append(item)
+        if not last_key:
+            return items, None
+        start_key = last_key
+
+
+def iter_query(table, **query_kwargs):
+    start_key = None
+    while True:
+        page, start_key = query_page(table, exclusive_start_key=start_key, **query_kwargs)
+        yield from page
+        if not start_key:
+            return
@@ -0,0 +1,207 @@
+import base64
+import gzip
+import json
+import os
+import zlib
+from decimal import Decimal
+from types import MappingProxyType
+from common import metrics
+
+try:
+    import orjson
+except ImportError:  # optional; the stdlib encoder produces the same JSON
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # optional; gzip and deflate are always available
+    brotli = None
+
+# Bodies smaller than this are cheaper to send as-is than to compress.
+COMPRESSION_MIN_BYTES = int(os.environ.get('COMPRESSION_MIN_BYTES', '1024'))
+GZIP_LEVEL = int(os.environ.get('GZIP_LEVEL', '6'))
+BROTLI_QUALITY = int(os.environ.get('BROTLI_QUALITY', '4'))
+
+CORS_HEADERS = MappingProxyType({
+    'Access-Control-Allow-Origin': '*',
+    'Access-Control-Allow-Methods': 'GET,POST,PUT,DELETE,OPTIONS',
+    'Access-Control-Allow-Headers': '*, Content-Type, Authorization',
+})
+PREFLIGHT_HEADERS = MappingProxyType(dict(CORS_HEADERS, **{'Access-Control-Allow-Headers': '*'}))
+
+
+def json_default(value):
+    # DynamoDB hands numbers back as Decimal; timestamps and counters are integral.
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    if isinstance(value, (set, frozenset)):
+        return sorted(value)
+    return str(value)
+
+
+if orjson is not None:
+    def dumps(obj):
+        return orjson.dumps(obj, default=json_default).decode('utf-8')
+else:
+    _encoder = json.JSONEncoder(default=json_default, ensure_ascii=False, separators=(',', ':'))
+
+    def dumps(obj):
+        return _encoder.encode(obj)
+
+
+def json_response(status_code, body, headers=None):
+    # The header mapping is shared and read-only, so every response gets its own dict.
+    merged = dict(CORS_HEADERS)
+    if headers:
+        merged.update(headers)
+    with metrics.phase('serialize'):
+        body = dumps(body)
+    return {
+        'statusCode': status_code,
+        'headers': merged,
+        'body': body
+    }
+
+
+def binary_response(status_code, data, headers=None):
+    merged = dict(CORS_HEADERS)
+    if headers:
+        merged.update(headers)
+    with metrics.phase('serialize'):
+        data = base64.b64encode(data).decode('ascii')
+    return {
+        'statusCode': status_code,
+        'headers': merged,
+        'body': data,
+        'isBase64Encoded': True
+    }
+
+
+def _gzip(data):
+    # mtime=0 keeps the output deterministic for identical bodies.
+    return gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+def _deflate(data):
+    # HTTP "deflate" is the zlib-wrapped stream, not raw deflate.
+    return zlib.compress(data, GZIP_LEVEL)
+
+
+def _brotli(data):
+    return brotli.compress(data, quality=BROTLI_QUALITY)
+
+
+ENCODERS = {'gzip': _gzip, 'deflate': _deflate}
+if brotli is not None:
+    ENCODERS['br'] = _brotli
+# Server preference when the client weights several encodings equally.
+ENCODING_PREFERENCE = ('br', 'gzip', 'deflate')
+
+
+def json_body(event, allow_empty=False):
+    """Decode the request's JSON body; allow_empty turns a missing body into {}."""
+    with metrics.phase('parse'):
+        body = event['body']
+        if allow_empty and not body:
+            return {}
+        return json.loads(body)
+
+
+def request_header(event, name):
+    headers = (event or {}).get('headers') or {}
+    name = name.lower()
+    return next((v for k, v in headers.items() if k.lower() == name), None)
+
+
+def accepted_encoding(event):
+    """Pick the best encoding both sides support from the Accept-Encoding header, or None."""
+    header = request_header(event, 'accept-encoding')
+    if not header:
+        return None
+
+    weights = {}
+    for part in header.split(','):
+        name, _, params = part.strip().partition(';')
+        name = name.strip().lower()
+        if not name:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[name] = q
+
+    wildcard = weights.get('*', 0.0)
+    best, best_q = None, 0.0
+    for name in ENCODING_PREFERENCE:
+        if name not in ENCODERS:
+            continue
+        q = weights.get(name, wildcard)
+        if q > best_q:
+            best, best_q = name, q
+    return best
+
+
+def compressed_response(event, status_code, body, headers=None):
+    """Like json_response, but compresses large bodies when the client accepts it."""
+    response = json_response(status_code, body, headers)
+    response['headers']['Vary'] = 'Accept-Encoding'
+    encoding = accepted_encoding(event)
+    if encoding is None:
+        return response
+
+    raw = response['body'].encode('utf-8')
+    if len(raw) < COMPRESSION_MIN_BYTES:
+        return response
+
+    with metrics.phase('serialize'):
+        compressed = ENCODERS[encoding](raw)
+        if len(compressed) >= len(raw):
+            return response
+        # API Gateway v2 decodes base64 bodies back to bytes before returning them.
+        response['body'] = base64.b64encode(compressed).decode('ascii')
+    response['headers']['Content-Encoding'] = encoding
+    response['isBase64Encoded'] = True
+    return response
+
+
+def etag(version):
+    # Weak, because the same version may be served gzipped or not.
+    return f'W/"{version}"'
+
+
+def etag_matches(event, tag):
+    header = request_header(event, 'if-none-match')
+    if not header:
+        return False
+    if header.strip() == '*':
+        return True
+    opaque = tag[2:] if tag.startswith('W/') else tag
+    return any(
+        (candidate[2:] if candidate.startswith('W/') else candidate) == opaque
+        for candidate in (part.strip() for part in header.split(','))
+    )
+
+
+def cache_headers(tag):
+    # no-cache lets the browser keep the body but revalidate it on every use.
+    return {'ETag': tag, 'Cache-Control': 'private, no-cache'}
+
+
+def not_modified(tag):
+    return {
+        'statusCode': 304,
+        'headers': dict(CORS_HEADERS, Vary='Accept-Encoding', **cache_headers(tag)),
+        'body': ''
+    }
+
+
+def preflight():
+    return {
+        'statusCode': 200,
+        'headers': dict(PREFLIGHT_HEADERS),
+        'body': dumps({'message': 'CORS preflight response'})
+    }
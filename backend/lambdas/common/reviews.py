@@ -0,0 +1,157 @@
+import logging
+import os
+import time
+from botocore.exceptions import ClientError
+from common import srs
+from common.batch import MAX_ATTEMPTS, backoff, batch_get, chunked
+from common.db import get_client
+from common.flashcards import set_partition
+from common.usernames import cancellation_codes
+
+logger = logging.getLogger()
+
+# A study session is submitted as one list of grades. Reviews are grouped per
+# card and folded through the scheduler in reviewed_at order, so each card is
+# read once and written once however many times it was graded. A card's
+# last_reviewed_at makes resubmission safe: any review at or before it has
+# already been applied and is reported as a duplicate instead.
+
+MAX_SESSION_REVIEWS = 500
+TRANSACTION_SIZE = int(os.environ.get('REVIEW_TRANSACTION_SIZE', '25'))
+MAX_CLOCK_SKEW = int(os.environ.get('REVIEW_MAX_CLOCK_SKEW', '300'))
+STATE_PROJECTION = ', '.join(('PK', 'SK', 'last_reviewed_at') + srs.STATE_FIELDS)
+
+
+class InvalidSession(ValueError):
+    pass
+
+
+class _CardUpdate:
+    def __init__(self, key, indexes, state, reviewed_at, previous_due_at):
+        self.key = key
+        self.indexes = indexes
+        self.state = state
+        self.reviewed_at = reviewed_at
+        self.previous_due_at = previous_due_at
+
+
+def _parse(reviews, now):
+    """Split raw reviews into {card key: [(reviewed_at, index, grade)]} and per-index errors."""
+    by_card = {}
+    errors = {}
+    for index, review in enumerate(reviews):
+        if not isinstance(review, dict):
+            errors[index] = 'Review must be an object'
+            continue
+        ids = [review.get(field) for field in ('language', 'set_id', 'flashcard_id')]
+        if not all(isinstance(value, str) and value for value in ids):
+            errors[index] = 'language, set_id and flashcard_id are required'
+            continue
+        try:
+            grade = srs.parse_grade(review.get('grade'))
+        except srs.InvalidGrade as e:
+            errors[index] = str(e)
+            continue
+        reviewed_at = review.get('reviewed_at')
+        if not isinstance(reviewed_at, int) or isinstance(reviewed_at, bool) or reviewed_at <= 0:
+            errors[index] = 'reviewed_at must be a unix timestamp in seconds'
+            continue
+        if reviewed_at > now + MAX_CLOCK_SKEW:
+            errors[index] = 'reviewed_at is in the future'
+            continue
+        language, set_id, flashcard_id = ids
+        key = (language, set_id, flashcard_id)
+        by_card.setdefault(key, []).append((reviewed_at, index, grade))
+    return by_card, errors
+
+
+def _write(client, table_name, user_id, updates):
+    """Apply updates in transactions. Returns (applied, conflicted) lists of updates."""
+    applied, conflicted = [], []
+    for chunk in chunked(updates, TRANSACTION_SIZE):
+        pending = chunk
+        for attempt in range(MAX_ATTEMPTS):
+            items = [
+                {'Update': dict(TableName=table_name, Key=update.key,
+                                **srs.state_update(user_id, update.state, update.previous_due_at, update.reviewed_at))}
+                for update in pending
+            ]
+            try:
+                client.transact_write_items(TransactItems=items)
+                applied.extend(pending)
+                break
+            except ClientError as e:
+                if e.response['Error']['Code'] != 'TransactionCanceledException':
+                    raise
+                codes = cancellation_codes(e)
+                # A failed condition means the card was graded elsewhere since it was read;
+                # everything else in the transaction is retried without it.
+                failed = [update for update, code in zip(pending, codes) if code == 'ConditionalCheckFailed']
+                conflicted.extend(failed)
+                pending = [update for update in pending if update not in failed]
+                if not pending:
+                    break
+                logger.warning("Review transaction cancelled (%s), retry %s of %s", codes, attempt + 1, MAX_ATTEMPTS)
+                if not failed:
+                    backoff(attempt)
+        else:
+            raise RuntimeError(f"{len(pending)} review updates could not be written")
+    return applied, conflicted
+
+
+def submit(user_id, reviews, now=None, table_name=None, client=None):
+    """Apply a session's reviews and return a per-review result list plus totals."""
+    if not isinstance(reviews, list) or not reviews:
+        raise InvalidSession('A non-empty reviews array is required')
+    if len(reviews) > MAX_SESSION_REVIEWS:
+        raise InvalidSession(f'At most {MAX_SESSION_REVIEWS} reviews can be submitted per request')
+
+    client = client or get_client()
+    table_name = table_name or os.environ['DYNAMODB_TABLE_NAME']
+    now = now or int(time.time())
+    by_card, errors = _parse(reviews, now)
+    results = {index: {'index': index, 'status': 'error', 'error': error} for index, error in errors.items()}
+
+    keys = {
+        card: {'PK': set_partition(user_id, card[0], card[1]), 'SK': f'FLASHCARD#{card[2]}'}
+        for card in by_card
+    }
+    found = {
+        (item['PK'], item['SK']): item
+        for item in batch_get(client, table_name, list(keys.values()), STATE_PROJECTION, consistent=True)
+    }
+
+    updates = []
+    for card, card_reviews in by_card.items():
+        key = keys[card]
+        current = found.get((key['PK'], key['SK']))
+        if current is None:
+            for _, index, _ in card_reviews:
+                results[index] = {'index': index, 'status': 'error', 'error': 'Flashcard not found'}
+            continue
+
+        state = current
+        last_reviewed_at = int(current.get('last_reviewed_at') or 0)
+        indexes = []
+        for reviewed_at, index, grade in sorted(card_reviews):
+            if reviewed_at <= last_reviewed_at:
+                results[index] = {'index': index, 'status': 'duplicate'}
+                continue
+            state = srs.schedule(state, grade, reviewed_at)
+            last_reviewed_at = reviewed_at
+            indexes.append(index)
+        if indexes:
+            updates.append(_CardUpdate(key, indexes, state, last_reviewed_at, current.get('due_at')))
+
+    applied, conflicted = _write(client, table_name, user_id, updates)
+    for update in applied:
+        for index in update.indexes:
+            results[index] = {'index': index, 'status': 'applied', 'due_at': update.state['due_at']}
+    for update in conflicted:
+        for index in update.indexes:
+            results[index] = {'index': index, 'status': 'error', 'error': 'Flashcard was graded concurrently, please retry'}
+
+    ordered = [results[index] for index in range(len(reviews))]
+    totals = {status: sum(1 for result in ordered if result['status'] == status) for status in ('applied', 'duplicate', 'error')}
+    logger.info("Applied %s reviews to %s flashcards for user %s", totals['applied'], len(applied), user_id)
+    return dict(totals, results=ordered)
@@ -0,0 +1,314 @@
+import logging
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from boto3.dynamodb.conditions import Key
+from common.batch import batch_write, delete_request, put_request
+from common.db import get_client
+from common.flashcards import FLASHCARD_FIELDS
+
+logger = logging.getLogger()
+
+# Each user has one search partition, USER#<id>#SEARCH, holding a posting item
+# per (token, card): SK = TERM#<token>#<language>#<set_id>#<flashcard_id>.
+# Sort keys are ordered by token, so a prefix search is a single begins_with
+# range read and costs reads in proportion to the matches, never to the size
+# of the collection. Postings carry the word and its translation so results
+# can be shown without touching the cards. Prefix results are cached per
+# container for CACHE_TTL; index writes drop the writer's cached results.
+#
+# Every posting is a write when a card is added, edited or deleted. The word
+# and its translation are indexed in full; the usage sentences skip
+# STOP_WORDS, the articles, pronouns and particles that match nearly every
+# card and are worth neither a write nor a search. An edit rewrites only the
+# postings that changed.
+
+MAX_TOKEN_LENGTH = 64
+MAX_TOKENS_PER_CARD = 24
+KEY_FIELDS = ('word', 'translated_word')
+USAGE_FIELDS = tuple(field for field in FLASHCARD_FIELDS if field not in KEY_FIELDS)
+# Normalized (see normalize), so accents are already stripped. French
+# elisions such as j' and l' tokenize to single letters.
+STOP_WORDS = frozenset((
+    # English
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'but', 'for', 'he', 'her', 'his', 'i', 'in', 'is', 'it', 'its',
+    'me', 'my', 'of', 'on', 'or', 'she', 'that', 'the', 'this', 'to', 'was', 'we', 'you',
+    # Spanish
+    'al', 'con', 'de', 'del', 'el', 'en', 'es', 'la', 'las', 'lo', 'los', 'mi', 'o', 'para', 'por', 'que',
+    'se', 'su', 'sus', 'te', 'un', 'una', 'unos', 'unas', 'y', 'yo',
+    # French
+    'au', 'aux', 'c', 'ce', 'd', 'des', 'du', 'et', 'il', 'j', 'je', 'l', 'le', 'les', 'ma', 'mon', 'n',
+    'ne', 'qu', 'qui', 's', 'sur', 'tu', 'une',
+    # German
+    'am', 'der', 'die', 'das', 'dem', 'den', 'ein', 'eine', 'einem', 'einen', 'einer', 'im', 'ich', 'ist',
+    'mit', 'und', 'zu', 'zum', 'zur',
+))
+MAX_QUERY_TOKENS = 4
+MAX_POSTINGS_PER_TOKEN = int(os.environ.get('SEARCH_MAX_POSTINGS', '2000'))
+CACHE_SIZE = int(os.environ.get('SEARCH_CACHE_SIZE', '256'))
+CACHE_TTL = float(os.environ.get('SEARCH_CACHE_TTL', '30'))
+
+_TOKEN = re.compile(r'\w+')
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def search_partition(user_id):
+    return f'USER#{user_id}#SEARCH'
+
+
+def normalize(text):
+    """Casefold and strip accents, so 'Élan' and 'elan' index the same way."""
+    decomposed = unicodedata.normalize('NFKD', text.casefold())
+    folded = ''.join(ch for ch in decomposed if not unicodedata.combining(ch))
+    # Recompose so scripts built from jamo or kana (Korean, Japanese) keep their syllables.
+    return unicodedata.normalize('NFC', folded)
+
+
+def tokenize(text):
+    seen = []
+    for token in _TOKEN.findall(normalize(text or '')):
+        token = token[:MAX_TOKEN_LENGTH]
+        if token not in seen:
+            seen.append(token)
+    return seen
+
+
+def card_tokens(card):
+    tokens = []
+    for field in KEY_FIELDS:
+        for token in tokenize(card.get(field)):
+            if token not in tokens:
+                tokens.append(token)
+    for field in USAGE_FIELDS:
+        for token in tokenize(card.get(field)):
+            if token not in STOP_WORDS and token not in tokens:
+                tokens.append(token)
+    return tokens[:MAX_TOKENS_PER_CARD]
+
+
+def posting_key(user_id, token, language, set_id, flashcard_id):
+    return {'PK': search_partition(user_id), 'SK': f'TERM#{token}#{language}#{set_id}#{flashcard_id}'}
+
+
+def posting_keys(user_id, language, set_id, flashcard_id, card):
+    return [posting_key(user_id, token, language, set_id, flashcard_id) for token in card_tokens(card)]
+
+
+def _postings(user_id, language, set_id, flashcard_id, card, skip=()):
+    for token in card_tokens(card):
+        if token not in skip:
+            yield dict(posting_key(user_id, token, language, set_id, flashcard_id),
+                       word=card.get('word'), translated_word=card.get('translated_word'))
+
+
+def index_requests(user_id, language, set_id, flashcard_id, old_card=None, new_card=None):
+    """Batch write requests that move a card's postings from old_card to new_card."""
+    requests = []
+    old_tokens = set(card_tokens(old_card)) if old_card else set()
+    new_tokens = set(card_tokens(new_card)) if new_card else set()
+    if old_card:
+        requests.extend(
+            delete_request(posting_key(user_id, token, language, set_id, flashcard_id))
+            for token in card_tokens(old_card) if token not in new_tokens
+        )
+    if new_card:
+        # Postings a card keeps only need rewriting when the text they carry changed.
+        unchanged = old_tokens if old_card and all(
+            old_card.get(field) == new_card.get(field) for field in KEY_FIELDS) else ()
+        requests.extend(put_request(item) for item in
+                        _postings(user_id, language, set_id, flashcard_id, new_card, skip=unchanged))
+    return requests
+
+
+def _user_of(request):
+    # Puts and deletes both carry the posting's PK, USER#<id>#SEARCH.
+    posting = request['PutRequest']['Item'] if 'PutRequest' in request else request['DeleteRequest']['Key']
+    return posting['PK'].split('#')[1]
+
+
+def apply(requests, table_name=None, client=None):
+    """Write index changes. Failures are logged rather than raised; a backfill repairs them."""
+    if not requests:
+        return 0
+    unprocessed = batch_write(client or get_client(), table_name or os.environ['DYNAMODB_TABLE_NAME'], requests)
+    for user_id in {_user_of(request) for request in requests}:
+        invalidate(user_id)
+    if unprocessed:
+        logger.warning("%s search index writes were not processed", len(unprocessed))
+    return len(requests) - len(unprocessed)
+
+
+def update_card(user_id, language, set_id, flashcard_id, old_card=None, new_card=None):
+    return apply(index_requests(user_id, language, set_id, flashcard_id, old_card, new_card))
+
+
+def _parse_posting(item):
+    _, token, ref = item['SK'].split('#', 2)
+    language, set_id, flashcard_id = ref.rsplit('#', 2)
+    return token, (language, set_id, flashcard_id)
+
+
+def _cached(key):
+    with _cache_lock:
+        entry = _cache.get(key)
+        if entry is None:
+            return None
+        expires, value = entry
+        if expires < time.monotonic():
+            del _cache[key]
+            return None
+        _cache.move_to_end(key)
+        return value
+
+
+def _store(key, value):
+    with _cache_lock:
+        _cache[key] = (time.monotonic() + CACHE_TTL, value)
+        _cache.move_to_end(key)
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+
+
+def invalidate(user_id):
+    """Drop the user's cached prefix results, so their next search sees their latest writes."""
+    with _cache_lock:
+        for key in [key for key in _cache if key[0] == user_id]:
+            del _cache[key]
+
+
+def clear_cache():
+    with _cache_lock:
+        _cache.clear()
+
+
+def _prefix_matches(user_id, prefix, table_name, client):
+    """{card ref: (word, translated_word)} for every posting whose token starts with prefix."""
+    cache_key = (user_id, prefix)
+    matches = _cached(cache_key)
+    if matches is not None:
+        return matches
+
+    matches = {}
+    kwargs = {
+        'TableName': table_name,
+        'KeyConditionExpression': Key('PK').eq(search_partition(user_id)) & Key('SK').begins_with(f'TERM#{prefix}'),
+        'ProjectionExpression': 'SK, word, translated_word',
+    }
+    read = 0
+    while read < MAX_POSTINGS_PER_TOKEN:
+        kwargs['Limit'] = MAX_POSTINGS_PER_TOKEN - read
+        response = client.query(**kwargs)
+        for item in response.get('Items', []):
+            _, ref = _parse_posting(item)
+            matches[ref] = (item.get('word'), item.get('translated_word'))
+        read += len(response.get('Items', []))
+        if 'LastEvaluatedKey' not in response:
+            break
+        kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+    _store(cache_key, matches)
+    return matches
+
+
+def search(user_id, query, language=None, limit=50, table_name=None, client=None):
+    """Cards whose text has a token starting with every query token, best matches first."""
+    tokens = tokenize(query)[:MAX_QUERY_TOKENS]
+    if not tokens:
+        return []
+    client = client or get_client()
+    table_name = table_name or os.environ['DYNAMODB_TABLE_NAME']
+
+    # Longest tokens are the most selective, so they narrow the candidate set first.
+    tokens.sort(key=len, reverse=True)
+    candidates = None
+    for token in tokens:
+        matches = _prefix_matches(user_id, token, table_name, client)
+        candidates = dict(matches) if candidates is None else {
+            ref: value for ref, value in candidates.items() if ref in matches
+        }
+        if not candidates:
+            return []
+
+    normalized = normalize(query).strip()
+    results = []
+    for (card_language, set_id, flashcard_id), (word, translated_word) in candidates.items():
+        if language and card_language != language:
+            continue
+        exact = normalized in (normalize(word or ''), normalize(translated_word or ''))
+        results.append(((not exact, len(word or '')), {
+            'flashcard_id': flashcard_id,
+            'language': card_language,
+            'set_id': set_id,
+            'word': word,
+            'translated_word': translated_word,
+        }))
+    results.sort(key=lambda result: result[0])
+    return [result for _, result in results[:limit]]
+
+
+def _stale(client, table_name, posting):
+    """Whether a posting belongs to no card, or to a card that no longer indexes its token."""
+    token, (language, set_id, flashcard_id) = _parse_posting(posting)
+    user_id = posting['PK'].split('#')[1]
+    card = client.get_item(
+        TableName=table_name,
+        Key={'PK': f'USER#{user_id}#LANGUAGE#{language}#SET#{set_id}', 'SK': f'FLASHCARD#{flashcard_id}'},
+        ConsistentRead=True,
+    ).get('Item')
+    return card is None or token not in card_tokens(card)
+
+
+def prune(table_name=None):
+    """Delete postings no card produces any more, e.g. after the tokenizer changed."""
+    client = get_client()
+    table_name = table_name or os.environ['DYNAMODB_TABLE_NAME']
+    kwargs = {
+        'TableName': table_name,
+        'FilterExpression': 'begins_with(SK, :term)',
+        'ExpressionAttributeValues': {':term': 'TERM#'},
+        'ProjectionExpression': 'PK, SK',
+    }
+    pruned = 0
+    while True:
+        response = client.scan(**kwargs)
+        stale = [posting for posting in response.get('Items', []) if _stale(client, table_name, posting)]
+        pruned += apply([delete_request({'PK': posting['PK'], 'SK': posting['SK']}) for posting in stale],
+                        table_name, client)
+        if 'LastEvaluatedKey' not in response:
+            return pruned
+        kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+def backfill(table_name=None):
+    """Index every flashcard. Safe to rerun: postings are plain puts."""
+    client = get_client()
+    table_name = table_name or os.environ['DYNAMODB_TABLE_NAME']
+    kwargs = {
+        'TableName': table_name,
+        'FilterExpression': 'begins_with(SK, :card)',
+        'ExpressionAttributeValues': {':card': 'FLASHCARD#'},
+        'ProjectionExpression': 'PK, SK, word, #u, translated_word, #tu',
+        'ExpressionAttributeNames': {'#u': 'usage', '#tu': 'translated_usage'},
+    }
+    indexed = 0
+    while True:
+        response = client.scan(**kwargs)
+        requests = []
+        for card in response.get('Items', []):
+            # PK is USER#<id>#LANGUAGE#<language>#SET#<set_id>
+            _, user_id, _, language, _, set_id = card['PK'].split('#', 5)
+            requests.extend(index_requests(user_id, language, set_id, card['SK'].split('#', 1)[1], new_card=card))
+            indexed += 1
+        apply(requests, table_name, client)
+        if 'LastEvaluatedKey' not in response:
+            return indexed
+        kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    print(f"Indexed {backfill()} flashcards")
+    print(f"Pruned {prune()} stale postings")
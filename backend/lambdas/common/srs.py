@@ -0,0 +1,147 @@
+import logging
+import os
+import time
+from decimal import Decimal
+from botocore.exceptions import ClientError
+from common.db import get_client
+
+logger = logging.getLogger()
+
+# Study state lives on the flashcard item itself: ease, interval_days,
+# repetitions and due_at, scheduled with SM-2. Every card also carries
+# due_user = USER#<id>, which together with due_at keys the sparse DueIndex,
+# so today's reviews are a single range query over just the due cards.
+
+DUE_INDEX = os.environ.get('DUE_INDEX_NAME', 'DueIndex')
+DAY = 86400
+INITIAL_EASE = Decimal('2.5')
+MIN_EASE = Decimal('1.3')
+# A lapsed card comes back within the same study session rather than tomorrow.
+RELEARN_DELAY = int(os.environ.get('SRS_RELEARN_DELAY', '600'))
+MIN_GRADE = 0
+MAX_GRADE = 5
+PASSING_GRADE = 3
+
+STATE_FIELDS = ('ease', 'interval_days', 'repetitions', 'due_at')
+
+
+class InvalidGrade(ValueError):
+    pass
+
+
+def due_partition(user_id):
+    return f'USER#{user_id}'
+
+
+def initial_state(user_id, now=None):
+    """Study state for a card that has never been reviewed; it is due straight away."""
+    return {
+        'due_user': due_partition(user_id),
+        'due_at': now or int(time.time()),
+        'ease': INITIAL_EASE,
+        'interval_days': 0,
+        'repetitions': 0,
+    }
+
+
+def parse_grade(value):
+    if isinstance(value, int) and not isinstance(value, bool) and MIN_GRADE <= value <= MAX_GRADE:
+        return value
+    raise InvalidGrade(f'grade must be an integer from {MIN_GRADE} to {MAX_GRADE}')
+
+
+def schedule(card, grade, now=None):
+    """Return the card's next study state after a review graded 0-5 (SM-2)."""
+    now = now or int(time.time())
+    ease = Decimal(str(card.get('ease', INITIAL_EASE)))
+    interval = int(card.get('interval_days', 0))
+    repetitions = int(card.get('repetitions', 0))
+
+    if grade >= PASSING_GRADE:
+        if repetitions == 0:
+            interval = 1
+        elif repetitions == 1:
+            interval = 6
+        else:
+            interval = max(1, int((interval * ease).to_integral_value()))
+        repetitions += 1
+        due_at = now + interval * DAY
+    else:
+        repetitions = 0
+        interval = 0
+        due_at = now + RELEARN_DELAY
+
+    miss = MAX_GRADE - grade
+    ease = max(MIN_EASE, ease + Decimal('0.1') - miss * (Decimal('0.08') + miss * Decimal('0.02')))
+    return {
+        'ease': ease.quantize(Decimal('0.01')),
+        'interval_days': interval,
+        'repetitions': repetitions,
+        'due_at': due_at,
+    }
+
+
+def state_update(user_id, state, previous_due_at, now=None):
+    """update_item arguments that store a new state, conditioned on nobody grading in between."""
+    kwargs = {
+        'UpdateExpression': ('SET due_user = :u, ease = :e, interval_days = :i, repetitions = :r, '
+                             'due_at = :d, last_reviewed_at = :now'),
+        'ExpressionAttributeValues': {
+            ':u': due_partition(user_id),
+            ':e': state['ease'],
+            ':i': state['interval_days'],
+            ':r': state['repetitions'],
+            ':d': state['due_at'],
+            ':now': now or int(time.time()),
+        },
+    }
+    if previous_due_at is None:
+        kwargs['ConditionExpression'] = 'attribute_exists(PK) AND attribute_not_exists(due_at)'
+    else:
+        kwargs['ConditionExpression'] = 'due_at = :prev'
+        kwargs['ExpressionAttributeValues'][':prev'] = previous_due_at
+    return kwargs
+
+
+def backfill(table_name=None):
+    """Give flashcards written before study state existed a fresh, due-now state."""
+    client = get_client()
+    table_name = table_name or os.environ['DYNAMODB_TABLE_NAME']
+    kwargs = {
+        'TableName': table_name,
+        'FilterExpression': 'begins_with(SK, :card) AND attribute_not_exists(due_user)',
+        'ExpressionAttributeValues': {':card': 'FLASHCARD#'},
+        'ProjectionExpression': 'PK, SK, created_at',
+    }
+    updated = 0
+    while True:
+        response = client.scan(**kwargs)
+        for card in response.get('Items', []):
+            user_id = card['PK'].split('#')[1]
+            state = initial_state(user_id, int(card.get('created_at') or time.time()))
+            try:
+                client.update_item(
+                    TableName=table_name,
+                    Key={'PK': card['PK'], 'SK': card['SK']},
+                    UpdateExpression='SET due_user = :u, due_at = :d, ease = :e, interval_days = :i, repetitions = :r',
+                    ConditionExpression='attribute_exists(PK) AND attribute_not_exists(due_user)',
+                    ExpressionAttributeValues={
+                        ':u': state['due_user'],
+                        ':d': state['due_at'],
+                        ':e': state['ease'],
+                        ':i': state['interval_days'],
+                        ':r': state['repetitions'],
+                    }
+                )
+                updated += 1
+            except ClientError as e:
+                if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                    raise
+        if 'LastEvaluatedKey' not in response:
+            return updated
+        kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    print(f"Scheduled {backfill()} flashcards")
@@ -0,0 +1,111 @@
+import logging
+import os
+from botocore.exceptions import ClientError
+from common.db import get_client
+
+logger = logging.getLogger()
+
+# Each username is claimed by a USERNAME#<name> item written in the same
+# transaction as the profile, conditioned on the item not existing yet. It
+# carries the user id and password hash so login is a single consistent GetItem.
+
+# Profile attributes returned to the client. The PROFILE item also holds the
+# password hash, which must never be added here.
+PROFILE_FIELDS = ('username', 'preferred_language', 'first_name', 'last_name', 'created_at', 'last_login')
+
+
+class UsernameTaken(Exception):
+    pass
+
+
+def reservation_key(username):
+    return {'PK': f'USERNAME#{username}', 'SK': 'USERNAME'}
+
+
+def claim(table_name, username, user_id, hashed_password):
+    return {
+        'Put': {
+            'TableName': table_name,
+            'Item': dict(reservation_key(username), user_id=user_id, hashed_password=hashed_password),
+            'ConditionExpression': 'attribute_not_exists(PK)',
+        }
+    }
+
+
+def release(table_name, username, user_id):
+    return {
+        'Delete': {
+            'TableName': table_name,
+            'Key': reservation_key(username),
+            'ConditionExpression': 'user_id = :uid',
+            'ExpressionAttributeValues': {':uid': user_id},
+        }
+    }
+
+
+def set_password(table_name, username, user_id, hashed_password):
+    return {
+        'Update': {
+            'TableName': table_name,
+            'Key': reservation_key(username),
+            'UpdateExpression': 'SET hashed_password = :hp',
+            'ConditionExpression': 'user_id = :uid',
+            'ExpressionAttributeValues': {':hp': hashed_password, ':uid': user_id},
+        }
+    }
+
+
+def cancellation_codes(error):
+    return [reason.get('Code') for reason in error.response.get('CancellationReasons', [])]
+
+
+def transact(items, claim_index=0):
+    """Run a transaction, raising UsernameTaken if the claim at claim_index lost its condition."""
+    try:
+        get_client().transact_write_items(TransactItems=items)
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'TransactionCanceledException':
+            raise
+        codes = cancellation_codes(e)
+        if claim_index is not None and len(codes) > claim_index and codes[claim_index] == 'ConditionalCheckFailed':
+            raise UsernameTaken()
+        raise
+
+
+def lookup(username):
+    response = get_client().get_item(
+        TableName=os.environ['DYNAMODB_TABLE_NAME'],
+        Key=reservation_key(username),
+        ConsistentRead=True
+    )
+    return response.get('Item')
+
+
+def backfill(table_name=None):
+    """Create reservation items for profiles written before reservations existed."""
+    client = get_client()
+    table_name = table_name or os.environ['DYNAMODB_TABLE_NAME']
+    kwargs = {
+        'TableName': table_name,
+        'FilterExpression': 'SK = :profile',
+        'ExpressionAttributeValues': {':profile': 'PROFILE'},
+    }
+    created = 0
+    while True:
+        response = client.scan(**kwargs)
+        for profile in response.get('Items', []):
+            try:
+                client.put_item(**claim(table_name, profile['username'], profile['user_id'], profile['hashed_password'])['Put'])
+                created += 1
+            except ClientError as e:
+                if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                    raise
+                logger.warning("Username %s is already reserved", profile['username'])
+        if 'LastEvaluatedKey' not in response:
+            return created
+        kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    print(f"Created {backfill()} username reservations")
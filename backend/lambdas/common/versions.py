@@ -0,0 +1,93 @@
+import logging
+import os
+from botocore.exceptions import ClientError
+from common.cascade import language_pk, user_pk
+from common.db import get_client
+from common.usernames import cancellation_codes
+
+logger = logging.getLogger()
+
+# Every write to a collection bumps a counter on the item that owns it: card
+# writes bump the SET item, set writes bump the LANGUAGE item, and profile and
+# language list writes bump the PROFILE item. List endpoints read that single
+# attribute, hand it out as an ETag and answer 304 when the client already has
+# it; the in-memory caches use it to revalidate expired entries. The counter only ever grows, so a stale ETag can
+# never match again once anything has changed.
+
+VERSION_ATTRIBUTE = 'version'
+
+
+class ConditionFailed(Exception):
+    def __init__(self, index):
+        super().__init__(index)
+        self.index = index
+
+
+def set_key(user_id, language, set_id):
+    return {'PK': language_pk(user_id, language), 'SK': f'SET#{set_id}'}
+
+
+def language_key(user_id, language):
+    return {'PK': user_pk(user_id), 'SK': f'LANGUAGE#{language}'}
+
+
+def profile_key(user_id):
+    return {'PK': user_pk(user_id), 'SK': 'PROFILE'}
+
+
+def bump(table_name, key):
+    return {
+        'Update': {
+            'TableName': table_name,
+            'Key': key,
+            'UpdateExpression': 'ADD #v :one',
+            'ConditionExpression': 'attribute_exists(PK)',
+            'ExpressionAttributeNames': {'#v': VERSION_ATTRIBUTE},
+            'ExpressionAttributeValues': {':one': 1},
+        }
+    }
+
+
+def transact(items, required=(0,)):
+    """Run a transaction, raising ConditionFailed if an item at one of the required
+    indexes failed its condition; e.index says which one."""
+    try:
+        get_client().transact_write_items(TransactItems=items)
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'TransactionCanceledException':
+            raise
+        codes = cancellation_codes(e)
+        for index in required:
+            if index < len(codes) and codes[index] == 'ConditionalCheckFailed':
+                raise ConditionFailed(index)
+        raise
+
+
+def bump_after(key, table_name=None):
+    """Bump a parent's version outside a transaction, after batched or cascaded writes.
+
+    Bumping after the writes means a reader in between sees new data under the
+    old version, which only costs it one extra full response later.
+    Returns False if the parent does not exist.
+    """
+    update = bump(table_name or os.environ['DYNAMODB_TABLE_NAME'], key)['Update']
+    try:
+        get_client().update_item(**update)
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            raise
+        return False
+    return True
+
+
+def read_version(table, key):
+    """Return the parent's version (0 if it was never bumped), or None if it does not exist."""
+    response = table.get_item(
+        Key=key,
+        ProjectionExpression='#v, PK',
+        ExpressionAttributeNames={'#v': VERSION_ATTRIBUTE}
+    )
+    item = response.get('Item')
+    if item is None:
+        return None
+    return int(item.get(VERSION_ATTRIBUTE, 0))
@@ -0,0 +1,166 @@
+import hashlib
+import logging
+import os
+import unicodedata
+from botocore.exceptions import ClientError
+from common.batch import MAX_ATTEMPTS, backoff, batch_get, chunked
+from common.db import get_client
+from common.usernames import cancellation_codes
+
+logger = logging.getLogger()
+
+# A set may hold each word once. Every card claims a WORDKEY#<digest> item in
+# its set partition, keyed by the SHA-256 of the normalized word so the sort key
+# stays within DynamoDB's 1024-byte limit however long the word is, written in the same transaction as the card and
+# conditioned on not existing yet, so a duplicate is found with one conditional
+# write instead of by reading the set. The claim carries the owning card's id
+# so the conflict can be answered with it.
+
+# Two writes per card, and a transaction takes at most 100.
+CARDS_PER_TRANSACTION = 50
+
+
+def normalize_word(word):
+    return ' '.join(unicodedata.normalize('NFKC', word).casefold().split())
+
+
+def wordkey(set_pk, word):
+    digest = hashlib.sha256(normalize_word(word).encode('utf-8')).hexdigest()
+    return {'PK': set_pk, 'SK': f'WORDKEY#{digest}'}
+
+
+def claim(table_name, set_pk, word, flashcard_id):
+    return {
+        'Put': {
+            'TableName': table_name,
+            # The normalized word is kept readable beside the digest.
+            'Item': dict(wordkey(set_pk, word), word=normalize_word(word), flashcard_id=flashcard_id),
+            'ConditionExpression': 'attribute_not_exists(PK)',
+        }
+    }
+
+
+def release(table_name, set_pk, word, flashcard_id):
+    # Only the owning card may drop a claim. Cards written before claims existed, or
+    # that lost a backfill to an older duplicate, own none, so check owner() first.
+    return {
+        'Delete': {
+            'TableName': table_name,
+            'Key': wordkey(set_pk, word),
+            'ConditionExpression': 'flashcard_id = :fid',
+            'ExpressionAttributeValues': {':fid': flashcard_id},
+        }
+    }
+
+
+def owner(set_pk, word, table_name=None, client=None):
+    """Return the id of the card holding a word in a set, or None."""
+    item = (client or get_client()).get_item(
+        TableName=table_name or os.environ['DYNAMODB_TABLE_NAME'],
+        Key=wordkey(set_pk, word),
+        ConsistentRead=True
+    ).get('Item')
+    return item['flashcard_id'] if item else None
+
+
+def _flashcard_id(item):
+    return item['SK'].split('#', 1)[1]
+
+
+def write_unique(items, table_name=None, client=None):
+    """Write new flashcard items, skipping words their set already holds.
+
+    Returns (written items, {SK: id of the existing card} for duplicates, set of SKs that failed).
+    """
+    client = client or get_client()
+    table_name = table_name or os.environ['DYNAMODB_TABLE_NAME']
+    duplicates = {}
+    failed = set()
+
+    # Repeats within the request point at the first card with that word.
+    pending = []
+    first = {}
+    for item in items:
+        key = (item['PK'], normalize_word(item['word']))
+        if key in first:
+            duplicates[item['SK']] = first[key]
+        else:
+            first[key] = _flashcard_id(item)
+            pending.append(item)
+
+    # Claims that already exist are found with a read, so they rarely cost a cancelled transaction.
+    keys = [wordkey(item['PK'], item['word']) for item in pending]
+    owners = {(claim_item['PK'], claim_item['SK']): claim_item['flashcard_id']
+              for claim_item in batch_get(client, table_name, keys, 'PK, SK, flashcard_id', consistent=True)}
+    fresh = []
+    for item, key in zip(pending, keys):
+        existing = owners.get((key['PK'], key['SK']))
+        if existing:
+            duplicates[item['SK']] = existing
+        else:
+            fresh.append(item)
+
+    written = []
+    for chunk in chunked(fresh, CARDS_PER_TRANSACTION):
+        for attempt in range(MAX_ATTEMPTS):
+            transact_items = []
+            for item in chunk:
+                transact_items.append(claim(table_name, item['PK'], item['word'], _flashcard_id(item)))
+                transact_items.append({'Put': {'TableName': table_name, 'Item': item}})
+            try:
+                client.transact_write_items(TransactItems=transact_items)
+                written.extend(chunk)
+                break
+            except ClientError as e:
+                if e.response['Error']['Code'] != 'TransactionCanceledException':
+                    raise
+                codes = cancellation_codes(e)
+                # Claims sit at even indexes; one that failed lost a race with another writer.
+                lost = [
+                    item for position, item in enumerate(chunk)
+                    if 2 * position < len(codes) and codes[2 * position] == 'ConditionalCheckFailed'
+                ]
+                for item in lost:
+                    duplicates[item['SK']] = owner(item['PK'], item['word'], table_name, client)
+                chunk = [item for item in chunk if item not in lost]
+                if not chunk:
+                    break
+                logger.warning("Flashcard transaction cancelled (%s), retry %s of %s", codes, attempt + 1, MAX_ATTEMPTS)
+                if not lost:
+                    backoff(attempt)
+        else:
+            failed.update(item['SK'] for item in chunk)
+    return written, duplicates, failed
+
+
+def backfill(table_name=None):
+    """Claim words for cards written before claims existed. The first card scanned keeps a word."""
+    client = get_client()
+    table_name = table_name or os.environ['DYNAMODB_TABLE_NAME']
+    kwargs = {
+        'TableName': table_name,
+        'FilterExpression': 'begins_with(SK, :card)',
+        'ExpressionAttributeValues': {':card': 'FLASHCARD#'},
+        'ProjectionExpression': 'PK, SK, word',
+    }
+    claimed = 0
+    while True:
+        response = client.scan(**kwargs)
+        for card in response.get('Items', []):
+            if not card.get('word'):
+                continue
+            try:
+                client.put_item(**claim(table_name, card['PK'], card['word'], _flashcard_id(card))['Put'])
+                claimed += 1
+            except ClientError as e:
+                if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                    raise
+                logger.warning("%s duplicates an existing word in %s", card['SK'], card['PK'])
+        if 'LastEvaluatedKey' not in response:
+            return claimed
+        kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    print(f"Claimed {backfill()} words")
@@ -1,123 +1,267 @@
-import boto3
-import json
-import os
+import base64
+import io
 import logging
 import uuid
 import time
 from boto3.dynamodb.conditions import Key
+from botocore.exceptions import ClientError
+from common import aggregates, cache, search, srs, versions, wordkeys
+from common.auth import require_auth
+from common.db import get_table
+from common.flashcards import new_flashcard_item, validate_flashcard
+from common.logs import fields
+from common.metrics import instrument
+from common.pagination import decode_cursor, encode_cursor, parse_limit, query_all, query_page
+from common.responses import cache_headers, compressed_response, etag, etag_matches, json_body, json_response, not_modified, preflight
 
-s3_client = boto3.client('s3')
 logger = logging.getLogger()
-logger.setLevel(logging.INFO)
 
+MAX_BULK_FLASHCARDS = 500
+DEFAULT_DUE_LIMIT = 100
+DEFAULT_SEARCH_LIMIT = 50
+
+
+def set_exists(table, user_id, language, set_id):
+    # Bulk writes go through word claims rather than one transaction with the
+    # SET item, so the set is checked up front; cards must never be orphaned.
+    return 'Item' in table.get_item(Key=versions.set_key(user_id, language, set_id),
+                                    ConsistentRead=True, ProjectionExpression='PK')
+
+
+@instrument
+@require_auth
 def add_flashcard(event, context):
     logger.info("Starting add_flashcard handler")
 
-    dynamodb = boto3.resource("dynamodb", region_name=os.environ["AWS_REGION"])
-    table = dynamodb.Table(os.environ["DYNAMODB_TABLE_NAME"])
+    table = get_table()
 
     try:
         user_id = event['queryStringParameters']['user_id']
         language = event['queryStringParameters']['language']
         set_id = event['queryStringParameters']['set_id']
-        logger.info(f"Received user_id: {user_id}, language: {language}, set_id: {set_id}")
+        logger.info("Received user_id: %s, language: %s, set_id: %s", user_id, language, set_id)
         if not user_id or not language or not set_id:
-            return {
-                'statusCode': 400,
-                'headers': {
-                    'Access-Control-Allow-Origin': '*',
-                    'Access-Control-Allow-Methods': 'GET,POST,PUT,DELETE,OPTIONS',
-                    'Access-Control-Allow-Headers': '*, Content-Type, Authorization',
-                },
-                'body': json.dumps({'error': 'User ID, language, and set ID are required'})
-            }
+            return json_response(400, {'error': 'User ID, language, and set ID are required'})
 
-        body = json.loads(event['body'])
-        logger.info(f"Received body: {body}")
+        body = json_body(event)
+        logger.debug("Received body", extra=fields(body=body))
+        error = validate_flashcard(body)
+        if error:
+            return json_response(400, {'error': error})
         word = body.get('word')
         usage = body.get('usage')
         translated_word = body.get('translated_word')
         translated_usage = body.get('translated_usage')
-        if not word or not translated_word:
-            return {
-                'statusCode': 400,
-                'headers': {
-                    'Access-Control-Allow-Origin': '*',
-                    'Access-Control-Allow-Methods': 'GET,POST,PUT,DELETE,OPTIONS',
-                    'Access-Control-Allow-Headers': '*, Content-Type, Authorization',
-                },
-                'body': json.dumps({'error': 'Word and translated word are required'})
-            }
 
-        logger.info(f"adding flashcard for user {user_id}, language {language}, set {set_id}")
+        logger.info("adding flashcard for user %s, language %s, set %s", user_id, language, set_id)
         flashcard_id = str(uuid.uuid4())
-        response = table.put_item(
-            Item={
-                'PK': f'USER#{user_id}#LANGUAGE#{language}#SET#{set_id}',
-                'SK': f'FLASHCARD#{flashcard_id}',
-                'word': word,
-                'usage': usage,
-                'translated_word': translated_word,
-                'translated_usage': translated_usage,
-                'created_at': int(time.time()), 
-                'updated_at': int(time.time()),
-            }
-        )
-        logger.info(f"Flashcard added with ID: {flashcard_id}")
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET,POST,PUT,DELETE,OPTIONS',
-                'Access-Control-Allow-Headers': '*, Content-Type, Authorization',
-            },
-            'body': json.dumps({'message': 'Flashcard added successfully', 'flashcard_id': flashcard_id})
+        now = int(time.time())
+        item = {
+            'PK': f'USER#{user_id}#LANGUAGE#{language}#SET#{set_id}',
+            'SK': f'FLASHCARD#{flashcard_id}',
+            'word': word,
+            'usage': usage,
+            'translated_word': translated_word,
+            'translated_usage': translated_usage,
+            'created_at': now,
+            'updated_at': now,
         }
+        item.update(srs.initial_state(user_id, now))
+        try:
+            versions.transact([
+                aggregates.adjust(table.name, user_id, language, set_id,
+                                  cards=1, characters=aggregates.card_characters(item), now=now),
+                {'Put': {'TableName': table.name, 'Item': item}},
+                versions.bump(table.name, versions.language_key(user_id, language)),
+                wordkeys.claim(table.name, item['PK'], word, flashcard_id)
+            ], required=(0, 2, 3))
+        except versions.ConditionFailed as e:
+            if e.index == 3:
+                existing_id = wordkeys.owner(item['PK'], word)
+                logger.info("Word %r already in set %s as flashcard %s", word, set_id, existing_id)
+                return json_response(409, {'error': 'A flashcard with this word already exists in the set', 'flashcard_id': existing_id})
+            logger.warning("Set not found for user_id: %s, language: %s, set_id: %s", user_id, language, set_id)
+            return json_response(404, {'error': 'Set not found'})
+        search.update_card(user_id, language, set_id, flashcard_id, new_card=item)
+        cache.sets.invalidate(user_id, language, set_id)
+        logger.info("Flashcard added with ID: %s", flashcard_id)
+        return json_response(200, {'message': 'Flashcard added successfully', 'flashcard_id': flashcard_id})
     except Exception as e:
-        logger.error(f"Error in add_flashcard: {str(e)}")
-        return {
-            'statusCode': 500,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET,POST,PUT,DELETE,OPTIONS',
-                'Access-Control-Allow-Headers': '*, Content-Type, Authorization',
-            },
-            'body': json.dumps({'error': 'Internal Server Error'})
-        }
+        logger.error("Error in add_flashcard: %s", e)
+        return json_response(500, {'error': 'Internal Server Error'})
     
+@instrument
+@require_auth
+def add_flashcards(event, context):
+    logger.info("Starting add_flashcards handler")
+
+    try:
+        user_id = event['queryStringParameters']['user_id']
+        language = event['queryStringParameters']['language']
+        set_id = event['queryStringParameters']['set_id']
+        logger.info("Received user_id: %s, language: %s, set_id: %s", user_id, language, set_id)
+        if not user_id or not language or not set_id:
+            return json_response(400, {'error': 'User ID, language, and set ID are required'})
+
+        body = json_body(event)
+        cards = body.get('flashcards') if isinstance(body, dict) else None
+        if not isinstance(cards, list) or not cards:
+            return json_response(400, {'error': 'A non-empty flashcards array is required'})
+        if len(cards) > MAX_BULK_FLASHCARDS:
+            return json_response(400, {'error': f'At most {MAX_BULK_FLASHCARDS} flashcards can be added per request'})
+
+        if not set_exists(get_table(), user_id, language, set_id):
+            logger.warning("Set not found for user_id: %s, language: %s, set_id: %s", user_id, language, set_id)
+            return json_response(404, {'error': 'Set not found'})
+
+        logger.info("Adding %s flashcards for user %s, language %s, set %s", len(cards), user_id, language, set_id)
+        now = int(time.time())
+        results = []
+        items = []
+        for index, card in enumerate(cards):
+            error = validate_flashcard(card)
+            if error:
+                results.append({'index': index, 'error': error})
+                continue
+            flashcard_id, item = new_flashcard_item(user_id, language, set_id, card, now)
+            items.append(item)
+            results.append({'index': index, 'flashcard_id': flashcard_id})
+
+        written, duplicates, failed = wordkeys.write_unique(items)
+        for result in results:
+            sk = f"FLASHCARD#{result.get('flashcard_id')}"
+            if sk in duplicates:
+                del result['flashcard_id']
+                result['error'] = 'A flashcard with this word already exists in the set'
+                result['duplicate_of'] = duplicates[sk]
+            elif sk in failed:
+                del result['flashcard_id']
+                result['error'] = 'Flashcard could not be written, please retry'
+
+        created = len(written)
+        if created:
+            aggregates.adjust_after(user_id, language, set_id, cards=created,
+                                    characters=sum(aggregates.card_characters(item) for item in written), now=now)
+            versions.bump_after(versions.language_key(user_id, language))
+            cache.sets.invalidate(user_id, language, set_id)
+            search.apply([
+                request for item in written
+                for request in search.index_requests(user_id, language, set_id, item['SK'].split('#', 1)[1], new_card=item)
+            ])
+        logger.info("Added %s of %s flashcards to set %s", created, len(cards), set_id)
+        return json_response(200, {
+            'message': f'Added {created} of {len(cards)} flashcards',
+            'created': created,
+            'duplicates': len(duplicates),
+            'failed': len(cards) - created,
+            'results': results
+        })
+    except Exception as e:
+        logger.error("Error in add_flashcards: %s", e)
+        return json_response(500, {'error': 'Internal Server Error'})
+
+@instrument
+@require_auth
+def import_flashcards(event, context):
+    logger.info("Starting import_flashcards handler")
+
+    try:
+        params = event['queryStringParameters']
+        user_id = params['user_id']
+        language = params['language']
+        set_id = params['set_id']
+        logger.info("Received user_id: %s, language: %s, set_id: %s", user_id, language, set_id)
+        if not user_id or not language or not set_id:
+            return json_response(400, {'error': 'User ID, language, and set ID are required'})
+
+        body = event.get('body')
+        if not body:
+            return json_response(400, {'error': 'Request body is required'})
+
+        if not set_exists(get_table(), user_id, language, set_id):
+            logger.warning("Set not found for user_id: %s, language: %s, set_id: %s", user_id, language, set_id)
+            return json_response(404, {'error': 'Set not found'})
+
+        # The file is sent as the raw request body; API Gateway base64-encodes binary payloads.
+        raw = base64.b64decode(body) if event.get('isBase64Encoded') else body.encode('utf-8')
+        # Only this function loads the importer and its parsers.
+        from common import importer
+        has_header = params.get('has_header')
+        columns = params.get('columns')
+
+        try:
+            result = importer.import_flashcards(
+                io.BytesIO(raw), user_id, language, set_id,
+                fmt=params.get('format'),
+                columns=columns.split(',') if columns else None,
+                has_header=None if has_header in (None, '', 'auto') else has_header.lower() == 'true',
+                encoding=params.get('encoding'),
+            )
+        except (importer.InvalidImport, LookupError) as ve:
+            logger.warning("Invalid import request: %s", ve)
+            return json_response(400, {'error': str(ve)})
+
+        if result.imported:
+            # Imports can be large and partially fail, so count what actually landed.
+            aggregates.recompute(user_id, language, set_id)
+            versions.bump_after(versions.language_key(user_id, language))
+            cache.sets.invalidate(user_id, language, set_id)
+        return json_response(200, dict(message=f'Imported {result.imported} flashcards', **result.to_dict()))
+    except Exception as e:
+        logger.error("Error in import_flashcards: %s", e)
+        return json_response(500, {'error': 'Internal Server Error'})
+
+@instrument
+@require_auth
 def get_flashcards(event, context):
     logger.info("Starting get_flashcards handler")
 
-    dynamodb = boto3.resource("dynamodb", region_name=os.environ["AWS_REGION"])
-    table = dynamodb.Table(os.environ["DYNAMODB_TABLE_NAME"])
+    table = get_table()
 
     try:
         user_id = event['queryStringParameters']['user_id']
         language = event['queryStringParameters']['language']
         set_id = event['queryStringParameters']['set_id']
-        logger.info(f"Received user_id: {user_id}, language: {language}, set_id: {set_id}")
+        logger.info("Received user_id: %s, language: %s, set_id: %s", user_id, language, set_id)
         if not user_id or not language or not set_id:
-            return {
-                'statusCode': 400,
-                'headers': {
-                    'Access-Control-Allow-Origin': '*',
-                    'Access-Control-Allow-Methods': 'GET,POST,PUT,DELETE,OPTIONS',
-                    'Access-Control-Allow-Headers': '*, Content-Type, Authorization',
-                },
-                'body': json.dumps({'error': 'User ID, language, and set ID are required'})
-            }
+            return json_response(400, {'error': 'User ID, language, and set ID are required'})
 
-        response = table.query(
-            KeyConditionExpression=Key('PK').eq(f'USER#{user_id}#LANGUAGE#{language}#SET#{set_id}') & Key('SK').begins_with('FLASHCARD#'),
-            ProjectionExpression='SK, word, #u, translated_word, #tu, created_at, updated_at',
-            ExpressionAttributeNames={
+        params = event['queryStringParameters']
+        partition_key = f'USER#{user_id}#LANGUAGE#{language}#SET#{set_id}'
+        try:
+            limit = parse_limit(params.get('limit'))
+            start_key = decode_cursor(params['cursor'], partition_key) if params.get('cursor') else None
+        except ValueError as ve:
+            logger.warning("Invalid pagination parameters: %s", ve)
+            return json_response(400, {'error': 'Invalid limit or cursor'})
+
+        # The version is read before the cards, and the cards are read consistently,
+        # so the data sent is never older than the ETag it is sent under.
+        version = versions.read_version(table, versions.set_key(user_id, language, set_id))
+        tag = etag(version) if version is not None else None
+        if tag and etag_matches(event, tag):
+            logger.info("Flashcards for set %s unchanged at version %s", set_id, version)
+            return not_modified(tag)
+
+        query_kwargs = {
+            'ConsistentRead': True,
+            'KeyConditionExpression': Key('PK').eq(partition_key) & Key('SK').begins_with('FLASHCARD#'),
+            'ProjectionExpression': 'PK, SK, word, #u, translated_word, #tu, created_at, updated_at',
+            'ExpressionAttributeNames': {
                 '#u': 'usage',
                 '#tu': 'translated_usage'
             }
-        )
+        }
+
+        # With a limit the client pages through the set; without one the whole set
+        # is drained server-side, up to a response size budget.
+        if limit:
+            items, last_key = query_page(table, limit=limit, exclusive_start_key=start_key, **query_kwargs)
+        else:
+            items, last_key = query_all(table, exclusive_start_key=start_key, **query_kwargs)
         
         flashcards = []
-        for item in response.get('Items', []):
+        for item in items:
             flashcard = {
                 'flashcard_id': item['SK'].split('#')[1],
                 'word': item.get('word'),
@@ -128,50 +272,28 @@ def get_flashcards(event, context):
                 'updated_at': item.get('updated_at')
             }
             flashcards.append(flashcard)
-        logger.info(f"Retrieved {len(flashcards)} flashcards for user {user_id}, language {language}, set {set_id}")
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET,POST,PUT,DELETE,OPTIONS',
-                'Access-Control-Allow-Headers': '*, Content-Type, Authorization',
-            },
-            'body': json.dumps({'flashcards': flashcards}, default=str)
-        }
+        logger.info("Retrieved %s flashcards for user %s, language %s, set %s", len(flashcards), user_id, language, set_id)
+        return compressed_response(event, 200, {'flashcards': flashcards, 'next_cursor': encode_cursor(last_key)},
+                                   cache_headers(tag) if tag else None)
     except Exception as e:
-        logger.error(f"Error in get_flashcards: {str(e)}")
-        return {
-            'statusCode': 500,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET,POST,PUT,DELETE,OPTIONS',
-                'Access-Control-Allow-Headers': '*, Content-Type, Authorization',
-            },
-            'body': json.dumps({'error': 'Internal Server Error'})
-        }
+        logger.error("Error in get_flashcards: %s", e)
+        return json_response(500, {'error': 'Internal Server Error'})
     
+@instrument
+@require_auth
 def get_flashcard(event, context):
     logger.info("Starting get_flashcard handler")
 
-    dynamodb = boto3.resource("dynamodb", region_name=os.environ["AWS_REGION"])
-    table = dynamodb.Table(os.environ["DYNAMODB_TABLE_NAME"])
+    table = get_table()
 
     try:
         user_id = event['queryStringParameters']['user_id']
         language = event['queryStringParameters']['language']
         set_id = event['queryStringParameters']['set_id']
         flashcard_id = event['queryStringParameters']['flashcard_id']
-        logger.info(f"Received user_id: {user_id}, language: {language}, set_id: {set_id}, flashcard_id: {flashcard_id}")
+        logger.info("Received user_id: %s, language: %s, set_id: %s, flashcard_id: %s", user_id, language, set_id, flashcard_id)
         if not user_id or not language or not set_id or not flashcard_id:
-            return {
-                'statusCode': 400,
-                'headers': {
-                    'Access-Control-Allow-Origin': '*',
-                    'Access-Control-Allow-Methods': 'GET,POST,PUT,DELETE,OPTIONS',
-                    'Access-Control-Allow-Headers': '*, Content-Type, Authorization',
-                },
-                'body': json.dumps({'error': 'User ID, language, set ID, and flashcard ID are required'})
-            }
+            return json_response(400, {'error': 'User ID, language, set ID, and flashcard ID are required'})
 
         response = table.get_item(
             Key={
@@ -186,15 +308,7 @@ def get_flashcard(event, context):
         )
         
         if 'Item' not in response:
-            return {
-                'statusCode': 404,
-                'headers': {
-                    'Access-Control-Allow-Origin': '*',
-                    'Access-Control-Allow-Methods': 'GET,POST,PUT,DELETE,OPTIONS',
-                    'Access-Control-Allow-Headers': '*, Content-Type, Authorization',
-                },
-                'body': json.dumps({'error': 'Flashcard not found'})
-            }
+            return json_response(404, {'error': 'Flashcard not found'})
         
         item = response['Item']
         flashcard = {
@@ -205,76 +319,41 @@ def get_flashcard(event, context):
             'created_at': item.get('created_at'),
             'updated_at': item.get('updated_at')
         }
-        logger.info(f"Retrieved flashcard: {flashcard}")
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET,POST,PUT,DELETE,OPTIONS',
-                'Access-Control-Allow-Headers': '*, Content-Type, Authorization',
-            },
-            'body': json.dumps({'flashcard': flashcard}, default=str)
-        }
+        logger.debug("Retrieved flashcard", extra=fields(flashcard=flashcard))
+        return json_response(200, {'flashcard': flashcard})
     except Exception as e:
-        logger.error(f"Error in get_flashcard: {str(e)}")
-        return {
-            'statusCode': 500,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET,POST,PUT,DELETE,OPTIONS',
-                'Access-Control-Allow-Headers': '*, Content-Type, Authorization',
-            },
-            'body': json.dumps({'error': 'Internal Server Error'})
-        }
+        logger.error("Error in get_flashcard: %s", e)
+        return json_response(500, {'error': 'Internal Server Error'})
     
+@instrument
+@require_auth
 def edit_flashcard(event, context):
     if event['requestContext']['http']['method'] == 'OPTIONS':
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET,POST,PUT,DELETE,OPTIONS',
-                'Access-Control-Allow-Headers': '*',
-            },
-            'body': json.dumps({'message': 'CORS preflight response'})
-        }
+        return preflight()
     
     logger.info("Starting edit_flashcard handler")
 
-    dynamodb = boto3.resource("dynamodb", region_name=os.environ["AWS_REGION"])
-    table = dynamodb.Table(os.environ["DYNAMODB_TABLE_NAME"])
+    table = get_table()
 
     try:
         user_id = event['queryStringParameters']['user_id']
         language = event['queryStringParameters']['language']
         set_id = event['queryStringParameters']['set_id']
         flashcard_id = event['queryStringParameters']['flashcard_id']
-        logger.info(f"Received user_id: {user_id}, language: {language}, set_id: {set_id}, flashcard_id: {flashcard_id}")
+        logger.info("Received user_id: %s, language: %s, set_id: %s, flashcard_id: %s", user_id, language, set_id, flashcard_id)
         if not user_id or not language or not set_id or not flashcard_id:
-            return {
-                'statusCode': 400,
-                'headers': {
-                    'Access-Control-Allow-Origin': '*',
-                    'Access-Control-Allow-Methods': 'GET,POST,PUT,DELETE,OPTIONS',
-                    'Access-Control-Allow-Headers': '*, Content-Type, Authorization',
-                },
-                'body': json.dumps({'error': 'User ID, language, set ID, and flashcard ID are required'})
-            }
+            return json_response(400, {'error': 'User ID, language, set ID, and flashcard ID are required'})
 
-        body = json.loads(event['body'])
+        body = json_body(event)
 
         if not body:
-            return {
-                'statusCode': 400,
-                'headers': {
-                    'Access-Control-Allow-Origin': '*',
-                    'Access-Control-Allow-Methods': 'GET,POST,PUT,DELETE,OPTIONS',
-                    'Access-Control-Allow-Headers': '*, Content-Type, Authorization',
-                },
-                'body': json.dumps({'error': 'Request body is required'})
-            }
+            return json_response(400, {'error': 'Request body is required'})
         
-        logger.info(f"Received body: {body}")
+        logger.debug("Received body", extra=fields(body=body))
+        # Same checks as a new card, so the character delta below only ever sees strings.
+        error = validate_flashcard(body)
+        if error:
+            return json_response(400, {'error': error})
         word = body.get('word')
         usage = body.get('usage')
         translated_word = body.get('translated_word')
@@ -282,130 +361,281 @@ def edit_flashcard(event, context):
         
         if not word or not usage or not translated_usage or not translated_word:
             logger.error("Missing required fields for editing flashcard")
-            return {
-                'statusCode': 400,
-                'headers': {
-                    'Access-Control-Allow-Origin': '*',
-                    'Access-Control-Allow-Methods': 'GET,POST,PUT,DELETE,OPTIONS',
-                    'Access-Control-Allow-Headers': '*, Content-Type, Authorization',
-                },
-                'body': json.dumps({'error': 'Word, usage, translated word, and translated usage are required'})
-            }
-        logger.info(f"Editing flashcard for user {user_id}, language {language}, set {set_id}, flashcard {flashcard_id}")
+            return json_response(400, {'error': 'Word, usage, translated word, and translated usage are required'})
+        logger.info("Editing flashcard for user %s, language %s, set %s, flashcard %s", user_id, language, set_id, flashcard_id)
 
-        response = table.update_item(
-            Key={
-                'PK': f'USER#{user_id}#LANGUAGE#{language}#SET#{set_id}',
-                'SK': f'FLASHCARD#{flashcard_id}'
-            },
-            UpdateExpression='SET word = :w, #u = :u, translated_word = :tw, #tu = :tu, updated_at = :ua',
-            ExpressionAttributeNames={
-                '#u': 'usage',
-                '#tu': 'translated_usage'
-            },
-            ExpressionAttributeValues={
-                ':w': word,
-                ':u': usage,
-                ':tw': translated_word,
-                ':tu': translated_usage,
-                ':ua': int(time.time())
-            },
-            ReturnValues='UPDATED_NEW'
-        )
+        key = {
+            'PK': f'USER#{user_id}#LANGUAGE#{language}#SET#{set_id}',
+            'SK': f'FLASHCARD#{flashcard_id}'
+        }
+        existing = table.get_item(Key=key, ConsistentRead=True).get('Item')
+        if existing is None:
+            logger.warning("Flashcard not found for user_id: %s, language: %s, set_id: %s, flashcard_id: %s", user_id, language, set_id, flashcard_id)
+            return json_response(404, {'error': 'Flashcard not found'})
 
-        if 'Attributes' not in response:
-            logger.warning(f"Set not found for user_id: {user_id}, language: {language}, set_id: {set_id}, flashcard_id: {flashcard_id}")
-            return {
-                'statusCode': 404,
-                'headers': {
-                    'Access-Control-Allow-Origin': '*',
-                    'Access-Control-Allow-Methods': 'GET,POST,PUT,DELETE,OPTIONS',
-                    'Access-Control-Allow-Headers': '*, Content-Type, Authorization',
+        updated_at = int(time.time())
+        characters = aggregates.card_characters(body) - aggregates.card_characters(existing)
+        transact_items = [
+            aggregates.adjust(table.name, user_id, language, set_id, characters=characters, now=updated_at),
+            {'Update': {
+                'TableName': table.name,
+                'Key': key,
+                'UpdateExpression': 'SET word = :w, #u = :u, translated_word = :tw, #tu = :tu, updated_at = :ua',
+                # The character delta was computed from the card as read above.
+                'ConditionExpression': 'updated_at = :prev',
+                'ExpressionAttributeNames': {
+                    '#u': 'usage',
+                    '#tu': 'translated_usage'
                 },
-                'body': json.dumps({'error': 'Set not found'})
-            }
+                'ExpressionAttributeValues': {
+                    ':w': word,
+                    ':u': usage,
+                    ':tw': translated_word,
+                    ':tu': translated_usage,
+                    ':ua': updated_at,
+                    ':prev': existing.get('updated_at')
+                }
+            }},
+            versions.bump(table.name, versions.language_key(user_id, language))
+        ]
+        # A changed word moves the card's claim; the old one is only dropped if this card holds it.
+        renamed = wordkeys.normalize_word(word) != wordkeys.normalize_word(existing.get('word') or '')
+        if renamed:
+            transact_items.append(wordkeys.claim(table.name, key['PK'], word, flashcard_id))
+            if existing.get('word') and wordkeys.owner(key['PK'], existing['word']) == flashcard_id:
+                transact_items.append(wordkeys.release(table.name, key['PK'], existing['word'], flashcard_id))
+        try:
+            versions.transact(transact_items, required=range(len(transact_items)))
+        except versions.ConditionFailed as e:
+            if e.index == 3:
+                existing_id = wordkeys.owner(key['PK'], word)
+                logger.info("Word %r already in set %s as flashcard %s", word, set_id, existing_id)
+                return json_response(409, {'error': 'A flashcard with this word already exists in the set', 'flashcard_id': existing_id})
+            if e.index in (1, 4):
+                logger.warning("Flashcard %s changed while it was being edited", flashcard_id)
+                return json_response(409, {'error': 'Flashcard was modified concurrently, please retry'})
+            logger.warning("Set not found for user_id: %s, language: %s, set_id: %s, flashcard_id: %s", user_id, language, set_id, flashcard_id)
+            return json_response(404, {'error': 'Set not found'})
 
-        logger.info(f"Flashcard {flashcard_id} updated successfully")
+        search.update_card(user_id, language, set_id, flashcard_id, old_card=existing, new_card=body)
+        cache.sets.invalidate(user_id, language, set_id)
+        logger.info("Flashcard %s updated successfully", flashcard_id)
 
-        updated_flashcard = response['Attributes']
         flashcard = {
-            'word': updated_flashcard.get('word'),
-            'usage': updated_flashcard.get('usage'),
-            'translated_word': updated_flashcard.get('translated_word'),
-            'translated_usage': updated_flashcard.get('translated_usage'),
-            'updated_at': updated_flashcard.get('updated_at')
+            'word': word,
+            'usage': usage,
+            'translated_word': translated_word,
+            'translated_usage': translated_usage,
+            'updated_at': updated_at
         }
 
-        logger.info(f"Updated flashcard: {flashcard}")
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET,POST,PUT,DELETE,OPTIONS',
-                'Access-Control-Allow-Headers': '*, Content-Type, Authorization',
-            },
-            'body': json.dumps({'message': 'Flashcard updated successfully', 'flashcard': flashcard}, default=str)
-        }
+        logger.debug("Updated flashcard", extra=fields(flashcard=flashcard))
+        return json_response(200, {'message': 'Flashcard updated successfully', 'flashcard': flashcard})
     except Exception as e:
-        logger.error(f"Error in edit_flashcard: {str(e)}")
-        return {
-            'statusCode': 500,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET,POST,PUT,DELETE,OPTIONS',
-                'Access-Control-Allow-Headers': '*, Content-Type, Authorization',
-            },
-            'body': json.dumps({'error': 'Internal Server Error'})
-        }
+        logger.error("Error in edit_flashcard: %s", e)
+        return json_response(500, {'error': 'Internal Server Error'})
     
+@instrument
+@require_auth
 def delete_flashcard(event, context):
     logger.info("Starting delete_flashcard handler")
 
-    dynamodb = boto3.resource("dynamodb", region_name=os.environ["AWS_REGION"])
-    table = dynamodb.Table(os.environ["DYNAMODB_TABLE_NAME"])
+    table = get_table()
 
     try:
         user_id = event['queryStringParameters']['user_id']
         language = event['queryStringParameters']['language']
         set_id = event['queryStringParameters']['set_id']
         flashcard_id = event['queryStringParameters']['flashcard_id']
-        logger.info(f"Received user_id: {user_id}, language: {language}, set_id: {set_id}, flashcard_id: {flashcard_id}")
+        logger.info("Received user_id: %s, language: %s, set_id: %s, flashcard_id: %s", user_id, language, set_id, flashcard_id)
         if not user_id or not language or not set_id or not flashcard_id:
-            return {
-                'statusCode': 400,
-                'headers': {
-                    'Access-Control-Allow-Origin': '*',
-                    'Access-Control-Allow-Methods': 'GET,POST,PUT,DELETE,OPTIONS',
-                    'Access-Control-Allow-Headers': '*, Content-Type, Authorization',
-                },
-                'body': json.dumps({'error': 'User ID, language, set ID, and flashcard ID are required'})
-            }
+            return json_response(400, {'error': 'User ID, language, set ID, and flashcard ID are required'})
 
-        response = table.delete_item(
-            Key={
-                'PK': f'USER#{user_id}#LANGUAGE#{language}#SET#{set_id}',
-                'SK': f'FLASHCARD#{flashcard_id}'
-            }
-        )
+        key = {
+            'PK': f'USER#{user_id}#LANGUAGE#{language}#SET#{set_id}',
+            'SK': f'FLASHCARD#{flashcard_id}'
+        }
+        existing = table.get_item(Key=key, ConsistentRead=True).get('Item')
+        if existing is not None:
+            transact_items = [
+                aggregates.adjust(table.name, user_id, language, set_id,
+                                  cards=-1, characters=-aggregates.card_characters(existing)),
+                {'Delete': {
+                    'TableName': table.name,
+                    'Key': key,
+                    # A concurrent delete must not decrement the count twice.
+                    'ConditionExpression': 'attribute_exists(PK)'
+                }},
+                versions.bump(table.name, versions.language_key(user_id, language))
+            ]
+            if existing.get('word') and wordkeys.owner(key['PK'], existing['word']) == flashcard_id:
+                transact_items.append(wordkeys.release(table.name, key['PK'], existing['word'], flashcard_id))
+            try:
+                versions.transact(transact_items, required=(0, 1, 2))
+            except versions.ConditionFailed as e:
+                if e.index != 1:
+                    logger.warning("Set not found for user_id: %s, language: %s, set_id: %s", user_id, language, set_id)
+                    return json_response(404, {'error': 'Set not found'})
+            else:
+                search.update_card(user_id, language, set_id, flashcard_id, old_card=existing)
+                cache.sets.invalidate(user_id, language, set_id)
         
-        logger.info(f"Flashcard {flashcard_id} deleted successfully")
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET,POST,PUT,DELETE,OPTIONS',
-                'Access-Control-Allow-Headers': '*, Content-Type, Authorization',
-            },
-            'body': json.dumps({'message': 'Flashcard deleted successfully'})
+        logger.info("Flashcard %s deleted successfully", flashcard_id)
+        return json_response(200, {'message': 'Flashcard deleted successfully'})
+    except Exception as e:
+        logger.error("Error in delete_flashcard: %s", e)
+        return json_response(500, {'error': 'Internal Server Error'})
+
+@instrument
+@require_auth
+def get_due(event, context):
+    logger.info("Starting get_due handler")
+
+    table = get_table()
+
+    try:
+        params = event['queryStringParameters']
+        user_id = params['user_id']
+        logger.info("Received user_id: %s", user_id)
+        if not user_id:
+            return json_response(400, {'error': 'User ID is required'})
+
+        due_user = srs.due_partition(user_id)
+        try:
+            limit = parse_limit(params.get('limit')) or DEFAULT_DUE_LIMIT
+            start_key = decode_cursor(params['cursor']) if params.get('cursor') else None
+            if start_key and start_key.get('due_user') != due_user:
+                raise ValueError('Cursor does not belong to this query')
+        except ValueError as ve:
+            logger.warning("Invalid pagination parameters: %s", ve)
+            return json_response(400, {'error': 'Invalid limit or cursor'})
+
+        # Only cards that are due are read: the index is ordered by due time per user.
+        items, last_key = query_page(
+            table, limit=limit, exclusive_start_key=start_key,
+            IndexName=srs.DUE_INDEX,
+            KeyConditionExpression=Key('due_user').eq(due_user) & Key('due_at').lte(int(time.time()))
+        )
+
+        cards = []
+        for item in items:
+            # PK is USER#<id>#LANGUAGE#<language>#SET#<set_id>
+            _, _, _, language, _, set_id = item['PK'].split('#', 5)
+            cards.append({
+                'flashcard_id': item['SK'].split('#')[1],
+                'language': language,
+                'set_id': set_id,
+                'word': item.get('word'),
+                'usage': item.get('usage'),
+                'translated_word': item.get('translated_word'),
+                'translated_usage': item.get('translated_usage'),
+                'due_at': item.get('due_at'),
+                'ease': item.get('ease'),
+                'interval_days': item.get('interval_days'),
+                'repetitions': item.get('repetitions')
+            })
+        logger.info("Retrieved %s due flashcards for user %s", len(cards), user_id)
+        return compressed_response(event, 200, {'flashcards': cards, 'next_cursor': encode_cursor(last_key)})
+    except Exception as e:
+        logger.error("Error in get_due: %s", e)
+        return json_response(500, {'error': 'Internal Server Error'})
+
+@instrument
+@require_auth
+def grade_flashcard(event, context):
+    logger.info("Starting grade_flashcard handler")
+
+    table = get_table()
+
+    try:
+        user_id = event['queryStringParameters']['user_id']
+        language = event['queryStringParameters']['language']
+        set_id = event['queryStringParameters']['set_id']
+        flashcard_id = event['queryStringParameters']['flashcard_id']
+        logger.info("Received user_id: %s, language: %s, set_id: %s, flashcard_id: %s", user_id, language, set_id, flashcard_id)
+        if not user_id or not language or not set_id or not flashcard_id:
+            return json_response(400, {'error': 'User ID, language, set ID, and flashcard ID are required'})
+
+        body = json_body(event, allow_empty=True)
+        try:
+            grade = srs.parse_grade(body.get('grade') if isinstance(body, dict) else None)
+        except srs.InvalidGrade as ve:
+            return json_response(400, {'error': str(ve)})
+
+        key = {
+            'PK': f'USER#{user_id}#LANGUAGE#{language}#SET#{set_id}',
+            'SK': f'FLASHCARD#{flashcard_id}'
         }
+        card = table.get_item(
+            Key=key,
+            ConsistentRead=True,
+            ProjectionExpression=', '.join(('PK',) + srs.STATE_FIELDS)
+        ).get('Item')
+        if card is None:
+            return json_response(404, {'error': 'Flashcard not found'})
+
+        now = int(time.time())
+        state = srs.schedule(card, grade, now)
+        try:
+            table.update_item(Key=key, **srs.state_update(user_id, state, card.get('due_at'), now))
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                raise
+            logger.warning("Flashcard %s was graded concurrently", flashcard_id)
+            return json_response(409, {'error': 'Flashcard was graded concurrently, please retry'})
+
+        logger.info("Flashcard %s graded %s, next due at %s", flashcard_id, grade, state['due_at'])
+        return json_response(200, {'message': 'Flashcard graded successfully', 'flashcard_id': flashcard_id, 'state': state})
     except Exception as e:
-        logger.error(f"Error in delete_flashcard: {str(e)}")
-        return {
-            'statusCode': 500,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET,POST,PUT,DELETE,OPTIONS',
-                'Access-Control-Allow-Headers': '*, Content-Type, Authorization',
-            },
-            'body': json.dumps({'error': 'Internal Server Error'})
-        }
\ No newline at end of file
+        logger.error("Error in grade_flashcard: %s", e)
+        return json_response(500, {'error': 'Internal Server Error'})
+
+@instrument
+@require_auth
+def submit_reviews(event, context):
+    logger.info("Starting submit_reviews handler")
+
+    try:
+        user_id = event['queryStringParameters']['user_id']
+        logger.info("Received user_id: %s", user_id)
+        if not user_id:
+            return json_response(400, {'error': 'User ID is required'})
+
+        from common import reviews
+        body = json_body(event, allow_empty=True)
+        try:
+            result = reviews.submit(user_id, body.get('reviews') if isinstance(body, dict) else None)
+        except reviews.InvalidSession as ve:
+            return json_response(400, {'error': str(ve)})
+
+        return json_response(200, dict(
+            message=f"Applied {result['applied']} of {len(result['results'])} reviews", **result
+        ))
+    except Exception as e:
+        logger.error("Error in submit_reviews: %s", e)
+        return json_response(500, {'error': 'Internal Server Error'})
+
+@instrument
+@require_auth
+def search_flashcards(event, context):
+    logger.info("Starting search_flashcards handler")
+
+    try:
+        params = event['queryStringParameters']
+        user_id = params['user_id']
+        query = params.get('q')
+        logger.info("Received user_id: %s, q: %s", user_id, query)
+        if not user_id or not query:
+            return json_response(400, {'error': 'User ID and q are required'})
+
+        try:
+            limit = parse_limit(params.get('limit')) or DEFAULT_SEARCH_LIMIT
+        except ValueError:
+            return json_response(400, {'error': 'Invalid limit'})
+
+        results = search.search(user_id, query, language=params.get('language'), limit=limit)
+        logger.info("Found %s flashcards matching %r for user %s", len(results), query, user_id)
+        return compressed_response(event, 200, {'flashcards': results})
+    except Exception as e:
+        logger.error("Error in search_flashcards: %s", e)
+        return json_response(500, {'error': 'Internal Server Error'})
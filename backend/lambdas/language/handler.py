@@ -1,235 +1,132 @@
-import boto3
-import json
-import os
 import logging
-from boto3.dynamodb.conditions import Key, Attr
+from boto3.dynamodb.conditions import Key
+from common.auth import require_auth
+from common.db import get_table
+from common.logs import fields
+from common.metrics import instrument
+from common.responses import compressed_response, json_body, json_response
+from common import cache, cascade, versions
 
-s3_client = boto3.client('s3')
 logger = logging.getLogger()
-logger.setLevel(logging.INFO)
 
+@instrument
+@require_auth
 def add_language(event, context):
     logger.info("Starting add_language handler")
 
-    dynamodb = boto3.resource("dynamodb", region_name=os.environ["AWS_REGION"])
-    table = dynamodb.Table(os.environ["DYNAMODB_TABLE_NAME"])
+    table = get_table()
 
     try:
         user_id = event['queryStringParameters']['user_id']
-        logger.info(f"Received user_id: {user_id}")
+        logger.info("Received user_id: %s", user_id)
         if not user_id:
-            return {
-                'statusCode': 400,
-                'headers': {
-                    'Access-Control-Allow-Origin': '*',
-                    'Access-Control-Allow-Methods': 'GET,POST,PUT,DELETE,OPTIONS',
-                    'Access-Control-Allow-Headers': '*, Content-Type, Authorization',
-                },
-                'body': json.dumps({'error': 'User ID is required'})
-            }
+            return json_response(400, {'error': 'User ID is required'})
         
-        body = json.loads(event['body'])
+        body = json_body(event)
 
         if not body:
-            return {
-                'statusCode': 400,
-                'headers': {
-                    'Access-Control-Allow-Origin': '*',
-                    'Access-Control-Allow-Methods': 'GET,POST,PUT,DELETE,OPTIONS',
-                    'Access-Control-Allow-Headers': '*, Content-Type, Authorization',
-                },
-                'body': json.dumps({'error': 'Request body is required'})
-            }
+            return json_response(400, {'error': 'Request body is required'})
         
-        logger.info(f"Received body: {body}")
+        logger.debug("Received body", extra=fields(body=body))
         language = body.get('language')
         if not language:
-            return {
-                'statusCode': 400,
-                'headers': {
-                    'Access-Control-Allow-Origin': '*',
-                    'Access-Control-Allow-Methods': 'GET,POST,PUT,DELETE,OPTIONS',
-                    'Access-Control-Allow-Headers': '*, Content-Type, Authorization',
-                },
-                'body': json.dumps({'error': 'Language is required'})
-            }
+            return json_response(400, {'error': 'Language is required'})
         
         language = language.strip().lower()
-        logger.info(f"Processing language: {language}")
+        logger.info("Processing language: %s", language)
 
         existing = table.query(
             KeyConditionExpression=Key('PK').eq('USER#' + user_id) & Key('SK').eq('LANGUAGE#' + language)
         )
         if existing['Count'] > 0:
-            return {
-                'statusCode': 409,
-                'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET,POST,PUT,DELETE,OPTIONS',
-                'Access-Control-Allow-Headers': '*, Content-Type, Authorization',
-            },
-                'body': json.dumps({'message': 'Language already exists'})
-            }
+            return json_response(409, {'message': 'Language already exists'})
         
         logger.info("Adding language to DynamoDB")
         
-        response = table.put_item(
+        table.put_item(
             Item={
                 'PK': 'USER#' + user_id,
                 'SK': 'LANGUAGE#' + language,
                 'language': language
             }
         )
-        logger.info(f"Language added successfully: {response}")
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET,POST,PUT,DELETE,OPTIONS',
-                'Access-Control-Allow-Headers': '*, Content-Type, Authorization',
-            },
-            'body': json.dumps({'message': 'Language added successfully'})
-        }
+        versions.bump_after(versions.profile_key(user_id))
+        cache.languages.invalidate(user_id)
+        logger.info("Language added successfully")
+        return json_response(200, {'message': 'Language added successfully'})
     except Exception as e:
-        logger.error(f"Error in add_language: {str(e)}")
-        return {
-            'statusCode': 500,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET,POST,PUT,DELETE,OPTIONS',
-                'Access-Control-Allow-Headers': '*, Content-Type, Authorization',
-            },
-            'body': json.dumps({'error': 'Internal Server Error'})
-        }
+        logger.error("Error in add_language: %s", e)
+        return json_response(500, {'error': 'Internal Server Error'})
     
+@instrument
+@require_auth
 def get_languages(event, context):
     logger.info("Starting get_languages handler")
 
-    dynamodb = boto3.resource("dynamodb", region_name=os.environ["AWS_REGION"])
-    table = dynamodb.Table(os.environ["DYNAMODB_TABLE_NAME"])
+    table = get_table()
 
     try:
         user_id = event['queryStringParameters']['user_id']
-        logger.info(f"Received user_id: {user_id}")
+        logger.info("Received user_id: %s", user_id)
         if not user_id:
-            return {
-                'statusCode': 400,
-                'headers': {
-                    'Access-Control-Allow-Origin': '*',
-                    'Access-Control-Allow-Methods': 'GET,POST,PUT,DELETE,OPTIONS',
-                    'Access-Control-Allow-Headers': '*, Content-Type, Authorization',
-                },
-                'body': json.dumps({'error': 'User ID is required'})
-            }
-        logger.info(f"Querying languages for user_id: {user_id}")
-
-        response = table.query(
-            KeyConditionExpression=Key('PK').eq('USER#' + user_id) & Key('SK').begins_with('LANGUAGE#'),
-            ProjectionExpression='SK, #lang',
-            ExpressionAttributeNames={
-                '#lang': 'language'
-            }
+            return json_response(400, {'error': 'User ID is required'})
+
+        def load():
+            # The profile shares the partition and carries the version of the language list.
+            logger.info("Querying languages for user_id: %s", user_id)
+            response = table.query(
+                KeyConditionExpression=Key('PK').eq('USER#' + user_id),
+                ProjectionExpression='SK, #lang, #v',
+                ExpressionAttributeNames={
+                    '#lang': 'language',
+                    '#v': versions.VERSION_ATTRIBUTE
+                }
+            )
+            version = None
+            languages = []
+            for item in response.get('Items', []):
+                if item['SK'] == 'PROFILE':
+                    version = int(item.get(versions.VERSION_ATTRIBUTE, 0))
+                elif item['SK'].startswith('LANGUAGE#') and item.get('language'):
+                    languages.append(item['language'])
+            return languages, version
+
+        languages, outcome = cache.languages.get(
+            (user_id,), load, lambda: versions.read_version(table, versions.profile_key(user_id))
         )
+        logger.info("Retrieved %s languages (cache %s)", len(languages), outcome)
+        logger.debug("Languages retrieved", extra=fields(languages=languages))
 
-        languages = []
-        for item in response.get('Items', []):
-            language = item.get('language')
-            if language:
-                languages.append(language)
-        logger.info(f"Languages retrieved successfully: {languages}")
-
-
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET,POST,PUT,DELETE,OPTIONS',
-                'Access-Control-Allow-Headers': '*, Content-Type, Authorization',
-            },
-            'body': json.dumps({'languages': languages})
-        }
+        return compressed_response(event, 200, {'languages': languages}, {'X-Cache': outcome})
     except Exception as e:
-        logger.error(f"Error in get_languages: {str(e)}")
-        return {
-            'statusCode': 500,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET,POST,PUT,DELETE,OPTIONS',
-                'Access-Control-Allow-Headers': '*, Content-Type, Authorization',
-            },
-            'body': json.dumps({'error': 'Internal Server Error'})
-        }
+        logger.error("Error in get_languages: %s", e)
+        return json_response(500, {'error': 'Internal Server Error'})
     
+@instrument
+@require_auth
 def delete_language(event, context):
     logger.info("starting delete_language handler")
 
-    dynamodb = boto3.resource("dynamodb", region_name=os.environ["AWS_REGION"])
-    table = dynamodb.Table(os.environ["DYNAMODB_TABLE_NAME"])
-
     try:
         user_id = event['queryStringParameters']['user_id']
         language = event['queryStringParameters']['language']
 
-        logger.info(f"Received user_id: {user_id}, language: {language}")
+        logger.info("Received user_id: %s, language: %s", user_id, language)
         if not user_id or not language:
-            return {
-                'statusCode': 400,
-                'headers': {
-                    'Access-Control-Allow-Origin': '*',
-                    'Access-Control-Allow-Methods': 'GET,POST,PUT,DELETE,OPTIONS',
-                    'Access-Control-Allow-Headers': '*, Content-Type, Authorization',
-                },
-                'body': json.dumps({'error': 'User ID and Language are required'})
-            }
+            return json_response(400, {'error': 'User ID and Language are required'})
         
-        items_to_delete = []
-
-        # 1. Find items where PK starts with USER#123#LANGUAGE#Korean
-        prefix = f"USER#{user_id}#LANGUAGE#{language}"
-        logger.info(f"Scanning for PK starting with {prefix}")
-        response1 = table.scan(
-            FilterExpression=Attr('PK').begins_with(prefix)
-        )
-        items_to_delete.extend(response1.get('Items', []))
-
-        # 2. Find items where PK = USER#123 AND SK = LANGUAGE#Korean
-        logger.info(f"Scanning for PK=USER#{user_id} and SK begins with LANGUAGE#{language}")
-        response2 = table.scan(
-            FilterExpression=Attr('PK').eq(f'USER#{user_id}') & Attr('SK').begins_with(f'LANGUAGE#{language}')
-        )
-        items_to_delete.extend(response2.get('Items', []))
-
-        logger.info(f"Total items to delete: {len(items_to_delete)}")
-
-        # Delete all matched items
-        for item in items_to_delete:
-            pk = item['PK']
-            sk = item['SK']
-            logger.info(f"Deleting item with PK={pk}, SK={sk}")
-            table.delete_item(Key={'PK': pk, 'SK': sk})
-
-        logger.info(f"Successfully deleted {len(items_to_delete)} items for language {language} of user {user_id}")
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET,POST,PUT,DELETE,OPTIONS',
-                'Access-Control-Allow-Headers': '*, Content-Type, Authorization',
-            },
-            'body': json.dumps({
-                'message': f"Deleted {len(items_to_delete)} items for language {language} of user {user_id}"
-            })
-        }
+        logger.info("Deleting language %s and its sets for user %s", language, user_id)
+        deleted = cascade.delete_language(user_id, language)
+        versions.bump_after(versions.profile_key(user_id))
+        cache.languages.invalidate(user_id)
+        cache.sets.invalidate(user_id, language)
+
+        logger.info("Successfully deleted %s items for language %s of user %s", deleted, language, user_id)
+        return json_response(200, {
+            'message': f"Deleted {deleted} items for language {language} of user {user_id}"
+        })
     except Exception as e:
-        logger.error(f'Error in delete_language: {str(e)}')
-        return {
-            'statusCode': 500,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET,POST,PUT,DELETE,OPTIONS',
-                'Access-Control-Allow-Headers': '*, Content-Type, Authorization',
-            },
-            'body': json.dumps({'error': 'Internal Server Error'})
-        }
+        logger.error('Error in delete_language: %s', e)
+        return json_response(500, {'error': 'Internal Server Error'})
     
 
@@ -0,0 +1,69 @@
+import importlib
+import logging
+from common.metrics import instrument
+from common.responses import json_response
+
+logger = logging.getLogger()
+
+# Entry point for deployment_mode = "router": one function serves every route,
+# so warm containers, DynamoDB clients and caches are shared by all of them
+# instead of being split across a function per route. Each route runs the same
+# handler function the per-function layout deploys, and those handlers emit
+# their own metrics, so the Route dimension and Handler property are unchanged.
+#
+# Route key -> (package, handler). The packages are the per-function zips'
+# directories, which build_all.sh copies into router.zip beside common/.
+# terraform/api_gateway.tf (local.lango_endpoints) declares the same routes.
+ROUTES = {
+    'POST /addFlashcard': ('flashcard', 'add_flashcard'),
+    'POST /addFlashcards': ('flashcard', 'add_flashcards'),
+    'POST /importFlashcards': ('flashcard', 'import_flashcards'),
+    'PUT /editFlashcard': ('flashcard', 'edit_flashcard'),
+    'DELETE /deleteFlashcard': ('flashcard', 'delete_flashcard'),
+    'GET /getFlashcards': ('flashcard', 'get_flashcards'),
+    'GET /getFlashcard': ('flashcard', 'get_flashcard'),
+    'GET /getDue': ('flashcard', 'get_due'),
+    'POST /gradeFlashcard': ('flashcard', 'grade_flashcard'),
+    'POST /submitReviews': ('flashcard', 'submit_reviews'),
+    'GET /searchFlashcards': ('flashcard', 'search_flashcards'),
+
+    'POST /addSet': ('set', 'add_set'),
+    'GET /getSets': ('set', 'get_sets'),
+    'GET /getSet': ('set', 'get_set'),
+    'PUT /editSet': ('set', 'edit_set'),
+    'DELETE /deleteSet': ('set', 'delete_set'),
+
+    'POST /addLanguage': ('language', 'add_language'),
+    'GET /getLanguages': ('language', 'get_languages'),
+    'DELETE /deleteLanguage': ('language', 'delete_language'),
+
+    'DELETE /deleteUser': ('user', 'delete_user'),
+    'PUT /editUser': ('user', 'edit_user'),
+    'GET /getUser': ('user', 'get_user'),
+    'GET /getDashboard': ('user', 'get_dashboard'),
+    'GET /exportUserData': ('user', 'export_user_data'),
+
+    'POST /signup': ('auth', 'signup'),
+    'POST /login': ('auth', 'login'),
+}
+
+# Every handler module is imported at init: they share boto3 and common/, so
+# the other four add little, and a warm container then serves any route
+# without importing anything.
+HANDLERS = {
+    route_key: getattr(importlib.import_module(f'{package}.handler'), name)
+    for route_key, (package, name) in ROUTES.items()
+}
+
+
+@instrument
+def route_not_found(event, context):
+    logger.warning("No handler for route %s", event.get('routeKey'))
+    return json_response(404, {'error': 'Not Found'})
+
+
+def route(event, context):
+    handler = HANDLERS.get((event or {}).get('routeKey'))
+    if handler is None:
+        return route_not_found(event or {}, context)
+    return handler(event, context)
@@ -1,124 +1,95 @@
-import boto3
-import json
-import os
 import logging
 import uuid
 import time
-from boto3.dynamodb.conditions import Key, Attr
+from boto3.dynamodb.conditions import Key
+from common.auth import require_auth
+from common.db import get_table
+from common.logs import fields
+from common.metrics import instrument
+from common.responses import cache_headers, compressed_response, etag, etag_matches, json_body, json_response, not_modified, preflight
+from common import cache, cascade, versions
 
-s3_client = boto3.client('s3')
 logger = logging.getLogger()
-logger.setLevel(logging.INFO)
 
+@instrument
+@require_auth
 def add_set(event, context):
     logger.info("Starting add_set handler")
 
-    dynamodb = boto3.resource("dynamodb", region_name=os.environ["AWS_REGION"])
-    table = dynamodb.Table(os.environ["DYNAMODB_TABLE_NAME"])
+    table = get_table()
 
     try:
         user_id = event['queryStringParameters']['user_id']
         language = event['queryStringParameters']['language']
-        logger.info(f"Received user_id: {user_id}, language: {language}")
+        logger.info("Received user_id: %s, language: %s", user_id, language)
         if not user_id or not language:
-            return {
-                'statusCode': 400,
-                'headers': {
-                    'Access-Control-Allow-Origin': '*',
-                    'Access-Control-Allow-Methods': 'GET,POST,PUT,DELETE,OPTIONS',
-                    'Access-Control-Allow-Headers': '*, Content-Type, Authorization',
-                },
-                'body': json.dumps({'error': 'User ID and language are required'})
-            }
-        body = json.loads(event['body'])
+            return json_response(400, {'error': 'User ID and language are required'})
+        body = json_body(event)
 
         if not body:
-            return {
-                'statusCode': 400,
-                'headers': {
-                    'Access-Control-Allow-Origin': '*',
-                    'Access-Control-Allow-Methods': 'GET,POST,PUT,DELETE,OPTIONS',
-                    'Access-Control-Allow-Headers': '*, Content-Type, Authorization',
-                },
-                'body': json.dumps({'error': 'Request body is required'})
-            }
+            return json_response(400, {'error': 'Request body is required'})
         
-        logger.info(f"Received body: {body}")
+        logger.debug("Received body", extra=fields(body=body))
         set_name = body.get('set_name')
         set_description = body.get('set_description', '')
         if not set_name:
-            return {
-                'statusCode': 400,
-                'headers': {
-                    'Access-Control-Allow-Origin': '*',
-                    'Access-Control-Allow-Methods': 'GET,POST,PUT,DELETE,OPTIONS',
-                    'Access-Control-Allow-Headers': '*, Content-Type, Authorization',
-                },
-                'body': json.dumps({'error': 'Set name are required'})
-            }
+            return json_response(400, {'error': 'Set name are required'})
         
-        logger.info(f"Adding set: {set_name} for user: {user_id} in language: {language}")
+        logger.info("Adding set: %s for user: %s in language: %s", set_name, user_id, language)
 
         logger.info("Generating unique set ID")
         set_id = str(uuid.uuid4())
-        logger.info(f"Generated set_id: {set_id}")
+        logger.info("Generated set_id: %s", set_id)
 
-        table.put_item(
-            Item={
-                'PK': f'USER#{user_id}#LANGUAGE#{language}',
-                'SK': f'SET#{set_id}',
-                'set_name': set_name,
-                'set_description': set_description,
-                'created_at': int(time.time()),
-                'updated_at': int(time.time())
-            }
-        )
+        try:
+            versions.transact([
+                versions.bump(table.name, versions.language_key(user_id, language)),
+                {'Put': {
+                    'TableName': table.name,
+                    'Item': {
+                        'PK': f'USER#{user_id}#LANGUAGE#{language}',
+                        'SK': f'SET#{set_id}',
+                        'set_name': set_name,
+                        'set_description': set_description,
+                        'created_at': int(time.time()),
+                        'updated_at': int(time.time())
+                    }
+                }}
+            ])
+        except versions.ConditionFailed:
+            logger.warning("Language not found for user_id: %s, language: %s", user_id, language)
+            return json_response(404, {'error': 'Language not found'})
 
         logger.info("Set added successfully")
-        return {
-            'statusCode': 201,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET,POST,PUT,DELETE,OPTIONS',
-                'Access-Control-Allow-Headers': '*, Content-Type, Authorization',
-            },
-            'body': json.dumps({'message': 'Set added successfully', 'set_id': set_id})
-        }
+        return json_response(201, {'message': 'Set added successfully', 'set_id': set_id})
     except Exception as e:
-        logger.error(f"Error in add_set: {str(e)}")
-        return {
-            'statusCode': 500,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET,POST,PUT,DELETE,OPTIONS',
-                'Access-Control-Allow-Headers': '*, Content-Type, Authorization',
-            },
-            'body': json.dumps({'error': 'Internal Server Error'})
-        }
+        logger.error("Error in add_set: %s", e)
+        return json_response(500, {'error': 'Internal Server Error'})
 
+@instrument
+@require_auth
 def get_sets(event, context):
     logger.info("Starting get_sets handler")
 
-    dynamodb = boto3.resource("dynamodb", region_name=os.environ["AWS_REGION"])
-    table = dynamodb.Table(os.environ["DYNAMODB_TABLE_NAME"])
+    table = get_table()
 
     try:
         user_id = event['queryStringParameters']['user_id']
         language = event['queryStringParameters']['language']
-        logger.info(f"Recieved user_id: {user_id}, language: {language}")
+        logger.info("Recieved user_id: %s, language: %s", user_id, language)
         if not user_id or not language:
-            return {
-                'statusCode': 400,
-                'headers': {
-                    'Access-Control-Allow-Origin': '*',
-                    'Access-Control-Allow-Methods': 'GET,POST,PUT,DELETE,OPTIONS',
-                    'Access-Control-Allow-Headers': '*, Content-Type, Authorization',
-                },
-                'body': json.dumps({'error': 'User ID and language are required'})
-            }
+            return json_response(400, {'error': 'User ID and language are required'})
         
-        logger.info(f"Querying sets for user_id: {user_id} in language: {language}")
+        # Version first, then a consistent query, so the sets are never older than the ETag.
+        version = versions.read_version(table, versions.language_key(user_id, language))
+        tag = etag(version) if version is not None else None
+        if tag and etag_matches(event, tag):
+            logger.info("Sets for user %s in %s unchanged at version %s", user_id, language, version)
+            return not_modified(tag)
+
+        logger.info("Querying sets for user_id: %s in language: %s", user_id, language)
         response = table.query(
+            ConsistentRead=True,
             KeyConditionExpression=Key('PK').eq(f'USER#{user_id}#LANGUAGE#{language}')
         )
         sets = []
@@ -129,286 +100,159 @@ def get_sets(event, context):
                     'set_name': item.get('set_name'),
                     'set_description': item.get('set_description'),
                     'created_at': item.get('created_at'),
-                    'updated_at': item.get('updated_at')
+                    'updated_at': item.get('updated_at'),
+                    'card_count': item.get('card_count', 0),
+                    'total_characters': item.get('total_characters', 0),
+                    'last_card_update': item.get('last_card_update')
                 })
-        logger.info(f"Sets retrieved successfully: {sets}")
+        logger.info("Retrieved %s sets", len(sets))
+        logger.debug("Sets retrieved", extra=fields(sets=sets))
 
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET,POST,PUT,DELETE,OPTIONS',
-                'Access-Control-Allow-Headers': '*, Content-Type, Authorization',
-            },
-            'body': json.dumps({'sets': sets}, default=str)
-        }
+        return compressed_response(event, 200, {'sets': sets}, cache_headers(tag) if tag else None)
     except Exception as e:
-        logger.error(f"Error in get_sets: {str(e)}")
-        return {
-            'statusCode': 500,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET,POST,PUT,DELETE,OPTIONS',
-                'Access-Control-Allow-Headers': '*, Content-Type, Authorization',
-            },
-            'body': json.dumps({'error': 'Internal Server Error'})
-        }
+        logger.error("Error in get_sets: %s", e)
+        return json_response(500, {'error': 'Internal Server Error'})
 
+@instrument
+@require_auth
 def get_set(event, context):
     logger.info("starting get_set handler")
 
-    dynamodb = boto3.resource("dynamodb", region_name=os.environ["AWS_REGION"])
-    table = dynamodb.Table(os.environ["DYNAMODB_TABLE_NAME"])
+    table = get_table()
 
     try:
         user_id = event['queryStringParameters']['user_id']
         language = event['queryStringParameters']['language']
         set_id = event['queryStringParameters']['set_id']
-        logger.info(f"Received user_id: {user_id}, language: {language}, set_id: {set_id}")
+        logger.info("Received user_id: %s, language: %s, set_id: %s", user_id, language, set_id)
         if not user_id or not language or not set_id:
-            return {
-                'statusCode': 400,
-                'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET,POST,PUT,DELETE,OPTIONS',
-                'Access-Control-Allow-Headers': '*, Content-Type, Authorization',
-            },
-                'body': json.dumps({'error': 'User ID, language, and set ID are required'})
-            }
-        logger.info(f"Querying set for user_id: {user_id}, language: {language}, set_id: {set_id}")
-        response = table.get_item(
-            Key={
-                'PK': f'USER#{user_id}#LANGUAGE#{language}',
-                'SK': f'SET#{set_id}'
+            return json_response(400, {'error': 'User ID, language, and set ID are required'})
+        def load():
+            logger.info("Querying set for user_id: %s, language: %s, set_id: %s", user_id, language, set_id)
+            item = table.get_item(Key=versions.set_key(user_id, language, set_id)).get('Item')
+            if item is None:
+                return None, None
+            set_data = {
+                'set_name': item.get('set_name', ''),
+                'set_description': item.get('set_description', ''),
+                'created_at': item.get('created_at', ''),
+                'updated_at': item.get('updated_at', ''),
+                'card_count': item.get('card_count', 0),
+                'total_characters': item.get('total_characters', 0),
+                'last_card_update': item.get('last_card_update')
             }
+            return set_data, int(item.get(versions.VERSION_ATTRIBUTE, 0))
+
+        # Card writes bump the set's version, so cached counts are refreshed by revalidation.
+        set_data, outcome = cache.sets.get(
+            (user_id, language, set_id), load,
+            lambda: versions.read_version(table, versions.set_key(user_id, language, set_id))
         )
-        if 'Item' not in response:
-            logger.warning(f"Set not found for user_id: {user_id}, language: {language}, set_id: {set_id}")
-            return {
-                'statusCode': 404,
-                'headers': {
-                    'Access-Control-Allow-Origin': '*',
-                    'Access-Control-Allow-Methods': 'GET,POST,PUT,DELETE,OPTIONS',
-                    'Access-Control-Allow-Headers': '*, Content-Type, Authorization',
-                },
-                'body': json.dumps({'error': 'Set not found'})
-            }
-        set_data = response['Item']
-        set_data.pop('PK', None)
-        set_data.pop('SK', None)
-        logger.info(f"Set data retrieved: {set_data}")
+        if set_data is None:
+            logger.warning("Set not found for user_id: %s, language: %s, set_id: %s", user_id, language, set_id)
+            return json_response(404, {'error': 'Set not found'})
+        logger.info("Set data retrieved (cache %s)", outcome)
+        logger.debug("Set data", extra=fields(set=set_data))
 
-        set_description = set_data.get('set_description', '')
-        set_name = set_data.get('set_name', '')
-        created_at = set_data.get('created_at', '')
-        updated_at = set_data.get('updated_at', '')
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET,POST,PUT,DELETE,OPTIONS',
-                'Access-Control-Allow-Headers': '*, Content-Type, Authorization',
-            },
-            'body': json.dumps({'set_name': set_name, 'set_description': set_description, 'created_at': created_at, 'updated_at': updated_at}, default=str)
-        }
+        return json_response(200, set_data, {'X-Cache': outcome})
     except Exception as e:
-        logger.error(f"Error in get_set: {str(e)}")
-        return {
-            'statusCode': 500,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET,POST,PUT,DELETE,OPTIONS',
-                'Access-Control-Allow-Headers': '*, Content-Type, Authorization',
-            },
-            'body': json.dumps({'error': 'Internal Server Error'})
-        }
+        logger.error("Error in get_set: %s", e)
+        return json_response(500, {'error': 'Internal Server Error'})
     
+@instrument
+@require_auth
 def edit_set(event, context):
     if event['requestContext']['http']['method'] == 'OPTIONS':
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET,POST,PUT,DELETE,OPTIONS',
-                'Access-Control-Allow-Headers': '*',
-            },
-            'body': json.dumps({'message': 'CORS preflight response'})
-        }
+        return preflight()
     
     logger.info("starting edit_set handler")
 
-    dynamodb = boto3.resource("dynamodb", region_name=os.environ["AWS_REGION"])
-    table = dynamodb.Table(os.environ["DYNAMODB_TABLE_NAME"])
+    table = get_table()
 
     try:
-        body = json.loads(event['body'])
+        body = json_body(event)
 
         if not body:
-            return {
-                'statusCode': 400,
-                'headers': {
-                    'Access-Control-Allow-Origin': '*',
-                    'Access-Control-Allow-Methods': 'GET,POST,PUT,DELETE,OPTIONS',
-                    'Access-Control-Allow-Headers': '*, Content-Type, Authorization',
-                },
-                'body': json.dumps({'error': 'Request body is required'})
-            }
+            return json_response(400, {'error': 'Request body is required'})
         
-        logger.info(f"Received body for edit_set: {body}")
+        logger.debug("Received body for edit_set", extra=fields(body=body))
 
         user_id = event['queryStringParameters']['user_id']
         language = event['queryStringParameters']['language']
         set_id = event['queryStringParameters']['set_id']
 
-        logger.info(f"Received user_id: {user_id}, language: {language}, set_id: {set_id}")
+        logger.info("Received user_id: %s, language: %s, set_id: %s", user_id, language, set_id)
         if not user_id or not language or not set_id:
-            return {
-                'statusCode': 400,
-                'headers': {
-                    'Access-Control-Allow-Origin': '*',
-                    'Access-Control-Allow-Methods': 'GET,POST,PUT,DELETE,OPTIONS',
-                    'Access-Control-Allow-Headers': '*, Content-Type, Authorization',
-                },
-                'body': json.dumps({'error': 'User ID, language, and set ID are required'})
-            }
+            return json_response(400, {'error': 'User ID, language, and set ID are required'})
         
         set_name = body.get('set_name')
         set_description = body.get('set_description', '')
         if not set_name:
-            return {
-                'statusCode': 400,
-                'headers': {
-                    'Access-Control-Allow-Origin': '*',
-                    'Access-Control-Allow-Methods': 'GET,POST,PUT,DELETE,OPTIONS',
-                    'Access-Control-Allow-Headers': '*, Content-Type, Authorization',
-                },
-                'body': json.dumps({'error': 'Set name and description are required'})
-            }
+            return json_response(400, {'error': 'Set name and description are required'})
         
-        logger.info(f"Editing set: {set_id} for user: {user_id} in language: {language}")
-        response = table.update_item(
-            Key={
-                'PK': f'USER#{user_id}#LANGUAGE#{language}',
-                'SK': f'SET#{set_id}'
-            },
-            UpdateExpression="SET set_name = :sn, set_description = :sd, updated_at = :ua",
-            ExpressionAttributeValues={
-                ':sn': set_name,
-                ':sd': set_description,
-                ':ua': int(time.time())
-            },
-            ReturnValues="UPDATED_NEW"
-        )
-
-        if 'Attributes' not in response:
-            logger.warning(f"Set not found for user_id: {user_id}, language: {language}, set_id: {set_id}")
-            return {
-                'statusCode': 404,
-                'headers': {
-                    'Access-Control-Allow-Origin': '*',
-                    'Access-Control-Allow-Methods': 'GET,POST,PUT,DELETE,OPTIONS',
-                    'Access-Control-Allow-Headers': '*, Content-Type, Authorization',
-                },
-                'body': json.dumps({'error': 'Set not found'})
-            }
-        
-        updated_attributes = response.get('Attributes', {})
-        logger.info(f"Set updated successfully: {updated_attributes}")
-        updated_attributes.pop('PK', None)
-        updated_attributes.pop('SK', None)
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET,POST,PUT,DELETE,OPTIONS',
-                'Access-Control-Allow-Headers': '*, Content-Type, Authorization',
-            },
-            'body': json.dumps({
-                'message': 'Set updated successfully',
-                'updated_attributes': updated_attributes
-            }, default=str)
+        logger.info("Editing set: %s for user: %s in language: %s", set_id, user_id, language)
+        updated_attributes = {
+            'set_name': set_name,
+            'set_description': set_description,
+            'updated_at': int(time.time())
         }
+        try:
+            versions.transact([
+                versions.bump(table.name, versions.language_key(user_id, language)),
+                {'Update': {
+                    'TableName': table.name,
+                    'Key': {
+                        'PK': f'USER#{user_id}#LANGUAGE#{language}',
+                        'SK': f'SET#{set_id}'
+                    },
+                    'UpdateExpression': "SET set_name = :sn, set_description = :sd, updated_at = :ua ADD #v :one",
+                    'ConditionExpression': 'attribute_exists(PK)',
+                    'ExpressionAttributeNames': {'#v': versions.VERSION_ATTRIBUTE},
+                    'ExpressionAttributeValues': {
+                        ':sn': set_name,
+                        ':sd': set_description,
+                        ':ua': updated_attributes['updated_at'],
+                        ':one': 1
+                    }
+                }}
+            ], required=(0, 1))
+        except versions.ConditionFailed:
+            logger.warning("Set not found for user_id: %s, language: %s, set_id: %s", user_id, language, set_id)
+            return json_response(404, {'error': 'Set not found'})
+        cache.sets.invalidate(user_id, language, set_id)
+
+        logger.info("Set updated successfully")
+        logger.debug("Updated set", extra=fields(set=updated_attributes))
+        return json_response(200, {
+            'message': 'Set updated successfully',
+            'updated_attributes': updated_attributes
+        })
     except Exception as e:
-        logger.error(f"Error in edit_set: {str(e)}")
-        return {
-            'statusCode': 500,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET,POST,PUT,DELETE,OPTIONS',
-                'Access-Control-Allow-Headers': '*, Content-Type, Authorization',
-            },
-            'body': json.dumps({'error': 'Internal Server Error'})
-        }
+        logger.error("Error in edit_set: %s", e)
+        return json_response(500, {'error': 'Internal Server Error'})
     
+@instrument
+@require_auth
 def delete_set(event, context):
     logger.info("starting delete_set handler")
 
-    dynamodb = boto3.resource("dynamodb", region_name=os.environ["AWS_REGION"])
-    table = dynamodb.Table(os.environ["DYNAMODB_TABLE_NAME"])
-
     try:
         user_id = event['queryStringParameters']['user_id']
         language = event['queryStringParameters']['language']
         set_id = event['queryStringParameters']['set_id']
-        logger.info(f"Received user_id: {user_id}, language: {language}, set_id: {set_id}")
+        logger.info("Received user_id: %s, language: %s, set_id: %s", user_id, language, set_id)
         if not user_id or not language or not set_id:
-            return {
-                'statusCode': 400,
-                'headers': {
-                    'Access-Control-Allow-Origin': '*',
-                    'Access-Control-Allow-Methods': 'GET,POST,PUT,DELETE,OPTIONS',
-                    'Access-Control-Allow-Headers': '*, Content-Type, Authorization',
-                },
-                'body': json.dumps({'error': 'User ID, language, and set ID are required'})
-            }
-        items_to_delete = []
-
-        prefix = f"USER#{user_id}#LANGUAGE#{language}#SET#{set_id}"
-        logger.info(f"Scanning for items with PK starting with {prefix}")
+            return json_response(400, {'error': 'User ID, language, and set ID are required'})
+        logger.info("Deleting set %s and its flashcards for user %s in language %s", set_id, user_id, language)
+        deleted = cascade.delete_set(user_id, language, set_id)
+        versions.bump_after(versions.language_key(user_id, language))
+        cache.sets.invalidate(user_id, language, set_id)
 
-        # 1. Delete all flashcards and related items under this set
-        response1 = table.scan(
-            FilterExpression=Attr('PK').begins_with(prefix)
-        )
-        items_to_delete = response1.get('Items', [])
-
-        # 2. Delete the set metadata itself
-        logger.info(f"Scanning for set metadata with PK=USER#{user_id}#LANGUAGE#{language} and SK=SET#{set_id}")
-        response2 = table.scan(
-            FilterExpression=Attr('PK').eq(f'USER#{user_id}#LANGUAGE#{language}') & Attr('SK').eq(f'SET#{set_id}')
-        )
-        items_to_delete.extend(response2.get('Items', []))
+        logger.info("Successfully deleted %s items for set %s of user %s", deleted, set_id, user_id)
 
-        logger.info(f"Found total {len(items_to_delete)} items to delete for set {set_id}")
-
-        # Delete all collected items
-        for item in items_to_delete:
-            pk = item['PK']
-            sk = item['SK']
-            logger.info(f"Deleting item with PK={pk}, SK={sk}")
-            table.delete_item(Key={'PK': pk, 'SK': sk})
-
-        logger.info(f"Successfully deleted {len(items_to_delete)} items for set {set_id} of user {user_id}")
-
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET,POST,PUT,DELETE,OPTIONS',
-                'Access-Control-Allow-Headers': '*, Content-Type, Authorization',
-            },
-            'body': json.dumps({
-                'message': f"Deleted {len(items_to_delete)} items for set {set_id} of user {user_id}"
-            })
-        }
+        return json_response(200, {
+            'message': f"Deleted {deleted} items for set {set_id} of user {user_id}"
+        })
     except Exception as e:
-        logger.error(f"Error in delete_set: {str(e)}")
-        return {
-            'statusCode': 500,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET,POST,PUT,DELETE,OPTIONS',
-                'Access-Control-Allow-Headers': '*, Content-Type, Authorization',
-            },
-            'body': json.dumps({'error': 'Internal Server Error'})
-        }
\ No newline at end of file
+        logger.error("Error in delete_set: %s", e)
+        return json_response(500, {'error': 'Internal Server Error'})
\ No newline at end of file
@@ -1,150 +1,81 @@
-import json
-import boto3
-import os
 import logging
+import os
 import re 
-import bcrypt
-from boto3.dynamodb.conditions import Attr
+import time
+from common.auth import require_auth
+from common.db import get_table
+from common.metrics import instrument
+from common.responses import binary_response, compressed_response, json_body, json_response, preflight
+from common import cache, cascade, usernames, versions
 
-s3_client = boto3.client('s3')
 logger = logging.getLogger()
-logger.setLevel(logging.INFO)
 
 def hash_password(password):
     if (len(password) < 8 or not re.search(r'[A-Z]', password) or not re.search(r'\d', password) or not re.search(r'[!@#$%^&*(),.?":{}|<>]', password)):
         raise ValueError("Password must be at least 8 characters long, contain an uppercase letter, a number, and a special character")
     
+    # Only password changes hash, so the other routes never load bcrypt.
+    import bcrypt
     hashed = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
     return hashed.decode('utf-8')
 
 
+@instrument
+@require_auth
 def get_user(event, context):
     logger.info("starting get_user handler")
 
-    dynamodb = boto3.resource("dynamodb", region_name=os.environ["AWS_REGION"])
-    table = dynamodb.Table(os.environ["DYNAMODB_TABLE_NAME"])
+    table = get_table()
 
     try:
         user_id = event['queryStringParameters']['user_id']
-        logger.info(f"Received user_id: {user_id}")
+        logger.info("Received user_id: %s", user_id)
 
         if not user_id:
-            return {
-                'statusCode': 400,
-                'headers': {
-                    'Access-Control-Allow-Origin': '*',
-                    'Access-Control-Allow-Methods': 'GET,POST,PUT,DELETE,OPTIONS',
-                    'Access-Control-Allow-Headers': '*, Content-Type, Authorization',
-                },
-                'body': json.dumps({'error': 'User ID is required'})
-            }
+            return json_response(400, {'error': 'User ID is required'})
 
-        logger.info(f"Attempting to retrieve user with ID: {user_id}")
-        
-        response = table.get_item(
-            Key={
-                'PK': 'USER#' + user_id,
-                'SK': 'PROFILE'
-            }
+        def load():
+            logger.info("Attempting to retrieve user with ID: %s", user_id)
+            item = table.get_item(Key=versions.profile_key(user_id)).get('Item')
+            if item is None:
+                return None, None
+            profile = {field: item.get(field) for field in usernames.PROFILE_FIELDS}
+            return profile, int(item.get(versions.VERSION_ATTRIBUTE, 0))
+
+        profile, outcome = cache.profiles.get(
+            (user_id,), load, lambda: versions.read_version(table, versions.profile_key(user_id))
         )
+        logger.info("Profile for user %s: cache %s", user_id, outcome)
 
-        logger.info(f"Retrieved response")
+        if profile is None:
+            return json_response(404, {'error': 'User not found'})
 
-        if 'Item' not in response:
-            return {
-                'statusCode': 404,
-                'headers': {
-                    'Access-Control-Allow-Origin': '*',
-                    'Access-Control-Allow-Methods': 'GET,POST,PUT,DELETE,OPTIONS',
-                    'Access-Control-Allow-Headers': '*, Content-Type, Authorization',
-                },
-                'body': json.dumps({'error': 'User not found'})
-            }
-        
-        user_data = response['Item']
-        user_data.pop('hashed_password', None)
-        user_data.pop('SK', None)
-        user_data.pop('PK', None)
-        logger.info(f"User data retrieved: {user_data}")
-
-        username = user_data.get('username')
-        preferred_language = user_data.get('preferred_language')
-        first_name = user_data.get('first_name')
-        last_name = user_data.get('last_name')
-        created_at = user_data.get('created_at')
-        last_login = user_data.get('last_login')
-
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET,POST,PUT,DELETE,OPTIONS',
-                'Access-Control-Allow-Headers': '*, Content-Type, Authorization',
-            },
-            'body': json.dumps({'username': username,
-                                'preferred_language': preferred_language,
-                                'first_name': first_name,
-                                'last_name': last_name,
-                                'created_at': created_at,
-                                'last_login': last_login}, 
-                                default=str)
-        }
+        return json_response(200, profile, {'X-Cache': outcome})
     except Exception as e:
-        logger.error(f'Error in get_user: {str(e)}')
-        return {
-            'statusCode': 500,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET,POST,PUT,DELETE,OPTIONS',
-                'Access-Control-Allow-Headers': '*, Content-Type, Authorization',
-            },
-            'body': json.dumps({'error': 'Internal Server Error'})
-        }
+        logger.error('Error in get_user: %s', e)
+        return json_response(500, {'error': 'Internal Server Error'})
     
+@instrument
+@require_auth
 def edit_user(event, context):
     if event['requestContext']['http']['method'] == 'OPTIONS':
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET,POST,PUT,DELETE,OPTIONS',
-                'Access-Control-Allow-Headers': '*',
-            },
-            'body': json.dumps({'message': 'CORS preflight response'})
-        }
+        return preflight()
     
     logger.info("starting edit_user handler")
 
-    dynamodb = boto3.resource("dynamodb", region_name=os.environ["AWS_REGION"])
-    table = dynamodb.Table(os.environ["DYNAMODB_TABLE_NAME"])
+    table = get_table()
 
     try:
-        body = json.loads(event['body'])
-        logger.info(f"Received body for edit_user")
+        body = json_body(event)
+        logger.info("Received body for edit_user")
 
         user_id = event['queryStringParameters']['user_id']
-        logger.info(f"Received user_id: {user_id}")
+        logger.info("Received user_id: %s", user_id)
         if not user_id:
-            return {
-                'statusCode': 400,
-                'headers': {
-                    'Access-Control-Allow-Origin': '*',
-                    'Access-Control-Allow-Methods': 'GET,POST,PUT,DELETE,OPTIONS',
-                    'Access-Control-Allow-Headers': '*, Content-Type, Authorization',
-                },
-                'body': json.dumps({'error': 'User ID is required'})
-            }
+            return json_response(400, {'error': 'User ID is required'})
         
         if not body:
-            return {
-                'statusCode': 400,
-                'headers': {
-                    'Access-Control-Allow-Origin': '*',
-                    'Access-Control-Allow-Methods': 'GET,POST,PUT,DELETE,OPTIONS',
-                    'Access-Control-Allow-Headers': '*, Content-Type, Authorization',
-                },
-                'body': json.dumps({'error': 'Request body is required'})
-            }
+            return json_response(400, {'error': 'Request body is required'})
         
         first_name = body.get('first_name')
         last_name = body.get('last_name')
@@ -153,15 +84,7 @@ def edit_user(event, context):
         password = body.get('password')
 
         if not first_name or not last_name or not preferred_language or not username:
-            return {
-                'statusCode': 400,
-                'headers': {
-                    'Access-Control-Allow-Origin': '*',
-                    'Access-Control-Allow-Methods': 'GET,POST,PUT,DELETE,OPTIONS',
-                    'Access-Control-Allow-Headers': '*, Content-Type, Authorization',
-                },
-                'body': json.dumps({'error': 'All fields are required'})
-            }
+            return json_response(400, {'error': 'All fields are required'})
         
         username = username.lower()
 
@@ -172,16 +95,8 @@ def edit_user(event, context):
                 hashed_password = hash_password(password)
                 logger.info("Password hashed successfully")
             except ValueError as ve:
-                logger.warning(f"Invalid password: {str(ve)}")
-                return {
-                    'statusCode': 400,
-                    'headers': {
-                        'Access-Control-Allow-Origin': '*',
-                        'Access-Control-Allow-Methods': 'GET,POST,PUT,DELETE,OPTIONS',
-                        'Access-Control-Allow-Headers': '*, Content-Type, Authorization',
-                    },
-                    'body': json.dumps({'error': str(ve)})
-                }
+                logger.warning("Invalid password: %s", ve)
+                return json_response(400, {'error': str(ve)})
             
         update_expression = "set first_name=:f, last_name=:l, preferred_language=:p, username=:u"
         expression_values = {
@@ -194,116 +109,170 @@ def edit_user(event, context):
         if hashed_password:
             update_expression += ", hashed_password=:hp"
             expression_values[':hp'] = hashed_password
+        update_expression += " ADD #v :one"
+        expression_values[':one'] = 1
 
-        response = table.update_item(
+        profile = table.get_item(
             Key={
                 'PK': 'USER#' + user_id,
                 'SK': 'PROFILE'
             },
-            UpdateExpression=update_expression,
-            ExpressionAttributeValues=expression_values,
-            ReturnValues="UPDATED_NEW"
-        )
-        updated_attributes = response.get('Attributes', {})
-
-        if 'Attributes' not in response:
-            logger.warning(f"User with ID {user_id} not found")
-            return {
-                'statusCode': 404,
-                'headers': {
-                    'Access-Control-Allow-Origin': '*',
-                    'Access-Control-Allow-Methods': 'GET,POST,PUT,DELETE,OPTIONS',
-                    'Access-Control-Allow-Headers': '*, Content-Type, Authorization',
+            ProjectionExpression='username, hashed_password',
+            ConsistentRead=True
+        ).get('Item')
+
+        if not profile:
+            logger.warning("User with ID %s not found", user_id)
+            return json_response(404, {'error': 'User not found'})
+
+        profile_update = {
+            'Update': {
+                'TableName': table.name,
+                'Key': {
+                    'PK': 'USER#' + user_id,
+                    'SK': 'PROFILE'
                 },
-                'body': json.dumps({'error': 'User not found'})
+                'UpdateExpression': update_expression,
+                'ConditionExpression': 'attribute_exists(PK)',
+                'ExpressionAttributeNames': {'#v': versions.VERSION_ATTRIBUTE},
+                'ExpressionAttributeValues': expression_values
             }
+        }
 
-        updated_attributes.pop('hashed_password', None)
+        # The username reservation item has to move, or pick up the new password
+        # hash, in the same transaction as the profile.
+        old_username = profile.get('username')
+        if username != old_username:
+            logger.info("Moving username reservation from %s to %s", old_username, username)
+            items = [usernames.claim(table.name, username, user_id, hashed_password or profile['hashed_password'])]
+            if old_username:
+                items.append(usernames.release(table.name, old_username, user_id))
+            items.append(profile_update)
+        elif hashed_password:
+            items = [usernames.set_password(table.name, username, user_id, hashed_password), profile_update]
+        else:
+            items = None
 
-        logger.info(f"User updated successfully: {response}")
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET,POST,PUT,DELETE,OPTIONS',
-                'Access-Control-Allow-Headers': '*, Content-Type, Authorization',
-            },
-            'body': json.dumps({
-                'message': 'User updated successfully',
-                'updated_attributes': updated_attributes
-            }, default=str)
+        try:
+            if items:
+                usernames.transact(items, claim_index=0 if username != old_username else None)
+            else:
+                update = dict(profile_update['Update'])
+                del update['TableName']
+                table.update_item(**update)
+        except usernames.UsernameTaken:
+            return json_response(409, {'error': 'Username already exists'})
+        cache.profiles.invalidate(user_id)
+
+        updated_attributes = {
+            'first_name': first_name,
+            'last_name': last_name,
+            'preferred_language': preferred_language,
+            'username': username
         }
+
+        logger.info("User %s updated successfully", user_id)
+        return json_response(200, {
+            'message': 'User updated successfully',
+            'updated_attributes': updated_attributes
+        })
     except Exception as e:
-        logger.error(f'Error in edit_user: {str(e)}')
-        return {
-            'statusCode': 500,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET,POST,PUT,DELETE,OPTIONS',
-                'Access-Control-Allow-Headers': '*, Content-Type, Authorization',
-            },
-            'body': json.dumps({'error': 'Internal Server Error'})
-        }
+        logger.error('Error in edit_user: %s', e)
+        return json_response(500, {'error': 'Internal Server Error'})
 
+@instrument
+@require_auth
 def delete_user(event, context):        
     logger.info("starting delete_user handler")
 
-    dynamodb = boto3.resource("dynamodb", region_name=os.environ["AWS_REGION"])
-    table = dynamodb.Table(os.environ["DYNAMODB_TABLE_NAME"])
-    
     try:
         user_id = event['queryStringParameters']['user_id']
-        logger.info(f"Recieved user_id: {user_id}")
+        logger.info("Recieved user_id: %s", user_id)
         if not user_id:
-            return {
-                'statusCode': 400,
-                'headers': {
-                    'Access-Control-Allow-Origin': '*',
-                    'Access-Control-Allow-Methods': 'GET,POST,PUT,DELETE,OPTIONS',
-                    'Access-Control-Allow-Headers': '*, Content-Type, Authorization',
-                },
-                'body': json.dumps({'error': 'User ID is required'})
-            }
+            return json_response(400, {'error': 'User ID is required'})
 
-        logger.info(f"Scanning for all items with PK = USER#{user_id} or PK starts with USER#{user_id}#")
-
-        # Scan for all PKs: exact match and those that begin with the prefix
-        response = table.scan(
-            FilterExpression=Attr('PK').eq(f'USER#{user_id}') | Attr('PK').begins_with(f'USER#{user_id}#')
-        )
+        logger.info("Deleting all languages, sets and flashcards for user %s", user_id)
+        deleted = cascade.delete_user(user_id)
+        cache.invalidate_user(user_id)
 
-        items = response.get('Items', [])
-        logger.info(f"Found {len(items)} items to delete for user {user_id}")
-
-        # Delete all matching items
-        for item in items:
-            pk = item['PK']
-            sk = item['SK']
-            logger.info(f"Deleting item with PK={pk}, SK={sk}")
-            table.delete_item(Key={'PK': pk, 'SK': sk})
-
-        logger.info(f"Successfully deleted {len(items)} items for user {user_id}")
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET,POST,PUT,DELETE,OPTIONS',
-                'Access-Control-Allow-Headers': '*, Content-Type, Authorization',
-            },
-            'body': json.dumps({
-                'message': f"Deleted {len(items)} items for user {user_id}"
-            }, default=str)
-        }
+        logger.info("Successfully deleted %s items for user %s", deleted, user_id)
+        return json_response(200, {
+            'message': f"Deleted {deleted} items for user {user_id}"
+        })
     except Exception as e:
-        logger.error(f'Error in delete_user: {str(e)}')
-        return {
-            'statusCode': 500,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET,POST,PUT,DELETE,OPTIONS',
-                'Access-Control-Allow-Headers': '*, Content-Type, Authorization',
-            },
-            'body': json.dumps({'error': 'Internal Server Error'})
-        }
+        logger.error('Error in delete_user: %s', e)
+        return json_response(500, {'error': 'Internal Server Error'})
         
     
+
+@instrument
+@require_auth
+def get_dashboard(event, context):
+    logger.info("starting get_dashboard handler")
+
+    try:
+        params = event['queryStringParameters']
+        user_id = params['user_id']
+        logger.info("Received user_id: %s", user_id)
+        if not user_id:
+            return json_response(400, {'error': 'User ID is required'})
+
+        from common import dashboard
+        include_counts = (params.get('include_counts') or 'false').lower() == 'true'
+        data = dashboard.load(user_id, include_counts=include_counts)
+        if data is None:
+            return json_response(404, {'error': 'User not found'})
+
+        timings = data['timings_ms']
+        server_timing = f"profile;dur={timings['profile_and_languages']}, total;dur={timings['total']}"
+        return compressed_response(event, 200, data, {'Server-Timing': server_timing})
+    except Exception as e:
+        logger.error('Error in get_dashboard: %s', e)
+        return json_response(500, {'error': 'Internal Server Error'})
+
+
+@instrument
+@require_auth
+def export_user_data(event, context):
+    logger.info("starting export_user_data handler")
+
+    try:
+        params = event['queryStringParameters']
+        user_id = params['user_id']
+        logger.info("Received user_id: %s", user_id)
+        if not user_id:
+            return json_response(400, {'error': 'User ID is required'})
+
+        # Export and dashboard are imported by the routes that use them, not at init.
+        from common import export
+        compress = params.get('compress', 'true').lower() != 'false'
+        counts = {}
+
+        def counted(records):
+            for record in records:
+                counts[record['type']] = counts.get(record['type'], 0) + 1
+                yield record
+
+        chunks = export.iter_ndjson(counted(export.iter_records(user_id)), compress=compress)
+        bucket = os.environ.get('EXPORT_BUCKET')
+
+        if not bucket:
+            # Local development has no export bucket, so the file comes back inline.
+            headers = {'Content-Type': 'application/x-ndjson'}
+            if compress:
+                headers['Content-Encoding'] = 'gzip'
+            return binary_response(200, b''.join(chunks), headers)
+
+        key = f"exports/{user_id}/{int(time.time())}.ndjson" + ('.gz' if compress else '')
+        size = export.upload_to_s3(chunks, bucket, key, compress=compress)
+        logger.info("Exported %s records (%s bytes) for user %s to %s", sum(counts.values()), size, user_id, key)
+
+        return json_response(200, {
+            'message': 'Export created successfully',
+            'url': export.presigned_url(bucket, key),
+            'records': counts,
+            'bytes': size
+        })
+    except Exception as e:
+        logger.error('Error in export_user_data: %s', e)
+        return json_response(500, {'error': 'Internal Server Error'})
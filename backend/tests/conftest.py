@@ -1,39 +1,78 @@
+import json
 import pytest
 from moto import mock_aws
-import boto3
+import jwt
 import os
+import sys
+import time
 os.environ['DYNAMODB_TABLE_NAME'] = 'LangoApp'
 os.environ['JWT_SECRET'] = 'testsecret'
+os.environ.setdefault('AWS_REGION', 'us-east-1')
+# STORAGE_BACKEND=dynamodb runs the suite against moto instead of the in-memory table.
+os.environ.setdefault('STORAGE_BACKEND', 'memory')
+
+# Each Lambda zip ships the shared modules at its root, so make them importable the same way here
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'lambdas'))
 
 from lambdas.auth import handler
+from common import auth, cache, db, search
 
 @pytest.fixture(scope="function")
 def dynamodb_mock():
     with mock_aws(config={"dynamodb": {}}):
+        db.reset()
+        auth.clear_cache()
+        search.clear_cache()
+        cache.clear_all()
 
-        dynamodb = boto3.resource('dynamodb', region_name='us-east-1')
-        table = dynamodb.create_table(
-            TableName='LangoApp',
-            KeySchema=[
-                {'AttributeName': 'PK', 'KeyType': 'HASH'},
-                {'AttributeName': 'SK', 'KeyType': 'RANGE'}
-            ],
-            AttributeDefinitions=[
-                {'AttributeName': 'PK', 'AttributeType': 'S'},
-                {'AttributeName': 'SK', 'AttributeType': 'S'},
-                {'AttributeName': 'username', 'AttributeType': 'S'}
-            ],
-            GlobalSecondaryIndexes=[
-                {
-                    'IndexName': 'UsernameIndex',
-                    'KeySchema': [{'AttributeName': 'username', 'KeyType': 'HASH'}],
-                    'Projection': {'ProjectionType': 'ALL'},
-                    'ProvisionedThroughput': {'ReadCapacityUnits': 1, 'WriteCapacityUnits': 1}
-                }
-            ],
-            ProvisionedThroughput={'ReadCapacityUnits': 2, 'WriteCapacityUnits': 2}
-        )
-
-        table.meta.client.get_waiter('table_exists').wait(TableName='LangoApp')
+        table = db.create_table('LangoApp')
         yield table
 
+
+def make_token(user_id, expires_in=3600):
+    return jwt.encode({'user_id': user_id, 'username': 'testuser', 'exp': int(time.time()) + expires_in}, 'testsecret', algorithm='HS256')
+
+
+@pytest.fixture
+def auth_headers():
+    def headers(user_id='123'):
+        return {'authorization': f'Bearer {make_token(user_id)}'}
+    return headers
+
+
+@pytest.fixture
+def language():
+    """Language of the set seed_set creates and card_event addresses; a module can override it."""
+    return 'korean'
+
+
+@pytest.fixture
+def seed_set(dynamodb_mock, language):
+    def seed(set_id='abc'):
+        dynamodb_mock.put_item(Item={'PK': 'USER#123', 'SK': f'LANGUAGE#{language}', 'language': language})
+        dynamodb_mock.put_item(Item={'PK': f'USER#123#LANGUAGE#{language}', 'SK': f'SET#{set_id}', 'set_name': 'Basics'})
+    return seed
+
+
+@pytest.fixture
+def event():
+    """Builds an API Gateway v2 event for user 123; params become query string parameters."""
+    def build(headers, body=None, method='GET', route=None, **params):
+        query = {'user_id': '123'}
+        query.update(params)
+        return {
+            'routeKey': route,
+            'queryStringParameters': query,
+            'headers': headers,
+            'body': json.dumps(body) if body is not None else None,
+            'requestContext': {'http': {'method': method}},
+        }
+    return build
+
+
+@pytest.fixture
+def card_event(event, language):
+    """An event addressed to the set seed_set creates."""
+    def build(headers, body=None, method='POST', **params):
+        return event(headers, body, method, **dict({'language': language, 'set_id': 'abc'}, **params))
+    return build
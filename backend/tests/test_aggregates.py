@@ -0,0 +1,78 @@
+import json
+from lambdas.flashcard import handler
+from lambdas.set import handler as set_handler
+from common import aggregates
+
+SET_KEY = {'PK': 'USER#123#LANGUAGE#korean', 'SK': 'SET#abc'}
+
+
+def set_item(table):
+    return table.get_item(Key=SET_KEY)['Item']
+
+
+def test_card_writes_maintain_set_aggregates(dynamodb_mock, auth_headers, seed_set, card_event):
+    seed_set()
+
+    added = handler.add_flashcard(card_event(auth_headers(), {'word': 'abc', 'translated_word': 'de'}), None)
+    flashcard_id = json.loads(added['body'])['flashcard_id']
+    handler.add_flashcards(card_event(auth_headers(), {'flashcards': [
+        {'word': 'x', 'translated_word': 'y'},
+        {'word': 'long', 'translated_word': 'longer'},
+    ]}), None)
+    assert set_item(dynamodb_mock)['card_count'] == 3
+    assert set_item(dynamodb_mock)['total_characters'] == 5 + 2 + 10
+
+    edited = handler.edit_flashcard(card_event(auth_headers(), {
+        'word': 'a', 'usage': 'u', 'translated_word': 'b', 'translated_usage': 'v'
+    }, method='PUT', flashcard_id=flashcard_id), None)
+    assert edited['statusCode'] == 200
+    assert set_item(dynamodb_mock)['total_characters'] == 4 + 2 + 10
+
+    handler.delete_flashcard(card_event(auth_headers(), flashcard_id=flashcard_id), None)
+    handler.delete_flashcard(card_event(auth_headers(), flashcard_id=flashcard_id), None)
+    item = set_item(dynamodb_mock)
+    assert item['card_count'] == 2
+    assert item['total_characters'] == 12
+    assert item['last_card_update'] > 0
+
+    sets = json.loads(set_handler.get_sets(card_event(auth_headers()), None)['body'])['sets']
+    assert sets[0]['card_count'] == 2
+
+
+def test_edit_missing_flashcard_is_not_found(dynamodb_mock, auth_headers, seed_set, card_event):
+    seed_set()
+    response = handler.edit_flashcard(card_event(auth_headers(), {
+        'word': 'a', 'usage': 'u', 'translated_word': 'b', 'translated_usage': 'v'
+    }, method='PUT', flashcard_id='missing'), None)
+    assert response['statusCode'] == 404
+    assert 'card_count' not in set_item(dynamodb_mock)
+
+
+def test_edits_with_non_string_fields_are_rejected(dynamodb_mock, auth_headers, seed_set, card_event):
+    seed_set()
+    added = handler.add_flashcard(card_event(auth_headers(), {'word': 'abc', 'translated_word': 'de'}), None)
+    flashcard_id = json.loads(added['body'])['flashcard_id']
+
+    response = handler.edit_flashcard(card_event(auth_headers(), {
+        'word': 'a', 'usage': ['u'], 'translated_word': 'b', 'translated_usage': 'v'
+    }, method='PUT', flashcard_id=flashcard_id), None)
+    rejected = handler.add_flashcard(card_event(auth_headers(), {'word': 7, 'translated_word': 'de'}), None)
+
+    assert response['statusCode'] == 400
+    assert json.loads(response['body'])['error'] == 'usage must be a string'
+    assert rejected['statusCode'] == 400
+    assert set_item(dynamodb_mock)['total_characters'] == 5
+
+
+def test_recompute_repairs_drifted_aggregates(dynamodb_mock, seed_set):
+    seed_set()
+    for i in range(3):
+        dynamodb_mock.put_item(Item={
+            'PK': 'USER#123#LANGUAGE#korean#SET#abc', 'SK': f'FLASHCARD#{i}',
+            'word': 'ab', 'translated_word': 'c', 'updated_at': 100 + i
+        })
+    dynamodb_mock.update_item(Key=SET_KEY, UpdateExpression='SET card_count = :n', ExpressionAttributeValues={':n': 99})
+
+    assert aggregates.repair_all() == 1
+    item = set_item(dynamodb_mock)
+    assert (item['card_count'], item['total_characters'], item['last_card_update']) == (3, 9, 102)
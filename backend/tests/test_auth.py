@@ -1,4 +1,5 @@
 import json
+import time
 from unittest.mock import patch
 from lambdas.auth import handler
 
@@ -13,16 +14,18 @@ def test_signup_success(dynamodb_mock):
         })
     }
 
-    # simulating no existing user
-    with patch.object(dynamodb_mock, 'query', return_value={'Items': []}), \
-         patch.object(dynamodb_mock, 'put_item', return_value=None), \
-         patch('lambdas.auth.handler.generate_jwt', return_value='fake_jwt_token'): # need to create fake as func depends on jwt secret
+    with patch('lambdas.auth.handler.generate_jwt', return_value='fake_jwt_token'): # need to create fake as func depends on jwt secret
         response = handler.signup(event, None)
         body = json.loads(response['body'])
         assert response['statusCode'] == 201
         assert 'token' in body
         assert body['message'] == 'User created successfully'
 
+    reservation = dynamodb_mock.get_item(Key={'PK': 'USERNAME#testuser', 'SK': 'USERNAME'})['Item']
+    assert reservation['user_id'] == body['user_id']
+    profile = dynamodb_mock.get_item(Key={'PK': 'USER#' + body['user_id'], 'SK': 'PROFILE'})['Item']
+    assert profile['username'] == 'testuser'
+
 def test_signup_missing_fields(dynamodb_mock):
     event = {'body': json.dumps({'username': 'user'})}  # missing fields
 
@@ -45,6 +48,12 @@ def test_login_success(dynamodb_mock):
         'created_at': 1234567890,
         'last_login': 1234567890
     })
+    dynamodb_mock.put_item(Item={
+        'PK': 'USERNAME#testuser',
+        'SK': 'USERNAME',
+        'user_id': '123',
+        'hashed_password': password_hash
+    })
 
     event = {
         'body': json.dumps({
@@ -69,6 +78,12 @@ def test_login_invalid_password(dynamodb_mock):
         'username': 'testuser',
         'hashed_password': password_hash
     })
+    dynamodb_mock.put_item(Item={
+        'PK': 'USERNAME#testuser',
+        'SK': 'USERNAME',
+        'user_id': '123',
+        'hashed_password': password_hash
+    })
 
     event = {
         'body': json.dumps({
@@ -111,7 +126,13 @@ def test_signup_weak_password(dynamodb_mock):
     assert 'Password must be at least 8 characters' in body['error']
 
 def test_signup_username_already_exists(dynamodb_mock):
-    # pre-inserting the user
+    # pre-inserting the user and its username reservation
+    dynamodb_mock.put_item(Item={
+        'PK': 'USERNAME#existinguser',
+        'SK': 'USERNAME',
+        'user_id': 'existing',
+        'hashed_password': 'hash'
+    })
     dynamodb_mock.put_item(Item={
         'PK': 'USER#existing',
         'SK': 'PROFILE',
@@ -149,3 +170,74 @@ def test_login_malformed_json(dynamodb_mock):
     response = handler.login(event, None)
     assert response['statusCode'] == 500
     assert 'error' in json.loads(response['body'])
+
+def test_signup_same_username_twice_conflicts(dynamodb_mock):
+    event = {
+        'body': json.dumps({
+            'username': 'Twice',
+            'password': 'StrongPass1#',
+            'first_name': 'Test',
+            'last_name': 'User',
+            'preferred_language': 'English'
+        })
+    }
+
+    assert handler.signup(event, None)['statusCode'] == 201
+    response = handler.signup(event, None)
+    assert response['statusCode'] == 409
+    profiles = [item for item in dynamodb_mock.scan()['Items'] if item['SK'] == 'PROFILE']
+    assert len(profiles) == 1
+
+def seed_login_user(table, last_login):
+    password_hash = handler.hash_password('StrongPass1#')
+    table.put_item(Item={
+        'PK': 'USER#123',
+        'SK': 'PROFILE',
+        'user_id': '123',
+        'username': 'testuser',
+        'hashed_password': password_hash,
+        'last_login': last_login
+    })
+    table.put_item(Item={
+        'PK': 'USERNAME#testuser',
+        'SK': 'USERNAME',
+        'user_id': '123',
+        'hashed_password': password_hash
+    })
+    handler._recent_logins.clear()
+
+
+def test_login_skips_recent_last_login_write(dynamodb_mock):
+    recent = int(time.time()) - 10
+    seed_login_user(dynamodb_mock, recent)
+    event = {'body': json.dumps({'username': 'testuser', 'password': 'StrongPass1#'})}
+
+    response = handler.login(event, None)
+
+    assert response['statusCode'] == 200
+    profile = dynamodb_mock.get_item(Key={'PK': 'USER#123', 'SK': 'PROFILE'})['Item']
+    assert profile['last_login'] == recent
+
+
+def test_login_writes_stale_last_login_once_per_window(dynamodb_mock):
+    seed_login_user(dynamodb_mock, 1234567890)
+    table = handler.get_table()
+
+    assert handler.record_login(table, '123') is True
+    with patch.object(table, 'update_item') as update_item:
+        assert handler.record_login(table, '123') is False
+        update_item.assert_not_called()
+    profile = dynamodb_mock.get_item(Key={'PK': 'USER#123', 'SK': 'PROFILE'})['Item']
+    assert profile['last_login'] > 1234567890
+
+
+def test_login_deferred_last_login_write(dynamodb_mock):
+    seed_login_user(dynamodb_mock, 1234567890)
+    event = {'body': json.dumps({'username': 'testuser', 'password': 'StrongPass1#'})}
+
+    with patch.object(handler, 'LAST_LOGIN_DEFERRED', True):
+        response = handler.login(event, None)
+
+    assert response['statusCode'] == 200
+    profile = dynamodb_mock.get_item(Key={'PK': 'USER#123', 'SK': 'PROFILE'})['Item']
+    assert profile['last_login'] > 1234567890
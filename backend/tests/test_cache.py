@@ -0,0 +1,167 @@
+import json
+from lambdas.language import handler as language_handler
+from lambdas.set import handler as set_handler
+from lambdas.user import handler as user_handler
+from common import cache, versions
+from common.cache import ReadThroughCache
+
+SET_KEY = {'PK': 'USER#123#LANGUAGE#korean', 'SK': 'SET#abc'}
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+
+def expire(*caches):
+    for entry_cache in caches:
+        for entry in entry_cache._entries.values():
+            entry.expires = 0
+
+
+def test_entries_expire_and_revalidate_against_version():
+    clock = Clock()
+    values = ReadThroughCache('test', ttl=10, clock=clock)
+    loads = []
+    current = {'version': 1}
+
+    def load():
+        loads.append(1)
+        return f"v{current['version']}", current['version']
+
+    def version():
+        return current['version']
+
+    assert values.get(('a',), load, version) == ('v1', cache.MISS)
+    assert values.get(('a',), load, version) == ('v1', cache.HIT)
+    clock.now = 11
+    assert values.get(('a',), load, version) == ('v1', cache.REVALIDATED)
+    clock.now = 22
+    current['version'] = 2
+    assert values.get(('a',), load, version) == ('v2', cache.MISS)
+    assert len(loads) == 2
+    assert values.stats() == {'hits': 1, 'misses': 2, 'revalidations': 1, 'evictions': 0,
+                              'invalidations': 0, 'entries': 1}
+
+
+def test_revalidating_caches_check_the_version_on_every_read():
+    values = ReadThroughCache('test', ttl=10, clock=Clock(), revalidate=True)
+    current = {'version': 1}
+
+    def load():
+        return f"v{current['version']}", current['version']
+
+    def version():
+        return current['version']
+
+    assert values.get(('a',), load, version) == ('v1', cache.MISS)
+    assert values.get(('a',), load, version) == ('v1', cache.REVALIDATED)
+    current['version'] = 2
+    assert values.get(('a',), load, version) == ('v2', cache.MISS)
+    # Without a version to check, entries are still served for their TTL.
+    assert values.get(('b',), lambda: ('b', 0)) == ('b', cache.MISS)
+    assert values.get(('b',), lambda: ('b2', 0)) == ('b', cache.HIT)
+
+
+def test_least_recently_used_entry_is_evicted_and_missing_values_are_not_cached():
+    values = ReadThroughCache('test', ttl=10, max_entries=2, clock=Clock())
+    for key in ('a', 'b'):
+        values.get((key,), lambda: (key, 0))
+    values.get(('a',), lambda: ('reloaded', 0))
+    values.get(('c',), lambda: ('c', 0))
+
+    assert values.get(('a',), lambda: ('reloaded', 0)) == ('a', cache.HIT)
+    assert values.get(('b',), lambda: ('b2', 0)) == ('b2', cache.MISS)
+    assert values.get(('gone',), lambda: (None, None)) == (None, cache.MISS)
+    assert values.get(('gone',), lambda: ('back', 1)) == ('back', cache.MISS)
+    assert values.stats()['evictions'] == 3
+
+
+def test_invalidate_drops_entries_by_key_prefix():
+    values = ReadThroughCache('test', ttl=10, clock=Clock())
+    for key in (('u1', 'korean', 's1'), ('u1', 'korean', 's2'), ('u1', 'french', 's3'), ('u2', 'korean', 's1')):
+        values.get(key, lambda: ('value', 0))
+
+    assert values.invalidate('u1', 'korean') == 2
+    assert values.invalidate('u1') == 1
+    assert values.stats()['entries'] == 1
+
+
+def test_get_set_is_served_from_cache_until_a_write(dynamodb_mock, auth_headers, event):
+    dynamodb_mock.put_item(Item={'PK': 'USER#123', 'SK': 'LANGUAGE#korean', 'language': 'korean'})
+    dynamodb_mock.put_item(Item=dict(SET_KEY, set_name='Basics'))
+    params = {'language': 'korean', 'set_id': 'abc'}
+
+    first = set_handler.get_set(event(auth_headers(), **params), None)
+    second = set_handler.get_set(event(auth_headers(), **params), None)
+    assert first['headers']['X-Cache'] == 'miss'
+    assert second['headers']['X-Cache'] == 'hit'
+    assert json.loads(second['body'])['set_name'] == 'Basics'
+
+    edited = set_handler.edit_set(event(auth_headers(), {'set_name': 'Renamed'}, method='PUT', **params), None)
+    assert edited['statusCode'] == 200
+    third = set_handler.get_set(event(auth_headers(), **params), None)
+    assert third['headers']['X-Cache'] == 'miss'
+    assert json.loads(third['body'])['set_name'] == 'Renamed'
+
+
+def test_writes_from_another_container_are_seen_after_the_ttl(dynamodb_mock, auth_headers, event):
+    dynamodb_mock.put_item(Item={'PK': 'USER#123', 'SK': 'PROFILE', 'username': 'tester'})
+    dynamodb_mock.put_item(Item={'PK': 'USER#123', 'SK': 'LANGUAGE#korean', 'language': 'korean'})
+
+    user_handler.get_user(event(auth_headers()), None)
+    language_handler.get_languages(event(auth_headers()), None)
+    assert user_handler.get_user(event(auth_headers()), None)['headers']['X-Cache'] == 'hit'
+
+    expire(cache.profiles, cache.languages)
+    assert user_handler.get_user(event(auth_headers()), None)['headers']['X-Cache'] == 'revalidated'
+    assert language_handler.get_languages(event(auth_headers()), None)['headers']['X-Cache'] == 'revalidated'
+
+    # Another container writes a language and bumps the profile version.
+    dynamodb_mock.put_item(Item={'PK': 'USER#123', 'SK': 'LANGUAGE#french', 'language': 'french'})
+    versions.bump_after(versions.profile_key('123'))
+    cached = language_handler.get_languages(event(auth_headers()), None)
+    assert json.loads(cached['body'])['languages'] == ['korean']
+
+    expire(cache.languages)
+    fresh = language_handler.get_languages(event(auth_headers()), None)
+    assert fresh['headers']['X-Cache'] == 'miss'
+    assert json.loads(fresh['body'])['languages'] == ['french', 'korean']
+
+
+def test_revalidating_every_read_sees_writes_from_another_container_at_once(
+        dynamodb_mock, auth_headers, monkeypatch, event):
+    for entry_cache in cache.CACHES:
+        monkeypatch.setattr(entry_cache, 'revalidate', True)
+    dynamodb_mock.put_item(Item={'PK': 'USER#123', 'SK': 'PROFILE', 'username': 'tester'})
+    dynamodb_mock.put_item(Item={'PK': 'USER#123', 'SK': 'LANGUAGE#korean', 'language': 'korean'})
+
+    user_handler.get_user(event(auth_headers()), None)
+    language_handler.get_languages(event(auth_headers()), None)
+
+    # Unchanged versions keep the cached values without reloading them.
+    assert user_handler.get_user(event(auth_headers()), None)['headers']['X-Cache'] == 'revalidated'
+    assert language_handler.get_languages(event(auth_headers()), None)['headers']['X-Cache'] == 'revalidated'
+
+    # Another container (edit_user and add_language run in the user and
+    # language functions) writes a language and bumps the profile version.
+    dynamodb_mock.put_item(Item={'PK': 'USER#123', 'SK': 'LANGUAGE#french', 'language': 'french'})
+    versions.bump_after(versions.profile_key('123'))
+    fresh = language_handler.get_languages(event(auth_headers()), None)
+    assert fresh['headers']['X-Cache'] == 'miss'
+    assert json.loads(fresh['body'])['languages'] == ['french', 'korean']
+
+
+def test_language_writes_invalidate_the_language_list(dynamodb_mock, auth_headers, event):
+    dynamodb_mock.put_item(Item={'PK': 'USER#123', 'SK': 'PROFILE', 'username': 'tester'})
+    language_handler.get_languages(event(auth_headers()), None)
+
+    language_handler.add_language(event(auth_headers(), {'language': 'Korean'}, method='POST'), None)
+    response = language_handler.get_languages(event(auth_headers()), None)
+
+    assert response['headers']['X-Cache'] == 'miss'
+    assert json.loads(response['body'])['languages'] == ['korean']
+    assert versions.read_version(dynamodb_mock, versions.profile_key('123')) == 1
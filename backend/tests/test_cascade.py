@@ -0,0 +1,97 @@
+import json
+from unittest.mock import MagicMock, patch
+from lambdas.set import handler as set_handler
+from lambdas.language import handler as language_handler
+from lambdas.user import handler as user_handler
+from common import batch, cascade, db
+
+
+def seed_user(table):
+    with table.batch_writer() as writer:
+        writer.put_item(Item={'PK': 'USER#123', 'SK': 'PROFILE', 'username': 'testuser'})
+        for language in ('korean', 'kor'):
+            writer.put_item(Item={'PK': 'USER#123', 'SK': f'LANGUAGE#{language}', 'language': language})
+            for set_id in ('s1', 's2'):
+                writer.put_item(Item={'PK': f'USER#123#LANGUAGE#{language}', 'SK': f'SET#{set_id}', 'set_name': set_id})
+                for i in range(30):
+                    writer.put_item(Item={
+                        'PK': f'USER#123#LANGUAGE#{language}#SET#{set_id}',
+                        'SK': f'FLASHCARD#{i}',
+                        'word': f'word{i}'
+                    })
+        writer.put_item(Item={'PK': 'USER#456', 'SK': 'PROFILE', 'username': 'otheruser'})
+
+
+def remaining(table):
+    return {(item['PK'], item['SK']) for item in table.scan()['Items']}
+
+
+def test_delete_set_only_removes_that_set(dynamodb_mock, auth_headers):
+    seed_user(dynamodb_mock)
+    event = {'queryStringParameters': {'user_id': '123', 'language': 'korean', 'set_id': 's1'}, 'headers': auth_headers()}
+
+    with patch.object(db.get_client(), 'scan', side_effect=AssertionError('scan used')):
+        response = set_handler.delete_set(event, None)
+
+    assert response['statusCode'] == 200
+    assert 'Deleted 31 items' in json.loads(response['body'])['message']
+    items = remaining(dynamodb_mock)
+    assert ('USER#123#LANGUAGE#korean', 'SET#s1') not in items
+    assert not any(pk == 'USER#123#LANGUAGE#korean#SET#s1' for pk, _ in items)
+    assert ('USER#123#LANGUAGE#korean', 'SET#s2') in items
+
+
+def test_delete_language_does_not_touch_prefix_sibling(dynamodb_mock, auth_headers):
+    seed_user(dynamodb_mock)
+    event = {'queryStringParameters': {'user_id': '123', 'language': 'kor'}, 'headers': auth_headers()}
+
+    response = language_handler.delete_language(event, None)
+
+    assert response['statusCode'] == 200
+    items = remaining(dynamodb_mock)
+    assert not any(pk.startswith('USER#123#LANGUAGE#kor#') or pk == 'USER#123#LANGUAGE#kor' for pk, _ in items)
+    assert ('USER#123', 'LANGUAGE#kor') not in items
+    assert ('USER#123', 'LANGUAGE#korean') in items
+    assert ('USER#123#LANGUAGE#korean#SET#s1', 'FLASHCARD#0') in items
+
+
+def test_delete_user_removes_whole_hierarchy(dynamodb_mock, auth_headers):
+    seed_user(dynamodb_mock)
+    event = {'queryStringParameters': {'user_id': '123'}, 'headers': auth_headers()}
+
+    response = user_handler.delete_user(event, None)
+
+    assert response['statusCode'] == 200
+    assert remaining(dynamodb_mock) == {('USER#456', 'PROFILE')}
+
+
+def test_set_postings_are_deleted_a_page_at_a_time(dynamodb_mock, monkeypatch):
+    seed_user(dynamodb_mock)
+    client = db.get_client()
+    query = client.query
+    deletes = []
+    monkeypatch.setattr(client, 'query', lambda **kwargs: query(**dict(kwargs, Limit=4)))
+    monkeypatch.setattr(cascade, '_delete_keys', lambda client, table_name, keys: deletes.append(len(keys)) or len(keys))
+
+    deleted = cascade._delete_postings(client, 'LangoApp', '123', 'korean', 's1')
+
+    # 30 cards of one token each, read 4 cards to a page.
+    assert deleted == 30
+    assert deletes == [4] * 7 + [2]
+
+
+def test_batch_write_retries_unprocessed_items():
+    requests = [batch.delete_request({'PK': 'P', 'SK': str(i)}) for i in range(30)]
+    client = MagicMock()
+    client.batch_write_item.side_effect = [
+        {'UnprocessedItems': {'LangoApp': requests[20:25]}},
+        {'UnprocessedItems': {}},
+        {'UnprocessedItems': {}},
+    ]
+
+    with patch('common.batch.time.sleep'):
+        unprocessed = batch.batch_write(client, 'LangoApp', requests)
+
+    assert unprocessed == []
+    calls = client.batch_write_item.call_args_list
+    assert [len(call.kwargs['RequestItems']['LangoApp']) for call in calls] == [25, 5, 5]
@@ -0,0 +1,27 @@
+import json
+import os
+import subprocess
+import sys
+import pytest
+
+LAMBDAS = os.path.join(os.path.dirname(__file__), '..', 'lambdas')
+
+
+def modules_after_import(zip_name):
+    """Modules loaded by importing a zip's handler in a fresh interpreter, laid out as Lambda runs it."""
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([os.path.join(LAMBDAS, zip_name), LAMBDAS]))
+    output = subprocess.run(
+        [sys.executable, '-c', 'import json, sys, handler; print(json.dumps(sorted(sys.modules)))'],
+        cwd=os.path.join(LAMBDAS, zip_name), env=env, capture_output=True, text=True, check=True
+    ).stdout
+    return set(json.loads(output))
+
+
+@pytest.mark.parametrize('zip_name, deferred', [
+    ('auth', {'jwt'}),
+    ('user', {'common.dashboard', 'common.export', 'jwt'}),
+    ('set', {'jwt', 'cryptography'}),
+    ('flashcard', {'common.importer', 'common.reviews', 'jwt'}),
+])
+def test_route_specific_modules_are_not_loaded_at_init(zip_name, deferred):
+    assert not deferred & modules_after_import(zip_name)
@@ -0,0 +1,60 @@
+import base64
+import gzip
+import json
+import boto3
+from unittest.mock import patch
+from lambdas.user import handler
+from common import export
+
+
+def seed(table):
+    with table.batch_writer() as writer:
+        writer.put_item(Item={'PK': 'USER#123', 'SK': 'PROFILE', 'user_id': '123', 'username': 'testuser', 'hashed_password': 'secret', 'created_at': 1234567890})
+        for language in ('korean', 'spanish'):
+            writer.put_item(Item={'PK': 'USER#123', 'SK': f'LANGUAGE#{language}', 'language': language})
+            for set_id in ('s1', 's2', 's3'):
+                writer.put_item(Item={'PK': f'USER#123#LANGUAGE#{language}', 'SK': f'SET#{set_id}', 'set_name': set_id})
+                for i in range(7):
+                    writer.put_item(Item={
+                        'PK': f'USER#123#LANGUAGE#{language}#SET#{set_id}',
+                        'SK': f'FLASHCARD#{i}',
+                        'word': f'단어{i}',
+                        'translated_word': f'word{i}'
+                    })
+
+
+def test_export_user_data_inline_gzip(dynamodb_mock, monkeypatch, auth_headers):
+    seed(dynamodb_mock)
+    monkeypatch.delenv('EXPORT_BUCKET', raising=False)
+
+    with patch.object(export, 'PAGE_SIZE', 3), patch.object(export, 'PREFETCH_SETS', 2):
+        response = handler.export_user_data({'queryStringParameters': {'user_id': '123'}, 'headers': auth_headers()}, None)
+
+    assert response['statusCode'] == 200
+    assert response['headers']['Content-Encoding'] == 'gzip'
+    lines = gzip.decompress(base64.b64decode(response['body'])).decode('utf-8').splitlines()
+    records = [json.loads(line) for line in lines]
+
+    assert records[0] == {'type': 'profile', 'user_id': '123', 'username': 'testuser', 'created_at': 1234567890}
+    assert [r['type'] for r in records].count('flashcard') == 42
+    sets = [(r['language'], r['set_id']) for r in records if r['type'] == 'set']
+    assert sets == [(language, s) for language in ('korean', 'spanish') for s in ('s1', 's2', 's3')]
+    first_set = records.index({'type': 'set', 'language': 'korean', 'set_id': 's1', 'set_name': 's1'})
+    assert records[first_set + 1]['word'] == '단어0'
+
+
+def test_export_user_data_uploads_to_s3(dynamodb_mock, monkeypatch, auth_headers):
+    seed(dynamodb_mock)
+    s3 = boto3.client('s3', region_name='us-east-1')
+    s3.create_bucket(Bucket='lango-exports')
+    monkeypatch.setenv('EXPORT_BUCKET', 'lango-exports')
+
+    response = handler.export_user_data({'queryStringParameters': {'user_id': '123', 'compress': 'false'}, 'headers': auth_headers()}, None)
+    body = json.loads(response['body'])
+
+    assert response['statusCode'] == 200
+    assert body['records'] == {'profile': 1, 'language': 2, 'set': 6, 'flashcard': 42}
+    key = s3.list_objects_v2(Bucket='lango-exports')['Contents'][0]['Key']
+    data = s3.get_object(Bucket='lango-exports', Key=key)['Body'].read()
+    assert len(data.splitlines()) == 51
+    assert body['bytes'] == len(data)
@@ -0,0 +1,181 @@
+import base64
+import gzip
+import json
+from lambdas.flashcard import handler
+from common import responses
+
+PK = 'USER#123#LANGUAGE#korean#SET#abc'
+
+
+def seed_flashcards(table, count):
+    with table.batch_writer() as batch:
+        for i in range(count):
+            batch.put_item(Item={
+                'PK': PK,
+                'SK': f'FLASHCARD#{i:04d}',
+                'word': f'word{i}',
+                'usage': f'usage{i}',
+                'translated_word': f'translated{i}',
+                'translated_usage': f'translated usage{i}',
+                'created_at': 1234567890,
+                'updated_at': 1234567890
+            })
+
+
+def flashcards_event(headers, **params):
+    query = {'user_id': '123', 'language': 'korean', 'set_id': 'abc'}
+    query.update(params)
+    return {'queryStringParameters': query, 'headers': headers}
+
+
+def test_get_flashcards_pages_with_cursor(dynamodb_mock, auth_headers):
+    seed_flashcards(dynamodb_mock, 5)
+
+    response = handler.get_flashcards(flashcards_event(auth_headers(), limit='2'), None)
+    body = json.loads(response['body'])
+    assert response['statusCode'] == 200
+    assert [f['word'] for f in body['flashcards']] == ['word0', 'word1']
+    assert body['next_cursor']
+
+    seen = [f['word'] for f in body['flashcards']]
+    cursor = body['next_cursor']
+    while cursor:
+        body = json.loads(handler.get_flashcards(flashcards_event(auth_headers(), limit='2', cursor=cursor), None)['body'])
+        seen.extend(f['word'] for f in body['flashcards'])
+        cursor = body['next_cursor']
+    assert seen == [f'word{i}' for i in range(5)]
+
+
+def test_get_flashcards_drains_all_pages_without_limit(dynamodb_mock, auth_headers):
+    seed_flashcards(dynamodb_mock, 30)
+
+    response = handler.get_flashcards(flashcards_event(auth_headers()), None)
+    body = json.loads(response['body'])
+    assert response['statusCode'] == 200
+    assert len(body['flashcards']) == 30
+    assert body['next_cursor'] is None
+
+
+def test_get_flashcards_rejects_tampered_cursor(dynamodb_mock, auth_headers):
+    seed_flashcards(dynamodb_mock, 3)
+    body = json.loads(handler.get_flashcards(flashcards_event(auth_headers(), limit='1'), None)['body'])
+
+    response = handler.get_flashcards(flashcards_event(auth_headers(), limit='1', cursor=body['next_cursor'] + 'x'), None)
+    assert response['statusCode'] == 400
+
+
+def test_get_flashcards_rejects_cursor_from_other_set(dynamodb_mock, auth_headers):
+    seed_flashcards(dynamodb_mock, 3)
+    body = json.loads(handler.get_flashcards(flashcards_event(auth_headers(), limit='1'), None)['body'])
+
+    response = handler.get_flashcards(flashcards_event(auth_headers(), set_id='other', limit='1', cursor=body['next_cursor']), None)
+    assert response['statusCode'] == 400
+
+
+def test_add_flashcards_reports_per_card_results(auth_headers, seed_set):
+    cards = [{'word': f'word{i}', 'translated_word': f'translated{i}'} for i in range(30)]
+    cards.insert(3, {'word': 'missing translation'})
+    event = {
+        'queryStringParameters': {'user_id': '123', 'language': 'korean', 'set_id': 'abc'},
+        'headers': auth_headers(),
+        'body': json.dumps({'flashcards': cards})
+    }
+
+    seed_set()
+    response = handler.add_flashcards(event, None)
+    body = json.loads(response['body'])
+    assert response['statusCode'] == 200
+    assert body['created'] == 30
+    assert body['failed'] == 1
+    assert body['results'][3] == {'index': 3, 'error': 'Word and translated word are required'}
+
+    stored = json.loads(handler.get_flashcards(flashcards_event(auth_headers()), None)['body'])['flashcards']
+    assert {f['flashcard_id'] for f in stored} == {r['flashcard_id'] for r in body['results'] if 'flashcard_id' in r}
+
+
+def test_add_flashcards_requires_array(dynamodb_mock, auth_headers):
+    event = {
+        'queryStringParameters': {'user_id': '123', 'language': 'korean', 'set_id': 'abc'},
+        'headers': auth_headers(),
+        'body': json.dumps({'flashcards': []})
+    }
+
+    response = handler.add_flashcards(event, None)
+    assert response['statusCode'] == 400
+
+
+def test_get_flashcards_gzips_large_pages(dynamodb_mock, auth_headers):
+    seed_flashcards(dynamodb_mock, 50)
+    headers = dict(auth_headers(), **{'accept-encoding': 'gzip, deflate'})
+
+    response = handler.get_flashcards(flashcards_event(headers), None)
+    assert response['statusCode'] == 200
+    assert response['isBase64Encoded'] is True
+    assert response['headers']['Content-Encoding'] == 'gzip'
+    body = json.loads(gzip.decompress(base64.b64decode(response['body'])))
+    assert len(body['flashcards']) == 50
+
+
+def test_get_flashcards_skips_compression_for_small_pages(dynamodb_mock, auth_headers):
+    seed_flashcards(dynamodb_mock, 1)
+    headers = dict(auth_headers(), **{'accept-encoding': 'gzip'})
+
+    response = handler.get_flashcards(flashcards_event(headers), None)
+    assert 'Content-Encoding' not in response['headers']
+    assert response['headers']['Vary'] == 'Accept-Encoding'
+    assert len(json.loads(response['body'])['flashcards']) == 1
+
+
+def test_accepted_encoding_honours_q_values():
+    def negotiate(value):
+        return responses.accepted_encoding({'headers': {'Accept-Encoding': value}})
+
+    assert negotiate('deflate, gzip;q=0.5') == 'deflate'
+    assert negotiate('gzip;q=0, deflate;q=0') is None
+    assert negotiate('identity') is None
+    assert negotiate('*') in responses.ENCODERS
+    assert responses.accepted_encoding({'headers': None}) is None
+
+
+def test_get_flashcards_answers_not_modified_until_a_write(dynamodb_mock, auth_headers, seed_set):
+    seed_set()
+    seed_flashcards(dynamodb_mock, 3)
+
+    first = handler.get_flashcards(flashcards_event(auth_headers()), None)
+    tag = first['headers']['ETag']
+    assert first['statusCode'] == 200
+
+    headers = dict(auth_headers(), **{'if-none-match': tag})
+    cached = handler.get_flashcards(flashcards_event(headers), None)
+    assert cached['statusCode'] == 304
+    assert cached['body'] == ''
+
+    deleted = handler.delete_flashcard(flashcards_event(auth_headers(), flashcard_id='0000'), None)
+    assert deleted['statusCode'] == 200
+
+    fresh = handler.get_flashcards(flashcards_event(headers), None)
+    assert fresh['statusCode'] == 200
+    assert fresh['headers']['ETag'] != tag
+    assert len(json.loads(fresh['body'])['flashcards']) == 2
+
+
+def test_add_flashcard_to_missing_set_is_not_found(dynamodb_mock, auth_headers):
+    event = flashcards_event(auth_headers())
+    event['body'] = json.dumps({'word': 'a', 'translated_word': 'b'})
+
+    response = handler.add_flashcard(event, None)
+    assert response['statusCode'] == 404
+    assert dynamodb_mock.scan()['Items'] == []
+
+
+def test_bulk_adds_into_a_missing_set_are_not_found(dynamodb_mock, auth_headers):
+    event = {
+        'queryStringParameters': {'user_id': '123', 'language': 'korean', 'set_id': 'abc'},
+        'headers': auth_headers(),
+        'body': json.dumps({'flashcards': [{'word': 'word', 'translated_word': 'translated'}]})
+    }
+
+    assert handler.add_flashcards(event, None)['statusCode'] == 404
+    event['body'] = 'word,translated_word\nword,translated\n'
+    assert handler.import_flashcards(event, None)['statusCode'] == 404
+    assert dynamodb_mock.query(KeyConditionExpression='PK = :pk', ExpressionAttributeValues={':pk': PK})['Count'] == 0
@@ -0,0 +1,78 @@
+import base64
+import io
+import json
+import pytest
+from lambdas.flashcard import handler
+from common import importer
+
+
+def parse(data, **kwargs):
+    return list(importer.parse_flashcards(io.BytesIO(data), **kwargs))
+
+
+def test_parse_csv_with_header_and_quoted_fields():
+    data = 'translation,word,example\n"hello, there",안녕,"안녕, 친구"\nbye,잘 가,\n'.encode('utf-8')
+
+    rows = parse(data)
+
+    assert [line for line, _, _ in rows] == [2, 3]
+    assert rows[0][1] == {'translated_word': 'hello, there', 'word': '안녕', 'usage': '안녕, 친구'}
+    assert rows[1][1]['usage'] is None
+    assert all(error is None for _, _, error in rows)
+
+
+def test_parse_tsv_positional_columns_reports_bad_rows():
+    data = b'gato\tcat\nperro\n\npez\tfish\tel pez nada\n'
+
+    rows = parse(data)
+
+    assert [(line, card['word'], error) for line, card, error in rows] == [
+        (1, 'gato', None),
+        (2, 'perro', 'Word and translated word are required'),
+        (4, 'pez', None),
+    ]
+    assert rows[2][1]['usage'] == 'el pez nada'
+
+
+def test_parse_anki_export_strips_html():
+    data = b'#separator:tab\n#html:true\n#columns:Front\tBack\nchat<br>noir\t<b>black</b> cat\n'
+
+    rows = parse(data)
+
+    assert rows == [(4, {'word': 'chat\nnoir', 'translated_word': 'black cat'}, None)]
+
+
+def test_parse_detects_legacy_encodings():
+    data = 'caf\xe9,coffee\n'.encode('cp1252')
+
+    assert parse(data)[0][1]['word'] == 'caf\xe9'
+    assert parse(b'\xef\xbb\xbfperro,dog\n')[0][1]['word'] == 'perro'
+
+
+def test_parse_rejects_unknown_column():
+    with pytest.raises(importer.InvalidImport):
+        parse(b'a,b\n', columns=['word', 'nonsense'])
+
+
+def test_import_flashcards_handler_writes_rows(dynamodb_mock, auth_headers, seed_set):
+    lines = ['word,translated_word'] + [f'word{i},translated{i}' for i in range(60)] + ['only a word,']
+    event = {
+        'queryStringParameters': {'user_id': '123', 'language': 'korean', 'set_id': 'abc'},
+        'headers': auth_headers(),
+        'body': base64.b64encode('\n'.join(lines).encode('utf-8')).decode('ascii'),
+        'isBase64Encoded': True
+    }
+
+    seed_set()
+
+    response = handler.import_flashcards(event, None)
+    body = json.loads(response['body'])
+
+    assert response['statusCode'] == 200
+    assert body['imported'] == 60
+    assert body['errors'] == [{'line': 62, 'error': 'Word and translated word are required'}]
+    stored = dynamodb_mock.query(
+        KeyConditionExpression='PK = :pk AND begins_with(SK, :card)',
+        ExpressionAttributeValues={':pk': 'USER#123#LANGUAGE#korean#SET#abc', ':card': 'FLASHCARD#'}
+    )
+    assert stored['Count'] == 60
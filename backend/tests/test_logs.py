@@ -0,0 +1,99 @@
+import io
+import json
+import logging
+import pytest
+from lambdas.auth import handler as auth_handler
+from lambdas.set import handler as set_handler
+from common import logs
+from common.logs import fields
+
+logger = logging.getLogger()
+
+
+@pytest.fixture
+def lines(monkeypatch):
+    stream = io.StringIO()
+    monkeypatch.setattr(logs._handler, 'stream', stream)
+    return lambda: [json.loads(line) for line in stream.getvalue().splitlines()]
+
+
+def test_lines_carry_request_context_and_payloads_stay_out(dynamodb_mock, auth_headers, lines, event):
+    dynamodb_mock.put_item(Item={'PK': 'USER#123', 'SK': 'LANGUAGE#korean', 'language': 'korean'})
+
+    response = set_handler.add_set(event(auth_headers(), {'set_name': 'Basics'}, method='POST', route='POST /addSet', language='korean'), None)
+
+    assert response['statusCode'] == 201
+    written = lines()
+    assert written
+    assert all(line['route'] == 'POST /addSet' and line['function'] == 'add_set' for line in written)
+    assert written[-1]['user_id'] == '123'
+    assert not any(line['message'] == 'Received body' for line in written)
+
+
+def test_debug_lines_are_written_when_the_request_fails(lines):
+    logs.start_request(route='GET /getSets')
+    logger.debug('Received body', extra=fields(body={'set_name': 'Basics'}))
+    logger.info('Working')
+    logs.end_request(failed=True)
+
+    logs.start_request(route='GET /getSets')
+    logger.debug('Not kept')
+    logs.end_request()
+
+    assert [line['message'] for line in lines()] == ['Working', 'Received body']
+
+
+def test_sampled_requests_write_debug_lines(monkeypatch, lines):
+    monkeypatch.setattr(logs, 'PAYLOAD_SAMPLE_RATE', 1.0)
+    logs.start_request(route='GET /getSets')
+    logger.debug('Sets retrieved', extra=fields(sets=[{'set_name': 'Basics'}]))
+    logs.end_request()
+
+    [line] = lines()
+    assert line['sets'] == [{'set_name': 'Basics'}]
+
+
+def test_sensitive_fields_are_redacted_and_long_ones_truncated(monkeypatch, lines):
+    monkeypatch.setattr(logs, 'MAX_FIELD_CHARS', 100)
+    logger.warning('Signup failed for %s', 'tester', extra=fields(
+        body={'username': 'tester', 'password': 'Password1!', 'nested': [{'token': 'abc'}]}, usage='x' * 150))
+
+    [line] = lines()
+    assert line['message'] == 'Signup failed for tester'
+    assert line['body'] == {'username': 'tester', 'password': '[REDACTED]', 'nested': [{'token': '[REDACTED]'}]}
+    assert line['usage'] == 'x' * 100 + '... (150 chars)'
+
+
+def test_library_debug_lines_are_never_buffered_or_flushed(lines):
+    botocore = logging.getLogger('botocore.endpoint')
+    logs.start_request(route='POST /signup')
+    assert not botocore.isEnabledFor(logging.DEBUG)
+    # Even if a library logger is turned down to DEBUG, its lines stay out of the buffer.
+    botocore.setLevel(logging.DEBUG)
+    try:
+        botocore.debug('Making request with params: %s', {'hashed_password': '$2b$12$...'})
+        logger.debug('Received body')
+        logs.end_request(failed=True)
+    finally:
+        botocore.setLevel(logging.NOTSET)
+
+    assert [line['message'] for line in lines()] == ['Received body']
+
+
+def test_failed_signup_flushes_no_library_lines(dynamodb_mock, monkeypatch, lines):
+    transact = auth_handler.usernames.transact
+
+    def written_then_failed(items):
+        transact(items)
+        raise RuntimeError('lost the response')
+
+    monkeypatch.setattr(auth_handler.usernames, 'transact', written_then_failed)
+    response = auth_handler.signup({'body': json.dumps({
+        'username': 'tester', 'password': 'Password1!', 'first_name': 'T', 'last_name': 'U',
+        'preferred_language': 'english'
+    }), 'requestContext': {'http': {'method': 'POST'}}}, None)
+
+    assert response['statusCode'] == 500
+    written = lines()
+    assert written[-1]['level'] == 'ERROR'
+    assert not any('hashed_password' in json.dumps(line) or '$2b$' in json.dumps(line) for line in written)
@@ -0,0 +1,201 @@
+import pytest
+from decimal import Decimal
+from boto3.dynamodb.conditions import Attr, Key
+from botocore.exceptions import ClientError
+from common import db
+
+# These run on whichever backend the suite uses, so STORAGE_BACKEND=dynamodb
+# checks the in-memory table against moto's behaviour.
+
+
+def error_code(excinfo):
+    return excinfo.value.response['Error']['Code']
+
+
+def test_items_round_trip_with_decimal_numbers(dynamodb_mock):
+    dynamodb_mock.put_item(Item={'PK': 'P', 'SK': 'S', 'count': 3, 'tags': {'a', 'b'}, 'nested': {'list': [1, 'x']}})
+
+    item = dynamodb_mock.get_item(Key={'PK': 'P', 'SK': 'S'})['Item']
+
+    assert item == {'PK': 'P', 'SK': 'S', 'count': Decimal(3), 'tags': {'a', 'b'}, 'nested': {'list': [Decimal(1), 'x']}}
+    item['nested']['list'].append('mutated')
+    assert dynamodb_mock.get_item(Key={'PK': 'P', 'SK': 'S'})['Item']['nested']['list'] == [Decimal(1), 'x']
+    assert 'Item' not in dynamodb_mock.get_item(Key={'PK': 'P', 'SK': 'missing'})
+
+
+def test_query_orders_by_sort_key_and_pages_with_limit(dynamodb_mock):
+    for sk in ('B#2', 'A#1', 'B#1', 'C#1'):
+        dynamodb_mock.put_item(Item={'PK': 'P', 'SK': sk})
+    dynamodb_mock.put_item(Item={'PK': 'other', 'SK': 'B#0'})
+
+    condition = Key('PK').eq('P') & Key('SK').begins_with('B#')
+    first = dynamodb_mock.query(KeyConditionExpression=condition, Limit=1)
+    rest = dynamodb_mock.query(KeyConditionExpression=condition, ExclusiveStartKey=first['LastEvaluatedKey'])
+    backwards = dynamodb_mock.query(KeyConditionExpression=Key('PK').eq('P'), ScanIndexForward=False)
+
+    assert [item['SK'] for item in first['Items']] == ['B#1']
+    assert first['LastEvaluatedKey'] == {'PK': 'P', 'SK': 'B#1'}
+    assert [item['SK'] for item in rest['Items']] == ['B#2']
+    assert 'LastEvaluatedKey' not in rest
+    assert [item['SK'] for item in backwards['Items']] == ['C#1', 'B#2', 'B#1', 'A#1']
+
+
+def test_filter_and_projection_apply_after_the_key_condition(dynamodb_mock):
+    for number in range(4):
+        dynamodb_mock.put_item(Item={'PK': 'P', 'SK': f'S#{number}', 'n': number, 'word': f'w{number}'})
+
+    response = dynamodb_mock.query(
+        KeyConditionExpression=Key('PK').eq('P'),
+        FilterExpression=Attr('n').gte(2),
+        ProjectionExpression='#w',
+        ExpressionAttributeNames={'#w': 'word'}
+    )
+
+    assert response['Items'] == [{'word': 'w2'}, {'word': 'w3'}]
+    assert response['Count'] == 2
+    assert response['ScannedCount'] == 4
+
+
+def test_sparse_index_holds_only_items_with_its_keys(dynamodb_mock):
+    dynamodb_mock.put_item(Item={'PK': 'P', 'SK': 'A', 'due_user': 'U', 'due_at': 30, 'word': 'late', 'extra': 'x'})
+    dynamodb_mock.put_item(Item={'PK': 'P', 'SK': 'B', 'due_user': 'U', 'due_at': 10, 'word': 'early'})
+    dynamodb_mock.put_item(Item={'PK': 'P', 'SK': 'C', 'word': 'unscheduled'})
+
+    response = dynamodb_mock.query(IndexName='DueIndex', KeyConditionExpression=Key('due_user').eq('U') & Key('due_at').lte(20))
+    everything = dynamodb_mock.query(IndexName='DueIndex', KeyConditionExpression=Key('due_user').eq('U'), Limit=1)
+
+    assert response['Items'] == [{'PK': 'P', 'SK': 'B', 'due_user': 'U', 'due_at': Decimal(10), 'word': 'early'}]
+    assert everything['LastEvaluatedKey'] == {'PK': 'P', 'SK': 'B', 'due_user': 'U', 'due_at': Decimal(10)}
+    rest = dynamodb_mock.query(IndexName='DueIndex', KeyConditionExpression=Key('due_user').eq('U'),
+                               ExclusiveStartKey=everything['LastEvaluatedKey'])
+    assert [item['word'] for item in rest['Items']] == ['late']
+    assert 'extra' not in rest['Items'][0]
+
+
+def test_update_expressions_set_add_and_remove(dynamodb_mock):
+    client = db.get_client()
+    dynamodb_mock.put_item(Item={'PK': 'P', 'SK': 'S', 'stale': 'x', 'count': 1})
+
+    response = client.update_item(
+        TableName='LangoApp',
+        Key={'PK': 'P', 'SK': 'S'},
+        UpdateExpression='set #n = if_not_exists(#n, :zero) + :one, created = :now REMOVE stale ADD #c :one, tags :tags',
+        ExpressionAttributeNames={'#n': 'visits', '#c': 'count'},
+        ExpressionAttributeValues={':zero': 0, ':one': 1, ':now': 100, ':tags': {'a'}},
+        ReturnValues='ALL_NEW'
+    )
+
+    assert response['Attributes'] == {
+        'PK': 'P', 'SK': 'S', 'visits': Decimal(1), 'created': Decimal(100), 'count': Decimal(2), 'tags': {'a'}
+    }
+    created = client.update_item(TableName='LangoApp', Key={'PK': 'P', 'SK': 'new'},
+                                 UpdateExpression='ADD version :one', ExpressionAttributeValues={':one': 1})
+    assert 'Attributes' not in created
+    assert dynamodb_mock.get_item(Key={'PK': 'P', 'SK': 'new'})['Item']['version'] == 1
+
+
+def test_invalid_requests_are_rejected_like_dynamodb(dynamodb_mock):
+    client = db.get_client()
+    key = {'PK': 'P', 'SK': 'S'}
+    dynamodb_mock.put_item(Item=dict(key, n=1))
+
+    invalid = [
+        dict(UpdateExpression='SET PK = :v', ExpressionAttributeValues={':v': 'x'}),
+        dict(UpdateExpression='SET n = :v', ExpressionAttributeValues={':v': 1, ':unused': 2}),
+        dict(UpdateExpression='SET n = :missing', ExpressionAttributeValues={':v': 1}),
+        dict(UpdateExpression='SET n = :v REMOVE n', ExpressionAttributeValues={':v': 1}),
+    ]
+    for arguments in invalid:
+        with pytest.raises(ClientError) as excinfo:
+            client.update_item(TableName='LangoApp', Key=key, **arguments)
+        assert error_code(excinfo) == 'ValidationException'
+
+    with pytest.raises(ClientError) as excinfo:
+        client.get_item(TableName='LangoApp', Key={'PK': 'P'})
+    assert error_code(excinfo) == 'ValidationException'
+
+    for oversized in ({'PK': 'P' * 2049, 'SK': 'S'}, {'PK': 'P', 'SK': 'S' * 1025}):
+        with pytest.raises(ClientError) as excinfo:
+            dynamodb_mock.put_item(Item=oversized)
+        assert error_code(excinfo) == 'ValidationException'
+    dynamodb_mock.put_item(Item={'PK': 'P' * 2048, 'SK': 'S' * 1024})
+
+
+def test_conditional_writes_fail_without_changing_the_item(dynamodb_mock):
+    client = db.get_client()
+    dynamodb_mock.put_item(Item={'PK': 'P', 'SK': 'S', 'owner': 'a'})
+
+    with pytest.raises(ClientError) as excinfo:
+        client.put_item(TableName='LangoApp', Item={'PK': 'P', 'SK': 'S', 'owner': 'b'},
+                        ConditionExpression='attribute_not_exists(PK)')
+    assert error_code(excinfo) == 'ConditionalCheckFailedException'
+
+    with pytest.raises(ClientError) as excinfo:
+        client.delete_item(TableName='LangoApp', Key={'PK': 'P', 'SK': 'S'},
+                           ConditionExpression='#o = :o', ExpressionAttributeNames={'#o': 'owner'},
+                           ExpressionAttributeValues={':o': 'b'})
+    assert error_code(excinfo) == 'ConditionalCheckFailedException'
+    assert dynamodb_mock.get_item(Key={'PK': 'P', 'SK': 'S'})['Item']['owner'] == 'a'
+
+
+def test_cancelled_transactions_write_nothing_and_report_each_item(dynamodb_mock):
+    client = db.get_client()
+    dynamodb_mock.put_item(Item={'PK': 'P', 'SK': 'taken'})
+
+    with pytest.raises(ClientError) as excinfo:
+        client.transact_write_items(TransactItems=[
+            {'Put': {'TableName': 'LangoApp', 'Item': {'PK': 'P', 'SK': 'new'}}},
+            {'Put': {'TableName': 'LangoApp', 'Item': {'PK': 'P', 'SK': 'taken'},
+                     'ConditionExpression': 'attribute_not_exists(PK)'}},
+        ])
+
+    assert error_code(excinfo) == 'TransactionCanceledException'
+    assert [reason['Code'] for reason in excinfo.value.response['CancellationReasons']] == ['None', 'ConditionalCheckFailed']
+    assert 'Item' not in dynamodb_mock.get_item(Key={'PK': 'P', 'SK': 'new'})
+
+    with pytest.raises(ClientError) as excinfo:
+        client.transact_write_items(TransactItems=[
+            {'Put': {'TableName': 'LangoApp', 'Item': {'PK': 'P', 'SK': 'same'}}},
+            {'Delete': {'TableName': 'LangoApp', 'Key': {'PK': 'P', 'SK': 'same'}}},
+        ])
+    assert error_code(excinfo) == 'ValidationException'
+
+
+def test_batches_reject_duplicate_keys(dynamodb_mock):
+    client = db.get_client()
+    put = {'PutRequest': {'Item': {'PK': 'P', 'SK': 'S'}}}
+
+    with pytest.raises(ClientError) as excinfo:
+        client.batch_write_item(RequestItems={'LangoApp': [put, put]})
+    assert error_code(excinfo) == 'ValidationException'
+
+    client.batch_write_item(RequestItems={'LangoApp': [put, {'PutRequest': {'Item': {'PK': 'P', 'SK': 'T'}}}]})
+    response = client.batch_get_item(RequestItems={'LangoApp': {
+        'Keys': [{'PK': 'P', 'SK': 'S'}, {'PK': 'P', 'SK': 'T'}, {'PK': 'P', 'SK': 'missing'}]
+    }})
+    assert sorted(item['SK'] for item in response['Responses']['LangoApp']) == ['S', 'T']
+
+
+@pytest.mark.skipif(db.backend() != 'memory', reason='moto reports fixed capacity')
+def test_consumed_capacity_is_billed_like_dynamodb(dynamodb_mock):
+    client = db.get_client()
+    big = {'PK': 'P', 'SK': 'S', 'text': 'x' * 3000, 'due_user': 'U', 'due_at': 1, 'word': 'w'}
+
+    put = client.put_item(TableName='LangoApp', Item=big, ReturnConsumedCapacity='TOTAL')
+    # 3 KB item in 1 KB write units, plus one unit for the new DueIndex entry.
+    assert put['ConsumedCapacity'] == {'TableName': 'LangoApp', 'CapacityUnits': 4.0}
+    read = client.get_item(TableName='LangoApp', Key={'PK': 'P', 'SK': 'S'}, ConsistentRead=True,
+                           ReturnConsumedCapacity='INDEXES')
+    assert read['ConsumedCapacity'] == {'TableName': 'LangoApp', 'CapacityUnits': 1.0, 'ReadCapacityUnits': 1.0}
+    query = client.query(TableName='LangoApp', KeyConditionExpression='PK = :p',
+                         ExpressionAttributeValues={':p': 'P'}, ReturnConsumedCapacity='TOTAL')
+    assert query['ConsumedCapacity']['CapacityUnits'] == 0.5
+    moved = client.update_item(TableName='LangoApp', Key={'PK': 'P', 'SK': 'S'}, UpdateExpression='SET due_at = :d',
+                               ExpressionAttributeValues={':d': 2}, ReturnConsumedCapacity='TOTAL')
+    # Moving the index key deletes one index entry and writes another.
+    assert moved['ConsumedCapacity']['CapacityUnits'] == 5.0
+    transaction = client.transact_write_items(TransactItems=[
+        {'Put': {'TableName': 'LangoApp', 'Item': {'PK': 'P', 'SK': 'T'}}},
+    ], ReturnConsumedCapacity='TOTAL')
+    assert transaction['ConsumedCapacity'] == [{'TableName': 'LangoApp', 'CapacityUnits': 2.0}]
+    assert 'ConsumedCapacity' not in client.delete_item(TableName='LangoApp', Key={'PK': 'P', 'SK': 'T'})
@@ -0,0 +1,79 @@
+import json
+import pytest
+from lambdas.auth import handler as auth_handler
+from lambdas.set import handler as set_handler
+from common import db, metrics
+
+
+@pytest.fixture
+def records(monkeypatch):
+    emitted = []
+    monkeypatch.setattr(metrics, 'sink', emitted.append)
+    return emitted
+
+
+class Context:
+    aws_request_id = 'request-1'
+
+
+def test_each_invocation_emits_one_emf_record(dynamodb_mock, auth_headers, records, event):
+    dynamodb_mock.put_item(Item={'PK': 'USER#123', 'SK': 'LANGUAGE#korean', 'language': 'korean'})
+
+    response = set_handler.add_set(
+        event(auth_headers(), {'set_name': 'Basics'}, method='POST', route='POST /addSet', language='korean'), Context())
+
+    assert response['statusCode'] == 201
+    [record] = records
+    definition = record['_aws']['CloudWatchMetrics'][0]
+    assert definition['Namespace'] == 'Lango'
+    assert definition['Dimensions'] == [['Function', 'Route']]
+    names = {metric['Name'] for metric in definition['Metrics']}
+    assert {'Latency', 'AuthTime', 'ParseTime', 'DynamoDBTime', 'SerializeTime', 'ConsumedWriteCapacity'} <= names
+    assert all(name in record for name in names)
+    assert record['Function'] == 'add_set'
+    assert record['Route'] == 'POST /addSet'
+    assert record['RequestId'] == 'request-1'
+    assert record['StatusCode'] == 201
+    assert record['DynamoDBOperations'] == {'transact_write_items': 1}
+    assert record['ServerErrors'] == 0
+    assert record['Latency'] >= record['DynamoDBTime'] > 0
+
+
+def test_cache_outcomes_are_counted_per_invocation(dynamodb_mock, auth_headers, records, event):
+    dynamodb_mock.put_item(Item={'PK': 'USER#123', 'SK': 'LANGUAGE#korean', 'language': 'korean'})
+    dynamodb_mock.put_item(Item={'PK': 'USER#123#LANGUAGE#korean', 'SK': 'SET#abc', 'set_name': 'Basics'})
+
+    for _ in range(2):
+        set_handler.get_set(event(auth_headers(), language='korean', set_id='abc'), None)
+
+    first, second = records
+    assert (first['CacheHits'], first['CacheMisses'], first['CacheRevalidations']) == (0, 1, 0)
+    assert second['CacheOutcomes'] == {'set': {'hits': 1, 'misses': 0, 'revalidations': 0}}
+    assert second['CacheHits'] == 1 and second['CacheMisses'] == 0
+
+
+def test_failed_calls_and_rejected_requests_are_counted(dynamodb_mock, auth_headers, records, event):
+    # No language item, so the transaction's condition fails.
+    missing = set_handler.add_set(event(auth_headers(), {'set_name': 'Basics'}, method='POST', language='korean'), None)
+    rejected = set_handler.get_sets(event({}, language='korean'), None)
+
+    assert missing['statusCode'] == 404
+    assert records[0]['DynamoDBErrorCodes'] == {'TransactionCanceledException': 1}
+    assert records[0]['ClientErrors'] == 1
+    assert rejected['statusCode'] == 401
+    assert records[1]['Route'] == 'get_sets'
+    assert records[1]['DynamoDBCalls'] == 0
+
+
+@pytest.mark.skipif(db.backend() != 'memory', reason='moto reports fixed capacity')
+def test_consumed_capacity_is_summed_per_invocation(dynamodb_mock, records):
+    auth_handler.signup({'body': json.dumps({
+        'username': 'tester', 'password': 'Password1!', 'first_name': 'T', 'last_name': 'U',
+        'preferred_language': 'english'
+    }), 'requestContext': {'http': {'method': 'POST'}}}, None)
+
+    [record] = records
+    # A transaction writing the username claim and the profile costs two units each.
+    assert record['ConsumedWriteCapacity'] == 4.0
+    assert record['ConsumedReadCapacity'] == 0.0
+    assert record['ColdStart'] in (0, 1)
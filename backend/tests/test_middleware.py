@@ -0,0 +1,50 @@
+import json
+from unittest.mock import patch
+import jwt
+from conftest import make_token
+from lambdas.language import handler
+from common import auth
+
+
+def languages_event(headers, **params):
+    return {'queryStringParameters': params or None, 'headers': headers}
+
+
+def test_missing_authorization_header_is_rejected(dynamodb_mock):
+    response = handler.get_languages(languages_event({}, user_id='123'), None)
+    assert response['statusCode'] == 401
+    assert json.loads(response['body'])['error'] == 'Authorization header is required'
+
+
+def test_expired_token_is_rejected(dynamodb_mock):
+    headers = {'authorization': f'Bearer {make_token("123", expires_in=-10)}'}
+    response = handler.get_languages(languages_event(headers, user_id='123'), None)
+    assert response['statusCode'] == 401
+
+
+def test_token_for_another_user_is_forbidden(dynamodb_mock, auth_headers):
+    response = handler.get_languages(languages_event(auth_headers('456'), user_id='123'), None)
+    assert response['statusCode'] == 403
+
+
+def test_user_id_is_taken_from_token(dynamodb_mock, auth_headers):
+    dynamodb_mock.put_item(Item={'PK': 'USER#123', 'SK': 'LANGUAGE#korean', 'language': 'korean'})
+    response = handler.get_languages(languages_event(auth_headers('123')), None)
+    assert response['statusCode'] == 200
+    assert json.loads(response['body'])['languages'] == ['korean']
+
+
+def test_verified_tokens_are_cached(dynamodb_mock):
+    token = make_token('123')
+    with patch('jwt.decode', wraps=jwt.decode) as decode:
+        assert auth.verify_token(token)['user_id'] == '123'
+        assert auth.verify_token(token)['user_id'] == '123'
+    assert decode.call_count == 1
+
+
+def test_cache_evicts_least_recently_used(dynamodb_mock):
+    tokens = [make_token(str(i)) for i in range(3)]
+    with patch.object(auth, 'CACHE_SIZE', 2):
+        for token in tokens:
+            auth.verify_token(token)
+        assert len(auth._cache) == 2
@@ -0,0 +1,55 @@
+import json
+import os
+import re
+import pytest
+from lambdas.router import handler as router
+from common import metrics
+
+TERRAFORM = os.path.join(os.path.dirname(__file__), '..', '..', 'terraform')
+
+
+@pytest.fixture
+def records(monkeypatch):
+    emitted = []
+    monkeypatch.setattr(metrics, 'sink', emitted.append)
+    return emitted
+
+
+def event(route_key, headers, **params):
+    return {
+        'routeKey': route_key,
+        'queryStringParameters': dict(params, user_id='123'),
+        'headers': headers,
+        'body': None,
+        'requestContext': {'http': {'method': route_key.split(' ')[0] if route_key else 'GET'}},
+    }
+
+
+def test_routes_match_the_terraform_endpoints():
+    with open(os.path.join(TERRAFORM, 'lambda.tf')) as f:
+        zips = dict(re.findall(r'(\w+)\s*=\s*\{\s*zip\s*=\s*"(\w+)\.zip"', f.read()))
+    with open(os.path.join(TERRAFORM, 'api_gateway.tf')) as f:
+        endpoints = re.findall(r'(\w+)\s*=\s*\{\s*method\s*=\s*"(\w+)",\s*function\s*=\s*"(\w+)"', f.read())
+
+    assert router.ROUTES == {f'{method} /{name}': (zips[function], function) for name, method, function in endpoints}
+    assert all(handler.__name__ == router.ROUTES[route_key][1] for route_key, handler in router.HANDLERS.items())
+
+
+def test_requests_run_the_route_handler_and_keep_its_metrics(dynamodb_mock, auth_headers, records, monkeypatch):
+    monkeypatch.setenv('AWS_LAMBDA_FUNCTION_NAME', 'routerFunction')
+    dynamodb_mock.put_item(Item={'PK': 'USER#123', 'SK': 'LANGUAGE#korean', 'language': 'korean'})
+
+    response = router.route(event('GET /getSets', auth_headers(), language='korean'), None)
+
+    assert response['statusCode'] == 200
+    assert json.loads(response['body'])['sets'] == []
+    [record] = records
+    assert (record['Function'], record['Route'], record['Handler']) == ('routerFunction', 'GET /getSets', 'get_sets')
+
+
+def test_unknown_routes_are_not_found(records):
+    response = router.route(event('GET /getEverything', {}), None)
+
+    assert response['statusCode'] == 404
+    assert records[0]['Handler'] == 'route_not_found'
+    assert records[0]['Route'] == 'GET /getEverything'
@@ -0,0 +1,104 @@
+import json
+import pytest
+from lambdas.flashcard import handler
+from lambdas.set import handler as set_handler
+from common import search
+
+
+@pytest.fixture
+def language():
+    return 'spanish'
+
+
+def find(headers, q):
+    response = handler.search_flashcards({'queryStringParameters': {'user_id': '123', 'q': q}, 'headers': headers}, None)
+    assert response['statusCode'] == 200
+    return json.loads(response['body'])['flashcards']
+
+
+def test_tokens_are_folded_and_normalized():
+    assert search.tokenize('Café  CAFÉ, naïve!') == ['cafe', 'naive']
+    assert search.tokenize('안녕하세요 세계') == ['안녕하세요', '세계']
+
+
+def test_usage_sentences_are_indexed_without_stop_words(auth_headers, seed_set, card_event):
+    card = {'word': 'manzana', 'translated_word': 'apple',
+            'usage': '¿Dónde está la manzana? La necesito hoy.',
+            'translated_usage': 'Where is the apple? I need it today.'}
+    assert search.card_tokens(card) == ['manzana', 'apple', 'donde', 'esta', 'necesito', 'hoy', 'where', 'need', 'today']
+
+    seed_set()
+    handler.add_flashcard(card_event(auth_headers(), card), None)
+    assert [found['word'] for found in find(auth_headers(), 'hoy')] == ['manzana']
+    assert [found['word'] for found in find(auth_headers(), 'need')] == ['manzana']
+    assert find(auth_headers(), 'the') == []
+
+
+def test_edits_rewrite_only_the_postings_that_changed():
+    card = {'word': 'perro', 'translated_word': 'dog', 'usage': 'el perro ladra'}
+    usage_edit = search.index_requests('123', 'spanish', 'abc', 'f1', card, dict(card, usage='el perro duerme'))
+    word_edit = search.index_requests('123', 'spanish', 'abc', 'f1', card, dict(card, translated_word='hound'))
+
+    assert [(kind, request[kind].get('Key', request[kind].get('Item'))['SK']) for request in usage_edit
+            for kind in request] == [('DeleteRequest', 'TERM#ladra#spanish#abc#f1'),
+                                     ('PutRequest', 'TERM#duerme#spanish#abc#f1')]
+    assert sorted(request['PutRequest']['Item']['SK'] for request in word_edit if 'PutRequest' in request) == [
+        'TERM#hound#spanish#abc#f1', 'TERM#ladra#spanish#abc#f1', 'TERM#perro#spanish#abc#f1']
+
+
+def test_search_tracks_card_writes_without_waiting_for_the_cache(auth_headers, seed_set, card_event):
+    seed_set()
+    added = handler.add_flashcard(card_event(auth_headers(), {
+        'word': 'Mañana', 'translated_word': 'tomorrow', 'usage': 'Hasta mañana'
+    }), None)
+    flashcard_id = json.loads(added['body'])['flashcard_id']
+    handler.add_flashcards(card_event(auth_headers(), {'flashcards': [
+        {'word': 'manzana', 'translated_word': 'apple'},
+        {'word': 'perro', 'translated_word': 'dog'},
+    ]}), None)
+
+    assert [card['word'] for card in find(auth_headers(), 'MANANA')] == ['Mañana']
+    assert sorted(card['word'] for card in find(auth_headers(), 'man')) == ['Mañana', 'manzana']
+    assert find(auth_headers(), 'hasta tom')[0]['flashcard_id'] == flashcard_id
+
+    handler.edit_flashcard(card_event(auth_headers(), {
+        'word': 'ayer', 'usage': 'desde ayer', 'translated_word': 'yesterday', 'translated_usage': 'since yesterday'
+    }, method='PUT', flashcard_id=flashcard_id), None)
+    assert [card['word'] for card in find(auth_headers(), 'man')] == ['manzana']
+    assert find(auth_headers(), 'yester')[0]['word'] == 'ayer'
+
+    handler.delete_flashcard(card_event(auth_headers(), flashcard_id=flashcard_id), None)
+    assert find(auth_headers(), 'ayer') == []
+
+
+def test_deleting_a_set_removes_its_postings(dynamodb_mock, auth_headers, seed_set, card_event):
+    seed_set()
+    handler.add_flashcard(card_event(auth_headers(), {'word': 'gato', 'translated_word': 'cat'}), None)
+    assert len(find(auth_headers(), 'gato')) == 1
+
+    set_handler.delete_set(card_event(auth_headers()), None)
+    assert find(auth_headers(), 'gato') == []
+    assert dynamodb_mock.query(
+        KeyConditionExpression='PK = :pk', ExpressionAttributeValues={':pk': 'USER#123#SEARCH'}
+    )['Items'] == []
+
+
+def test_backfill_indexes_existing_cards(dynamodb_mock, auth_headers):
+    dynamodb_mock.put_item(Item={'PK': 'USER#123#LANGUAGE#spanish#SET#abc', 'SK': 'FLASHCARD#1', 'word': 'libro', 'translated_word': 'book'})
+    assert search.backfill() == 1
+    assert find(auth_headers(), 'book')[0]['word'] == 'libro'
+
+
+def test_prune_deletes_postings_no_card_produces(dynamodb_mock, auth_headers, seed_set, card_event):
+    seed_set()
+    added = handler.add_flashcard(card_event(auth_headers(), {'word': 'gato', 'translated_word': 'cat'}), None)
+    flashcard_id = json.loads(added['body'])['flashcard_id']
+    # Left behind by an older tokenizer, and by a card deleted before it was indexed.
+    for token, card_id in (('el', flashcard_id), ('gato', 'gone')):
+        dynamodb_mock.put_item(Item=search.posting_key('123', token, 'spanish', 'abc', card_id))
+
+    assert search.prune() == 2
+    postings = dynamodb_mock.query(
+        KeyConditionExpression='PK = :pk', ExpressionAttributeValues={':pk': 'USER#123#SEARCH'})['Items']
+    assert sorted(item['SK'] for item in postings) == [
+        f'TERM#cat#spanish#abc#{flashcard_id}', f'TERM#gato#spanish#abc#{flashcard_id}']
@@ -0,0 +1,114 @@
+import json
+import time
+from decimal import Decimal
+from lambdas.flashcard import handler
+from common import reviews, srs
+
+PK = 'USER#123#LANGUAGE#korean#SET#abc'
+
+
+def test_schedule_follows_sm2():
+    state = srs.initial_state('123', 1000)
+    state = srs.schedule(state, 5, 1000)
+    assert (state['interval_days'], state['repetitions'], state['due_at']) == (1, 1, 1000 + srs.DAY)
+    state = srs.schedule(state, 4, 1000)
+    assert (state['interval_days'], state['repetitions']) == (6, 2)
+    state = srs.schedule(state, 4, 1000)
+    assert (state['interval_days'], state['ease']) == (16, Decimal('2.60'))
+
+    lapsed = srs.schedule(state, 1, 1000)
+    assert (lapsed['interval_days'], lapsed['repetitions'], lapsed['due_at']) == (0, 0, 1000 + srs.RELEARN_DELAY)
+    assert lapsed['ease'] < state['ease']
+    assert srs.schedule({'ease': srs.MIN_EASE}, 0, 1000)['ease'] == srs.MIN_EASE
+
+
+def test_grade_moves_card_out_of_due_queue(auth_headers, seed_set, card_event):
+    seed_set()
+    for word in ('a', 'b'):
+        handler.add_flashcard(card_event(auth_headers(), {'word': word, 'translated_word': word.upper()}), None)
+
+    due = json.loads(handler.get_due(card_event(auth_headers()), None)['body'])['flashcards']
+    assert sorted(card['word'] for card in due) == ['a', 'b']
+    assert due[0]['set_id'] == 'abc' and due[0]['language'] == 'korean'
+
+    graded = handler.grade_flashcard(card_event(auth_headers(), {'grade': 5}, flashcard_id=due[0]['flashcard_id']), None)
+    state = json.loads(graded['body'])['state']
+    assert graded['statusCode'] == 200
+    assert state['due_at'] > time.time()
+
+    remaining = json.loads(handler.get_due(card_event(auth_headers()), None)['body'])['flashcards']
+    assert [card['flashcard_id'] for card in remaining] == [due[1]['flashcard_id']]
+
+
+def test_get_due_pages_with_cursor(dynamodb_mock, auth_headers, seed_set, card_event):
+    seed_set()
+    now = int(time.time())
+    for i in range(3):
+        dynamodb_mock.put_item(Item=dict({'PK': PK, 'SK': f'FLASHCARD#{i}', 'word': f'w{i}'}, **srs.initial_state('123', now - 10 + i)))
+    dynamodb_mock.put_item(Item=dict({'PK': PK, 'SK': 'FLASHCARD#later', 'word': 'later'}, **srs.initial_state('123', now + 3600)))
+
+    first = json.loads(handler.get_due(card_event(auth_headers(), limit='2'), None)['body'])
+    assert [card['word'] for card in first['flashcards']] == ['w0', 'w1']
+    rest = json.loads(handler.get_due(card_event(auth_headers(), limit='2', cursor=first['next_cursor']), None)['body'])
+    assert [card['word'] for card in rest['flashcards']] == ['w2']
+
+
+def test_grade_rejects_bad_grades_and_missing_cards(dynamodb_mock, auth_headers, card_event):
+    bad = handler.grade_flashcard(card_event(auth_headers(), {'grade': 7}, flashcard_id='x'), None)
+    assert bad['statusCode'] == 400
+    missing = handler.grade_flashcard(card_event(auth_headers(), {'grade': 3}, flashcard_id='x'), None)
+    assert missing['statusCode'] == 404
+
+
+def test_backfill_schedules_legacy_cards(dynamodb_mock):
+    dynamodb_mock.put_item(Item={'PK': PK, 'SK': 'FLASHCARD#old', 'word': 'old', 'created_at': 100})
+    assert srs.backfill() == 1
+    assert srs.backfill() == 0
+    item = dynamodb_mock.get_item(Key={'PK': PK, 'SK': 'FLASHCARD#old'})['Item']
+    assert (item['due_user'], item['due_at']) == ('USER#123', 100)
+
+
+def seed_cards(table, count, due_at):
+    for i in range(count):
+        table.put_item(Item=dict({'PK': PK, 'SK': f'FLASHCARD#{i}', 'word': f'w{i}'}, **srs.initial_state('123', due_at)))
+
+
+def review(flashcard_id, grade, reviewed_at):
+    return {'language': 'korean', 'set_id': 'abc', 'flashcard_id': flashcard_id, 'grade': grade, 'reviewed_at': reviewed_at}
+
+
+def test_submit_reviews_applies_session_once(dynamodb_mock, auth_headers, card_event):
+    now = int(time.time())
+    seed_cards(dynamodb_mock, 30, now - 100)
+    session = [review(str(i), 4, now - 50 + i) for i in range(30)]
+    # A card lapsed and then relearned in the same session ends up with the state of both reviews.
+    session.append(review('0', 1, now - 60))
+    session.append(review('missing', 3, now - 10))
+    session.append(review('1', 9, now - 10))
+
+    response = handler.submit_reviews(card_event(auth_headers(), {'reviews': session}), None)
+    body = json.loads(response['body'])
+    assert response['statusCode'] == 200
+    assert (body['applied'], body['duplicate'], body['error']) == (31, 0, 2)
+    assert body['results'][31]['error'] == 'Flashcard not found'
+    card = dynamodb_mock.get_item(Key={'PK': PK, 'SK': 'FLASHCARD#0'})['Item']
+    assert (card['repetitions'], card['interval_days'], card['last_reviewed_at']) == (1, 1, now - 50)
+
+    again = json.loads(handler.submit_reviews(card_event(auth_headers(), {'reviews': session[:30]}), None)['body'])
+    assert (again['applied'], again['duplicate']) == (0, 30)
+
+
+def test_submit_reviews_reports_concurrent_grades(dynamodb_mock, monkeypatch):
+    now = int(time.time())
+    seed_cards(dynamodb_mock, 2, now - 100)
+    original = reviews.batch_get
+
+    def stale_read(*args, **kwargs):
+        items = original(*args, **kwargs)
+        dynamodb_mock.update_item(Key={'PK': PK, 'SK': 'FLASHCARD#0'}, UpdateExpression='SET due_at = :d',
+                                  ExpressionAttributeValues={':d': now + 999})
+        return items
+
+    monkeypatch.setattr(reviews, 'batch_get', stale_read)
+    result = reviews.submit('123', [review('0', 5, now - 5), review('1', 5, now - 5)], now)
+    assert [r['status'] for r in result['results']] == ['error', 'applied']
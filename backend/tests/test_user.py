@@ -0,0 +1,96 @@
+import json
+from lambdas.auth import handler as auth_handler
+from lambdas.user import handler
+
+
+def signup(username, password='StrongPass1#'):
+    response = auth_handler.signup({'body': json.dumps({
+        'username': username,
+        'password': password,
+        'first_name': 'Test',
+        'last_name': 'User',
+        'preferred_language': 'English'
+    })}, None)
+    return json.loads(response['body'])['user_id']
+
+
+def edit_event(auth_headers, user_id, **fields):
+    body = {'first_name': 'New', 'last_name': 'Name', 'preferred_language': 'Korean'}
+    body.update(fields)
+    return {
+        'requestContext': {'http': {'method': 'PUT'}},
+        'queryStringParameters': {'user_id': user_id},
+        'headers': auth_headers(user_id),
+        'body': json.dumps(body)
+    }
+
+
+def login(username, password='StrongPass1#'):
+    return auth_handler.login({'body': json.dumps({'username': username, 'password': password})}, None)
+
+
+def test_edit_user_moves_username_reservation(dynamodb_mock, auth_headers):
+    user_id = signup('before')
+
+    response = handler.edit_user(edit_event(auth_headers, user_id, username='After'), None)
+
+    assert response['statusCode'] == 200
+    assert json.loads(response['body'])['updated_attributes']['username'] == 'after'
+    assert 'Item' not in dynamodb_mock.get_item(Key={'PK': 'USERNAME#before', 'SK': 'USERNAME'})
+    assert login('after')['statusCode'] == 200
+    assert login('before')['statusCode'] == 404
+
+
+def test_edit_user_rejects_taken_username(dynamodb_mock, auth_headers):
+    user_id = signup('first')
+    signup('second')
+
+    response = handler.edit_user(edit_event(auth_headers, user_id, username='second'), None)
+
+    assert response['statusCode'] == 409
+    profile = dynamodb_mock.get_item(Key={'PK': f'USER#{user_id}', 'SK': 'PROFILE'})['Item']
+    assert profile['username'] == 'first'
+
+
+def test_edit_user_password_change_applies_to_login(dynamodb_mock, auth_headers):
+    user_id = signup('changer')
+
+    response = handler.edit_user(edit_event(auth_headers, user_id, username='changer', password='NewerPass2!'), None)
+
+    assert response['statusCode'] == 200
+    assert login('changer', 'NewerPass2!')['statusCode'] == 200
+    assert login('changer')['statusCode'] == 401
+
+
+def test_delete_user_releases_username(dynamodb_mock, auth_headers):
+    user_id = signup('leaving')
+
+    response = handler.delete_user({'queryStringParameters': {'user_id': user_id}, 'headers': auth_headers(user_id)}, None)
+
+    assert response['statusCode'] == 200
+    assert dynamodb_mock.scan()['Count'] == 0
+
+
+def test_dashboard_returns_profile_languages_and_sets(dynamodb_mock, auth_headers):
+    dynamodb_mock.put_item(Item={'PK': 'USER#123', 'SK': 'PROFILE', 'user_id': '123', 'username': 'sky', 'hashed_password': 'x'})
+    for language in ('korean', 'spanish'):
+        dynamodb_mock.put_item(Item={'PK': 'USER#123', 'SK': f'LANGUAGE#{language}', 'language': language})
+    dynamodb_mock.put_item(Item={'PK': 'USER#123#LANGUAGE#korean', 'SK': 'SET#abc', 'set_name': 'Basics', 'card_count': 4})
+
+    event = {'queryStringParameters': {'user_id': '123', 'include_counts': 'true'}, 'headers': auth_headers()}
+    response = handler.get_dashboard(event, None)
+    body = json.loads(response['body'])
+
+    assert response['statusCode'] == 200
+    assert body['profile']['username'] == 'sky'
+    assert 'hashed_password' not in body['profile']
+    sets = {entry['language']: entry['sets'] for entry in body['languages']}
+    assert sets['spanish'] == []
+    assert sets['korean'][0]['set_id'] == 'abc'
+    assert sets['korean'][0]['card_count'] == 4
+    assert set(body['timings_ms']['sets']) == {'korean', 'spanish'}
+
+
+def test_dashboard_for_missing_user_is_not_found(dynamodb_mock, auth_headers):
+    event = {'queryStringParameters': {'user_id': '123'}, 'headers': auth_headers()}
+    assert handler.get_dashboard(event, None)['statusCode'] == 404
@@ -0,0 +1,77 @@
+import json
+import pytest
+from lambdas.flashcard import handler
+from common import wordkeys
+
+SET_PK = 'USER#123#LANGUAGE#spanish#SET#abc'
+
+
+@pytest.fixture
+def language():
+    return 'spanish'
+
+
+def test_normalize_word():
+    assert wordkeys.normalize_word('  Ｈola\t  MUNDO ') == 'hola mundo'
+
+
+def test_add_flashcard_returns_existing_card_for_duplicate_word(auth_headers, seed_set, card_event):
+    seed_set()
+    first = handler.add_flashcard(card_event(auth_headers(), {'word': 'Hola', 'translated_word': 'hello'}), None)
+    flashcard_id = json.loads(first['body'])['flashcard_id']
+
+    again = handler.add_flashcard(card_event(auth_headers(), {'word': ' HOLA ', 'translated_word': 'hi'}), None)
+    assert again['statusCode'] == 409
+    assert json.loads(again['body'])['flashcard_id'] == flashcard_id
+
+    bulk = json.loads(handler.add_flashcards(card_event(auth_headers(), {'flashcards': [
+        {'word': 'hola', 'translated_word': 'hello'},
+        {'word': 'adiós', 'translated_word': 'bye'},
+        {'word': 'Adiós', 'translated_word': 'goodbye'},
+    ]}), None)['body'])
+    assert (bulk['created'], bulk['duplicates']) == (1, 2)
+    assert bulk['results'][0]['duplicate_of'] == flashcard_id
+    assert bulk['results'][2]['duplicate_of'] == bulk['results'][1]['flashcard_id']
+
+
+def test_edit_and_delete_move_the_claim(auth_headers, seed_set, card_event):
+    seed_set()
+    ids = [
+        json.loads(handler.add_flashcard(card_event(auth_headers(), {'word': word, 'translated_word': 'x'}), None)['body'])['flashcard_id']
+        for word in ('uno', 'dos')
+    ]
+    edit = {'word': 'dos', 'usage': 'u', 'translated_word': 'two', 'translated_usage': 'v'}
+    clash = handler.edit_flashcard(card_event(auth_headers(), edit, method='PUT', flashcard_id=ids[0]), None)
+    assert clash['statusCode'] == 409
+    assert json.loads(clash['body'])['flashcard_id'] == ids[1]
+
+    edit['word'] = 'tres'
+    assert handler.edit_flashcard(card_event(auth_headers(), edit, method='PUT', flashcard_id=ids[0]), None)['statusCode'] == 200
+    assert wordkeys.owner(SET_PK, 'uno') is None
+    assert wordkeys.owner(SET_PK, 'tres') == ids[0]
+
+    handler.delete_flashcard(card_event(auth_headers(), flashcard_id=ids[1]), None)
+    assert wordkeys.owner(SET_PK, 'dos') is None
+    added = handler.add_flashcard(card_event(auth_headers(), {'word': 'dos', 'translated_word': 'two'}), None)
+    assert added['statusCode'] == 200
+
+
+def test_backfill_keeps_one_claim_per_word(dynamodb_mock):
+    for i in range(2):
+        dynamodb_mock.put_item(Item={'PK': SET_PK, 'SK': f'FLASHCARD#{i}', 'word': 'Gato'})
+    assert wordkeys.backfill() == 1
+    assert wordkeys.owner(SET_PK, 'gato') in ('0', '1')
+
+
+def test_long_words_fit_the_sort_key_limit(auth_headers, seed_set, card_event):
+    seed_set()
+    word = 'palabra' * 220
+
+    single = handler.add_flashcard(card_event(auth_headers(), {'word': word, 'translated_word': 'x'}), None)
+    assert single['statusCode'] == 200
+    bulk = json.loads(handler.add_flashcards(card_event(auth_headers(), {'flashcards': [
+        {'word': word.upper(), 'translated_word': 'y'},
+        {'word': 'corta', 'translated_word': 'short'},
+    ]}), None)['body'])
+    assert (bulk['created'], bulk['duplicates']) == (1, 1)
+    assert len(wordkeys.wordkey(SET_PK, word)['SK'].encode('utf-8')) < 100
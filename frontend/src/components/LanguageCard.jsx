@@ -2,11 +2,11 @@ import { useNavigate } from 'react-router-dom';
 import React from 'react';
 import '../styles/LanguageCard.css';
 
-function LanguageCard({ language, onDelete }) {
+function LanguageCard({ language, sets, onDelete }) {
   const navigate = useNavigate();
 
   const handleClick = () => {
-    navigate(`/set/${language}`);
+    navigate(`/set/${language}`, { state: { sets } });
   };
 
   return (
@@ -13,6 +13,9 @@ function SetCard({ set, onDelete, language_id}) {
         <div className="set-card" onClick={handleClick}>
             <h3>{set.set_name}</h3>
             <p className="description">{set.set_description}</p>
+            <p className="card-count">
+                {set.card_count ?? 0} {set.card_count === 1 ? 'card' : 'cards'}
+            </p>
 
             <div className="button-container">
                 <button
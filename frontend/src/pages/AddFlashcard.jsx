@@ -36,6 +36,7 @@ function AddFlashcard() {
           method: 'POST',
           headers: {
             'Content-Type': 'application/json',
+            'Authorization': `Bearer ${localStorage.getItem('token')}`,
           },
           body: JSON.stringify({
             "word": word,
@@ -48,7 +49,7 @@ function AddFlashcard() {
 
       if (!response.ok) {
         const errorData = await response.json();
-        throw new Error(errorData.message || 'Failed to add flashcard.');
+        throw new Error(errorData.error || errorData.message || 'Failed to add flashcard.');
       }
 
       const data = await response.json();
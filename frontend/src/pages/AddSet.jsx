@@ -32,6 +32,7 @@ function AddSet() {
                 method: 'POST',
                 headers: {
                 'Content-Type': 'application/json',
+                'Authorization': `Bearer ${localStorage.getItem('token')}`,
                 },
                 body: JSON.stringify({
                 'set_name': name,
@@ -33,6 +33,7 @@ function EditFlashcard() {
                 method: 'GET',
                 headers: {
                 'Content-Type': 'application/json',
+                'Authorization': `Bearer ${localStorage.getItem('token')}`,
                 },
             }
             );
@@ -65,6 +66,7 @@ function EditFlashcard() {
           method: 'PUT',
           headers: {
             'Content-Type': 'application/json',
+            'Authorization': `Bearer ${localStorage.getItem('token')}`,
           },
           body: JSON.stringify({
             "word": word,
@@ -34,6 +34,7 @@ function EditSet() {
                 method: 'GET',
                 headers: {
                     'Content-Type': 'application/json',
+                    'Authorization': `Bearer ${localStorage.getItem('token')}`,
                 },
                 }
             );
@@ -66,6 +67,7 @@ function EditSet() {
             method: 'PUT',
             headers: {
             'Content-Type': 'application/json',
+            'Authorization': `Bearer ${localStorage.getItem('token')}`,
             },
             body: JSON.stringify({
             "set_name": name,
@@ -27,7 +27,11 @@ function Flashcard() {
       const fetchFlashcards = async () => {
         if (!token) return;
           try {
-              const response = await fetch(`${import.meta.env.VITE_API_BASE_URL}/getFlashcards?user_id=${user}&language=${language_id}&set_id=${set_id}`);
+              const response = await fetch(`${import.meta.env.VITE_API_BASE_URL}/getFlashcards?user_id=${user}&language=${language_id}&set_id=${set_id}`, {
+                  headers: {
+                      'Authorization': `Bearer ${localStorage.getItem('token')}`,
+                  },
+              });
               if (!response.ok) {
                   console.error('Failed to fetch flashcards');
                   return;
@@ -55,6 +59,7 @@ function Flashcard() {
                 method: 'DELETE',
                 headers: {
                     'Content-Type': 'application/json',
+                    'Authorization': `Bearer ${localStorage.getItem('token')}`,
                 },
             });
             if (!response.ok) {
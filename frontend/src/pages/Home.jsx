@@ -25,10 +25,11 @@ function Home() {
         const fetchLanguages = async () => {
             if (!token) return;
             try {
-                const response = await fetch(`${import.meta.env.VITE_API_BASE_URL}/getLanguages?user_id=${user}`, {
+                const response = await fetch(`${import.meta.env.VITE_API_BASE_URL}/getDashboard?user_id=${user}&include_counts=true`, {
                     method: 'GET',
                     headers: {
                         'Content-Type': 'application/json',
+                        'Authorization': `Bearer ${localStorage.getItem('token')}`,
                     },
                 });
                 if (!response.ok) {
@@ -36,6 +37,7 @@ function Home() {
                     return;
                 }
                 const data = await response.json();
+                // Each entry keeps its sets, so the Set page needs no getSets call of its own.
                 setLanguages(data.languages);
                 
             } catch (error) {
@@ -55,6 +57,7 @@ function Home() {
                     method: 'DELETE',
                     headers: {
                         'Content-Type': 'application/json',
+                        'Authorization': `Bearer ${localStorage.getItem('token')}`,
                     },
                 });
                 if (!response.ok) {
@@ -63,7 +66,7 @@ function Home() {
                 }
                 const data = await response.json();
                 console.log('Language deleted successfully:', data);
-                setLanguages(languages.filter(language => language !== language_id));
+                setLanguages(languages.filter(entry => entry.language !== language_id));
             }
             catch (error) {
                 console.error('Error deleting language:', error);
@@ -88,11 +91,12 @@ function Home() {
                     <h2>Your Languages</h2>
                     <button onClick={handleAddLanguage}>Add Language</button>
                     {languages.length > 0 ? (
-                        languages.map((language) => (
+                        languages.map((entry) => (
                             <LanguageCard
-                                key={language}
-                                language={language}
-                                onDelete={() => handleDeleteLanguage(language)}
+                                key={entry.language}
+                                language={entry.language}
+                                sets={entry.sets}
+                                onDelete={() => handleDeleteLanguage(entry.language)}
                             />
                         ))
                     ) : (
@@ -36,7 +36,7 @@ function Profile() {
       try {
         const response = await fetch(`${import.meta.env.VITE_API_BASE_URL}/getUser?user_id=${storedUserId}`, {
           method: 'GET',
-          headers: { 'Content-Type': 'application/json' }
+          headers: { 'Content-Type': 'application/json', 'Authorization': `Bearer ${localStorage.getItem('token')}` }
         });
 
         if (!response.ok) throw new Error('Failed to fetch user info');
@@ -83,7 +83,7 @@ function Profile() {
     try {
       const response = await fetch(`${import.meta.env.VITE_API_BASE_URL}/editUser?user_id=${localStorage.getItem('user_id')}`, {
         method: 'PUT',
-        headers: { 'Content-Type': 'application/json' },
+        headers: { 'Content-Type': 'application/json', 'Authorization': `Bearer ${localStorage.getItem('token')}` },
         body: JSON.stringify(formData)
       });
 
@@ -118,7 +118,7 @@ function Profile() {
     try {
       const response = await fetch(`${import.meta.env.VITE_API_BASE_URL}/deleteUser?user_id=${localStorage.getItem('user_id')}`, {
         method: 'DELETE',
-        headers: { 'Content-Type': 'application/json' }
+        headers: { 'Content-Type': 'application/json', 'Authorization': `Bearer ${localStorage.getItem('token')}` }
       });
 
       if (!response.ok) throw new Error('Delete failed');
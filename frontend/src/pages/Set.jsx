@@ -1,11 +1,13 @@
 import React, { useState, useEffect } from 'react';
-import { useNavigate, useParams } from 'react-router-dom';
+import { useLocation, useNavigate, useParams } from 'react-router-dom';
 import SetCard from '../components/SetCard';
 import '../styles/Set.css';
 
 function Set() {
     const { language_id } = useParams();
-    const [sets, setSets] = useState(null);
+    const location = useLocation();
+    // Home passes the sets it loaded with the dashboard; reloads and direct links fetch them.
+    const [sets, setSets] = useState(location.state?.sets ?? null);
     const navigate = useNavigate();
     const [error, setError] = useState(null);
     const [user, setUser] = useState(null);
@@ -24,12 +26,13 @@ function Set() {
 
     useEffect(() => {
         const fetchSets = async () => {
-            if (!token) return;
+            if (!token || location.state?.sets) return;
             try {
                 const response = await fetch(`${import.meta.env.VITE_API_BASE_URL}/getSets?user_id=${user}&language=${language_id}`, {
                     method: 'GET',
                     headers: {
                         'Content-Type': 'application/json',
+                        'Authorization': `Bearer ${localStorage.getItem('token')}`,
                     },
                 });
                 if (!response.ok) {
@@ -44,7 +47,7 @@ function Set() {
 
         fetchSets();
     }
-    , [token, user, language_id]);
+    , [token, user, language_id, location.state]);
 
     const handleAddSet = () => {
         navigate(`/add-set/${language_id}`);
@@ -57,6 +60,7 @@ function Set() {
                     method: 'DELETE',
                     headers: {
                         'Content-Type': 'application/json',
+                        'Authorization': `Bearer ${localStorage.getItem('token')}`,
                     },
                 });
                 if (!response.ok) {
@@ -12,28 +12,42 @@ resource "aws_apigatewayv2_api" "lango_api" {
 
 locals {
   lango_endpoints = {
-    addFlashcard     = { method = "POST",    lambda = aws_lambda_function.lango_functions["add_flashcard"] }
-    editFlashcard    = { method = "PUT",     lambda = aws_lambda_function.lango_functions["edit_flashcard"]}
-    deleteFlashcard  = { method = "DELETE",  lambda = aws_lambda_function.lango_functions["delete_flashcard"]}
-    getFlashcards    = { method = "GET",     lambda = aws_lambda_function.lango_functions["get_flashcards"]}
-    getFlashcard     = { method = "GET",     lambda = aws_lambda_function.lango_functions["get_flashcard"]}
-
-    addSet           = { method = "POST",    lambda = aws_lambda_function.lango_functions["add_set"]}
-    getSets          = { method = "GET",     lambda = aws_lambda_function.lango_functions["get_sets"]}
-    getSet           = { method = "GET",     lambda = aws_lambda_function.lango_functions["get_set"]}
-    editSet          = { method = "PUT",     lambda = aws_lambda_function.lango_functions["edit_set"]}
-    deleteSet        = { method = "DELETE",  lambda = aws_lambda_function.lango_functions["delete_set"]}
-
-    addLanguage      = { method = "POST",    lambda = aws_lambda_function.lango_functions["add_language"]}
-    getLanguages     = { method = "GET",     lambda = aws_lambda_function.lango_functions["get_languages"]}
-    deleteLanguage   = { method = "DELETE",  lambda = aws_lambda_function.lango_functions["delete_language"]}
-
-    deleteUser       = { method = "DELETE",  lambda = aws_lambda_function.lango_functions["delete_user"]}
-    editUser      = { method = "PUT",     lambda = aws_lambda_function.lango_functions["edit_user"]}
-    getUser       = { method = "GET",     lambda = aws_lambda_function.lango_functions["get_user"]}
-
-    signup = { method = "POST", lambda = aws_lambda_function.lango_functions["signup"]}
-    login  = { method = "POST", lambda = aws_lambda_function.lango_functions["login"]}
+    addFlashcard     = { method = "POST",    function = "add_flashcard" }
+    addFlashcards    = { method = "POST",    function = "add_flashcards" }
+    importFlashcards = { method = "POST",    function = "import_flashcards" }
+    editFlashcard    = { method = "PUT",     function = "edit_flashcard" }
+    deleteFlashcard  = { method = "DELETE",  function = "delete_flashcard" }
+    getFlashcards    = { method = "GET",     function = "get_flashcards" }
+    getFlashcard     = { method = "GET",     function = "get_flashcard" }
+    getDue           = { method = "GET",     function = "get_due" }
+    gradeFlashcard   = { method = "POST",    function = "grade_flashcard" }
+    submitReviews    = { method = "POST",    function = "submit_reviews" }
+    searchFlashcards = { method = "GET",     function = "search_flashcards" }
+
+    addSet           = { method = "POST",    function = "add_set" }
+    getSets          = { method = "GET",     function = "get_sets" }
+    getSet           = { method = "GET",     function = "get_set" }
+    editSet          = { method = "PUT",     function = "edit_set" }
+    deleteSet        = { method = "DELETE",  function = "delete_set" }
+
+    addLanguage      = { method = "POST",    function = "add_language" }
+    getLanguages     = { method = "GET",     function = "get_languages" }
+    deleteLanguage   = { method = "DELETE",  function = "delete_language" }
+
+    deleteUser       = { method = "DELETE",  function = "delete_user" }
+    editUser      = { method = "PUT",     function = "edit_user" }
+    getUser       = { method = "GET",     function = "get_user" }
+    getDashboard  = { method = "GET",     function = "get_dashboard" }
+    exportUserData = { method = "GET",    function = "export_user_data" }
+
+    signup = { method = "POST", function = "signup" }
+    login  = { method = "POST", function = "login" }
+  }
+
+  # The function serving each endpoint: its own, or the router that serves them all.
+  endpoint_lambdas = {
+    for name, endpoint in local.lango_endpoints :
+    name => aws_lambda_function.lango_functions[var.deployment_mode == "router" ? "router" : endpoint.function]
   }
 }
 
@@ -42,7 +56,7 @@ resource "aws_lambda_permission" "lango_permissions" {
 
   statement_id  = "Allow${each.key}Invoke"
   action        = "lambda:InvokeFunction"
-  function_name = each.value.lambda.function_name
+  function_name = local.endpoint_lambdas[each.key].function_name
   principal     = "apigateway.amazonaws.com"
   source_arn    = "${aws_apigatewayv2_api.lango_api.execution_arn}/*/*"
 }
@@ -53,7 +67,7 @@ resource "aws_apigatewayv2_integration" "lango_integrations" {
 
   api_id                  = aws_apigatewayv2_api.lango_api.id
   integration_type        = "AWS_PROXY"
-  integration_uri         = each.value.lambda.invoke_arn
+  integration_uri         = local.endpoint_lambdas[each.key].invoke_arn
   payload_format_version  = "2.0"
 }
 
@@ -1,6 +1,8 @@
 
+# One alarm per deployed function: each handler's own function, or the router
+# in deployment_mode = "router".
 resource "aws_cloudwatch_metric_alarm" "lambda_errors" {
-    for_each = toset(var.lambda_names)
+    for_each = aws_lambda_function.lango_functions
 
     alarm_name          = "Lango-${each.key}-Errors"
     comparison_operator = "GreaterThanThreshold"
@@ -15,7 +17,7 @@ resource "aws_cloudwatch_metric_alarm" "lambda_errors" {
     alarm_description   = "Alarm for ${each.key} function errors"
     
     dimensions = {
-        FunctionName = each.key
+        FunctionName = each.value.function_name
     }
     
     tags = {
@@ -24,3 +26,57 @@ resource "aws_cloudwatch_metric_alarm" "lambda_errors" {
         LambdaName  = each.key
     }
 }
+
+# The handlers publish per-route metrics with dimensions Function and Route
+# (see backend/lambdas/common/metrics.py).
+resource "aws_cloudwatch_metric_alarm" "route_latency" {
+    for_each = local.lango_endpoints
+
+    alarm_name          = "Lango-${each.key}-LatencyP99"
+    comparison_operator = "GreaterThanThreshold"
+    evaluation_periods  = 3
+    metric_name         = "Latency"
+    namespace           = var.metrics_namespace
+    period              = 300
+    extended_statistic  = "p99"
+    treat_missing_data  = "notBreaching"
+    threshold           = var.latency_alarm_threshold_ms
+    alarm_description   = "p99 latency of ${each.value.method} /${each.key}"
+
+    dimensions = {
+        Function = local.endpoint_lambdas[each.key].function_name
+        Route    = "${each.value.method} /${each.key}"
+    }
+
+    tags = {
+        Project     = "Lango"
+        Environment = "dev"
+        Route       = each.key
+    }
+}
+
+resource "aws_cloudwatch_metric_alarm" "route_server_errors" {
+    for_each = local.lango_endpoints
+
+    alarm_name          = "Lango-${each.key}-ServerErrors"
+    comparison_operator = "GreaterThanThreshold"
+    evaluation_periods  = 1
+    metric_name         = "ServerErrors"
+    namespace           = var.metrics_namespace
+    period              = 60
+    statistic           = "Sum"
+    treat_missing_data  = "notBreaching"
+    threshold           = 1
+    alarm_description   = "5xx responses from ${each.value.method} /${each.key}"
+
+    dimensions = {
+        Function = local.endpoint_lambdas[each.key].function_name
+        Route    = "${each.value.method} /${each.key}"
+    }
+
+    tags = {
+        Project     = "Lango"
+        Environment = "dev"
+        Route       = each.key
+    }
+}
@@ -16,14 +16,22 @@ resource "aws_dynamodb_table" "lango_table" {
     }
 
     attribute {
-        name = "username"
+        name = "due_user"
         type = "S"
     }
 
+    attribute {
+        name = "due_at"
+        type = "N"
+    }
+
+    # Sparse: only flashcards carry due_user, so the index holds exactly the review queue.
     global_secondary_index {
-        name            = "UsernameIndex"
-        hash_key        = "username"
-        projection_type = "ALL"
+        name               = "DueIndex"
+        hash_key           = "due_user"
+        range_key          = "due_at"
+        projection_type    = "INCLUDE"
+        non_key_attributes = ["word", "usage", "translated_word", "translated_usage", "ease", "interval_days", "repetitions"]
     }
 
     tags = {
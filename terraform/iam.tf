@@ -29,15 +29,28 @@ resource "aws_iam_role_policy" "lambda_policy" {
         Action = [
           "dynamodb:PutItem",
           "dynamodb:GetItem",
+          "dynamodb:BatchGetItem",
           "dynamodb:UpdateItem",
           "dynamodb:DeleteItem",
+          "dynamodb:BatchWriteItem",
+          "dynamodb:TransactWriteItems",
+          "dynamodb:ConditionCheckItem",
           "dynamodb:Scan",
           "dynamodb:Query"
         ]
         Resource = [
           "${aws_dynamodb_table.lango_table.arn}",
-          "${aws_dynamodb_table.lango_table.arn}/index/UsernameIndex"
+          "${aws_dynamodb_table.lango_table.arn}/index/DueIndex"
         ]
+      },
+      {
+        Effect = "Allow"
+        Action = [
+          "s3:PutObject",
+          "s3:GetObject",
+          "s3:AbortMultipartUpload"
+        ]
+        Resource = "${aws_s3_bucket.exports.arn}/exports/*"
       }
     ]
   })
@@ -5,6 +5,15 @@ locals {
       zip     = "flashcard.zip"
       handler = "handler.add_flashcard"
     }
+    add_flashcards = {
+      zip     = "flashcard.zip"
+      handler = "handler.add_flashcards"
+    }
+    import_flashcards = {
+      zip     = "flashcard.zip"
+      handler = "handler.import_flashcards"
+      timeout = 60
+    }
     edit_flashcard = {
       zip     = "flashcard.zip"
       handler = "handler.edit_flashcard"
@@ -21,6 +30,23 @@ locals {
       zip     = "flashcard.zip"
       handler = "handler.get_flashcard"
     }
+    get_due = {
+      zip     = "flashcard.zip"
+      handler = "handler.get_due"
+    }
+    grade_flashcard = {
+      zip     = "flashcard.zip"
+      handler = "handler.grade_flashcard"
+    }
+    submit_reviews = {
+      zip     = "flashcard.zip"
+      handler = "handler.submit_reviews"
+      timeout = 30
+    }
+    search_flashcards = {
+      zip     = "flashcard.zip"
+      handler = "handler.search_flashcards"
+    }
 
     add_set = {
       zip     = "set.zip"
@@ -69,6 +95,15 @@ locals {
       zip     = "user.zip"
       handler = "handler.get_user"
     }
+    get_dashboard = {
+      zip     = "user.zip"
+      handler = "handler.get_dashboard"
+    }
+    export_user_data = {
+      zip     = "user.zip"
+      handler = "handler.export_user_data"
+      timeout = 120
+    }
 
     signup = {
       zip     = "auth.zip"
@@ -79,22 +114,42 @@ locals {
       handler = "handler.login"
     }
   }
+
+  # deployment_mode = "router" deploys this one function in place of the ones
+  # above; it dispatches on the route key to the same handlers
+  # (backend/lambdas/router/handler.py), so every route shares its warm containers.
+  router_function = {
+    router = {
+      zip     = "router.zip"
+      handler = "handler.route"
+      timeout = max([for name, f in local.lambda_functions : try(f.timeout, 10)]...)
+    }
+  }
+
+  deployed_functions = merge(
+    { for name, f in local.lambda_functions : name => f if var.deployment_mode == "per_function" },
+    { for name, f in local.router_function : name => f if var.deployment_mode == "router" },
+  )
 }
 
 resource "aws_lambda_function" "lango_functions" {
-   for_each      = local.lambda_functions
+   for_each      = local.deployed_functions
 
   function_name = "${each.key}Function"
   role          = aws_iam_role.lambda_exec_role.arn
   handler       = each.value.handler
   runtime       = var.lambda_runtime
   filename      = "${var.lambda_source_folder}/${each.value.zip}"
-  timeout       = 10
+  timeout       = try(each.value.timeout, 10)
 
   environment {
     variables = {
       DYNAMODB_TABLE_NAME = aws_dynamodb_table.lango_table.name
       JWT_SECRET          = var.jwt_secret
+      EXPORT_BUCKET       = aws_s3_bucket.exports.bucket
+      METRICS_NAMESPACE   = var.metrics_namespace
+      LOG_LEVEL           = var.log_level
+      LOG_PAYLOAD_SAMPLE_RATE = var.log_payload_sample_rate
     }
   }
 
@@ -44,4 +44,42 @@ resource "aws_s3_bucket_policy" "my_bucket_policy" {
       }
     ]
   })
-}
\ No newline at end of file
+}
+resource "aws_s3_bucket" "exports" {
+  bucket = "lang-app-exports-12345678"
+
+  tags = {
+    Name        = "LangoExports"
+    Environment = var.stage_name
+  }
+}
+
+resource "aws_s3_bucket_public_access_block" "exports_block" {
+  bucket = aws_s3_bucket.exports.id
+
+  block_public_acls       = true
+  block_public_policy     = true
+  ignore_public_acls      = true
+  restrict_public_buckets = true
+}
+
+resource "aws_s3_bucket_lifecycle_configuration" "exports_expiry" {
+  bucket = aws_s3_bucket.exports.id
+
+  rule {
+    id     = "expire-exports"
+    status = "Enabled"
+
+    filter {
+      prefix = "exports/"
+    }
+
+    expiration {
+      days = 1
+    }
+
+    abort_incomplete_multipart_upload {
+      days_after_initiation = 1
+    }
+  }
+}
@@ -18,6 +18,17 @@ variable "lambda_source_folder" {
   default     = "../backend/lambdas/zip"
 }
 
+variable "deployment_mode" {
+  description = "per_function deploys a Lambda function per route; router deploys one function (router.zip) that serves every route"
+  type        = string
+  default     = "per_function"
+
+  validation {
+    condition     = contains(["per_function", "router"], var.deployment_mode)
+    error_message = "deployment_mode must be \"per_function\" or \"router\"."
+  }
+}
+
 # API Gateway settings
 variable "api_name" {
   description = "The name of the API Gateway"
@@ -44,25 +55,28 @@ variable "jwt_secret" {
   sensitive   = true
 }
 
-variable "lambda_names" {
-  default = [
-    "add_flashcard",
-    "edit_flashcard",
-    "delete_flashcard",
-    "get_flashcards",
-    "get_flashcard",
-    "add_set",
-    "edit_set",
-    "delete_set",
-    "get_sets",
-    "get_set",
-    "add_language",
-    "delete_language",
-    "get_languages",
-    "delete_user",
-    "edit_user",
-    "get_user",
-    "signup",
-    "login"
-  ]
-}
\ No newline at end of file
+# Handler metrics (CloudWatch Embedded Metric Format)
+variable "metrics_namespace" {
+  description = "CloudWatch namespace the handlers publish their per-request metrics to"
+  type        = string
+  default     = "Lango"
+}
+
+variable "latency_alarm_threshold_ms" {
+  description = "p99 handler latency, in milliseconds, above which a route's alarm fires"
+  type        = number
+  default     = 3000
+}
+
+# Handler logging (see backend/lambdas/common/logs.py)
+variable "log_level" {
+  description = "Lowest level the handlers write, e.g. DEBUG in dev and INFO or WARNING in production"
+  type        = string
+  default     = "INFO"
+}
+
+variable "log_payload_sample_rate" {
+  description = "Fraction of requests, 0 to 1, whose DEBUG payload lines are written even when they succeed"
+  type        = number
+  default     = 0
+}